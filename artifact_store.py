@@ -0,0 +1,369 @@
+"""
+ماژول مخزن فایل‌های دانلود شده
+
+همه فایل‌های دانلود شده (downloads، temp_downloads، videos و instagram_videos)
+در یک فهرست پایدار ثبت می‌شوند: مسیر، حجم، شناسه دانلودهای مالک، کلید
+استفاده مجدد و زمان آخرین دسترسی. فایل‌هایی که در حال آپلود هستند قفل
+(pin) می‌شوند و وقتی حجم کل از بودجه تعیین شده بیشتر شود، فایل‌هایی که
+مدت بیشتری استفاده نشده‌اند (LRU) حذف می‌شوند.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple, List
+
+from config import ARTIFACT_STORE_BUDGET_MB, ARTIFACT_MANIFEST_FILE, ARTIFACT_DIRS, ARTIFACT_CACHE_TTL
+from debug_logger import debug_log
+
+# فایل‌هایی که تازه استفاده شده‌اند حتی با پر شدن بودجه حذف نمی‌شوند (ثانیه)
+EVICTION_GRACE_SECONDS = 60
+
+# فایل‌های نیمه‌کاره که هرگز توسط پاکسازی حذف نمی‌شوند: .part/.ytdl/.temp/.tmp/.segments
+# (به صورت پسوند یا میانی مثل name.temp.mp4)، تکه‌های .part-FragN و فایل‌های میانی
+# yt-dlp پیش از ادغام (video.f137.mp4) و فایل موقت افزودن مشخصات صوتی (.tagged.)
+IN_PROGRESS_PATTERN = re.compile(r'\.(part|ytdl|temp|tmp|segments)(\.|$)|\.part-Frag|\.f\d+\.\w+$|\.tagged\.')
+
+# پیشوند پوشه‌های موقت بخش‌های ویدیو (video_splitter) که بعد از ارسال حذف می‌شوند
+TEMP_DIR_PREFIXES = ('parts-',)
+
+
+def _key_to_str(key: Optional[Tuple[str, str]]) -> Optional[str]:
+    """تبدیل کلید (شناسه ویدیو، فرمت) به رشته قابل ذخیره در JSON"""
+    return "|".join(key) if key else None
+
+
+class ArtifactStore:
+    """
+    مخزن فایل‌های دانلود شده با بودجه حجم و حذف LRU
+    """
+
+    def __init__(self, budget_bytes: int = ARTIFACT_STORE_BUDGET_MB * 1024 * 1024,
+                 manifest_file: Optional[str] = ARTIFACT_MANIFEST_FILE,
+                 directories: Optional[List[str]] = None,
+                 max_idle: float = ARTIFACT_CACHE_TTL):
+        self.budget_bytes = budget_bytes
+        self.manifest_file = manifest_file
+        self.directories = list(directories if directories is not None else ARTIFACT_DIRS)
+        self.max_idle = max_idle
+        self._lock = threading.RLock()
+        self._entries = {}  # path -> {"size", "owners", "key", "created_at", "last_access"}
+        self._keys = {}  # key -> path
+        self._pins = {}  # path -> تعداد قفل‌ها (فقط در حافظه)
+        self.stats = {"evicted": 0, "evicted_bytes": 0, "reused": 0}
+        self._load_manifest()
+
+    # --- ذخیره‌سازی فهرست ---
+
+    def _load_manifest(self) -> None:
+        """بارگیری فهرست فایل‌ها از دیسک"""
+        if not self.manifest_file or not os.path.exists(self.manifest_file):
+            return
+
+        try:
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+            for path, entry in data.get("artifacts", {}).items():
+                if not os.path.exists(path):
+                    continue
+                self._entries[path] = entry
+                if entry.get("key"):
+                    self._keys[entry["key"]] = path
+
+            debug_log(f"{len(self._entries)} فایل از فهرست مخزن بارگیری شد", "INFO")
+        except Exception as e:
+            debug_log(f"خطا در بارگیری فهرست مخزن فایل‌ها: {str(e)}", "ERROR")
+
+    def _save_manifest(self) -> None:
+        """ذخیره فهرست فایل‌ها (باید با قفل فراخوانی شود)"""
+        if not self.manifest_file:
+            return
+
+        try:
+            temp_file = self.manifest_file + ".tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump({"artifacts": self._entries}, f, ensure_ascii=False)
+            os.replace(temp_file, self.manifest_file)
+        except Exception as e:
+            debug_log(f"خطا در ذخیره فهرست مخزن فایل‌ها: {str(e)}", "ERROR")
+
+    def _is_manifest(self, path: str) -> bool:
+        """بررسی اینکه مسیر همان فایل فهرست است"""
+        if not self.manifest_file:
+            return False
+        manifest = os.path.abspath(self.manifest_file)
+        return os.path.abspath(path) in (manifest, manifest + ".tmp")
+
+    # --- ثبت و دسترسی ---
+
+    def add(self, path: str, owner: Optional[int] = None, key: Optional[Tuple[str, str]] = None) -> None:
+        """
+        ثبت فایل دانلود شده در مخزن
+
+        Args:
+            path: مسیر فایل
+            owner: شناسه دانلود مالک (اختیاری)
+            key: کلید استفاده مجدد (شناسه ویدیو، فرمت نهایی) (اختیاری)
+        """
+        if not path or not os.path.exists(path):
+            return
+
+        now = time.time()
+        key_str = _key_to_str(key)
+
+        with self._lock:
+            entry = self._entries.get(path)
+
+            if entry is None:
+                entry = {"size": 0, "owners": [], "key": None, "created_at": now, "last_access": now}
+                self._entries[path] = entry
+
+            entry["size"] = os.path.getsize(path)
+            entry["last_access"] = now
+            if owner is not None and owner not in entry["owners"]:
+                entry["owners"].append(owner)
+            if key_str:
+                entry["key"] = key_str
+                self._keys[key_str] = path
+
+            self._evict_to_budget()
+            self._save_manifest()
+
+    def lookup(self, key: Tuple[str, str], owner: Optional[int] = None) -> Optional[str]:
+        """
+        یافتن فایل قابل استفاده مجدد برای یک کلید
+
+        Args:
+            key: (شناسه ویدیو، فرمت نهایی)
+            owner: شناسه دانلودی که از فایل استفاده می‌کند (اختیاری)
+
+        Returns:
+            مسیر فایل یا None
+        """
+        key_str = _key_to_str(key)
+
+        with self._lock:
+            path = self._keys.get(key_str)
+
+            if path is None:
+                return None
+
+            if not os.path.exists(path) or path not in self._entries:
+                self._forget(path)
+                self._keys.pop(key_str, None)
+                self._save_manifest()
+                return None
+
+            entry = self._entries[path]
+            entry["last_access"] = time.time()
+            if owner is not None and owner not in entry["owners"]:
+                entry["owners"].append(owner)
+            self.stats["reused"] += 1
+            self._save_manifest()
+            return path
+
+    def forget_key(self, key: Tuple[str, str]) -> None:
+        """
+        حذف کلید استفاده مجدد (فایل تا زمان حذف LRU روی دیسک می‌ماند)
+
+        Args:
+            key: (شناسه ویدیو، فرمت نهایی)
+        """
+        with self._lock:
+            path = self._keys.pop(_key_to_str(key), None)
+            if path in self._entries:
+                self._entries[path]["key"] = None
+                self._save_manifest()
+
+    def touch(self, path: str) -> None:
+        """به‌روزرسانی زمان آخرین دسترسی فایل"""
+        with self._lock:
+            if path in self._entries:
+                self._entries[path]["last_access"] = time.time()
+
+    # --- قفل فایل‌ها ---
+
+    @contextmanager
+    def pinned(self, path: str):
+        """
+        جلوگیری از حذف فایل تا پایان بلوک (مثلا حین آپلود)
+
+        Args:
+            path: مسیر فایل
+        """
+        with self._lock:
+            self._pins[path] = self._pins.get(path, 0) + 1
+            if path in self._entries:
+                self._entries[path]["last_access"] = time.time()
+        try:
+            yield path
+        finally:
+            with self._lock:
+                count = self._pins.get(path, 1) - 1
+                if count <= 0:
+                    self._pins.pop(path, None)
+                else:
+                    self._pins[path] = count
+
+    def is_pinned(self, path: str) -> bool:
+        with self._lock:
+            return path in self._pins
+
+    # --- حذف فایل‌ها ---
+
+    def _forget(self, path: str) -> None:
+        """حذف فایل از فهرست (باید با قفل فراخوانی شود)"""
+        entry = self._entries.pop(path, None)
+        if entry and entry.get("key") and self._keys.get(entry["key"]) == path:
+            del self._keys[entry["key"]]
+
+    def _delete(self, path: str) -> int:
+        """حذف فایل از دیسک و فهرست (باید با قفل فراخوانی شود)"""
+        entry = self._entries.get(path, {})
+        size = entry.get("size", 0)
+
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+            # حذف پوشه خالی دانلود (مثلا downloads/{id}/)
+            parent = os.path.dirname(path)
+            if parent and parent not in self.directories and os.path.isdir(parent) and not os.listdir(parent):
+                os.rmdir(parent)
+        except OSError as e:
+            debug_log(f"خطا در حذف فایل {path}: {str(e)}", "WARNING")
+            return 0
+
+        self._forget(path)
+        return size
+
+    def discard(self, path: str) -> bool:
+        """
+        حذف فوری یک فایل (اگر قفل نباشد)
+
+        Args:
+            path: مسیر فایل
+
+        Returns:
+            True اگر فایل حذف شد
+        """
+        with self._lock:
+            if path in self._pins:
+                return False
+            self._delete(path)
+            self._save_manifest()
+            return True
+
+    def _evict_to_budget(self) -> None:
+        """حذف فایل‌های LRU تا رسیدن حجم کل به بودجه (باید با قفل فراخوانی شود)"""
+        total = sum(entry["size"] for entry in self._entries.values())
+
+        if total <= self.budget_bytes:
+            return
+
+        now = time.time()
+        candidates = sorted(
+            (path for path, entry in self._entries.items()
+             if path not in self._pins and now - entry["last_access"] > EVICTION_GRACE_SECONDS),
+            key=lambda path: self._entries[path]["last_access"]
+        )
+
+        for path in candidates:
+            if total <= self.budget_bytes:
+                break
+            freed = self._delete(path)
+            total -= freed
+            self.stats["evicted"] += 1
+            self.stats["evicted_bytes"] += freed
+            debug_log(f"فایل {path} برای آزادسازی فضا حذف شد ({freed} بایت)", "INFO")
+
+        if total > self.budget_bytes:
+            debug_log(f"حجم فایل‌ها ({total} بایت) بیش از بودجه است ولی فایل قابل حذفی نیست", "WARNING")
+
+    def sweep(self, max_idle: Optional[float] = None) -> int:
+        """
+        همگام‌سازی فهرست با دیسک، حذف فایل‌های بدون استفاده قدیمی و اعمال بودجه
+
+        حذف LRU فقط روی فایل‌های ثبت شده و قفل نشده انجام می‌شود. فایل‌های ثبت
+        نشده (مثلا از نسخه‌های قبلی یا دانلودهای رها شده) فقط وقتی حذف می‌شوند که
+        بیش از max_idle تغییری نکرده باشند، تا فایل‌هایی که هنوز در حال نوشتن
+        هستند (ادغام، فشرده‌سازی یا تقسیم) حذف نشوند. فایل‌های نیمه‌کاره و
+        پوشه‌های موقت بخش‌ها هرگز حذف نمی‌شوند.
+
+        Args:
+            max_idle: حداکثر مدت بدون استفاده به ثانیه (پیش‌فرض: مقدار مخزن)
+
+        Returns:
+            تعداد فایل‌های حذف شده
+        """
+        now = time.time()
+        max_idle = self.max_idle if max_idle is None else max_idle
+        removed = 0
+
+        with self._lock:
+            # حذف ورودی‌هایی که فایلشان وجود ندارد
+            for path in [path for path in self._entries if not os.path.exists(path)]:
+                self._forget(path)
+
+            # حذف فایل‌های ثبت نشده قدیمی
+            for directory in self.directories:
+                if not os.path.isdir(directory):
+                    continue
+                for root, dirs, files in os.walk(directory):
+                    dirs[:] = [name for name in dirs if not name.startswith(TEMP_DIR_PREFIXES)]
+                    for name in files:
+                        path = os.path.join(root, name)
+                        if (path in self._entries or path in self._pins or IN_PROGRESS_PATTERN.search(name)
+                                or self._is_manifest(path)):
+                            continue
+                        try:
+                            if now - os.path.getmtime(path) <= max_idle:
+                                continue
+                        except OSError:
+                            continue
+                        self._delete(path)
+                        if not os.path.exists(path):
+                            removed += 1
+
+            # حذف فایل‌هایی که مدت زیادی استفاده نشده‌اند
+            for path, entry in list(self._entries.items()):
+                if path not in self._pins and now - entry["last_access"] > max_idle:
+                    self._delete(path)
+                    removed += 1
+
+            evicted_before = self.stats["evicted"]
+            self._evict_to_budget()
+            removed += self.stats["evicted"] - evicted_before
+
+            self._save_manifest()
+
+        if removed:
+            debug_log(f"پاکسازی مخزن فایل‌ها: {removed} فایل حذف شد", "INFO")
+
+        return removed
+
+    # --- آمار ---
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        دریافت آمار مخزن
+
+        Returns:
+            دیکشنری آمار
+        """
+        with self._lock:
+            return {
+                "files": len(self._entries),
+                "total_bytes": sum(entry["size"] for entry in self._entries.values()),
+                "budget_bytes": self.budget_bytes,
+                "pinned": len(self._pins),
+                "reusable": len(self._keys),
+                **self.stats,
+            }
+
+
+# نمونه سراسری
+artifact_store = ArtifactStore()
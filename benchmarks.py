@@ -0,0 +1,989 @@
+"""
+اسکریپت بنچمارک اجزای دانلود ربات
+
+اجرا:
+    python benchmarks.py segmented --size-mb 16 --rate-kb 512 --segments 8
+    python benchmarks.py resume --size-mb 8 --stop-percent 90
+    python benchmarks.py upload --size-mb 16 --chunk-kb 64 256 1024
+    python benchmarks.py media-group --items 10 --latency-ms 300
+    python benchmarks.py gateway --broadcast 120 --replies 10 --throttle-first 3
+    python benchmarks.py progress --jobs 50 --seconds 6 --interval 3
+    python benchmarks.py transcode --clip-seconds 60 --jobs 4 --target-mb 2
+    python benchmarks.py split --parts 6 --part-mb 4 --rate-kb 2048
+    python benchmarks.py db --threads 32 --seconds 5 --write-percent 20
+    python benchmarks.py db-writes --threads 16 --writes 2000
+    python benchmarks.py db-plans --downloads 200000 --logs 200000 --users 5000
+    python benchmarks.py db-pages --downloads 1000000 --page-size 20
+    python benchmarks.py db-logs --days 60 --per-day 20000 --retention 14
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import datetime
+import shutil
+import argparse
+import tempfile
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# --- سرور HTTP محلی با محدودیت سرعت هر اتصال ---
+
+def make_throttled_handler(payload: bytes, rate_bytes: int):
+    """ساخت هندلر HTTP که هر اتصال را به rate_bytes بایت در ثانیه محدود می‌کند"""
+
+    class ThrottledHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            total = len(payload)
+            start, end = 0, total - 1
+            range_header = self.headers.get("Range")
+
+            if range_header and range_header.startswith("bytes="):
+                first, _, last = range_header[6:].partition("-")
+                start = int(first)
+                end = min(int(last), total - 1) if last else total - 1
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+            else:
+                self.send_response(200)
+
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+
+            # ارسال داده با سرعت محدود (تکه‌های 1/20 ثانیه)
+            chunk = max(1, rate_bytes // 20)
+            position = start
+            try:
+                while position <= end:
+                    data = payload[position:min(position + chunk, end + 1)]
+                    self.wfile.write(data)
+                    position += len(data)
+                    time.sleep(len(data) / rate_bytes)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return ThrottledHandler
+
+
+def start_throttled_server(payload: bytes, rate_bytes: int):
+    """راه‌اندازی سرور محلی در یک ترد و برگرداندن (سرور، آدرس)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_throttled_handler(payload, rate_bytes))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/video.mp4"
+
+
+# --- سرور جعلی Bot API برای آپلود ---
+
+def make_fake_bot_api_handler(rate_bytes: int, throttle_first: int, stats: dict, latency: float = 0):
+    """
+    ساخت هندلر Bot API جعلی که بدنه multipart را با سرعت محدود می‌خواند
+
+    به throttle_first درخواست اول پاسخ 429 با retry_after داده می‌شود و هر
+    پاسخ latency ثانیه تاخیر دارد (شبیه‌سازی رفت و برگشت شبکه).
+    """
+
+    class FakeBotAPIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # سرصفحه و بدنه پاسخ جداگانه نوشته می‌شوند؛ بدون این گزینه اتصال keep-alive با تاخیر ACK کند می‌شود
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, data: dict) -> None:
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(200 if data.get("ok") else data.get("error_code", 400))
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            remaining = length
+            chunk = max(1, rate_bytes // 20)
+
+            # خواندن بدنه با سرعت محدود (فقط ابتدای بدنه برای خواندن فیلد media نگه داشته می‌شود)
+            head = b""
+            while remaining > 0:
+                data = self.rfile.read(min(chunk, remaining))
+                if not data:
+                    break
+                if len(head) < 65536:
+                    head += data[:65536 - len(head)]
+                remaining -= len(data)
+                time.sleep(len(data) / rate_bytes)
+
+            time.sleep(latency)
+
+            stats["requests"] += 1
+            if stats["requests"] <= throttle_first:
+                self._reply({"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                             "parameters": {"retry_after": 1}})
+                return
+
+            method = self.path.rsplit("/", 1)[-1]
+            stats["bytes"] += length
+
+            def message(kind, index=0):
+                return {
+                    "message_id": stats["requests"] * 100 + index, "date": int(time.time()),
+                    "chat": {"id": 1, "type": "private"},
+                    kind: {"file_id": f"fake-{stats['requests']}-{index}",
+                           "file_unique_id": f"u{stats['requests']}-{index}", "file_size": length},
+                }
+
+            if method == "sendMediaGroup":
+                match = re.search(rb'name="media"\r\n\r\n(.*?)\r\n--', head, re.S)
+                if match:
+                    media = json.loads(match.group(1))
+                else:
+                    media = json.loads(urllib.parse.parse_qs(head.decode("utf-8"))["media"][0])
+                self._reply({"ok": True, "result": [message(item["type"], i) for i, item in enumerate(media)]})
+                return
+
+            self._reply({"ok": True, "result": message(method[4:].lower())})
+
+    return FakeBotAPIHandler
+
+
+def start_fake_bot_api(rate_bytes: int, throttle_first: int = 0, latency: float = 0):
+    """راه‌اندازی سرور Bot API جعلی و برگرداندن (سرور، آدرس، آمار)"""
+    stats = {"requests": 0, "bytes": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_fake_bot_api_handler(rate_bytes, throttle_first, stats, latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", stats
+
+
+# --- بنچمارک‌ها ---
+
+def bench_segmented(args) -> None:
+    """مقایسه دانلود تک اتصالی و چند اتصالی در برابر سرور محدود شده"""
+    from segmented_downloader import SegmentedDownloader
+
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    rate = args.rate_kb * 1024
+    server, url = start_throttled_server(payload, rate)
+    work_dir = tempfile.mkdtemp(prefix="bench-segmented-")
+
+    print(f"فایل {args.size_mb}MB، محدودیت هر اتصال {args.rate_kb}KB/s")
+    try:
+        for segments, connections in ((1, 1), (args.segments, args.connections)):
+            downloader = SegmentedDownloader(segments=segments, max_connections=connections, min_size=0)
+            dest = os.path.join(work_dir, f"video-{segments}.mp4")
+
+            started = time.time()
+            downloader.download(url, dest)
+            elapsed = time.time() - started
+
+            with open(dest, "rb") as f:
+                ok = f.read() == payload
+            print(f"  بخش‌ها={segments:<3} اتصال‌ها={connections:<3} زمان={elapsed:6.2f}s "
+                  f"سرعت={len(payload) / elapsed / 1024 / 1024:6.2f}MB/s صحت={'✓' if ok else '✗'}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_resume(args) -> None:
+    """قطع دانلود چند اتصالی در میانه راه و ادامه آن از فایل .part"""
+    from segmented_downloader import SegmentedDownloader
+    from download_cancellation import CancelToken, DownloadCancelled
+
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    rate = args.rate_kb * 1024
+    server, url = start_throttled_server(payload, rate)
+    work_dir = tempfile.mkdtemp(prefix="bench-resume-")
+    dest = os.path.join(work_dir, "video.mp4")
+    downloader = SegmentedDownloader(segments=args.segments, max_connections=args.segments, min_size=0)
+
+    try:
+        # قطع دانلود پس از رسیدن به درصد مشخص (مثل توقف ربات)
+        token = CancelToken()
+        stop_at = len(payload) * args.stop_percent / 100
+
+        def interrupt(data):
+            if data["downloaded_bytes"] >= stop_at:
+                token.cancel()
+
+        started = time.time()
+        try:
+            downloader.download(url, dest, progress_hook=interrupt, cancel_token=token)
+        except DownloadCancelled:
+            pass
+        first_elapsed = time.time() - started
+
+        # ادامه دانلود
+        resumed_from = {}
+
+        def record(data):
+            resumed_from.setdefault("bytes", data["downloaded_bytes"])
+
+        started = time.time()
+        downloader.download(url, dest, progress_hook=record)
+        second_elapsed = time.time() - started
+
+        with open(dest, "rb") as f:
+            ok = f.read() == payload
+        print(f"فایل {args.size_mb}MB، قطع در {args.stop_percent}%")
+        print(f"  اجرای اول={first_elapsed:6.2f}s  ادامه={second_elapsed:6.2f}s "
+              f"شروع ادامه از {resumed_from.get('bytes', 0) / len(payload) * 100:5.1f}% صحت={'✓' if ok else '✗'}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_upload(args) -> None:
+    """سرعت آپلود جریانی در برابر Bot API جعلی و تلاش مجدد پس از 429"""
+    from uploader import TelegramUploader
+
+    server, api_url, stats = start_fake_bot_api(args.rate_kb * 1024, args.throttle_first)
+    work_dir = tempfile.mkdtemp(prefix="bench-upload-")
+    file_path = os.path.join(work_dir, "video.mp4")
+
+    with open(file_path, "wb") as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+    print(f"فایل {args.size_mb}MB، سرعت سرور {args.rate_kb}KB/s، پاسخ 429 به {args.throttle_first} درخواست اول")
+    try:
+        for chunk_kb in args.chunk_kb:
+            uploader = TelegramUploader("123:fake", api_url, chunk_size=chunk_kb * 1024)
+            reports = []
+            started = time.time()
+            result = uploader.send_file("video", 1, file_path, progress_callback=lambda p, s, t: reports.append(p),
+                                        caption="bench", supports_streaming=True)
+            elapsed = time.time() - started
+            upload_stats = uploader.get_stats()
+            print(f"  تکه={chunk_kb:<5}KB زمان={elapsed:6.2f}s سرعت={upload_stats['throughput'] / 1024 / 1024:6.2f}MB/s "
+                  f"تلاش مجدد={upload_stats['retries']} گزارش پیشرفت={len(reports)} "
+                  f"صحت={'✓' if result['video']['file_size'] > args.size_mb * 1024 * 1024 else '✗'}")
+            stats["requests"] = args.throttle_first  # 429 فقط برای اولین اجرا
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_media_group(args) -> None:
+    """ارسال رسانه‌های یک پست چندتایی: یک درخواست برای هر فایل در برابر یک آلبوم"""
+    from uploader import TelegramUploader
+
+    server, api_url, stats = start_fake_bot_api(args.rate_kb * 1024, latency=args.latency_ms / 1000)
+    work_dir = tempfile.mkdtemp(prefix="bench-album-")
+    files = []
+
+    for i in range(args.items):
+        path = os.path.join(work_dir, f"post_{i + 1}.jpg")
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8" + os.urandom(args.item_kb * 1024))
+        files.append(path)
+
+    uploader = TelegramUploader("123:fake", api_url)
+    print(f"{args.items} تصویر {args.item_kb}KB، تاخیر هر پاسخ {args.latency_ms}ms")
+    try:
+        requests_before = stats["requests"]
+        started = time.time()
+        for path in files:
+            uploader.send_file("photo", 1, path)
+        print(f"  جداگانه: زمان={time.time() - started:6.2f}s درخواست‌ها={stats['requests'] - requests_before}")
+
+        requests_before = stats["requests"]
+        started = time.time()
+        for start in range(0, len(files), 10):
+            messages = uploader.send_media_group(1, [{"type": "photo", "path": path} for path in files[start:start + 10]])
+        print(f"  آلبوم:   زمان={time.time() - started:6.2f}s درخواست‌ها={stats['requests'] - requests_before} "
+              f"پیام‌ها={len(messages)}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_gateway(args) -> None:
+    """اتصال keep-alive، اولویت پاسخ‌ها نسبت به ارسال همگانی و مدیریت 429 در دروازه تلگرام"""
+    from uploader import TelegramUploader
+    from telegram_gateway import TelegramGateway, RequestPriority
+
+    server, api_url, stats = start_fake_bot_api(64 * 1024 * 1024, args.throttle_first, args.latency_ms / 1000)
+    url = f"{api_url}/bot123:fake/sendMessage"
+
+    try:
+        # 1) هزینه اتصال: اتصال جدید برای هر درخواست در برابر اتصال keep-alive
+        stats["requests"] = args.throttle_first
+        uploader = TelegramUploader("123:fake", api_url)
+        gateway = TelegramGateway(global_rate=100000, chat_rate=100000, chat_burst=100000)
+        started = time.time()
+        for i in range(args.sequential):
+            uploader.call("sendMessage", chat_id=10000 + i, text="ping")
+        fresh = time.time() - started
+        started = time.time()
+        for i in range(args.sequential):
+            gateway.request("post", url, {"chat_id": 10000 + i, "text": "ping"})
+        pooled = time.time() - started
+        gateway_stats = gateway.get_stats()
+        print(f"{args.sequential} درخواست پشت سر هم:")
+        print(f"  اتصال جدید={fresh:6.2f}s  keep-alive={pooled:6.2f}s "
+              f"(اتصال‌های ساخته شده={gateway_stats['connections']})")
+
+        # 2) ارسال همگانی، ویرایش پیشرفت و پاسخ کاربران به طور همزمان با محدودیت نرخ
+        stats["requests"] = 0
+        gateway = TelegramGateway(global_rate=args.global_rate)
+        user_ids = iter(range(20000, 20000 + args.broadcast))
+        ids_lock = threading.Lock()
+
+        def broadcast_worker():
+            with gateway.priority(RequestPriority.BROADCAST):
+                while True:
+                    with ids_lock:
+                        chat_id = next(user_ids, None)
+                    if chat_id is None:
+                        return
+                    gateway.request("post", url, {"chat_id": chat_id, "text": "broadcast"})
+
+        def progress_worker():
+            for percent in range(0, 100, 100 // args.edits):
+                gateway.request("post", f"{api_url}/bot123:fake/editMessageText",
+                                {"chat_id": 1, "message_id": 1, "text": f"{percent}%"})
+
+        def reply_worker(chat_id):
+            gateway.request("post", url, {"chat_id": chat_id, "text": "reply"})
+
+        threads = [threading.Thread(target=broadcast_worker) for _ in range(args.broadcast_threads)]
+        threads.append(threading.Thread(target=progress_worker))
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for i in range(args.replies):
+            time.sleep(0.2)
+            thread = threading.Thread(target=reply_worker, args=(30000 + i,))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+
+        gateway_stats = gateway.get_stats()
+        print(f"\n{args.broadcast} پیام همگانی با {args.broadcast_threads} ترد، {args.edits} ویرایش پیشرفت در یک چت، "
+              f"{args.replies} پاسخ؛ محدودیت کلی {args.global_rate}/s، پاسخ 429 به {args.throttle_first} درخواست اول")
+        print(f"  زمان کل={elapsed:6.2f}s نرخ={gateway_stats['requests'] / elapsed:6.1f}req/s "
+              f"پاسخ 429={gateway_stats['rate_limited']} ({gateway_stats['rate_limited_ratio'] * 100:.1f}%) "
+              f"ارسال مجدد={gateway_stats['retries']} اتصال‌ها={gateway_stats['connections']}")
+        for name, delay in gateway_stats["queue_delay"].items():
+            print(f"  تاخیر صف {name:<9} تعداد={delay['count']:<4} میانگین={delay['avg']:6.3f}s بیشینه={delay['max']:6.3f}s")
+    finally:
+        server.shutdown()
+
+
+def bench_progress(args) -> None:
+    """تعداد ویرایش پیام‌های پیشرفت: ویرایش مستقیم هر 10 درصد در برابر ویرایش تجمیعی"""
+    from progress_renderer import ProgressRenderer
+
+    class FakeBot:
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.edits = 0
+            self.texts = {}
+
+        def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+            time.sleep(args.latency_ms / 1000)
+            with self.lock:
+                self.edits += 1
+                self.texts[(chat_id, message_id)] = text
+
+    def job(index, report):
+        # پیشرفت از 0 تا 100 درصد با چند تغییر وضعیت در طول دانلود
+        steps = int(args.seconds * args.rate)
+        for step in range(steps + 1):
+            percent = step * 100 / steps
+            status = "📥 دانلود" if percent < 80 else ("🔄 ادغام" if percent < 100 else "✅ پایان")
+            report(index, percent, status)
+            time.sleep(1 / args.rate)
+
+    def run(make_report, finish=None):
+        threads = [threading.Thread(target=job, args=(i, make_report)) for i in range(args.jobs)]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if finish:
+            for i in range(args.jobs):
+                finish(i)
+        return time.time() - started
+
+    print(f"{args.jobs} دانلود همزمان، {args.rate} گزارش پیشرفت در ثانیه، {args.seconds} ثانیه")
+
+    # روش قبلی: ویرایش هر 10 درصد یا با تغییر وضعیت
+    bot = FakeBot()
+    last = {}
+
+    def direct(index, percent, status):
+        previous = last.get(index)
+        if previous and percent - previous[0] < 10 and status == previous[1] and percent < 100:
+            return
+        last[index] = (percent, status)
+        bot.edit_message_text(f"{percent:.1f}% {status}", chat_id=index, message_id=1)
+
+    elapsed = run(direct)
+    print(f"  مستقیم:  ویرایش‌ها={bot.edits:<5} ویرایش در دقیقه={bot.edits / elapsed * 60:7.0f}")
+
+    # ویرایش تجمیعی
+    bot = FakeBot()
+    renderer = ProgressRenderer(interval=args.interval)
+
+    def coalesced(index, percent, status):
+        renderer.update(bot, index, 1, f"{percent:.1f}% {status}")
+
+    elapsed = run(coalesced, lambda index: renderer.finish(bot, index, 1))
+    final_ok = all(bot.texts.get((i, 1)) == "100.0% ✅ پایان" for i in range(args.jobs))
+    stats = renderer.get_stats()
+    print(f"  تجمیعی:  ویرایش‌ها={bot.edits:<5} ویرایش در دقیقه={bot.edits / elapsed * 60:7.0f} "
+          f"جایگزین شده={stats['coalesced']} وضعیت نهایی={'✓' if final_ok else '✗'}")
+
+
+def bench_transcode(args) -> None:
+    """سرعت فشرده‌سازی برای جا شدن در حجم هدف (ثانیه ویدیو به ازای هر ثانیه CPU)"""
+    import subprocess
+    from transcoder import Transcoder, is_available
+
+    if not is_available():
+        print("ffmpeg نصب نیست؛ بنچمارک فشرده‌سازی اجرا نشد")
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="bench-transcode-")
+    try:
+        # ساخت ویدیوی آزمایشی 720p با صدا
+        clip = os.path.join(work_dir, "clip.mp4")
+        subprocess.run(["ffmpeg", "-y", "-v", "error",
+                        "-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=30",
+                        "-f", "lavfi", "-i", "sine=frequency=440",
+                        "-t", str(args.clip_seconds), "-c:v", "libx264", "-preset", "ultrafast",
+                        "-b:v", "5M", "-c:a", "aac", clip], check=True)
+        target = int(args.target_mb * 1024 * 1024)
+        print(f"ویدیوی {args.clip_seconds} ثانیه‌ای {os.path.getsize(clip) / 1024 / 1024:.1f}MB، "
+              f"هدف {args.target_mb}MB، {args.jobs} کار، {args.workers} کارگر، حالت {args.mode}")
+
+        transcoder = Transcoder(workers=args.workers, max_queue=args.jobs, mode=args.mode)
+        sizes = []
+
+        def job(index):
+            output = transcoder.transcode_to_fit(clip, args.clip_seconds, target,
+                                                 os.path.join(work_dir, f"out-{index}.mp4"))
+            sizes.append(os.path.getsize(output))
+
+        started = time.time()
+        threads = [threading.Thread(target=job, args=(i,)) for i in range(args.jobs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+
+        stats = transcoder.get_stats()
+        print(f"  زمان کل={elapsed:.1f}s  ثانیه ویدیو در ثانیه={stats['media_seconds'] / elapsed:.2f}  "
+              f"به ازای هر هسته={stats['realtime_per_core']:.2f}x")
+        if sizes:
+            print(f"  حجم خروجی: حداقل={min(sizes) / 1024 / 1024:.2f}MB حداکثر={max(sizes) / 1024 / 1024:.2f}MB "
+                  f"({max(sizes) / target * 100:.0f}% هدف)، ناموفق={stats['failed']}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_split(args) -> None:
+    """ارسال بخش‌های یک ویدیوی تقسیم شده: پشت سر هم در برابر پیش‌آپلود موازی"""
+    from uploader import TelegramUploader
+    from video_splitter import deliver_parts
+
+    server, api_url, stats = start_fake_bot_api(args.rate_kb * 1024)
+    work_dir = tempfile.mkdtemp(prefix="bench-split-")
+    parts = []
+
+    for i in range(args.parts):
+        path = os.path.join(work_dir, f"part-{i:03d}.mp4")
+        with open(path, "wb") as f:
+            f.write(os.urandom(args.part_mb * 1024 * 1024))
+        parts.append(path)
+
+    uploader = TelegramUploader("123:fake", api_url)
+    print(f"{args.parts} بخش {args.part_mb}MB، سرعت هر اتصال {args.rate_kb}KB/s")
+    try:
+        for label, cache_chat_id in (("پشت سر هم", 0), ("موازی", 2)):
+            requests_before = stats["requests"]
+            started = time.time()
+            messages = deliver_parts(1, parts, "bench", uploader=uploader,
+                                     cache_chat_id=cache_chat_id, workers=args.workers)
+            print(f"  {label:<9} زمان={time.time() - started:6.2f}s درخواست‌ها={stats['requests'] - requests_before} "
+                  f"پیام‌ها={len(messages)}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_db(args) -> None:
+    """عملیات در ثانیه دیتابیس با چند ترد: اتصال جدید و قفل سراسری در برابر اتصال پایدار و WAL"""
+    import random
+    import sqlite3
+    import config
+
+    work_dir = tempfile.mkdtemp(prefix="bench-db-")
+    # مسیر موقت پیش از بارگیری ماژول دیتابیس
+    config.DATABASE_PATH = os.path.join(work_dir, "bot.db")
+    import database
+    from debug_logger import debug_decorator
+
+    database.initialize_database()
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with database.write_transaction() as conn:
+        conn.executemany("INSERT INTO users (id, username, role, join_date, last_activity) VALUES (?, ?, 0, ?, ?)",
+                         [(user_id, f"user{user_id}", now, now) for user_id in range(1, args.users + 1)])
+        conn.executemany("INSERT INTO downloads (user_id, url, status, start_time, quality) VALUES (?, ?, 2, ?, '18')",
+                         [(i % args.users + 1, f"https://youtu.be/{i:011d}", now) for i in range(args.downloads)])
+
+    # نسخه دوم دیتابیس با حالت ژورنال پیش‌فرض برای روش قبلی
+    legacy_path = os.path.join(work_dir, "legacy.db")
+    legacy = sqlite3.connect(legacy_path)
+    database.get_db_connection().backup(legacy)
+    legacy.execute("PRAGMA journal_mode=DELETE")
+    legacy.close()
+
+    # روش قبلی: اتصال جدید در هر فراخوانی، قفل سراسری و dict_factory با لاگ
+    legacy_lock = threading.RLock()
+    legacy_factory = debug_decorator(database.dict_factory)
+
+    def legacy_connection():
+        conn = sqlite3.connect(legacy_path, check_same_thread=False)
+        conn.row_factory = legacy_factory
+        return conn
+
+    def legacy_read(user_id):
+        with legacy_lock:
+            conn = legacy_connection()
+            conn.execute("SELECT * FROM downloads WHERE user_id = ? ORDER BY start_time DESC LIMIT 10 OFFSET 0",
+                         (user_id,)).fetchall()
+            conn.close()
+
+    def legacy_write(download_id):
+        with legacy_lock:
+            conn = legacy_connection()
+            conn.execute("UPDATE downloads SET status = ?, end_time = ? WHERE id = ?", (2, now, download_id))
+            conn.commit()
+            conn.close()
+
+    # لایه جدید (بدون دکوراتور لاگ توابع عمومی تا فقط لایه اتصال مقایسه شود)
+    pooled_read = lambda user_id: database.get_user_downloads.__wrapped__(user_id, 10)
+    pooled_write = lambda download_id: database.update_download_status.__wrapped__(download_id, 2)
+
+    def run(read, write):
+        counts = [0] * args.threads
+        stop = threading.Event()
+
+        def worker(index):
+            rng = random.Random(index)
+            while not stop.is_set():
+                if rng.random() * 100 < args.write_percent:
+                    write(rng.randint(1, args.downloads))
+                else:
+                    read(rng.randint(1, args.users))
+                counts[index] += 1
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return sum(counts) / args.seconds
+
+    print(f"{args.threads} ترد، {args.seconds} ثانیه، {args.write_percent}% نوشتن، "
+          f"{args.users} کاربر و {args.downloads} دانلود")
+    try:
+        legacy_ops = run(legacy_read, legacy_write)
+        print(f"  اتصال جدید + قفل سراسری: {legacy_ops:8.0f} عملیات در ثانیه")
+        pooled_ops = run(pooled_read, pooled_write)
+        print(f"  اتصال پایدار + WAL:      {pooled_ops:8.0f} عملیات در ثانیه ({pooled_ops / legacy_ops:.1f}x)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_db_writes(args) -> None:
+    """نوشتن لاگ و وضعیت دانلود: تراکنش جداگانه برای هر نوشتن در برابر صف نوشتن با تاخیر"""
+    import config
+
+    work_dir = tempfile.mkdtemp(prefix="bench-db-writes-")
+    # مسیر موقت پیش از بارگیری ماژول دیتابیس
+    config.DATABASE_PATH = os.path.join(work_dir, "bot.db")
+    import database
+
+    database.initialize_database()
+    now = time.strftime("%Y-%m-%dT%H:%M:%S")
+    with database.write_transaction() as conn:
+        conn.executemany("INSERT INTO downloads (user_id, url, status, start_time) VALUES (?, ?, 0, ?)",
+                         [(1, f"https://youtu.be/{i:011d}", now) for i in range(args.threads)])
+
+    add_log = database.add_log.__wrapped__
+    update_status = database.update_download_status.__wrapped__
+    get_download = database.get_download.__wrapped__
+
+    def run(write_behind):
+        database.DB_WRITE_BEHIND = write_behind
+        stale = []
+
+        def worker(index):
+            download_id = index + 1
+            for i in range(args.writes):
+                if i % 2:
+                    add_log("INFO", f"پیشرفت دانلود {download_id}: {i}", user_id=1, context={"i": i})
+                else:
+                    update_status(download_id, 1, metadata={"progress": i})
+            # وضعیت نهایی باید بلافاصله خوانده شود
+            update_status(download_id, 2, metadata={"title": f"ویدیو {download_id}"})
+            if get_download(download_id)["status"] != 2:
+                stale.append(download_id)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        database.flush_writes()
+        elapsed = time.perf_counter() - started
+        return args.threads * (args.writes + 1) / elapsed, stale
+
+    print(f"{args.threads} ترد × {args.writes} نوشتن (نیمی لاگ، نیمی وضعیت دانلود)")
+    try:
+        sync_ops, sync_stale = run(False)
+        print(f"  تراکنش برای هر نوشتن: {sync_ops:8.0f} نوشتن در ثانیه، خواندن کهنه: {len(sync_stale)}")
+        behind_ops, behind_stale = run(True)
+        stats = database.write_behind.get_stats()
+        print(f"  صف نوشتن با تاخیر:    {behind_ops:8.0f} نوشتن در ثانیه ({behind_ops / sync_ops:.1f}x)، "
+              f"خواندن کهنه: {len(behind_stale)}")
+        print(f"  {stats['batches']} دسته، میانگین {stats['avg_batch']:.0f} ردیف، بیشترین عمق صف {stats['max_depth']}، "
+              f"{stats['read_flushes']} تخلیه هنگام خواندن، {stats['backpressure_waits']} انتظار فشار معکوس")
+        with database.write_transaction() as conn:
+            logs = sum(conn.execute(f"SELECT COUNT(*) AS n FROM {database.log_table_name(day)}").fetchone()["n"]
+                       for day in database.list_log_partitions(conn))
+        print(f"  لاگ‌های ثبت شده: {logs} (انتظار {args.threads * args.writes})")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_db_plans(args) -> int:
+    """زمان کوئری‌های پرتکرار با شاخص‌های قبلی و پس از مهاجرت، و بررسی طرح اجرای آن‌ها"""
+    import random
+    import sqlite3
+    import config
+
+    work_dir = tempfile.mkdtemp(prefix="bench-db-plans-")
+    # مسیر موقت پیش از بارگیری ماژول دیتابیس
+    config.DATABASE_PATH = os.path.join(work_dir, "bot.db")
+    import database
+
+    database.initialize_database()
+    rng = random.Random(1)
+    day = 24 * 3600
+    stamp = lambda: time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - rng.random() * 90 * day))
+    log_table = database.ensure_log_partition(datetime.date.today())
+    with database.write_transaction() as conn:
+        conn.executemany("INSERT INTO users (id, username, join_date, last_activity) VALUES (?, ?, ?, ?)",
+                         [(user_id, f"user{user_id}", stamp(), stamp()) for user_id in range(1, args.users + 1)])
+        conn.executemany("INSERT INTO downloads (user_id, url, status, start_time, quality) VALUES (?, ?, ?, ?, ?)",
+                         [(rng.randint(1, args.users), f"https://youtu.be/{i:011d}", rng.choice((2, 2, 2, 3, 4)),
+                           stamp(), rng.choice(("18", "22", "best"))) for i in range(args.downloads)])
+        conn.executemany(f"INSERT INTO {log_table} (timestamp, level, message, user_id) VALUES (?, ?, ?, ?)",
+                         [(stamp(), rng.choice(("INFO", "INFO", "WARNING", "ERROR")), f"پیام {i}",
+                           rng.randint(1, args.users)) for i in range(args.logs)])
+
+    # نسخه دوم با شاخص‌های قبلی initialize_database
+    legacy_path = os.path.join(work_dir, "legacy.db")
+    legacy = sqlite3.connect(legacy_path)
+    database.get_db_connection().backup(legacy)
+    for (name,) in legacy.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL").fetchall():
+        legacy.execute(f"DROP INDEX {name}")
+    legacy.execute("CREATE INDEX idx_user_id ON downloads(user_id)")
+    legacy.execute("CREATE INDEX idx_download_status ON downloads(status)")
+    legacy.execute(f"CREATE INDEX idx_log_level ON {log_table}(level)")
+    legacy.execute("PRAGMA user_version = 0")
+    legacy.commit()
+    legacy.row_factory = database.dict_factory
+
+    current = database.get_db_connection()
+
+    def timed(conn, query, params):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            conn.execute(query, params).fetchall()
+        return (time.perf_counter() - started) / args.repeat * 1000
+
+    print(f"{args.users} کاربر، {args.downloads} دانلود، {args.logs} لاگ؛ میانگین {args.repeat} اجرا (میلی‌ثانیه)")
+    print(f"  {'کوئری':30} {'قبلی':>9} {'جدید':>9}")
+    try:
+        for name, query, params in database.HOT_QUERIES:
+            query = query.format(logs=log_table) if "{logs}" in query else query
+            before = timed(legacy, query, params)
+            after = timed(current, query, params)
+            print(f"  {name:30} {before:9.3f} {after:9.3f}  ({before / after if after else 0:.0f}x)")
+
+        print(f"  مشکلات طرح اجرا با شاخص‌های قبلی: {len(database.verify_query_plans(legacy))}")
+        problems = database.verify_query_plans(current)
+        print(f"  مشکلات طرح اجرا پس از مهاجرت (نسخه {database.get_schema_version(current)}): {len(problems)}")
+        for problem in problems:
+            print(f"    {problem}")
+        return 1 if problems else 0
+    finally:
+        legacy.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_db_pages(args) -> None:
+    """زمان خواندن صفحه‌های عمیق: LIMIT/OFFSET در برابر صفحه‌بندی با نشانگر"""
+    import config
+
+    work_dir = tempfile.mkdtemp(prefix="bench-db-pages-")
+    # مسیر موقت پیش از بارگیری ماژول دیتابیس
+    config.DATABASE_PATH = os.path.join(work_dir, "bot.db")
+    import database
+
+    database.initialize_database()
+    started = time.time() - args.downloads
+    with database.write_transaction() as conn:
+        conn.executemany("INSERT INTO downloads (user_id, url, status, start_time) VALUES (?, ?, 2, ?)",
+                         ((i % 1000 + 1, f"https://youtu.be/{i:011d}",
+                           time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started + i)))
+                          for i in range(args.downloads)))
+
+    by_offset = database.get_all_downloads.__wrapped__
+    by_cursor = database.get_downloads_page.__wrapped__
+    conn = database.get_db_connection()
+
+    def timed(fn):
+        begin = time.perf_counter()
+        for _ in range(args.repeat):
+            rows = fn()
+        return (time.perf_counter() - begin) / args.repeat * 1000, rows
+
+    print(f"{args.downloads} دانلود، صفحه‌های {args.page_size} تایی؛ میانگین {args.repeat} اجرا (میلی‌ثانیه)")
+    print(f"  {'عمق (ردیف)':>12} {'OFFSET':>9} {'نشانگر':>9}")
+    try:
+        for depth in (0, 1000, 10000, 100000, args.downloads // 2, args.downloads - args.page_size):
+            cursor = None
+            if depth:
+                # نشانگر آخرین ردیف صفحه قبل، همان چیزی که دکمه صفحه بعد در خود دارد
+                last = conn.execute("SELECT start_time, id FROM downloads ORDER BY start_time DESC, id ASC "
+                                    "LIMIT 1 OFFSET ?", (depth - 1,)).fetchone()
+                cursor = database.encode_cursor(last["start_time"], last["id"])
+            offset_ms, offset_rows = timed(lambda: by_offset(limit=args.page_size, offset=depth))
+            cursor_ms, (cursor_rows, _) = timed(lambda: by_cursor(cursor=cursor, limit=args.page_size))
+            same = [row["id"] for row in offset_rows] == [row["id"] for row in cursor_rows]
+            print(f"  {depth:>12} {offset_ms:9.3f} {cursor_ms:9.3f}  {'' if same else '(نتیجه متفاوت)'}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def bench_db_logs(args) -> None:
+    """حجم فایل و زمان حذف لاگ‌های قدیمی: یک جدول logs در برابر جدول‌های روزانه با incremental_vacuum"""
+    import random
+    import sqlite3
+    import config
+
+    work_dir = tempfile.mkdtemp(prefix="bench-db-logs-")
+    # مسیر موقت پیش از بارگیری ماژول دیتابیس
+    config.DATABASE_PATH = os.path.join(work_dir, "bot.db")
+    import database
+
+    database.initialize_database()
+    rng = random.Random(1)
+    today = datetime.date.today()
+
+    def day_rows(day):
+        return [(f"{day.isoformat()}T{i * 86400 // args.per_day // 3600:02d}:"
+                 f"{i * 86400 // args.per_day // 60 % 60:02d}:{i * 86400 // args.per_day % 60:02d}.{i:06d}",
+                 rng.choice(("INFO", "INFO", "WARNING", "ERROR")), "پیام " * 40, rng.randint(1, 1000))
+                for i in range(args.per_day)]
+
+    # روش قبلی: یک جدول logs با شاخص‌های مهاجرت 1 و بدون auto_vacuum
+    legacy_path = os.path.join(work_dir, "legacy.db")
+    legacy = sqlite3.connect(legacy_path)
+    legacy.row_factory = database.dict_factory
+    legacy.execute("PRAGMA journal_mode=WAL")
+    legacy.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, level TEXT, "
+                   "message TEXT, user_id INTEGER, context TEXT)")
+    legacy.execute("CREATE INDEX idx_logs_time ON logs(timestamp DESC)")
+    legacy.execute("CREATE INDEX idx_logs_level_time ON logs(level, timestamp DESC)")
+    legacy.execute("CREATE INDEX idx_logs_user_time ON logs(user_id, timestamp DESC)")
+
+    for offset in range(args.days - 1, -1, -1):
+        day = today - datetime.timedelta(days=offset)
+        rows = day_rows(day)
+        legacy.executemany("INSERT INTO logs (timestamp, level, message, user_id) VALUES (?, ?, ?, ?)", rows)
+        with database.write_transaction() as conn:
+            # ساخت مستقیم جدول روز (ensure_log_partition روزهای قدیمی را فوراً حذف می‌کند)
+            database._create_log_partition(conn, day)
+            conn.executemany(f"INSERT INTO {database.log_table_name(day)} (timestamp, level, message, user_id) "
+                             "VALUES (?, ?, ?, ?)", rows)
+    legacy.commit()
+
+    current = database.get_db_connection()
+
+    def file_mb(conn, path):
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return os.path.getsize(path) / 1024 / 1024
+
+    def timed(fn, repeat=20):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - started) / repeat * 1000
+
+    print(f"{args.days} روز × {args.per_day} لاگ، نگهداری {args.retention} روز")
+    try:
+        with database.db_lock:
+            before_legacy, before_current = file_mb(legacy, legacy_path), file_mb(current, config.DATABASE_PATH)
+        print(f"  حجم پیش از حذف:      یک جدول {before_legacy:7.1f}MB | روزانه {before_current:7.1f}MB")
+
+        cutoff = today - datetime.timedelta(days=args.retention - 1)
+        started = time.perf_counter()
+        legacy.execute("DELETE FROM logs WHERE timestamp < ?", (cutoff.isoformat(),))
+        legacy.commit()
+        legacy_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        dropped = database.prune_log_partitions(args.retention)
+        current_seconds = time.perf_counter() - started
+
+        with database.db_lock:
+            after_legacy, after_current = file_mb(legacy, legacy_path), file_mb(current, config.DATABASE_PATH)
+        print(f"  زمان حذف:            DELETE {legacy_seconds:6.2f}s | DROP {dropped} جدول + vacuum {current_seconds:6.2f}s")
+        print(f"  حجم پس از حذف:       یک جدول {after_legacy:7.1f}MB | روزانه {after_current:7.1f}MB")
+
+        get_logs = database.get_logs.__wrapped__
+        for label, legacy_query, legacy_params, kwargs in (
+            ("get_logs", "SELECT * FROM logs ORDER BY timestamp DESC, id ASC LIMIT ?", (100,), {}),
+            ("get_logs(level)", "SELECT * FROM logs WHERE level = ? ORDER BY timestamp DESC, id ASC LIMIT ?",
+             ("ERROR", 100), {"level": "ERROR"}),
+        ):
+            legacy_ms = timed(lambda: legacy.execute(legacy_query, legacy_params).fetchall())
+            current_ms = timed(lambda: get_logs(limit=100, **kwargs))
+            print(f"  {label:20} یک جدول {legacy_ms:7.3f}ms | روزانه {current_ms:7.3f}ms")
+    finally:
+        legacy.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="بنچمارک اجزای دانلود ربات")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    segmented = subparsers.add_parser("segmented", help="دانلود چند اتصالی در برابر سرور محدود شده")
+    segmented.add_argument("--size-mb", type=int, default=16)
+    segmented.add_argument("--rate-kb", type=int, default=1024, help="محدودیت سرعت هر اتصال")
+    segmented.add_argument("--segments", type=int, default=8)
+    segmented.add_argument("--connections", type=int, default=8)
+    segmented.set_defaults(func=bench_segmented)
+
+    resume = subparsers.add_parser("resume", help="ادامه دانلود قطع شده از فایل .part")
+    resume.add_argument("--size-mb", type=int, default=8)
+    resume.add_argument("--rate-kb", type=int, default=1024, help="محدودیت سرعت هر اتصال")
+    resume.add_argument("--segments", type=int, default=4)
+    resume.add_argument("--stop-percent", type=int, default=90)
+    resume.set_defaults(func=bench_resume)
+
+    upload = subparsers.add_parser("upload", help="آپلود جریانی به Bot API جعلی")
+    upload.add_argument("--size-mb", type=int, default=16)
+    upload.add_argument("--rate-kb", type=int, default=8192, help="سرعت خواندن سرور")
+    upload.add_argument("--chunk-kb", type=int, nargs="+", default=[64, 256, 1024])
+    upload.add_argument("--throttle-first", type=int, default=1, help="تعداد پاسخ‌های 429 اولیه")
+    upload.set_defaults(func=bench_upload)
+
+    album = subparsers.add_parser("media-group", help="ارسال پست چندتایی اینستاگرام به صورت آلبوم")
+    album.add_argument("--items", type=int, default=10)
+    album.add_argument("--item-kb", type=int, default=300)
+    album.add_argument("--rate-kb", type=int, default=65536, help="سرعت خواندن سرور")
+    album.add_argument("--latency-ms", type=int, default=300, help="تاخیر هر پاسخ")
+    album.set_defaults(func=bench_media_group)
+
+    gateway = subparsers.add_parser("gateway", help="محدودیت نرخ، اولویت و اتصال keep-alive دروازه تلگرام")
+    gateway.add_argument("--sequential", type=int, default=200, help="تعداد درخواست‌های آزمون اتصال")
+    gateway.add_argument("--broadcast", type=int, default=120)
+    gateway.add_argument("--broadcast-threads", type=int, default=8)
+    gateway.add_argument("--edits", type=int, default=10)
+    gateway.add_argument("--replies", type=int, default=10)
+    gateway.add_argument("--global-rate", type=float, default=30)
+    gateway.add_argument("--throttle-first", type=int, default=3, help="تعداد پاسخ‌های 429 اولیه")
+    gateway.add_argument("--latency-ms", type=int, default=5, help="تاخیر هر پاسخ")
+    gateway.set_defaults(func=bench_gateway)
+
+    progress = subparsers.add_parser("progress", help="ویرایش تجمیعی پیام‌های پیشرفت")
+    progress.add_argument("--jobs", type=int, default=50)
+    progress.add_argument("--seconds", type=float, default=6)
+    progress.add_argument("--rate", type=float, default=10, help="گزارش پیشرفت در ثانیه برای هر دانلود")
+    progress.add_argument("--interval", type=float, default=3, help="حداقل فاصله ویرایش هر پیام")
+    progress.add_argument("--latency-ms", type=int, default=50, help="زمان هر ویرایش")
+    progress.set_defaults(func=bench_progress)
+
+    transcode = subparsers.add_parser("transcode", help="فشرده‌سازی ویدیو برای جا شدن در حجم هدف")
+    transcode.add_argument("--clip-seconds", type=int, default=60)
+    transcode.add_argument("--jobs", type=int, default=4)
+    transcode.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    transcode.add_argument("--target-mb", type=float, default=2)
+    transcode.add_argument("--mode", choices=["2pass", "crf"], default="2pass")
+    transcode.set_defaults(func=bench_transcode)
+
+    split = subparsers.add_parser("split", help="ارسال بخش‌های ویدیوی تقسیم شده")
+    split.add_argument("--parts", type=int, default=6)
+    split.add_argument("--part-mb", type=int, default=4)
+    split.add_argument("--rate-kb", type=int, default=2048, help="سرعت خواندن سرور برای هر اتصال")
+    split.add_argument("--workers", type=int, default=3)
+    split.set_defaults(func=bench_split)
+
+    db = subparsers.add_parser("db", help="عملیات در ثانیه دیتابیس با چند ترد همزمان")
+    db.add_argument("--threads", type=int, default=32)
+    db.add_argument("--seconds", type=float, default=5)
+    db.add_argument("--write-percent", type=float, default=20)
+    db.add_argument("--users", type=int, default=500)
+    db.add_argument("--downloads", type=int, default=20000)
+    db.set_defaults(func=bench_db)
+
+    db_writes = subparsers.add_parser("db-writes", help="نوشتن لاگ و وضعیت دانلود با و بدون صف نوشتن با تاخیر")
+    db_writes.add_argument("--threads", type=int, default=16)
+    db_writes.add_argument("--writes", type=int, default=2000)
+    db_writes.set_defaults(func=bench_db_writes)
+
+    db_plans = subparsers.add_parser("db-plans", help="زمان و طرح اجرای کوئری‌های پرتکرار پیش و پس از مهاجرت شاخص‌ها")
+    db_plans.add_argument("--users", type=int, default=5000)
+    db_plans.add_argument("--downloads", type=int, default=200000)
+    db_plans.add_argument("--logs", type=int, default=200000)
+    db_plans.add_argument("--repeat", type=int, default=20)
+    db_plans.set_defaults(func=bench_db_plans)
+
+    db_pages = subparsers.add_parser("db-pages", help="زمان صفحه‌های عمیق با OFFSET و با نشانگر")
+    db_pages.add_argument("--downloads", type=int, default=1000000)
+    db_pages.add_argument("--page-size", type=int, default=20)
+    db_pages.add_argument("--repeat", type=int, default=10)
+    db_pages.set_defaults(func=bench_db_pages)
+
+    db_logs = subparsers.add_parser("db-logs", help="حجم فایل و زمان حذف لاگ‌های قدیمی با جدول‌های روزانه")
+    db_logs.add_argument("--days", type=int, default=60)
+    db_logs.add_argument("--per-day", type=int, default=20000)
+    db_logs.add_argument("--retention", type=int, default=14)
+    db_logs.set_defaults(func=bench_db_logs)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
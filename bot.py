@@ -2,6 +2,7 @@ import os
 <<<<<<< HEAD
 import asyncio
 import logging
+from contextlib import ExitStack
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, 
@@ -70,21 +71,49 @@ YT_QUALITIES = {
 # وارد کردن ماژول‌های مورد نیاز
 from utils import (
     is_youtube_url, is_instagram_url, format_size, 
-    cleanup_temp_file, cleanup_temp_dir, ensure_temp_dir,
+    cleanup_temp_file, ensure_temp_dir,
     setup_logging
 )
-from downloaders import YouTubeDownloader, InstagramDownloader
+from downloaders import YouTubeDownloader, InstagramDownloader, get_instagram_shortcode
+from download_queue import download_scheduler
+from artifact_store import artifact_store
+from uploader import TelegramUploader, configure_ptb_builder
+from instagram_delivery import InstagramDelivery
 
 # Set up logging
 logger = setup_logging()
 
 # Initialize downloaders
 youtube_downloader = YouTubeDownloader(TEMP_DIR)
+telegram_uploader = TelegramUploader(BOT_TOKEN)
+instagram_delivery = InstagramDelivery(telegram_uploader)
 instagram_downloader = InstagramDownloader(TEMP_DIR)
 
 # User data dictionary to store user preferences
 user_preferences = {}
 
+def run_youtube_job(payload, job):
+    """Download a YouTube video inside a download queue worker."""
+    downloader = YouTubeDownloader(TEMP_DIR, payload.get('quality', 'medium'))
+    return downloader.download_sync(payload['url'])
+
+def run_instagram_job(payload, job):
+    """Download all media of an Instagram post inside a download queue worker."""
+    return asyncio.run(instagram_downloader.download_all(payload['url']))
+
+download_scheduler.register_handler("bot.youtube", run_youtube_job)
+download_scheduler.register_handler("bot.instagram", run_instagram_job)
+
+async def wait_for_download_job(kind, payload, user_id, progress_message):
+    """Submit a download job to the shared queue and wait for its result."""
+    job = download_scheduler.submit(kind, payload, user_id=user_id, persist=False)
+    
+    position = download_scheduler.get_position(job.job_id)
+    if position > 0:
+        await progress_message.edit_text(f"⏳ شما نفر #{position} در صف دانلود هستید...")
+    
+    return await asyncio.wrap_future(job.future)
+
 # Bot handlers
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send welcome message when the command /start is issued."""
@@ -152,9 +181,9 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ensure_temp_dir(TEMP_DIR)
     
     # Set quality according to user preference
+    quality = youtube_downloader.quality
     if user_id in user_preferences and 'quality' in user_preferences[user_id]:
         quality = user_preferences[user_id]['quality']
-        youtube_downloader.set_quality(quality)
         logger.info(f"Using quality setting for user {user_id}: {quality}")
 
     try:
@@ -165,7 +194,9 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Handle YouTube URL
             logger.info(f"Processing YouTube URL: {url}")
             await progress_message.edit_text("📥 در حال دانلود ویدیوی یوتیوب...")
-            file_path, title = await youtube_downloader.download(url)
+            file_path, title = await wait_for_download_job(
+                "bot.youtube", {'url': url, 'quality': quality}, user_id, progress_message
+            )
 
             # Send the file
             logger.info(f"Uploading YouTube video: {title}")
@@ -173,47 +204,52 @@ async def handle_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
             file_size = os.path.getsize(file_path)
             
             if file_size > 0:
-                with open(file_path, 'rb') as video_file:
-                    await context.bot.send_video(
-                        chat_id=chat_id,
-                        video=video_file,
+                # آپلود جریانی در ترد جداگانه و نمایش درصد آپلود در پیام پیشرفت
+                loop = asyncio.get_running_loop()
+
+                def upload_progress(percent, sent, total):
+                    asyncio.run_coroutine_threadsafe(
+                        progress_message.edit_text(f"📤 در حال آپلود به تلگرام... {percent:.0f}%"), loop
+                    )
+
+                with artifact_store.pinned(file_path):
+                    await asyncio.to_thread(
+                        telegram_uploader.send_file, "video", chat_id, file_path, upload_progress,
                         caption=f"📹 {title}\n\nحجم: {format_size(file_size)}"
                     )
             else:
                 raise Exception("فایل دانلود شده خالی است")
 
-            # Cleanup
-            cleanup_temp_file(file_path)
+            # Cleanup (نام فایل بر اساس عنوان است و قابل استفاده مجدد نیست)
+            artifact_store.discard(file_path)
             logger.info(f"Successfully processed YouTube video: {title}")
 
         elif is_instagram_url(url):
             # Handle Instagram URL
             logger.info(f"Processing Instagram URL: {url}")
             await progress_message.edit_text("📥 در حال دانلود محتوای اینستاگرام...")
-            file_path, title = await instagram_downloader.download(url)
+            media_files, title = await wait_for_download_job(
+                "bot.instagram", {'url': url}, user_id, progress_message
+            )
 
-            # Send the file
-            logger.info(f"Uploading Instagram content: {title}")
+            # Send all media as albums of up to 10 items
+            logger.info(f"Uploading Instagram content: {title} ({len(media_files)} files)")
             await progress_message.edit_text("📤 در حال آپلود به تلگرام...")
-            file_size = os.path.getsize(file_path)
-
-            if file_path.endswith(('.mp4', '.mov')):
-                with open(file_path, 'rb') as video_file:
-                    await context.bot.send_video(
-                        chat_id=chat_id,
-                        video=video_file,
-                        caption=f"📷 {title}\n\nحجم: {format_size(file_size)}"
-                    )
-            else:
-                with open(file_path, 'rb') as photo_file:
-                    await context.bot.send_photo(
-                        chat_id=chat_id,
-                        photo=photo_file,
-                        caption=f"📷 {title}"
-                    )
-
-            # Cleanup
-            cleanup_temp_dir(os.path.dirname(file_path))
+            total_size = sum(os.path.getsize(path) for path in media_files)
+            media_dir = os.path.dirname(media_files[0])
+
+            # قفل فایل‌ها تا پاکسازی مخزن حین آپلود آن‌ها را حذف نکند
+            with ExitStack() as pins:
+                for path in media_files:
+                    pins.enter_context(artifact_store.pinned(path))
+                await asyncio.to_thread(
+                    instagram_delivery.deliver, chat_id, get_instagram_shortcode(url), media_files,
+                    f"📷 {title}\n\nحجم: {format_size(total_size)}"
+                )
+
+            # Cleanup (از طریق مخزن تا فهرست فایل‌ها با دیسک همگام بماند)
+            for name in os.listdir(media_dir):
+                artifact_store.discard(os.path.join(media_dir, name))
             logger.info(f"Successfully processed Instagram content: {title}")
 
         else:
@@ -260,7 +296,7 @@ def main():
     import os
     if os.environ.get("USE_LEGACY_BOT") == "1":
         # Create the Application instance - Legacy bot mode
-        application = Application.builder().token(BOT_TOKEN).build()
+        application = configure_ptb_builder(Application.builder().token(BOT_TOKEN)).build()
 
         # Add command handlers
         application.add_handler(CommandHandler("start", start))
@@ -530,35 +566,6 @@ def save_hashtags(data):
         debug_log(f"خطا در ذخیره اطلاعات هشتگ‌ها: {e}", "ERROR")
         return False
 
-# پاکسازی فایل‌های قدیمی و نگهداری حداکثر تعداد مشخصی فایل
-def clear_folder(folder_path, max_files=MAX_VIDEOS_TO_KEEP):
-    """حذف فایل‌های قدیمی و نگهداری حداکثر تعداد مشخصی فایل"""
-    try:
-        # دریافت همه فایل‌ها
-        all_files = glob.glob(f"{folder_path}/*.*")
-
-        # اگر تعداد فایل‌ها از حد مجاز بیشتر است
-        if len(all_files) > max_files:
-            # مرتب‌سازی فایل‌ها بر اساس زمان ویرایش
-            files_with_time = [(f, os.path.getmtime(f)) for f in all_files]
-            files_sorted = sorted(files_with_time, key=lambda x: x[1])
-
-            # حذف فایل‌های قدیمی
-            files_to_delete = files_sorted[:-max_files]  # نگهداری max_files فایل جدیدتر
-
-            for file_path, _ in files_to_delete:
-                try:
-                    os.remove(file_path)
-                    debug_log(f"فایل قدیمی حذف شد: {file_path}")
-                except Exception as e:
-                    debug_log(f"خطا در حذف فایل {file_path}: {e}", "ERROR")
-
-            return len(files_to_delete)
-    except Exception as e:
-        debug_log(f"خطا در پاکسازی پوشه {folder_path}: {e}", "ERROR")
-
-    return 0
-
 # تابع شروع - Start command
 @bot.message_handler(commands=["start"])
 def start_command(message):
@@ -10,13 +10,18 @@ from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 from debug_logger import debug_log, debug_decorator, format_exception_with_context
 from config import (
-    BOT_TOKEN, WEBHOOK_URL, BOT_MESSAGES, ADMIN_IDS, UserRole,
-    MAX_VIDEO_SIZE_MB, MAX_DOWNLOAD_TIME, MAX_DOWNLOADS_PER_USER, MAX_VIDEO_DURATION
+    BOT_TOKEN, WEBHOOK_URL, BOT_MESSAGES, ADMIN_IDS, UserRole, DownloadStatus,
+    MAX_VIDEO_SIZE_MB, MAX_DOWNLOAD_TIME, MAX_DOWNLOADS_PER_USER, MAX_VIDEO_DURATION,
+    SPLIT_OVERSIZED
+)
+from database import (
+    add_download, get_download, update_download_status, get_user_downloads_page,
+    get_telegram_file, save_telegram_file, delete_telegram_file
 )
-from database import add_download, get_download, update_download_status, get_user_downloads
 from youtube_downloader import (
-    validate_youtube_url, extract_video_info, download_video,
-    get_download_progress, cancel_download, clean_old_downloads
+    validate_youtube_url, extract_video_info, download_video, download_audio, extract_formats,
+    get_download_progress, cancel_download, clean_old_downloads, recover_interrupted_downloads,
+    SEND_AUDIO_EXTENSIONS
 )
 from user_management import (
     update_user_info, is_user_blocked, is_admin, is_premium,
@@ -24,8 +29,21 @@ from user_management import (
 )
 from system_info import get_system_status_text
 from bot_commands import register_commands
+from download_queue import download_scheduler, JobPriority
+from video_info_cache import get_video_id
+from download_progress import get_stage_timer, log_stage_timings
+from artifact_store import artifact_store
+from uploader import telegram_uploader, get_upload_limit, configure_telebot_api
+from telegram_gateway import telegram_gateway, RequestPriority, install_telebot_gateway
+from progress_renderer import progress_renderer
+from format_planner import get_delivery_limit
+from prefetch import prefetcher
+from video_splitter import split_video, deliver_parts, remove_parts, is_available as splitter_available
 
-# ایجاد نمونه ربات
+# ایجاد نمونه ربات (در صورت تنظیم، با سرور Bot API محلی)
+# همه درخواست‌ها از دروازه با محدودیت نرخ و اتصال‌های keep-alive عبور می‌کنند
+configure_telebot_api()
+install_telebot_gateway()
 bot = telebot.TeleBot(BOT_TOKEN)
 
 # قفل‌ها برای مدیریت همزمانی
@@ -227,6 +245,126 @@ def register_handlers(bot_instance):
     # ثبت دستورات در منوی ربات
     register_commands(bot_instance)
     
+    # --- صفحه‌بندی لیست‌ها با نشانگر (callback_data: pg_<نوع>_<نشانگر>) ---
+    
+    def next_page_markup(prefix, next_cursor):
+        """دکمه صفحه بعد یا None در صفحه آخر"""
+        if not next_cursor:
+            return None
+        markup = types.InlineKeyboardMarkup()
+        markup.add(types.InlineKeyboardButton("➡️ صفحه بعد", callback_data=f"{prefix}{next_cursor}"))
+        return markup
+    
+    def format_download_entry(i, dl, show_user=False):
+        """متن یک دانلود در لیست دانلودها"""
+        # وضعیت دانلود
+        status_emoji = "⏳" if dl['status'] in [0, 1] else ("✅" if dl['status'] == 2 else ("❌" if dl['status'] == 3 else "🚫"))
+        status_text = ["در انتظار", "در حال پردازش", "تکمیل شده", "با خطا مواجه شد", "لغو شده"][dl['status']]
+        
+        # استخراج عنوان ویدیو
+        title = "ویدیو ناشناس"
+        if dl.get('metadata') and isinstance(dl['metadata'], dict) and dl['metadata'].get('title'):
+            title = dl['metadata']['title']
+        
+        # افزودن اطلاعات دانلود
+        result = f"{i}. {status_emoji} *#{dl['id']}*"
+        result += f" - کاربر: `{dl['user_id']}`\n" if show_user else "\n"
+        result += f"🎬 *عنوان:* {title[:30]}...\n"
+        result += f"🔄 *وضعیت:* {status_text}\n"
+        
+        # اگر اندازه فایل موجود است
+        if dl.get('file_size'):
+            from youtube_downloader import format_filesize
+            result += f"📦 *حجم:* {format_filesize(dl['file_size'])}\n"
+        
+        # افزودن زمان شروع
+        if dl.get('start_time'):
+            start_time = dl['start_time'].split('T')[0] if 'T' in dl['start_time'] else dl['start_time']
+            result += f"🕒 *زمان شروع:* {start_time}\n"
+        
+        # دکمه‌ها برای دانلودهای در حال انجام
+        if dl['status'] in [0, 1]:
+            result += f"برای لغو دانلود: /cancel_{dl['id']}\n"
+        
+        return result + "\n"
+    
+    def render_user_downloads_page(user_id, cursor=None):
+        """متن و دکمه یک صفحه از دانلودهای کاربر"""
+        downloads, next_cursor = get_user_downloads_page(user_id, cursor, limit=10)
+        if not downloads:
+            return "📂 شما هیچ دانلودی ندارید.", None
+        
+        result = "📋 *دانلودهای شما:*\n\n"
+        for i, dl in enumerate(downloads, 1):
+            result += format_download_entry(i, dl)
+        return result, next_page_markup("pg_m_", next_cursor)
+    
+    def render_downloads_page(cursor=None):
+        """متن و دکمه یک صفحه از همه دانلودها"""
+        from database import get_downloads_page
+        
+        downloads, next_cursor = get_downloads_page(cursor=cursor, limit=20)
+        if not downloads:
+            return "📂 هیچ دانلودی یافت نشد.", None
+        
+        result = "📋 *لیست دانلودها:*\n\n"
+        for i, dl in enumerate(downloads, 1):
+            result += format_download_entry(i, dl, show_user=True)
+            
+            # محدودیت اندازه پیام (ادامه از آخرین دانلود نمایش داده شده)
+            if len(result) > 3500 and i < len(downloads):
+                from database import encode_cursor
+                next_cursor = encode_cursor(dl['start_time'], dl['id'])
+                break
+        return result, next_page_markup("pg_d_", next_cursor)
+    
+    def render_users_page(cursor=None):
+        """متن و دکمه یک صفحه از کاربران"""
+        from user_management import format_users_list
+        from database import get_users_page
+        
+        users, next_cursor = get_users_page(cursor, limit=50)
+        return format_users_list(users), next_page_markup("pg_u_", next_cursor)
+    
+    def render_logs_page(count, cursor=None):
+        """متن و دکمه یک صفحه از لاگ‌ها"""
+        from database import get_logs_page, encode_cursor
+        
+        logs, next_cursor = get_logs_page(cursor=cursor, limit=count)
+        if not logs:
+            return "🔍 هیچ لاگی یافت نشد.", None
+        
+        # فرمت‌بندی لاگ‌ها
+        logs_text = f"📋 *{len(logs)} لاگ اخیر:*\n\n"
+        
+        for i, log in enumerate(logs, 1):
+            # فرمت‌بندی زمان
+            timestamp = log.get('timestamp') or 'نامشخص'
+            
+            if len(timestamp) > 19:
+                timestamp = timestamp[:19].replace('T', ' ')
+            
+            # سطح لاگ
+            level = log.get('level', 'DEBUG')
+            level_emoji = "🔵" if level == "DEBUG" else (
+                "🟢" if level == "INFO" else (
+                "🟡" if level == "WARNING" else "🔴"
+            ))
+            
+            # پیام لاگ (محدود به 100 کاراکتر)
+            message_text = log.get('message') or ''
+            if len(message_text) > 100:
+                message_text = message_text[:97] + "..."
+            
+            logs_text += f"{level_emoji} `{timestamp}` *{level}*: {message_text}\n\n"
+            
+            # محدودیت طول پیام تلگرام (ادامه از آخرین لاگ نمایش داده شده)
+            if len(logs_text) > 3500 and i < len(logs):
+                next_cursor = encode_cursor(log['timestamp'], log['id'])
+                break
+        
+        return logs_text, next_page_markup(f"pg_l_{count}_", next_cursor)
+    
     # هندلر دستور شروع
     @bot_instance.message_handler(commands=['start'])
     def start_command(message):
@@ -374,53 +512,10 @@ def register_handlers(bot_instance):
                 bot_instance.reply_to(message, BOT_MESSAGES['user_blocked'])
                 return
             
-            # دریافت دانلودهای کاربر
-            downloads = get_user_downloads(user_id, limit=10)
-            
-            if not downloads:
-                bot_instance.send_message(message.chat.id, "📂 شما هیچ دانلودی ندارید.")
-                return
+            # نمایش صفحه اول دانلودهای کاربر
+            result, markup = render_user_downloads_page(user_id)
             
-            # نمایش دانلودها
-            result = "📋 *دانلودهای شما:*\n\n"
-            
-            for i, dl in enumerate(downloads, 1):
-                # وضعیت دانلود
-                status_emoji = "⏳" if dl['status'] in [0, 1] else ("✅" if dl['status'] == 2 else ("❌" if dl['status'] == 3 else "🚫"))
-                status_text = ["در انتظار", "در حال پردازش", "تکمیل شده", "با خطا مواجه شد", "لغو شده"][dl['status']]
-                
-                # استخراج عنوان ویدیو
-                title = "ویدیو ناشناس"
-                if dl.get('metadata') and isinstance(dl['metadata'], dict) and dl['metadata'].get('title'):
-                    title = dl['metadata']['title']
-                
-                # افزودن اطلاعات دانلود
-                result += f"{i}. {status_emoji} *#{dl['id']}*\n"
-                result += f"🎬 *عنوان:* {title[:30]}...\n"
-                result += f"🔄 *وضعیت:* {status_text}\n"
-                
-                # اگر اندازه فایل موجود است
-                if dl.get('file_size'):
-                    from youtube_downloader import format_filesize
-                    result += f"📦 *حجم:* {format_filesize(dl['file_size'])}\n"
-                
-                # افزودن زمان شروع
-                if dl.get('start_time'):
-                    start_time = dl['start_time'].split('T')[0] if 'T' in dl['start_time'] else dl['start_time']
-                    result += f"🕒 *زمان شروع:* {start_time}\n"
-                
-                # دکمه‌ها برای دانلودهای در حال انجام
-                if dl['status'] in [0, 1]:
-                    result += f"برای لغو دانلود: /cancel_{dl['id']}\n"
-                
-                result += "\n"
-                
-                # محدودیت اندازه پیام
-                if len(result) > 3500:
-                    result += f"... و {len(downloads) - i} دانلود دیگر"
-                    break
-            
-            bot_instance.send_message(message.chat.id, result, parse_mode="Markdown")
+            bot_instance.send_message(message.chat.id, result, parse_mode="Markdown", reply_markup=markup)
             
         except Exception as e:
             debug_log(f"خطا در دستور mydownloads: {str(e)}", "ERROR")
@@ -540,11 +635,12 @@ def register_handlers(bot_instance):
             # دکمه‌های کیفیت
             quality_buttons = []
             
-            # افزودن فرمت‌های موجود
-            formats = video_info.get('formats', [])
+            # افزودن فرمت‌های موجود (یک گزینه برای هر کیفیت و یک گزینه فقط صدا)
+            formats = extract_formats(video_info)
             
             # محدود کردن تعداد دکمه‌ها (حداکثر 8 گزینه)
             max_formats = min(len(formats), 8) if formats else 0
+            offered_formats = []
             
             for i in range(max_formats):
                 format_info = formats[i]
@@ -554,11 +650,14 @@ def register_handlers(bot_instance):
                 # برچسب دکمه
                 if quality_label == 'audio':
                     button_text = f"🎵 فقط صدا - {format_info.get('filesize_human', 'نامشخص')}"
+                    # حالت صوتی: فقط جریان صوتی دریافت و بدون تبدیل ارسال می‌شود
+                    format_id = 'audio'
                 else:
                     button_text = f"🎬 {quality_label} - {format_info.get('filesize_human', 'نامشخص')}"
                 
                 callback_data = f"download_{format_id}_{url[:30]}"  # محدود کردن اندازه callback_data
                 quality_buttons.append(types.InlineKeyboardButton(button_text, callback_data=callback_data))
+                offered_formats.append({"format_id": format_id, "filesize": format_info.get('filesize')})
             
             # اگر فرمتی یافت نشد
             if not quality_buttons:
@@ -570,6 +669,12 @@ def register_handlers(bot_instance):
             # اضافه کردن دکمه لغو
             markup.add(types.InlineKeyboardButton("❌ لغو", callback_data="cancel_download"))
             
+            # شروع دانلود کیفیت محتمل با اولویت پایین تا زمان انتخاب کاربر
+            try:
+                prefetcher.start(user_id, url, offered_formats)
+            except Exception as prefetch_error:
+                debug_log(f"خطا در شروع پیش‌واکشی: {str(prefetch_error)}", "WARNING")
+            
             # نمایش پیش‌نمایش ویدیو
             preview_text = f"📹 *{video_title}*\n\n"
             preview_text += f"👤 *کانال:* {video_uploader}\n"
@@ -618,7 +723,8 @@ def register_handlers(bot_instance):
             )
     
     # هندلر کال‌بک کوئری
-    @bot_instance.callback_query_handler(func=lambda call: True)
+    # کال‌بک‌های broadcast_ و cancelall_ هندلرهای جداگانه دارند
+    @bot_instance.callback_query_handler(func=lambda call: not call.data.startswith(("broadcast_", "cancelall_")))
     def callback_handler(call):
         try:
             # دریافت اطلاعات کاربر
@@ -664,6 +770,7 @@ def register_handlers(bot_instance):
                 
             elif data == "cancel_download":
                 # لغو انتخاب دانلود
+                prefetcher.discard(user_id)
                 bot_instance.answer_callback_query(call.id, "درخواست دانلود لغو شد")
                 bot_instance.edit_message_text(
                     "❌ درخواست دانلود توسط کاربر لغو شد.",
@@ -671,6 +778,37 @@ def register_handlers(bot_instance):
                     message_id=call.message.message_id
                 )
                 
+            elif data.startswith("pg_"):
+                # صفحه بعد لیست‌ها (pg_<نوع>_<نشانگر>)
+                parts = data.split('_', 2)
+                kind, cursor = (parts[1], parts[2]) if len(parts) == 3 else (None, None)
+                
+                if kind in ("u", "d", "l") and not is_admin(user_id):
+                    bot_instance.answer_callback_query(call.id, "شما دسترسی ادمین ندارید!", show_alert=True)
+                    return
+                
+                if kind == "m":
+                    text, markup = render_user_downloads_page(user_id, cursor)
+                elif kind == "u":
+                    text, markup = render_users_page(cursor)
+                elif kind == "d":
+                    text, markup = render_downloads_page(cursor)
+                elif kind == "l" and '_' in cursor:
+                    count, cursor = cursor.split('_', 1)
+                    text, markup = render_logs_page(int(count), cursor)
+                else:
+                    bot_instance.answer_callback_query(call.id, "داده نامعتبر", show_alert=True)
+                    return
+                
+                bot_instance.answer_callback_query(call.id)
+                bot_instance.edit_message_text(
+                    text,
+                    chat_id=call.message.chat.id,
+                    message_id=call.message.message_id,
+                    parse_mode="Markdown",
+                    reply_markup=markup
+                )
+                
             elif data.startswith("download_"):
                 # شروع دانلود
                 # بررسی محدودیت‌های کاربر
@@ -712,7 +850,8 @@ def register_handlers(bot_instance):
                         bot_instance.send_message(call.message.chat.id, "🔄 لطفاً URL کامل یوتیوب را مجددا ارسال کنید.")
                         return
                     
-                    # شروع دانلود
+                    # شروع دانلود (پیش‌واکشی همین کیفیت ادامه می‌یابد و بقیه لغو می‌شوند)
+                    prefetcher.resolve(user_id, url, quality)
                     start_download_process(call.message.chat.id, url, user_id, quality)
                     
                     # پاسخ به کاربر
@@ -738,10 +877,67 @@ def register_handlers(bot_instance):
             except Exception:
                 pass
     
+    # ارسال مجدد فایلی که قبلا در تلگرام آپلود شده است
+    def send_cached_file(chat_id, url, user_id, quality):
+        """ارسال فایل با file_id ذخیره شده (بدون دانلود و آپلود مجدد)"""
+        video_id = get_video_id(url)
+        if not video_id:
+            return False
+        
+        cached = get_telegram_file(video_id, quality)
+        if not cached:
+            return False
+        
+        title = cached.get('title') or "ویدیو یوتیوب"
+        try:
+            if cached['media_kind'] == 'audio':
+                bot_instance.send_audio(
+                    chat_id,
+                    cached['file_id'],
+                    caption=f"🎵 {title}\n\n🤖 @{bot_instance.get_me().username}",
+                    title=title,
+                    performer="YouTube Download Bot"
+                )
+            elif cached['media_kind'] == 'document':
+                bot_instance.send_document(
+                    chat_id,
+                    cached['file_id'],
+                    caption=f"🎬 {title}\n\n🤖 @{bot_instance.get_me().username}"
+                )
+            else:
+                bot_instance.send_video(
+                    chat_id,
+                    cached['file_id'],
+                    caption=f"🎬 {title}\n\n🤖 @{bot_instance.get_me().username}",
+                    supports_streaming=True
+                )
+        except Exception as e:
+            # file_id نامعتبر است (مثلا توکن ربات تغییر کرده)، دانلود عادی انجام شود
+            debug_log(f"خطا در ارسال مجدد با file_id برای {video_id}: {str(e)}", "WARNING")
+            delete_telegram_file(video_id, quality, cached['media_kind'])
+            return False
+        
+        # ثبت در تاریخچه دانلودهای کاربر
+        download_id = add_download(user_id, url, quality)
+        if download_id != -1:
+            update_download_status(
+                download_id,
+                DownloadStatus.COMPLETED,
+                file_size=cached.get('file_size'),
+                metadata={"title": title, "telegram_file_id": cached['file_id']}
+            )
+        
+        debug_log(f"ارسال مجدد {video_id} ({quality}) با file_id بدون دانلود", "INFO")
+        return True
+    
     # تابع شروع دانلود
     @debug_decorator
     def start_download_process(chat_id, url, user_id, quality="best"):
-        """شروع فرایند دانلود"""
+        """ثبت دانلود و افزودن آن به صف دانلود"""
+        
+        # اگر فایل قبلا در تلگرام آپلود شده، فقط file_id ارسال شود
+        if send_cached_file(chat_id, url, user_id, quality):
+            return
         
         # ثبت در دیتابیس
         download_id = add_download(user_id, url, quality)
@@ -760,151 +956,272 @@ def register_handlers(bot_instance):
             parse_mode="Markdown"
         )
         
-        # تابع آپدیت پیشرفت
-        def progress_callback(percent, status):
+        # افزودن به صف دانلود (کاربران ویژه اولویت بالاتری دارند)
+        priority = JobPriority.HIGH if is_premium(user_id) else JobPriority.NORMAL
+        job = download_scheduler.submit(
+            "bot_handlers.youtube",
+            {
+                "chat_id": chat_id,
+                "message_id": message.message_id,
+                "url": url,
+                "user_id": user_id,
+                "quality": quality,
+                "download_id": download_id
+            },
+            priority=priority,
+            user_id=user_id,
+            download_id=download_id
+        )
+        
+        # اطلاع‌رسانی جایگاه در صف
+        position = download_scheduler.get_position(job.job_id)
+        if position > 0:
             try:
-                # به‌روزرسانی پیام هر 10 درصد یا تغییر وضعیت
-                if hasattr(progress_callback, 'last_update'):
-                    last_percent, last_status = progress_callback.last_update
-                    if percent - last_percent < 10 and status == last_status and percent < 100:
-                        return
-                
-                # ذخیره آخرین به‌روزرسانی
-                progress_callback.last_update = (percent, status)
-                
-                # به‌روزرسانی پیام
-                progress_text = f"🔄 *دانلود در حال انجام...*\n\n"
-                progress_text += f"🆔 شناسه دانلود: `{download_id}`\n"
-                progress_text += f"📊 پیشرفت: {percent:.1f}%\n"
-                progress_text += f"🔄 وضعیت: {status}\n\n"
-                progress_text += "برای لغو دانلود: /cancel_" + str(download_id)
-                
                 bot_instance.edit_message_text(
-                    progress_text,
-                    chat_id=message.chat.id,
+                    BOT_MESSAGES['download_queued'].format(download_id=download_id, position=position),
+                    chat_id=chat_id,
                     message_id=message.message_id,
                     parse_mode="Markdown"
                 )
-            except Exception as e:
-                debug_log(f"خطا در به‌روزرسانی پیشرفت دانلود: {str(e)}", "WARNING")
+            except Exception:
+                pass  # نادیده گرفتن خطای احتمالی در ویرایش پیام
+    
+    # اجرای کار دانلود توسط کارگرهای صف
+    def run_download_job(payload, job):
+        """اجرای یک کار دانلود از صف"""
+        chat_id = payload["chat_id"]
+        message_id = payload["message_id"]
+        url = payload["url"]
+        user_id = payload["user_id"]
+        quality = payload.get("quality", "best")
+        download_id = payload["download_id"]
         
-        # تنظیم مقادیر اولیه
-        progress_callback.last_update = (0, "در حال شروع...")
+        # تابع آپدیت پیشرفت (فقط آخرین وضعیت ثبت و حداکثر هر چند ثانیه یک بار ارسال می‌شود)
+        def progress_callback(percent, status):
+            progress_text = f"🔄 *دانلود در حال انجام...*\n\n"
+            progress_text += f"🆔 شناسه دانلود: `{download_id}`\n"
+            progress_text += f"📊 پیشرفت: {percent:.1f}%\n"
+            progress_text += f"🔄 وضعیت: {status}\n\n"
+            progress_text += "برای لغو دانلود: /cancel_" + str(download_id)
+            
+            progress_renderer.update(bot_instance, chat_id, message_id, progress_text, parse_mode="Markdown")
         
-        # شروع دانلود در ترد جداگانه
-        def download_thread():
-            try:
+        # اجرای دانلود
+        try:
+            if quality == "audio":
+                # دانلود فقط جریان صوتی
+                success, file_path, error = download_audio(url, download_id, user_id, progress_callback, job=job)
+            else:
                 # دانلود ویدیو
                 success, file_path, error = download_video(
                     url, 
                     download_id, 
                     user_id, 
                     quality, 
-                    progress_callback
+                    progress_callback,
+                    allow_split=SPLIT_OVERSIZED,
+                    job=job
                 )
-                
-                if success and file_path:
+            
+            if success and file_path:
+                # آپلود فایل به تلگرام
+                try:
+                    # دریافت اطلاعات دانلود از دیتابیس
+                    download_info = get_download(download_id)
+                    
+                    if not download_info:
+                        bot_instance.send_message(
+                            chat_id,
+                            "❌ خطا در دریافت اطلاعات دانلود. لطفاً با ادمین تماس بگیرید."
+                        )
+                        return
+                    
+                    # استخراج عنوان ویدیو
+                    title = "ویدیو یوتیوب"
+                    if (download_info.get('metadata') and 
+                        isinstance(download_info['metadata'], dict) and 
+                        download_info['metadata'].get('title')):
+                        title = download_info['metadata']['title']
+                    metadata = download_info['metadata'] if isinstance(download_info.get('metadata'), dict) else {}
+                    
+                    # ارسال پیام نهایی دانلود
+                    progress_renderer.finish(
+                        bot_instance, chat_id, message_id,
+                        f"✅ *دانلود با موفقیت انجام شد!*\n\n"
+                        f"🎬 *عنوان:* {title}\n"
+                        f"🆔 *شناسه:* `{download_id}`\n"
+                        f"💾 *فایل در حال آپلود...*",
+                        parse_mode="Markdown"
+                    )
+                    
                     # آپلود فایل به تلگرام
-                    try:
-                        # دریافت اطلاعات دانلود از دیتابیس
-                        download_info = get_download(download_id)
-                        
-                        if not download_info:
-                            bot_instance.send_message(
-                                chat_id,
-                                "❌ خطا در دریافت اطلاعات دانلود. لطفاً با ادمین تماس بگیرید."
-                            )
-                            return
-                        
-                        # استخراج عنوان ویدیو
-                        title = "ویدیو یوتیوب"
-                        if (download_info.get('metadata') and 
-                            isinstance(download_info['metadata'], dict) and 
-                            download_info['metadata'].get('title')):
-                            title = download_info['metadata']['title']
-                        
-                        # ارسال پیام نهایی
-                        bot_instance.edit_message_text(
-                            f"✅ *دانلود با موفقیت انجام شد!*\n\n"
-                            f"🎬 *عنوان:* {title}\n"
-                            f"🆔 *شناسه:* `{download_id}`\n"
-                            f"💾 *فایل در حال آپلود...*",
-                            chat_id=message.chat.id,
-                            message_id=message.message_id,
+                    upload_limit = get_upload_limit()
+                    delivery_limit = get_delivery_limit(user_id)
+                    is_audio = file_path.endswith('.mp3') or 'audio' in quality
+                    split = (not is_audio and SPLIT_OVERSIZED and os.path.getsize(file_path) > delivery_limit
+                             and splitter_available())
+                    if os.path.getsize(file_path) > upload_limit and not split:
+                        # اگر فایل بزرگتر از حد مجاز سرور Bot API باشد (50 مگابایت، یا 2 گیگابایت با سرور محلی)
+                        bot_instance.send_message(
+                            chat_id,
+                            f"⚠️ حجم فایل بیشتر از {upload_limit // (1024 * 1024)} مگابایت است و امکان آپلود مستقیم وجود ندارد.\n\n"
+                            f"🔗 *لینک دانلود:* فایل در سرور ذخیره شده و تا 24 ساعت آینده قابل دسترسی است.",
                             parse_mode="Markdown"
                         )
+                    else:
+                        # ارسال فایل به صورت جریانی با گزارش درصد آپلود در همان پیام پیشرفت
+                        def upload_progress(percent, sent, total):
+                            progress_callback(percent, "📤 در حال آپلود به تلگرام...")
                         
-                        # آپلود فایل به تلگرام
-                        if os.path.getsize(file_path) > 50 * 1024 * 1024 and not is_premium(user_id):
-                            # اگر فایل بزرگتر از 50 مگابایت باشد و کاربر ویژه نباشد
-                            bot_instance.send_message(
-                                chat_id,
-                                f"⚠️ حجم فایل بیشتر از 50 مگابایت است و امکان آپلود مستقیم وجود ندارد.\n\n"
-                                f"🔗 *لینک دانلود:* فایل در سرور ذخیره شده و تا 24 ساعت آینده قابل دسترسی است.\n\n"
-                                f"💎 برای دریافت فایل‌های بزرگتر، به اکانت ویژه ارتقا دهید.",
-                                parse_mode="Markdown"
-                            )
-                        else:
-                            # ارسال فایل
-                            with open(file_path, 'rb') as video_file:
-                                if file_path.endswith('.mp3') or 'audio' in quality:
-                                    # ارسال به عنوان فایل صوتی
-                                    bot_instance.send_audio(
+                        with download_scheduler.stage("upload"), get_stage_timer(download_id).stage("upload"), \
+                                artifact_store.pinned(file_path):
+                            if split:
+                                # ارسال ویدیوی بزرگتر از حد مجاز در چند بخش با کیفیت کامل (بدون تبدیل)
+                                progress_callback(100, "✂️ در حال تقسیم ویدیو به چند بخش...")
+                                parts = split_video(file_path, delivery_limit, metadata.get('duration'))
+                                try:
+                                    deliver_parts(
                                         chat_id,
-                                        video_file,
-                                        caption=f"🎵 {title}\n\n🤖 @{bot_instance.get_me().username}",
-                                        title=title,
-                                        performer="YouTube Download Bot"
-                                    )
-                                else:
-                                    # ارسال به عنوان ویدیو
-                                    bot_instance.send_video(
-                                        chat_id,
-                                        video_file,
-                                        caption=f"🎬 {title}\n\n🤖 @{bot_instance.get_me().username}",
+                                        parts,
+                                        f"🎬 {title}\n\n🤖 @{bot_instance.get_me().username}",
+                                        upload_progress,
                                         supports_streaming=True
                                     )
-                            
-                            # پیام تکمیل
-                            bot_instance.send_message(
-                                chat_id,
-                                f"✅ *دانلود کامل شد*\n\n"
-                                f"🎬 *عنوان:* {title}\n"
-                                f"🆔 *شناسه دانلود:* `{download_id}`\n\n"
-                                f"از استفاده شما متشکریم! 🙏",
-                                parse_mode="Markdown"
-                            )
-                    except Exception as upload_error:
-                        debug_log(f"خطا در آپلود فایل: {str(upload_error)}", "ERROR")
+                                finally:
+                                    remove_parts(parts)
+                                # بخش‌ها file_id قابل استفاده مجدد برای کل ویدیو ندارند
+                                sent_message = None
+                            elif is_audio and file_path.endswith(SEND_AUDIO_EXTENSIONS):
+                                # ارسال به عنوان فایل صوتی
+                                result = telegram_uploader.send_file(
+                                    "audio",
+                                    chat_id,
+                                    file_path,
+                                    upload_progress,
+                                    caption=f"🎵 {title}\n\n🤖 @{bot_instance.get_me().username}",
+                                    title=title,
+                                    performer=metadata.get('uploader') or "YouTube Download Bot",
+                                    duration=int(metadata.get('duration') or 0) or None
+                                )
+                            elif is_audio:
+                                # صدای opus (.ogg) در sendAudio پخش نمی‌شود و به صورت فایل ارسال می‌شود
+                                result = telegram_uploader.send_file(
+                                    "document",
+                                    chat_id,
+                                    file_path,
+                                    upload_progress,
+                                    caption=f"🎵 {title}\n\n🤖 @{bot_instance.get_me().username}"
+                                )
+                            else:
+                                # ارسال به عنوان ویدیو
+                                result = telegram_uploader.send_file(
+                                    "video",
+                                    chat_id,
+                                    file_path,
+                                    upload_progress,
+                                    caption=f"🎬 {title}\n\n🤖 @{bot_instance.get_me().username}",
+                                    supports_streaming=True
+                                )
+                            sent_message = types.Message.de_json(result)
+                        
+                        # ارسال آخرین درصد آپلود
+                        progress_renderer.finish(bot_instance, chat_id, message_id)
+                        log_stage_timings(download_id)
+                        
+                        # ذخیره file_id برای ارسال مجدد بدون دانلود (فقط اگر همان کیفیت درخواستی ارسال شده باشد،
+                        # چون فایل کاهش کیفیت یافته یا فشرده شده به محدودیت حجم همین کاربر وابسته است)
+                        video_id = get_video_id(url)
+                        if video_id and sent_message and not metadata.get('downgraded'):
+                            for media_kind in ('audio', 'video', 'document'):
+                                media = getattr(sent_message, media_kind, None)
+                                if media:
+                                    save_telegram_file(
+                                        video_id, quality, media_kind,
+                                        media.file_id, media.file_unique_id,
+                                        getattr(media, 'file_size', None), title
+                                    )
+                                    break
+                        
+                        # پیام تکمیل
                         bot_instance.send_message(
                             chat_id,
-                            f"⚠️ دانلود با موفقیت انجام شد اما خطایی در آپلود فایل رخ داد:\n{str(upload_error)}"
+                            f"✅ *دانلود کامل شد*\n\n"
+                            f"🎬 *عنوان:* {title}\n"
+                            f"🆔 *شناسه دانلود:* `{download_id}`\n\n"
+                            f"از استفاده شما متشکریم! 🙏",
+                            parse_mode="Markdown"
                         )
-                else:
-                    # خطا در دانلود
-                    error_message = "خطای نامشخص"
-                    if error and isinstance(error, dict):
-                        error_message = error.get('error', 'خطای نامشخص')
-                    
+                except Exception as upload_error:
+                    debug_log(f"خطا در آپلود فایل: {str(upload_error)}", "ERROR")
                     bot_instance.send_message(
                         chat_id,
-                        BOT_MESSAGES['download_failed'].format(error=error_message),
-                        parse_mode="Markdown"
+                        f"⚠️ دانلود با موفقیت انجام شد اما خطایی در آپلود فایل رخ داد:\n{str(upload_error)}"
                     )
-            except Exception as thread_error:
-                debug_log(f"خطا در ترد دانلود: {str(thread_error)}", "ERROR")
+            elif error and isinstance(error, dict) and error.get('canceled'):
+                # دانلود توسط کاربر لغو شده است
                 try:
-                    bot_instance.send_message(
-                        chat_id,
-                        f"❌ خطایی در فرایند دانلود رخ داد:\n{str(thread_error)}"
+                    progress_renderer.finish(
+                        bot_instance, chat_id, message_id,
+                        f"🚫 دانلود با شناسه `{download_id}` لغو شد.",
+                        parse_mode="Markdown"
                     )
                 except Exception:
                     pass
-        
-        # شروع ترد دانلود
-        thread = threading.Thread(target=download_thread)
-        thread.daemon = True
-        thread.start()
+            else:
+                # خطا در دانلود
+                error_message = "خطای نامشخص"
+                if error and isinstance(error, dict):
+                    error_message = error.get('error', 'خطای نامشخص')
+                
+                bot_instance.send_message(
+                    chat_id,
+                    BOT_MESSAGES['download_failed'].format(error=error_message),
+                    parse_mode="Markdown"
+                )
+        except Exception as thread_error:
+            debug_log(f"خطا در کار دانلود: {str(thread_error)}", "ERROR")
+            try:
+                bot_instance.send_message(
+                    chat_id,
+                    f"❌ خطایی در فرایند دانلود رخ داد:\n{str(thread_error)}"
+                )
+            except Exception:
+                pass
+        finally:
+            # ارسال آخرین وضعیت پیام پیشرفت (در صورت باقی ماندن)
+            try:
+                progress_renderer.finish(bot_instance, chat_id, message_id)
+            except Exception as e:
+                debug_log(f"خطا در ارسال وضعیت نهایی پیشرفت: {str(e)}", "WARNING")
+    
+    # ثبت پردازشگر کارهای دانلود در زمان‌بند
+    download_scheduler.register_handler("bot_handlers.youtube", run_download_job)
+    
+    # افزودن مجدد دانلودهای نیمه‌کاره به صف (با همان شناسه، تا از فایل .part ادامه یابند)
+    def resubmit_download(row):
+        """افزودن مجدد یک دانلود قطع شده به صف"""
+        user_id = row["user_id"]
+        message = bot_instance.send_message(
+            user_id,
+            BOT_MESSAGES['download_resumed'].format(download_id=row["id"])
+        )
+        download_scheduler.submit(
+            "bot_handlers.youtube",
+            {
+                "chat_id": user_id,
+                "message_id": message.message_id,
+                "url": row["url"],
+                "user_id": user_id,
+                "quality": row.get("quality") or "best",
+                "download_id": row["id"]
+            },
+            priority=JobPriority.HIGH if is_premium(user_id) else JobPriority.NORMAL,
+            user_id=user_id,
+            download_id=row["id"]
+        )
+        return True
+    
+    recover_interrupted_downloads(resubmit_download)
     
     # هندلر دستورات مدیریتی برای ادمین‌ها
     
@@ -919,14 +1236,10 @@ def register_handlers(bot_instance):
                 bot_instance.reply_to(message, BOT_MESSAGES['unauthorized'])
                 return
                 
-            # دریافت لیست کاربران
-            from user_management import format_users_list
-            from database import get_all_users
-            
-            users = get_all_users(limit=50)
-            users_text = format_users_list(users)
+            # دریافت صفحه اول کاربران
+            users_text, markup = render_users_page()
             
-            bot_instance.send_message(message.chat.id, users_text, parse_mode="Markdown")
+            bot_instance.send_message(message.chat.id, users_text, parse_mode="Markdown", reply_markup=markup)
             
         except Exception as e:
             debug_log(f"خطا در دستور users: {str(e)}", "ERROR")
@@ -1178,45 +1491,10 @@ def register_handlers(bot_instance):
                 except ValueError:
                     pass
             
-            # دریافت لاگ‌های اخیر
-            from debug_logger import get_recent_logs
+            # دریافت صفحه اول لاگ‌ها
+            logs_text, markup = render_logs_page(count)
             
-            logs = get_recent_logs(count)
-            
-            if not logs:
-                bot_instance.reply_to(message, "🔍 هیچ لاگی یافت نشد.")
-                return
-                
-            # فرمت‌بندی لاگ‌ها
-            logs_text = f"📋 *{len(logs)} لاگ اخیر:*\n\n"
-            
-            for log in logs:
-                # فرمت‌بندی زمان
-                timestamp = log.get('timestamp', 'نامشخص')
-                
-                if len(timestamp) > 19:
-                    timestamp = timestamp[:19].replace('T', ' ')
-                
-                # سطح لاگ
-                level = log.get('level', 'DEBUG')
-                level_emoji = "🔵" if level == "DEBUG" else (
-                    "🟢" if level == "INFO" else (
-                    "🟡" if level == "WARNING" else "🔴"
-                ))
-                
-                # پیام لاگ (محدود به 100 کاراکتر)
-                message_text = log.get('message', '')
-                if len(message_text) > 100:
-                    message_text = message_text[:97] + "..."
-                
-                logs_text += f"{level_emoji} `{timestamp}` *{level}*: {message_text}\n\n"
-                
-                # محدودیت طول پیام تلگرام
-                if len(logs_text) > 3500:
-                    logs_text += f"... و {len(logs) - logs.index(log) - 1} لاگ دیگر"
-                    break
-            
-            bot_instance.send_message(message.chat.id, logs_text, parse_mode="Markdown")
+            bot_instance.send_message(message.chat.id, logs_text, parse_mode="Markdown", reply_markup=markup)
             
         except Exception as e:
             debug_log(f"خطا در دستور logs: {str(e)}", "ERROR")
@@ -1319,15 +1597,14 @@ def register_handlers(bot_instance):
                                 continue
                                 
                             try:
-                                bot_instance.send_message(
-                                    user_id,
-                                    f"📣 *پیام از طرف ادمین:*\n\n{broadcast_message}",
-                                    parse_mode="Markdown"
-                                )
+                                # نرخ ارسال توسط دروازه کنترل می‌شود؛ پاسخ کاربران جلوتر از این پیام‌ها ارسال می‌شود
+                                with telegram_gateway.priority(RequestPriority.BROADCAST):
+                                    bot_instance.send_message(
+                                        user_id,
+                                        f"📣 *پیام از طرف ادمین:*\n\n{broadcast_message}",
+                                        parse_mode="Markdown"
+                                    )
                                 successful += 1
-                                
-                                # تأخیر برای جلوگیری از محدودیت API
-                                time.sleep(0.1)
                             except Exception:
                                 failed += 1
                         
@@ -1386,55 +1663,10 @@ def register_handlers(bot_instance):
                 bot_instance.reply_to(message, BOT_MESSAGES['unauthorized'])
                 return
                 
-            # دریافت همه دانلودها
-            from database import get_all_downloads
-            
-            downloads = get_all_downloads(limit=20)
-            
-            if not downloads:
-                bot_instance.reply_to(message, "📂 هیچ دانلودی یافت نشد.")
-                return
-                
-            # نمایش دانلودها
-            result = "📋 *لیست دانلودها:*\n\n"
-            
-            for i, dl in enumerate(downloads, 1):
-                # وضعیت دانلود
-                status_emoji = "⏳" if dl['status'] in [0, 1] else ("✅" if dl['status'] == 2 else ("❌" if dl['status'] == 3 else "🚫"))
-                status_text = ["در انتظار", "در حال پردازش", "تکمیل شده", "با خطا مواجه شد", "لغو شده"][dl['status']]
-                
-                # استخراج عنوان ویدیو
-                title = "ویدیو ناشناس"
-                if dl.get('metadata') and isinstance(dl['metadata'], dict) and dl['metadata'].get('title'):
-                    title = dl['metadata']['title']
-                
-                # افزودن اطلاعات دانلود
-                result += f"{i}. {status_emoji} *#{dl['id']}* - کاربر: `{dl['user_id']}`\n"
-                result += f"🎬 *عنوان:* {title[:30]}...\n"
-                result += f"🔄 *وضعیت:* {status_text}\n"
-                
-                # اگر اندازه فایل موجود است
-                if dl.get('file_size'):
-                    from youtube_downloader import format_filesize
-                    result += f"📦 *حجم:* {format_filesize(dl['file_size'])}\n"
-                
-                # افزودن زمان شروع
-                if dl.get('start_time'):
-                    start_time = dl['start_time'].split('T')[0] if 'T' in dl['start_time'] else dl['start_time']
-                    result += f"🕒 *زمان شروع:* {start_time}\n"
-                
-                # دکمه‌ها برای دانلودهای در حال انجام
-                if dl['status'] in [0, 1]:
-                    result += f"برای لغو دانلود: /cancel_{dl['id']}\n"
-                
-                result += "\n"
-                
-                # محدودیت اندازه پیام
-                if len(result) > 3500:
-                    result += f"... و {len(downloads) - i} دانلود دیگر"
-                    break
+            # دریافت صفحه اول همه دانلودها
+            result, markup = render_downloads_page()
             
-            bot_instance.send_message(message.chat.id, result, parse_mode="Markdown")
+            bot_instance.send_message(message.chat.id, result, parse_mode="Markdown", reply_markup=markup)
             
         except Exception as e:
             debug_log(f"خطا در دستور downloads: {str(e)}", "ERROR")
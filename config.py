@@ -126,6 +126,8 @@ BOT_MESSAGES = {
     'invalid_url': "❌ لینک نامعتبر است. لطفاً یک لینک یوتیوب معتبر ارسال کنید.",
     'processing': "⏳ درحال پردازش لینک...",
     'download_started': "🔄 دانلود شروع شد. شناسه دانلود: {download_id}",
+    'download_queued': "⏳ دانلود در صف قرار گرفت. شناسه دانلود: {download_id}\n\n👥 شما نفر #{position} در صف هستید.",
+    'download_resumed': "♻️ دانلود با شناسه {download_id} پس از راه‌اندازی مجدد ربات ادامه می‌یابد.",
     'download_success': "✅ دانلود با موفقیت انجام شد!",
     'download_failed': "❌ دانلود با خطا مواجه شد: {error}",
     'unauthorized': "⛔ شما اجازه استفاده از این دستور را ندارید.",
@@ -135,4 +137,111 @@ BOT_MESSAGES = {
 # تنظیمات سیستم
 DOWNLOADS_DIR = "downloads"
 if not os.path.exists(DOWNLOADS_DIR):
-    os.makedirs(DOWNLOADS_DIR)
\ No newline at end of file
+    os.makedirs(DOWNLOADS_DIR)
+
+# تنظیمات صف دانلود
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "3"))  # تعداد تردهای کارگر دانلود
+DOWNLOAD_QUEUE_FILE = os.environ.get("DOWNLOAD_QUEUE_FILE", "download_queue.json")  # فایل ذخیره صف دانلود
+DOWNLOAD_STAGE_LIMITS = {  # حداکثر کارهای همزمان در هر مرحله
+    "extract": int(os.environ.get("EXTRACT_CONCURRENCY", "4")),
+    "download": int(os.environ.get("DOWNLOAD_CONCURRENCY", "3")),
+    "upload": int(os.environ.get("UPLOAD_CONCURRENCY", "2")),
+}
+
+# تنظیمات کش اطلاعات ویدیو
+INFO_CACHE_TTL = int(os.environ.get("INFO_CACHE_TTL", "1800"))  # مدت اعتبار اطلاعات استخراج شده به ثانیه
+INFO_CACHE_SIZE = int(os.environ.get("INFO_CACHE_SIZE", "256"))  # حداکثر تعداد ویدیوهای نگهداری شده در کش
+
+# تنظیمات استفاده مجدد از فایل‌های دانلود شده
+ARTIFACT_CACHE_TTL = int(os.environ.get("ARTIFACT_CACHE_TTL", "21600"))  # حداکثر مدت نگهداری فایل بدون استفاده به ثانیه
+
+# تنظیمات لغو دانلود
+CANCEL_WATCHDOG_INTERVAL = float(os.environ.get("CANCEL_WATCHDOG_INTERVAL", "1"))  # فاصله بررسی مهلت دانلودها به ثانیه
+
+# تنظیمات مخزن فایل‌های دانلود شده
+ARTIFACT_STORE_BUDGET_MB = int(os.environ.get("ARTIFACT_STORE_BUDGET_MB", "2048"))  # حداکثر حجم فایل‌های نگهداری شده به مگابایت
+ARTIFACT_MANIFEST_FILE = os.environ.get("ARTIFACT_MANIFEST_FILE", "artifact_manifest.json")  # فایل فهرست فایل‌های دانلود شده
+ARTIFACT_DIRS = [DOWNLOADS_DIR, TEMP_DIR, "videos", "instagram_videos"]  # پوشه‌های تحت مدیریت مخزن
+
+# تنظیمات اجرای yt-dlp
+DOWNLOAD_ENGINE_MODE = os.environ.get("DOWNLOAD_ENGINE_MODE", "thread")  # حالت اجرا: thread (در همین پروسه) یا process (استخر پروسه‌ها)
+DOWNLOAD_PROCESS_WORKERS = int(os.environ.get("DOWNLOAD_PROCESS_WORKERS", str(os.cpu_count() or 1)))  # تعداد پروسه‌های کارگر
+DOWNLOAD_PROCESS_MAX_JOBS = int(os.environ.get("DOWNLOAD_PROCESS_MAX_JOBS", "20"))  # بازسازی پروسه پس از این تعداد کار
+DOWNLOAD_PROCESS_MAX_RSS_MB = int(os.environ.get("DOWNLOAD_PROCESS_MAX_RSS_MB", "512"))  # بازسازی پروسه با مصرف حافظه بیشتر از این مقدار
+
+# تنظیمات دانلود چند اتصالی (برای فرمت‌های تک فایلی)
+SEGMENTED_DOWNLOAD = os.environ.get("SEGMENTED_DOWNLOAD", "1") == "1"  # فعال بودن دانلود چند اتصالی
+SEGMENT_COUNT = int(os.environ.get("SEGMENT_COUNT", "8"))  # تعداد بخش‌های هر فایل
+SEGMENT_MAX_CONNECTIONS = int(os.environ.get("SEGMENT_MAX_CONNECTIONS", "4"))  # حداکثر اتصال همزمان برای هر دانلود
+SEGMENT_GLOBAL_CONNECTIONS = int(os.environ.get("SEGMENT_GLOBAL_CONNECTIONS", "16"))  # حداکثر اتصال همزمان برای همه دانلودها
+SEGMENT_MIN_SIZE_MB = int(os.environ.get("SEGMENT_MIN_SIZE_MB", "2"))  # فایل‌های کوچکتر با یک اتصال دانلود می‌شوند
+
+# بازیابی دانلودهای نیمه‌کاره پس از راه‌اندازی مجدد
+RESUME_INTERRUPTED_DOWNLOADS = os.environ.get("RESUME_INTERRUPTED_DOWNLOADS", "1") == "1"  # ادامه دانلودهای قطع شده هنگام شروع
+RESUME_MAX_AGE_HOURS = int(os.environ.get("RESUME_MAX_AGE_HOURS", "24"))  # دانلودهای قدیمی‌تر از این مقدار ادامه داده نمی‌شوند
+
+# تنظیمات آپلود فایل به تلگرام
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")  # آدرس سرور Bot API
+TELEGRAM_LOCAL_MODE = os.environ.get("TELEGRAM_LOCAL_MODE", "0") == "1"  # سرور Bot API محلی: ارسال فایل با مسیر file:// و حجم تا 2 گیگابایت
+TELEGRAM_CLOUD_UPLOAD_LIMIT_MB = int(os.environ.get("TELEGRAM_CLOUD_UPLOAD_LIMIT_MB", "50"))  # حداکثر حجم آپلود در سرور رسمی تلگرام
+TELEGRAM_LOCAL_UPLOAD_LIMIT_MB = int(os.environ.get("TELEGRAM_LOCAL_UPLOAD_LIMIT_MB", "2000"))  # حداکثر حجم آپلود در سرور محلی
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(256 * 1024)))  # اندازه هر تکه ارسالی به بایت
+UPLOAD_RETRIES = int(os.environ.get("UPLOAD_RETRIES", "3"))  # تعداد تلاش مجدد آپلود در خطاهای موقت
+UPLOAD_TIMEOUT = int(os.environ.get("UPLOAD_TIMEOUT", "120"))  # مهلت انتظار پاسخ سرور به ثانیه
+
+# تنظیمات ارسال پست‌های اینستاگرام
+INSTAGRAM_CACHE_CHAT_ID = int(os.environ.get("INSTAGRAM_CACHE_CHAT_ID", "0"))  # چت پیش‌آپلود موازی برای گرفتن file_id؛ پیش‌فرض 0 یعنی آپلود موازی خاموش است و آلبوم‌ها مستقیم و پشت سر هم ارسال می‌شوند
+INSTAGRAM_UPLOAD_WORKERS = int(os.environ.get("INSTAGRAM_UPLOAD_WORKERS", "4"))  # تعداد آپلودهای موازی رسانه‌های یک پست
+
+# تنظیمات دروازه ارسال درخواست‌ها به تلگرام
+TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE", "30"))  # حداکثر درخواست در ثانیه برای کل ربات
+TELEGRAM_CHAT_RATE = float(os.environ.get("TELEGRAM_CHAT_RATE", "1"))  # حداکثر پیام در ثانیه برای هر چت خصوصی
+TELEGRAM_GROUP_RATE_PER_MIN = float(os.environ.get("TELEGRAM_GROUP_RATE_PER_MIN", "20"))  # حداکثر پیام در دقیقه برای هر گروه
+TELEGRAM_CHAT_BURST = int(os.environ.get("TELEGRAM_CHAT_BURST", "3"))  # تعداد پیام مجاز پشت سر هم در هر چت
+GATEWAY_POOL_SIZE = int(os.environ.get("GATEWAY_POOL_SIZE", "8"))  # حداکثر اتصال‌های keep-alive بیکار
+GATEWAY_MAX_RETRIES = int(os.environ.get("GATEWAY_MAX_RETRIES", "3"))  # تعداد ارسال مجدد پس از پاسخ 429
+
+# تنظیمات ویرایش پیام‌های پیشرفت
+PROGRESS_EDIT_INTERVAL = float(os.environ.get("PROGRESS_EDIT_INTERVAL", "3"))  # حداقل فاصله ویرایش هر پیام پیشرفت به ثانیه
+PROGRESS_RENDER_WORKERS = int(os.environ.get("PROGRESS_RENDER_WORKERS", "4"))  # تعداد ویرایش‌های همزمان پیام‌های مختلف
+
+# تنظیمات انتخاب فرمت بر اساس حجم
+REGULAR_DELIVERY_LIMIT_MB = int(os.environ.get("REGULAR_DELIVERY_LIMIT_MB", "50"))  # حداکثر حجم ارسال برای کاربران عادی
+PREMIUM_DELIVERY_LIMIT_MB = int(os.environ.get("PREMIUM_DELIVERY_LIMIT_MB", "2000"))  # حداکثر حجم ارسال برای کاربران ویژه
+FORMAT_SIZE_MARGIN = float(os.environ.get("FORMAT_SIZE_MARGIN", "1.05"))  # ضریب اطمینان برای خطای تخمین حجم و سربار کانتینر
+
+# تنظیمات فشرده‌سازی ویدیو برای جا شدن در محدودیت حجم
+TRANSCODE_TO_FIT = os.environ.get("TRANSCODE_TO_FIT", "0") == "1"  # فشرده‌سازی ویدیو وقتی هیچ فرمتی در حجم مجاز جا نمی‌شود
+TRANSCODE_MODE = os.environ.get("TRANSCODE_MODE", "2pass")  # روش فشرده‌سازی: 2pass (حجم دقیق‌تر) یا crf (سریع‌تر)
+TRANSCODE_WORKERS = int(os.environ.get("TRANSCODE_WORKERS", str(os.cpu_count() or 1)))  # تعداد پروسه‌های فشرده‌سازی
+TRANSCODE_THREADS = int(os.environ.get("TRANSCODE_THREADS", "1"))  # تعداد ترد ffmpeg برای هر کار
+TRANSCODE_MAX_QUEUE = int(os.environ.get("TRANSCODE_MAX_QUEUE", str(2 * (os.cpu_count() or 1))))  # حداکثر کارهای در صف و در حال اجرا
+TRANSCODE_NICE = int(os.environ.get("TRANSCODE_NICE", "10"))  # کاهش اولویت CPU پروسه‌های فشرده‌سازی
+TRANSCODE_AUDIO_KBPS = int(os.environ.get("TRANSCODE_AUDIO_KBPS", "96"))  # بیت‌ریت صدای خروجی
+TRANSCODE_MIN_VIDEO_KBPS = int(os.environ.get("TRANSCODE_MIN_VIDEO_KBPS", "150"))  # کمترین بیت‌ریت قابل قبول ویدیو
+TRANSCODE_SOURCE_MAX_HEIGHT = int(os.environ.get("TRANSCODE_SOURCE_MAX_HEIGHT", "720"))  # حداکثر کیفیت ویدیوی دانلودی برای فشرده‌سازی
+
+# تنظیمات تقسیم فایل‌های بزرگ به چند بخش
+SPLIT_OVERSIZED = os.environ.get("SPLIT_OVERSIZED", "1") == "1"  # ارسال ویدیوهای بزرگتر از حد مجاز در چند بخش (بدون تبدیل)
+SPLIT_MAX_PARTS = int(os.environ.get("SPLIT_MAX_PARTS", "20"))  # حداکثر تعداد بخش‌های هر ویدیو
+SPLIT_UPLOAD_WORKERS = int(os.environ.get("SPLIT_UPLOAD_WORKERS", "3"))  # تعداد آپلودهای موازی بخش‌ها
+SPLIT_CACHE_CHAT_ID = int(os.environ.get("SPLIT_CACHE_CHAT_ID", str(INSTAGRAM_CACHE_CHAT_ID)))  # چت پیش‌آپلود موازی بخش‌ها (0: آپلود پشت سر هم)
+
+# تنظیمات پیش‌واکشی حدسی هنگام انتخاب کیفیت
+PREFETCH_ENABLED = os.environ.get("PREFETCH_ENABLED", "1") == "1"  # شروع دانلود کیفیت محتمل پیش از انتخاب کاربر
+PREFETCH_TTL = int(os.environ.get("PREFETCH_TTL", "90"))  # لغو پیش‌واکشی اگر کاربر در این مدت (ثانیه) کیفیتی انتخاب نکند
+PREFETCH_MAX_SIZE_MB = int(os.environ.get("PREFETCH_MAX_SIZE_MB", "200"))  # حداکثر حجم تخمینی فایل برای پیش‌واکشی
+PREFETCH_RESERVED_WORKERS = int(os.environ.get("PREFETCH_RESERVED_WORKERS", "1"))  # تعداد کارگرهای صف که همیشه برای دانلودهای واقعی آزاد می‌مانند
+PREFETCH_HISTORY = int(os.environ.get("PREFETCH_HISTORY", "200"))  # تعداد دانلودهای اخیر برای حدس کیفیت پرکاربرد
+
+# تنظیمات اتصال پایگاه داده
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))  # زمان انتظار برای قفل نوشتن SQLite به میلی‌ثانیه
+DB_MMAP_SIZE_MB = int(os.environ.get("DB_MMAP_SIZE_MB", "64"))  # حجم نگاشت حافظه فایل دیتابیس
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "8192"))  # حجم کش صفحات هر اتصال
+DB_WRITE_BEHIND = os.environ.get("DB_WRITE_BEHIND", "1") == "1"  # نوشتن دسته‌ای لاگ‌ها و وضعیت دانلودها با تاخیر کوتاه
+DB_WRITE_BEHIND_INTERVAL_MS = int(os.environ.get("DB_WRITE_BEHIND_INTERVAL_MS", "200"))  # حداکثر تاخیر نوشتن هر دسته به میلی‌ثانیه
+DB_WRITE_BEHIND_BATCH = int(os.environ.get("DB_WRITE_BEHIND_BATCH", "500"))  # نوشتن دسته با رسیدن به این تعداد ردیف
+DB_WRITE_BEHIND_MAX_PENDING = int(os.environ.get("DB_WRITE_BEHIND_MAX_PENDING", "10000"))  # حداکثر نوشتن‌های معلق پیش از انتظار تولیدکننده
+
+# تنظیمات نگهداری لاگ‌های دیتابیس
+LOG_RETENTION_DAYS = int(os.environ.get("LOG_RETENTION_DAYS", "14"))  # تعداد روزهای نگهداری جدول‌های روزانه لاگ (0: بدون حذف)
@@ -1,38 +1,554 @@
 import os
+import time
+import base64
+import atexit
 import sqlite3
 import json
 import datetime
 import threading
+from contextlib import contextmanager
 from typing import Any, Dict, List, Optional, Tuple, Union
-from config import DATABASE_PATH, UserRole, DownloadStatus
+from config import (
+    DATABASE_PATH, UserRole, DownloadStatus,
+    DB_BUSY_TIMEOUT_MS, DB_MMAP_SIZE_MB, DB_CACHE_SIZE_KB,
+    DB_WRITE_BEHIND, DB_WRITE_BEHIND_INTERVAL_MS, DB_WRITE_BEHIND_BATCH, DB_WRITE_BEHIND_MAX_PENDING,
+    LOG_RETENTION_DAYS
+)
 from debug_logger import debug_log, debug_decorator
 
-# لاک برای جلوگیری از مشکلات همزمانی در دسترسی به دیتابیس
+# قفل نوشتن: SQLite در هر لحظه یک نویسنده دارد؛ خواندن‌ها در حالت WAL بدون قفل و همزمان انجام می‌شوند
 db_lock = threading.RLock()
 
-@debug_decorator
+# اتصال پایدار هر ترد (به جای ساخت اتصال جدید در هر فراخوانی)
+_local = threading.local()
+
 def dict_factory(cursor, row):
     """تبدیل نتیجه کوئری به دیکشنری"""
-    d = {}
-    for idx, col in enumerate(cursor.description):
-        d[col[0]] = row[idx]
-    return d
+    return dict(zip([col[0] for col in cursor.description], row))
 
-@debug_decorator
-def get_db_connection():
-    """ایجاد اتصال به دیتابیس"""
-    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
-    conn.row_factory = dict_factory
+def get_db_connection() -> sqlite3.Connection:
+    """
+    دریافت اتصال پایدار ترد جاری به دیتابیس
+
+    اتصال در اولین استفاده هر ترد ساخته و با حالت WAL و تنظیمات کارایی
+    پیکربندی می‌شود و با پایان ترد بسته می‌شود.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.row_factory = dict_factory
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE_MB * 1024 * 1024}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        _local.conn = conn
     return conn
 
+@contextmanager
+def write_transaction():
+    """
+    تراکنش نوشتن با قفل نویسنده (commit در پایان، rollback در صورت خطا)
+
+    Yields:
+        اتصال ترد جاری
+    """
+    with db_lock:
+        conn = get_db_connection()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+class WriteBehindQueue:
+    """
+    صف نوشتن با تاخیر: نوشتن‌های پرتکرار (لاگ‌ها و وضعیت دانلودها) جمع می‌شوند و
+    هر DB_WRITE_BEHIND_INTERVAL_MS میلی‌ثانیه یا با رسیدن به DB_WRITE_BEHIND_BATCH
+    ردیف در یک تراکنش نوشته می‌شوند.
+
+    خواندن رکوردی که نوشتن معلق دارد ابتدا صف را تخلیه می‌کند (read-your-writes).
+    اگر صف به DB_WRITE_BEHIND_MAX_PENDING برسد، تولیدکننده تا تخلیه صف منتظر می‌ماند.
+    """
+
+    def __init__(self, interval_ms: int = DB_WRITE_BEHIND_INTERVAL_MS, batch_size: int = DB_WRITE_BEHIND_BATCH,
+                 max_pending: int = DB_WRITE_BEHIND_MAX_PENDING):
+        self.interval = max(1, interval_ms) / 1000
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max(self.batch_size, max_pending)
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # ترتیب دسته‌ها حفظ می‌شود
+        self._pending: List[Tuple[str, Any, str, Any]] = []  # (query, params, table, key)
+        self._keys: Dict[Tuple[str, Any], int] = {}  # (table, key) -> تعداد نوشتن معلق (تا commit)
+        self._thread = None
+        self._closed = False
+        self.stats = {"enqueued": 0, "written": 0, "failed": 0, "batches": 0, "max_depth": 0,
+                      "backpressure_waits": 0, "backpressure_seconds": 0.0, "flush_seconds": 0.0,
+                      "read_flushes": 0}
+
+    def enqueue(self, query: str, params, table: str, key: Any = None) -> None:
+        """
+        افزودن یک نوشتن به صف
+
+        Args:
+            query: دستور SQL
+            params: پارامترهای دستور
+            table: نام جدول (برای تضمین read-your-writes)
+            key: کلید رکورد (مثلا شناسه دانلود)
+        """
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+                self._thread.start()
+
+            if len(self._pending) >= self.max_pending:
+                # فشار معکوس: تا تخلیه صف توسط ترد نوشتن صبر می‌شود
+                started = time.time()
+                self.stats["backpressure_waits"] += 1
+                self._cond.notify_all()
+                while len(self._pending) >= self.max_pending and not self._closed:
+                    self._cond.wait(self.interval)
+                self.stats["backpressure_seconds"] += time.time() - started
+
+            self._pending.append((query, params, table, key))
+            self._keys[(table, key)] = self._keys.get((table, key), 0) + 1
+            self.stats["enqueued"] += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], len(self._pending))
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+            closed = self._closed
+
+        if closed:
+            # پس از خاموش شدن ترد نوشتن، نوشتن بلافاصله انجام می‌شود
+            self.flush()
+
+    def has_pending(self, table: str, key: Any = None) -> bool:
+        """بررسی وجود نوشتن معلق برای یک رکورد (یا هر رکوردی از جدول اگر key برابر None باشد)"""
+        with self._cond:
+            if key is not None:
+                return (table, key) in self._keys
+            return any(pending_table == table for pending_table, _ in self._keys)
+
+    def sync(self, table: str, key: Any = None) -> None:
+        """
+        تخلیه صف پیش از خواندن، اگر رکورد مورد نظر نوشتن معلق داشته باشد
+
+        Args:
+            table: نام جدول
+            key: کلید رکورد (None: هر رکوردی از جدول)
+        """
+        if self.has_pending(table, key):
+            with self._cond:
+                self.stats["read_flushes"] += 1
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        نوشتن همه موارد معلق در دسته‌هایی حداکثر به اندازه batch_size (هر دسته یک تراکنش)
+
+        قفل نویسنده بین دسته‌ها آزاد می‌شود تا نوشتن‌های دیگر پشت یک تخلیه بزرگ نمانند.
+
+        Returns:
+            تعداد نوشتن‌های انجام شده
+        """
+        with self._flush_lock:
+            with self._cond:
+                pending, self._pending = self._pending, []
+                # تولیدکننده‌های منتظر فشار معکوس آزاد می‌شوند
+                self._cond.notify_all()
+
+            written = 0
+            for start in range(0, len(pending), self.batch_size):
+                written += self._write_batch(pending[start:start + self.batch_size])
+            return written
+
+    def _write_batch(self, batch: List[Tuple[str, Any, str, Any]]) -> int:
+        """نوشتن یک دسته در یک تراکنش (باید با _flush_lock فراخوانی شود)"""
+        started = time.time()
+        failed = 0
+        try:
+            with write_transaction() as conn:
+                for query, params, _, _ in batch:
+                    conn.execute(query, params)
+        except Exception as e:
+            # یک ردیف خراب نباید کل دسته را از بین ببرد؛ هر نوشتن جداگانه تکرار می‌شود
+            debug_log(f"خطا در نوشتن دسته‌ای ({len(batch)} ردیف)، تلاش تک‌به‌تک: {str(e)}", "WARNING")
+            for query, params, table, _ in batch:
+                try:
+                    with write_transaction() as conn:
+                        conn.execute(query, params)
+                except Exception as row_error:
+                    failed += 1
+                    debug_log(f"خطا در نوشتن با تاخیر در جدول {table}: {str(row_error)}", "ERROR")
+
+        with self._cond:
+            for _, _, table, key in batch:
+                count = self._keys.get((table, key), 0) - 1
+                if count > 0:
+                    self._keys[(table, key)] = count
+                else:
+                    self._keys.pop((table, key), None)
+            self.stats["batches"] += 1
+            self.stats["written"] += len(batch) - failed
+            self.stats["failed"] += failed
+            self.stats["flush_seconds"] += time.time() - started
+        return len(batch) - failed
+
+    def _run(self) -> None:
+        """ترد نوشتن: تخلیه صف با پر شدن دسته یا حداکثر interval پس از اولین نوشتن معلق"""
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                deadline = time.time() + self.interval
+                while len(self._pending) < self.batch_size and not self._closed:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self) -> None:
+        """تخلیه نهایی صف هنگام خاموش شدن"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        written = self.flush()
+        if written:
+            debug_log(f"{written} نوشتن معلق هنگام خاموش شدن در دیتابیس ثبت شد", "INFO")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        دریافت آمار صف نوشتن با تاخیر
+
+        Returns:
+            دیکشنری آمار شامل عمق فعلی صف و زمان انتظار تولیدکننده‌ها (فشار معکوس)
+        """
+        with self._cond:
+            stats = dict(self.stats, depth=len(self._pending), max_pending=self.max_pending)
+        stats["avg_batch"] = stats["written"] / stats["batches"] if stats["batches"] else 0
+        return stats
+
+
+# نمونه سراسری (ترد نوشتن در اولین استفاده ساخته می‌شود)
+write_behind = WriteBehindQueue()
+atexit.register(write_behind.close)
+
+def flush_writes() -> int:
+    """
+    نوشتن فوری همه نوشتن‌های معلق (مثلا پیش از خاموش شدن یا پشتیبان‌گیری)
+
+    Returns:
+        تعداد نوشتن‌های انجام شده
+    """
+    return write_behind.flush()
+
+# --- بخش‌بندی روزانه لاگ‌ها ---
+
+# لاگ‌های هر روز در جدول جداگانه logs_YYYYMMDD نوشته می‌شوند تا حذف لاگ‌های قدیمی
+# با DROP TABLE (بدون DELETE سطر به سطر) انجام شود و صفحات آزاد شده با
+# auto_vacuum=INCREMENTAL به سیستم‌عامل برگردند.
+_LOG_PARTITION_PATTERN = "logs_[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]"
+
+# تعداد صفحاتی که در هر مرحله incremental_vacuum آزاد می‌شوند (بین مراحل قفل نویسنده آزاد است)
+_VACUUM_CHUNK_PAGES = 2048
+
+# روزهایی که جدول لاگ آن‌ها ساخته شده است (کش برای جلوگیری از پرس‌وجوی sqlite_master در هر لاگ)
+_log_partitions = set()
+_log_partitions_lock = threading.Lock()
+
+def log_table_name(day: datetime.date) -> str:
+    """نام جدول لاگ‌های یک روز"""
+    return f"logs_{day:%Y%m%d}"
+
+def list_log_partitions(conn: Optional[sqlite3.Connection] = None) -> List[datetime.date]:
+    """
+    روزهای دارای جدول لاگ
+    
+    Args:
+        conn: اتصال دیتابیس (پیش‌فرض: اتصال ترد جاری)
+        
+    Returns:
+        لیست روزها، جدیدترین اول
+    """
+    conn = conn or get_db_connection()
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+                        (_LOG_PARTITION_PATTERN,)).fetchall()
+    return sorted((datetime.datetime.strptime(row["name"][5:], "%Y%m%d").date() for row in rows), reverse=True)
+
+def _create_log_partition(conn: sqlite3.Connection, day: datetime.date) -> bool:
+    """ساخت جدول و شاخص‌های لاگ یک روز (True اگر جدول تازه ساخته شد)"""
+    table = log_table_name(day)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+        return False
+    
+    conn.execute(f'''
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,  -- زمان لاگ
+        level TEXT,  -- سطح لاگ
+        message TEXT,  -- پیام لاگ
+        user_id INTEGER,  -- شناسه کاربر مرتبط
+        context TEXT  -- اطلاعات اضافی
+    )
+    ''')
+    conn.execute(f"CREATE INDEX idx_{table}_time ON {table}(timestamp DESC)")
+    conn.execute(f"CREATE INDEX idx_{table}_level_time ON {table}(level, timestamp DESC)")
+    conn.execute(f"CREATE INDEX idx_{table}_user_time ON {table}(user_id, timestamp DESC)")
+    return True
+
+def ensure_log_partition(day: datetime.date) -> str:
+    """
+    اطمینان از وجود جدول لاگ یک روز؛ ساخت جدول روز جدید لاگ‌های قدیمی را هم حذف می‌کند
+    
+    Args:
+        day: روز
+        
+    Returns:
+        نام جدول
+    """
+    with _log_partitions_lock:
+        if day in _log_partitions:
+            return log_table_name(day)
+    
+    with write_transaction() as conn:
+        created = _create_log_partition(conn, day)
+    
+    with _log_partitions_lock:
+        _log_partitions.add(day)
+    
+    if created:
+        # شروع روز جدید: حذف بخش‌های خارج از مدت نگهداری
+        prune_log_partitions()
+    return log_table_name(day)
+
+def prune_log_partitions(retention_days: int = LOG_RETENTION_DAYS) -> int:
+    """
+    حذف جدول لاگ روزهای قدیمی‌تر از مدت نگهداری و آزادسازی فضای آن‌ها
+    
+    Args:
+        retention_days: تعداد روزهای نگهداری (شامل امروز؛ 0 یعنی بدون حذف)
+        
+    Returns:
+        تعداد جدول‌های حذف شده
+    """
+    if retention_days <= 0:
+        return 0
+    
+    cutoff = datetime.date.today() - datetime.timedelta(days=retention_days - 1)
+    write_behind.sync("logs")
+    
+    # هر جدول در تراکنش جداگانه تا قفل نویسنده طولانی نگه داشته نشود
+    dropped = []
+    for day in list_log_partitions():
+        if day < cutoff:
+            with write_transaction() as conn:
+                conn.execute(f"DROP TABLE IF EXISTS {log_table_name(day)}")
+            dropped.append(day)
+    
+    with _log_partitions_lock:
+        _log_partitions.difference_update(dropped)
+    
+    # برگرداندن صفحات آزاد شده به سیستم‌عامل در چند مرحله کوتاه
+    freed = 0
+    while True:
+        with db_lock:
+            conn = get_db_connection()
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()["freelist_count"]
+            if not free_pages:
+                break
+            # execute فقط یک گام (یک صفحه) از این pragma را اجرا می‌کند؛ executescript تا پایان
+            conn.executescript(f"PRAGMA incremental_vacuum({_VACUUM_CHUNK_PAGES});")
+            freed += min(free_pages, _VACUUM_CHUNK_PAGES)
+    
+    if dropped or freed:
+        debug_log(f"{len(dropped)} جدول لاگ قدیمی‌تر از {cutoff} حذف و {freed} صفحه آزاد شد", "INFO")
+    return len(dropped)
+
+def _partition_legacy_logs(conn: sqlite3.Connection) -> None:
+    """مهاجرت 2: انتقال ردیف‌های جدول قدیمی logs به جدول‌های روزانه"""
+    days = conn.execute("SELECT DISTINCT substr(timestamp, 1, 10) AS day FROM logs").fetchall()
+    for row in days:
+        try:
+            day = datetime.date.fromisoformat(row["day"] or "")
+        except ValueError:
+            # زمان نامعتبر؛ ردیف در جدول قدیمی می‌ماند
+            continue
+        _create_log_partition(conn, day)
+        conn.execute(f'''
+        INSERT INTO {log_table_name(day)} (timestamp, level, message, user_id, context)
+        SELECT timestamp, level, message, user_id, context FROM logs
+        WHERE substr(timestamp, 1, 10) = ? ORDER BY id
+        ''', (row["day"],))
+        conn.execute("DELETE FROM logs WHERE substr(timestamp, 1, 10) = ?", (row["day"],))
+
+def _enable_incremental_vacuum(conn: sqlite3.Connection) -> None:
+    """فعال‌سازی auto_vacuum=INCREMENTAL (در دیتابیس موجود با یک بار VACUUM)"""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()["auto_vacuum"] == 2:
+        return
+    
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    # پس از تنظیم WAL (حتی در دیتابیس خالی) حالت جدید فقط با VACUUM اعمال می‌شود
+    if conn.execute("SELECT COUNT(*) AS n FROM sqlite_master").fetchone()["n"]:
+        debug_log("بازسازی دیتابیس برای فعال‌سازی auto_vacuum افزایشی...", "INFO")
+    conn.execute("VACUUM")
+
+# --- مهاجرت‌های پایگاه داده ---
+
+# مهاجرت‌ها به ترتیب نسخه؛ نسخه فعلی در PRAGMA user_version نگهداری می‌شود.
+# مهاجرت جدید فقط به انتهای لیست اضافه شود و مهاجرت‌های قبلی تغییر نکنند.
+# هر مرحله یک دستور SQL یا تابعی است که اتصال را دریافت می‌کند.
+MIGRATIONS: List[Tuple[int, str, List[Any]]] = [
+    (1, "شاخص‌های ترکیبی برای کوئری‌های پرتکرار", [
+        # شاخص‌های تک ستونی قبلی زیرمجموعه شاخص‌های ترکیبی هستند
+        "DROP INDEX IF EXISTS idx_user_id",
+        "DROP INDEX IF EXISTS idx_log_level",
+        # get_quality_counts (ترتیب شناسه در هر وضعیت)، get_interrupted_downloads
+        "CREATE INDEX IF NOT EXISTS idx_download_status ON downloads(status)",
+        # get_active_downloads_count، get_quality_counts (پوشش کامل شمارش)
+        "CREATE INDEX IF NOT EXISTS idx_downloads_user_status ON downloads(user_id, status)",
+        # get_user_downloads
+        "CREATE INDEX IF NOT EXISTS idx_downloads_user_time ON downloads(user_id, start_time DESC)",
+        # get_all_downloads
+        "CREATE INDEX IF NOT EXISTS idx_downloads_status_time ON downloads(status, start_time DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_downloads_time ON downloads(start_time DESC)",
+        # get_logs
+        "CREATE INDEX IF NOT EXISTS idx_logs_time ON logs(timestamp DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_level_time ON logs(level, timestamp DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_logs_user_time ON logs(user_id, timestamp DESC)",
+        # get_all_users
+        "CREATE INDEX IF NOT EXISTS idx_users_last_activity ON users(last_activity DESC)",
+    ]),
+    (2, "بخش‌بندی روزانه لاگ‌ها", [
+        _partition_legacy_logs,
+        # جدول قدیمی logs دیگر خوانده نمی‌شود و شاخص‌هایش فقط فضا می‌گیرند
+        "DROP INDEX IF EXISTS idx_logs_time",
+        "DROP INDEX IF EXISTS idx_logs_level_time",
+        "DROP INDEX IF EXISTS idx_logs_user_time",
+    ]),
+]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """نسخه فعلی طرح دیتابیس (تعداد مهاجرت‌های اعمال شده)"""
+    return conn.execute("PRAGMA user_version").fetchone()["user_version"]
+
+def apply_migrations(conn: sqlite3.Connection) -> int:
+    """
+    اعمال مهاجرت‌های انجام نشده، هر کدام در یک تراکنش جداگانه
+    
+    Args:
+        conn: اتصال دیتابیس (زیر قفل نویسنده)
+        
+    Returns:
+        نسخه طرح پس از اعمال مهاجرت‌ها
+    """
+    version = get_schema_version(conn)
+    if conn.in_transaction:
+        conn.commit()
+    
+    for target, description, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        try:
+            conn.execute("BEGIN")
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(target)}")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise RuntimeError(f"خطا در مهاجرت {target} ({description}): {str(e)}")
+        version = target
+        debug_log(f"مهاجرت {target} دیتابیس اعمال شد: {description}", "INFO")
+    
+    return version
+
+# کوئری‌های پرتکرار و پارامترهای نمونه (همان متن کوئری‌های توابع همین ماژول)
+# برای بررسی اینکه هیچ‌کدام به پیمایش کامل جدول یا مرتب‌سازی موقت برنگردد.
+# get_interrupted_downloads فقط یک بار هنگام شروع ربات اجرا می‌شود و مرتب‌سازی
+# دانلودهای نیمه‌کاره آن (دو مقدار IN) اجتناب‌ناپذیر است. {logs} جدول لاگ یک روز است.
+HOT_QUERIES: List[Tuple[str, str, tuple]] = [
+    ("get_user_downloads",
+     "SELECT * FROM downloads WHERE user_id = ? ORDER BY start_time DESC LIMIT ? OFFSET ?", (1, 10, 0)),
+    ("get_all_downloads",
+     "SELECT * FROM downloads ORDER BY start_time DESC LIMIT ? OFFSET ?", (100, 0)),
+    ("get_all_downloads(status)",
+     "SELECT * FROM downloads WHERE status = ? ORDER BY start_time DESC LIMIT ? OFFSET ?", (0, 100, 0)),
+    ("get_active_downloads_count",
+     "SELECT COUNT(*) as count FROM downloads WHERE user_id = ? AND status IN (?, ?)", (1, 0, 1)),
+    ("get_quality_counts",
+     "SELECT quality FROM downloads WHERE status = ? AND user_id = ? ORDER BY id DESC LIMIT ?", (2, 1, 200)),
+    ("get_quality_counts(all)",
+     "SELECT quality FROM downloads WHERE status = ? ORDER BY id DESC LIMIT ?", (2, 200)),
+    ("get_logs", "SELECT * FROM {logs} ORDER BY timestamp DESC, id ASC LIMIT ?", (100,)),
+    ("get_logs(level)",
+     "SELECT * FROM {logs} WHERE level = ? ORDER BY timestamp DESC, id ASC LIMIT ?", ("ERROR", 100)),
+    ("get_logs(user)",
+     "SELECT * FROM {logs} WHERE user_id = ? ORDER BY timestamp DESC, id ASC LIMIT ?", (1, 100)),
+    ("get_all_users", "SELECT * FROM users ORDER BY last_activity DESC LIMIT ? OFFSET ?", (100, 0)),
+    # صفحه‌های بعدی صفحه‌بندی با نشانگر (_keyset_page)
+    ("get_users_page", "SELECT * FROM users WHERE last_activity <= ? AND (last_activity < ? OR id > ?) "
+     "ORDER BY last_activity DESC, id ASC LIMIT ?", ("2026-01-01", "2026-01-01", 1, 51)),
+    ("get_downloads_page", "SELECT * FROM downloads WHERE start_time <= ? AND (start_time < ? OR id > ?) "
+     "ORDER BY start_time DESC, id ASC LIMIT ?", ("2026-01-01", "2026-01-01", 1, 21)),
+    ("get_downloads_page(status)", "SELECT * FROM downloads WHERE status = ? AND start_time <= ? AND "
+     "(start_time < ? OR id > ?) ORDER BY start_time DESC, id ASC LIMIT ?", (2, "2026-01-01", "2026-01-01", 1, 21)),
+    ("get_user_downloads_page", "SELECT * FROM downloads WHERE user_id = ? AND start_time <= ? AND "
+     "(start_time < ? OR id > ?) ORDER BY start_time DESC, id ASC LIMIT ?", (1, "2026-01-01", "2026-01-01", 1, 11)),
+    ("get_logs_page", "SELECT * FROM {logs} WHERE timestamp <= ? AND (timestamp < ? OR id > ?) "
+     "ORDER BY timestamp DESC, id ASC LIMIT ?", ("2026-01-01", "2026-01-01", 1, 11)),
+    ("get_logs_page(level)", "SELECT * FROM {logs} WHERE level = ? AND timestamp <= ? AND (timestamp < ? OR id > ?) "
+     "ORDER BY timestamp DESC, id ASC LIMIT ?", ("ERROR", "2026-01-01", "2026-01-01", 1, 11)),
+    ("get_user", "SELECT * FROM users WHERE id = ?", (1,)),
+    ("get_download", "SELECT * FROM downloads WHERE id = ?", (1,)),
+    ("get_telegram_file",
+     "SELECT * FROM telegram_files WHERE video_id = ? AND format = ? AND media_kind = ?", ("x", "best", "video")),
+]
+
+def verify_query_plans(conn: Optional[sqlite3.Connection] = None) -> List[str]:
+    """
+    بررسی طرح اجرای کوئری‌های پرتکرار با EXPLAIN QUERY PLAN
+    
+    Args:
+        conn: اتصال دیتابیس (پیش‌فرض: اتصال ترد جاری)
+        
+    Returns:
+        لیست مشکلات (پیمایش کامل جدول یا مرتب‌سازی با B-tree موقت)؛ لیست خالی یعنی همه کوئری‌ها از شاخص استفاده می‌کنند
+    """
+    conn = conn or get_db_connection()
+    partitions = list_log_partitions(conn)
+    problems = []
+    for name, query, params in HOT_QUERIES:
+        if "{logs}" in query:
+            if not partitions:
+                continue
+            query = query.format(logs=log_table_name(partitions[0]))
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall():
+            detail = row["detail"]
+            full_scan = detail.startswith("SCAN") and "INDEX" not in detail
+            temp_sort = "TEMP B-TREE" in detail
+            if full_scan or temp_sort:
+                problems.append(f"{name}: {detail}")
+    return problems
+
 @debug_decorator
 def initialize_database():
     """ایجاد جداول پایگاه داده در صورت عدم وجود"""
     debug_log("شروع ایجاد پایگاه داده...", "INFO")
     
-    with db_lock:
-        try:
-            conn = get_db_connection()
+    try:
+        with write_transaction() as conn:
+            # فضای جدول‌های حذف شده (لاگ‌های قدیمی) با incremental_vacuum آزاد می‌شود
+            _enable_incremental_vacuum(conn)
+            
             cursor = conn.cursor()
             
             # جدول کاربران
@@ -68,7 +584,7 @@ def initialize_database():
             )
             ''')
             
-            # جدول لاگ‌ها
+            # جدول قدیمی لاگ‌ها (لاگ‌های جدید در جدول‌های روزانه logs_YYYYMMDD نوشته می‌شوند)
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -89,21 +605,38 @@ def initialize_database():
             )
             ''')
             
-            # ایجاد شاخص‌ها
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_id ON downloads(user_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_download_status ON downloads(status)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_log_level ON logs(level)')
+            # جدول فایل‌های آپلود شده در تلگرام (برای ارسال مجدد با file_id)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS telegram_files (
+                video_id TEXT,  -- شناسه استاندارد ویدیو
+                format TEXT,  -- فرمت یا کیفیت درخواستی
+                media_kind TEXT,  -- نوع رسانه (video، audio، photo، document)
+                file_id TEXT,  -- شناسه فایل در تلگرام
+                file_unique_id TEXT,  -- شناسه یکتای فایل در تلگرام
+                file_size INTEGER,  -- حجم فایل
+                title TEXT,  -- عنوان ویدیو
+                created_at TEXT,  -- زمان اولین آپلود
+                last_used TEXT,  -- آخرین استفاده
+                use_count INTEGER DEFAULT 0,  -- تعداد ارسال مجدد
+                PRIMARY KEY (video_id, format, media_kind)
+            )
+            ''')
             
-            # ذخیره تغییرات
-            conn.commit()
-            debug_log("پایگاه داده با موفقیت ایجاد شد", "INFO")
+            # شاخص‌ها و تغییرات بعدی طرح در مهاجرت‌ها
+            version = apply_migrations(conn)
+            _create_log_partition(conn, datetime.date.today())
             
-        except Exception as e:
-            debug_log(f"خطا در ایجاد پایگاه داده: {str(e)}", "ERROR")
-            raise
-        finally:
-            if 'conn' in locals():
-                conn.close()
+            # هشدار اگر کوئری پرتکراری به پیمایش کامل جدول برگشته باشد
+            for problem in verify_query_plans(conn):
+                debug_log(f"کوئری بدون شاخص مناسب: {problem}", "WARNING")
+        
+        prune_log_partitions()
+        
+        debug_log(f"پایگاه داده با موفقیت ایجاد شد (نسخه طرح {version})", "INFO")
+        
+    except Exception as e:
+        debug_log(f"خطا در ایجاد پایگاه داده: {str(e)}", "ERROR")
+        raise
 
 # --- مدیریت کاربران ---
 
@@ -122,9 +655,8 @@ def add_or_update_user(user_id: int, username: str = None, first_name: str = Non
     Returns:
         True در صورت موفقیت
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
+    try:
+        with write_transaction() as conn:
             cursor = conn.cursor()
             
             # بررسی وجود کاربر
@@ -150,13 +682,11 @@ def add_or_update_user(user_id: int, username: str = None, first_name: str = Non
                 VALUES (?, ?, ?, ?, ?, ?, ?, 0)
                 ''', (user_id, username, first_name, last_name, role, current_time, current_time))
             
-            conn.commit()
-            conn.close()
             return True
             
-        except Exception as e:
-            debug_log(f"خطا در افزودن/به‌روزرسانی کاربر: {str(e)}", "ERROR")
-            return False
+    except Exception as e:
+        debug_log(f"خطا در افزودن/به‌روزرسانی کاربر: {str(e)}", "ERROR")
+        return False
 
 @debug_decorator
 def get_user(user_id: int) -> Optional[Dict[str, Any]]:
@@ -169,20 +699,18 @@ def get_user(user_id: int) -> Optional[Dict[str, Any]]:
     Returns:
         دیکشنری حاوی اطلاعات کاربر یا None
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-            user = cursor.fetchone()
-            
-            conn.close()
-            return user
-            
-        except Exception as e:
-            debug_log(f"خطا در دریافت اطلاعات کاربر: {str(e)}", "ERROR")
-            return None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+        user = cursor.fetchone()
+        
+        return user
+        
+    except Exception as e:
+        debug_log(f"خطا در دریافت اطلاعات کاربر: {str(e)}", "ERROR")
+        return None
 
 @debug_decorator
 def update_user_role(user_id: int, role: int) -> bool:
@@ -196,20 +724,17 @@ def update_user_role(user_id: int, role: int) -> bool:
     Returns:
         True در صورت موفقیت
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
+    try:
+        with write_transaction() as conn:
             cursor = conn.cursor()
             
             cursor.execute('UPDATE users SET role = ? WHERE id = ?', (role, user_id))
             
-            conn.commit()
-            conn.close()
             return True
             
-        except Exception as e:
-            debug_log(f"خطا در به‌روزرسانی نقش کاربر: {str(e)}", "ERROR")
-            return False
+    except Exception as e:
+        debug_log(f"خطا در به‌روزرسانی نقش کاربر: {str(e)}", "ERROR")
+        return False
 
 @debug_decorator
 def increment_download_count(user_id: int) -> bool:
@@ -222,20 +747,17 @@ def increment_download_count(user_id: int) -> bool:
     Returns:
         True در صورت موفقیت
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
+    try:
+        with write_transaction() as conn:
             cursor = conn.cursor()
             
             cursor.execute('UPDATE users SET download_count = download_count + 1 WHERE id = ?', (user_id,))
             
-            conn.commit()
-            conn.close()
             return True
             
-        except Exception as e:
-            debug_log(f"خطا در افزایش تعداد دانلودها: {str(e)}", "ERROR")
-            return False
+    except Exception as e:
+        debug_log(f"خطا در افزایش تعداد دانلودها: {str(e)}", "ERROR")
+        return False
 
 @debug_decorator
 def get_all_users(limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
@@ -249,20 +771,18 @@ def get_all_users(limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
     Returns:
         لیست کاربران
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM users ORDER BY last_activity DESC LIMIT ? OFFSET ?', (limit, offset))
-            users = cursor.fetchall()
-            
-            conn.close()
-            return users
-            
-        except Exception as e:
-            debug_log(f"خطا در دریافت لیست کاربران: {str(e)}", "ERROR")
-            return []
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM users ORDER BY last_activity DESC LIMIT ? OFFSET ?', (limit, offset))
+        users = cursor.fetchall()
+        
+        return users
+        
+    except Exception as e:
+        debug_log(f"خطا در دریافت لیست کاربران: {str(e)}", "ERROR")
+        return []
 
 # --- مدیریت دانلودها ---
 
@@ -279,9 +799,8 @@ def add_download(user_id: int, url: str, quality: str = "best") -> int:
     Returns:
         شناسه دانلود یا -1 در صورت خطا
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
+    try:
+        with write_transaction() as conn:
             cursor = conn.cursor()
             
             current_time = datetime.datetime.now().isoformat()
@@ -294,17 +813,14 @@ def add_download(user_id: int, url: str, quality: str = "best") -> int:
             # دریافت ID آخرین رکورد اضافه شده
             download_id = cursor.lastrowid
             
-            conn.commit()
-            conn.close()
-            
-            # افزایش تعداد دانلودهای کاربر
-            increment_download_count(user_id)
+            # افزایش تعداد دانلودهای کاربر (در همان تراکنش)
+            cursor.execute('UPDATE users SET download_count = download_count + 1 WHERE id = ?', (user_id,))
             
             return download_id
             
-        except Exception as e:
-            debug_log(f"خطا در افزودن دانلود جدید: {str(e)}", "ERROR")
-            return -1
+    except Exception as e:
+        debug_log(f"خطا در افزودن دانلود جدید: {str(e)}", "ERROR")
+        return -1
 
 @debug_decorator
 def update_download_status(download_id: int, status: int, file_path: str = None, 
@@ -312,6 +828,9 @@ def update_download_status(download_id: int, status: int, file_path: str = None,
     """
     به‌روزرسانی وضعیت دانلود
     
+    اگر DB_WRITE_BEHIND فعال باشد به‌روزرسانی در صف نوشتن با تاخیر قرار می‌گیرد؛
+    get_download و سایر خواندن‌های جدول دانلودها پیش از خواندن صف را تخلیه می‌کنند.
+    
     Args:
         download_id: شناسه دانلود
         status: وضعیت جدید
@@ -321,49 +840,49 @@ def update_download_status(download_id: int, status: int, file_path: str = None,
         error_message: پیام خطا (اختیاری)
         
     Returns:
-        True در صورت موفقیت
+        True در صورت موفقیت (یا قرار گرفتن در صف)
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
+    try:
+        current_time = datetime.datetime.now().isoformat()
+        metadata_json = json.dumps(metadata, ensure_ascii=False) if metadata else None
+        
+        # به‌روزرسانی رکورد
+        update_fields = ["status = ?", "end_time = ?"]
+        params = [status, current_time]
+        
+        if file_path:
+            update_fields.append("file_path = ?")
+            params.append(file_path)
             
-            current_time = datetime.datetime.now().isoformat()
-            metadata_json = json.dumps(metadata, ensure_ascii=False) if metadata else None
-            
-            # به‌روزرسانی رکورد
-            update_fields = ["status = ?", "end_time = ?"]
-            params = [status, current_time]
-            
-            if file_path:
-                update_fields.append("file_path = ?")
-                params.append(file_path)
-                
-            if file_size is not None:
-                update_fields.append("file_size = ?")
-                params.append(file_size)
-                
-            if metadata_json:
-                update_fields.append("metadata = ?")
-                params.append(metadata_json)
-                
-            if error_message:
-                update_fields.append("error_message = ?")
-                params.append(error_message)
-                
-            # افزودن شناسه دانلود به پارامترها
-            params.append(download_id)
-            
-            query = f"UPDATE downloads SET {', '.join(update_fields)} WHERE id = ?"
-            cursor.execute(query, params)
+        if file_size is not None:
+            update_fields.append("file_size = ?")
+            params.append(file_size)
             
-            conn.commit()
-            conn.close()
+        if metadata_json:
+            update_fields.append("metadata = ?")
+            params.append(metadata_json)
+            
+        if error_message:
+            update_fields.append("error_message = ?")
+            params.append(error_message)
+            
+        # افزودن شناسه دانلود به پارامترها
+        params.append(download_id)
+        
+        query = f"UPDATE downloads SET {', '.join(update_fields)} WHERE id = ?"
+        
+        if DB_WRITE_BEHIND:
+            write_behind.enqueue(query, params, "downloads", download_id)
             return True
+        
+        with write_transaction() as conn:
+            conn.execute(query, params)
             
-        except Exception as e:
-            debug_log(f"خطا در به‌روزرسانی وضعیت دانلود: {str(e)}", "ERROR")
-            return False
+            return True
+            
+    except Exception as e:
+        debug_log(f"خطا در به‌روزرسانی وضعیت دانلود: {str(e)}", "ERROR")
+        return False
 
 @debug_decorator
 def get_download(download_id: int) -> Optional[Dict[str, Any]]:
@@ -376,27 +895,26 @@ def get_download(download_id: int) -> Optional[Dict[str, Any]]:
     Returns:
         دیکشنری حاوی اطلاعات دانلود یا None
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM downloads WHERE id = ?', (download_id,))
-            download = cursor.fetchone()
-            
-            # تبدیل متادیتا از JSON به دیکشنری
-            if download and download.get('metadata'):
-                try:
-                    download['metadata'] = json.loads(download['metadata'])
-                except:
-                    download['metadata'] = {}
-            
-            conn.close()
-            return download
-            
-        except Exception as e:
-            debug_log(f"خطا در دریافت اطلاعات دانلود: {str(e)}", "ERROR")
-            return None
+    try:
+        write_behind.sync("downloads", download_id)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM downloads WHERE id = ?', (download_id,))
+        download = cursor.fetchone()
+        
+        # تبدیل متادیتا از JSON به دیکشنری
+        if download and download.get('metadata'):
+            try:
+                download['metadata'] = json.loads(download['metadata'])
+            except:
+                download['metadata'] = {}
+        
+        return download
+        
+    except Exception as e:
+        debug_log(f"خطا در دریافت اطلاعات دانلود: {str(e)}", "ERROR")
+        return None
 
 @debug_decorator
 def get_user_downloads(user_id: int, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
@@ -411,34 +929,33 @@ def get_user_downloads(user_id: int, limit: int = 10, offset: int = 0) -> List[D
     Returns:
         لیست دانلودها
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT * FROM downloads 
-            WHERE user_id = ? 
-            ORDER BY start_time DESC 
-            LIMIT ? OFFSET ?
-            ''', (user_id, limit, offset))
-            
-            downloads = cursor.fetchall()
-            
-            # تبدیل متادیتا از JSON به دیکشنری
-            for download in downloads:
-                if download.get('metadata'):
-                    try:
-                        download['metadata'] = json.loads(download['metadata'])
-                    except:
-                        download['metadata'] = {}
-            
-            conn.close()
-            return downloads
-            
-        except Exception as e:
-            debug_log(f"خطا در دریافت دانلودهای کاربر: {str(e)}", "ERROR")
-            return []
+    try:
+        write_behind.sync("downloads")
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT * FROM downloads 
+        WHERE user_id = ? 
+        ORDER BY start_time DESC 
+        LIMIT ? OFFSET ?
+        ''', (user_id, limit, offset))
+        
+        downloads = cursor.fetchall()
+        
+        # تبدیل متادیتا از JSON به دیکشنری
+        for download in downloads:
+            if download.get('metadata'):
+                try:
+                    download['metadata'] = json.loads(download['metadata'])
+                except:
+                    download['metadata'] = {}
+        
+        return downloads
+        
+    except Exception as e:
+        debug_log(f"خطا در دریافت دانلودهای کاربر: {str(e)}", "ERROR")
+        return []
 
 @debug_decorator
 def get_all_downloads(status: Optional[int] = None, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
@@ -453,41 +970,40 @@ def get_all_downloads(status: Optional[int] = None, limit: int = 100, offset: in
     Returns:
         لیست دانلودها
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            if status is not None:
-                cursor.execute('''
-                SELECT * FROM downloads 
-                WHERE status = ? 
-                ORDER BY start_time DESC 
-                LIMIT ? OFFSET ?
-                ''', (status, limit, offset))
-            else:
-                cursor.execute('''
-                SELECT * FROM downloads 
-                ORDER BY start_time DESC 
-                LIMIT ? OFFSET ?
-                ''', (limit, offset))
-            
-            downloads = cursor.fetchall()
-            
-            # تبدیل متادیتا از JSON به دیکشنری
-            for download in downloads:
-                if download.get('metadata'):
-                    try:
-                        download['metadata'] = json.loads(download['metadata'])
-                    except:
-                        download['metadata'] = {}
-            
-            conn.close()
-            return downloads
-            
-        except Exception as e:
-            debug_log(f"خطا در دریافت همه دانلودها: {str(e)}", "ERROR")
-            return []
+    try:
+        write_behind.sync("downloads")
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        if status is not None:
+            cursor.execute('''
+            SELECT * FROM downloads 
+            WHERE status = ? 
+            ORDER BY start_time DESC 
+            LIMIT ? OFFSET ?
+            ''', (status, limit, offset))
+        else:
+            cursor.execute('''
+            SELECT * FROM downloads 
+            ORDER BY start_time DESC 
+            LIMIT ? OFFSET ?
+            ''', (limit, offset))
+        
+        downloads = cursor.fetchall()
+        
+        # تبدیل متادیتا از JSON به دیکشنری
+        for download in downloads:
+            if download.get('metadata'):
+                try:
+                    download['metadata'] = json.loads(download['metadata'])
+                except:
+                    download['metadata'] = {}
+        
+        return downloads
+        
+    except Exception as e:
+        debug_log(f"خطا در دریافت همه دانلودها: {str(e)}", "ERROR")
+        return []
 
 @debug_decorator
 def get_active_downloads_count(user_id: int) -> int:
@@ -500,25 +1016,197 @@ def get_active_downloads_count(user_id: int) -> int:
     Returns:
         تعداد دانلودهای فعال
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
+    try:
+        write_behind.sync("downloads")
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT COUNT(*) as count FROM downloads 
+        WHERE user_id = ? AND status IN (?, ?)
+        ''', (user_id, DownloadStatus.PENDING, DownloadStatus.PROCESSING))
+        
+        result = cursor.fetchone()
+        count = result['count'] if result else 0
+        
+        return count
+        
+    except Exception as e:
+        debug_log(f"خطا در دریافت تعداد دانلودهای فعال: {str(e)}", "ERROR")
+        return 0
+
+@debug_decorator
+def get_quality_counts(user_id: Optional[int] = None, limit: int = 200) -> List[Tuple[str, int]]:
+    """
+    دریافت کیفیت‌های پرکاربرد در دانلودهای موفق اخیر
+    
+    Args:
+        user_id: شناسه کاربر (اختیاری، پیش‌فرض: همه کاربران)
+        limit: تعداد دانلودهای اخیر مورد بررسی
+        
+    Returns:
+        لیست (کیفیت، تعداد) به ترتیب کاهش تعداد
+    """
+    try:
+        write_behind.sync("downloads")
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        user_filter = "AND user_id = ?" if user_id is not None else ""
+        params = [DownloadStatus.COMPLETED] + ([user_id] if user_id is not None else []) + [limit]
+        cursor.execute(f'''
+        SELECT quality, COUNT(*) as count FROM (
+            SELECT quality FROM downloads 
+            WHERE status = ? {user_filter}
+            ORDER BY id DESC 
+            LIMIT ?
+        )
+        GROUP BY quality 
+        ORDER BY count DESC
+        ''', params)
+        
+        counts = [(row['quality'], row['count']) for row in cursor.fetchall() if row['quality']]
+        
+        return counts
+        
+    except Exception as e:
+        debug_log(f"خطا در دریافت کیفیت‌های پرکاربرد: {str(e)}", "ERROR")
+        return []
+
+@debug_decorator
+def get_interrupted_downloads() -> List[Dict[str, Any]]:
+    """
+    دریافت دانلودهایی که با توقف ربات نیمه‌کاره مانده‌اند
+    
+    Returns:
+        لیست دانلودهای در انتظار یا در حال پردازش (قدیمی‌ترین اول)
+    """
+    try:
+        write_behind.sync("downloads")
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT * FROM downloads 
+        WHERE status IN (?, ?)
+        ORDER BY id ASC
+        ''', (DownloadStatus.PENDING, DownloadStatus.PROCESSING))
+        
+        downloads = cursor.fetchall()
+        
+        return downloads
+        
+    except Exception as e:
+        debug_log(f"خطا در دریافت دانلودهای نیمه‌کاره: {str(e)}", "ERROR")
+        return []
+
+# --- مدیریت فایل‌های تلگرام ---
+
+@debug_decorator
+def save_telegram_file(video_id: str, format: str, media_kind: str, file_id: str, file_unique_id: str,
+                       file_size: Optional[int] = None, title: Optional[str] = None) -> bool:
+    """
+    ذخیره file_id فایل آپلود شده در تلگرام
+    
+    Args:
+        video_id: شناسه استاندارد ویدیو
+        format: فرمت یا کیفیت درخواستی
+        media_kind: نوع رسانه (video، audio، photo، document)
+        file_id: شناسه فایل در تلگرام
+        file_unique_id: شناسه یکتای فایل در تلگرام
+        file_size: حجم فایل (اختیاری)
+        title: عنوان ویدیو (اختیاری)
+        
+    Returns:
+        True در صورت موفقیت
+    """
+    try:
+        with write_transaction() as conn:
             cursor = conn.cursor()
             
+            current_time = datetime.datetime.now().isoformat()
+            
+            cursor.execute('''
+            INSERT OR REPLACE INTO telegram_files
+                (video_id, format, media_kind, file_id, file_unique_id, file_size, title, created_at, last_used, use_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+            ''', (video_id, format, media_kind, file_id, file_unique_id, file_size, title, current_time, current_time))
+            
+            return True
+            
+    except Exception as e:
+        debug_log(f"خطا در ذخیره file_id: {str(e)}", "ERROR")
+        return False
+
+@debug_decorator
+def get_telegram_file(video_id: str, format: str, media_kind: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    دریافت file_id ذخیره شده برای یک ویدیو و فرمت
+    
+    Args:
+        video_id: شناسه استاندارد ویدیو
+        format: فرمت یا کیفیت درخواستی
+        media_kind: نوع رسانه (اختیاری)
+        
+    Returns:
+        دیکشنری اطلاعات فایل یا None
+    """
+    try:
+        # خواندن بدون قفل نوشتن؛ فقط به‌روزرسانی آمار استفاده در تراکنش نوشتن انجام می‌شود
+        cursor = get_db_connection().cursor()
+        
+        if media_kind:
             cursor.execute('''
-            SELECT COUNT(*) as count FROM downloads 
-            WHERE user_id = ? AND status IN (?, ?)
-            ''', (user_id, DownloadStatus.PENDING, DownloadStatus.PROCESSING))
+            SELECT * FROM telegram_files WHERE video_id = ? AND format = ? AND media_kind = ?
+            ''', (video_id, format, media_kind))
+        else:
+            cursor.execute('''
+            SELECT * FROM telegram_files WHERE video_id = ? AND format = ?
+            ORDER BY last_used DESC LIMIT 1
+            ''', (video_id, format))
+        
+        telegram_file = cursor.fetchone()
+        cursor.close()
+        
+        if telegram_file:
+            with write_transaction() as conn:
+                conn.execute('''
+                UPDATE telegram_files SET last_used = ?, use_count = use_count + 1
+                WHERE video_id = ? AND format = ? AND media_kind = ?
+                ''', (datetime.datetime.now().isoformat(), video_id, format, telegram_file['media_kind']))
+        
+        return telegram_file
+        
+    except Exception as e:
+        debug_log(f"خطا در دریافت file_id: {str(e)}", "ERROR")
+        return None
+
+@debug_decorator
+def delete_telegram_file(video_id: str, format: str, media_kind: str) -> bool:
+    """
+    حذف file_id نامعتبر
+    
+    Args:
+        video_id: شناسه استاندارد ویدیو
+        format: فرمت یا کیفیت درخواستی
+        media_kind: نوع رسانه
+        
+    Returns:
+        True در صورت موفقیت
+    """
+    try:
+        with write_transaction() as conn:
+            cursor = conn.cursor()
             
-            result = cursor.fetchone()
-            count = result['count'] if result else 0
+            cursor.execute('''
+            DELETE FROM telegram_files WHERE video_id = ? AND format = ? AND media_kind = ?
+            ''', (video_id, format, media_kind))
             
-            conn.close()
-            return count
+            return True
             
-        except Exception as e:
-            debug_log(f"خطا در دریافت تعداد دانلودهای فعال: {str(e)}", "ERROR")
-            return 0
+    except Exception as e:
+        debug_log(f"خطا در حذف file_id: {str(e)}", "ERROR")
+        return False
 
 # --- مدیریت لاگ‌ها ---
 
@@ -534,30 +1222,33 @@ def add_log(level: str, message: str, user_id: Optional[int] = None, context: Op
         context: اطلاعات اضافی (اختیاری)
         
     Returns:
-        شناسه لاگ یا -1 در صورت خطا
+        شناسه لاگ در جدول روز (0 اگر در صف نوشتن با تاخیر قرار گرفت) یا -1 در صورت خطا
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
+    try:
+        now = datetime.datetime.now()
+        current_time = now.isoformat()
+        context_json = json.dumps(context, ensure_ascii=False) if context else None
+        query = f'''
+        INSERT INTO {ensure_log_partition(now.date())} (timestamp, level, message, user_id, context)
+        VALUES (?, ?, ?, ?, ?)
+        '''
+        params = (current_time, level, message, user_id, context_json)
+        
+        if DB_WRITE_BEHIND:
+            write_behind.enqueue(query, params, "logs")
+            return 0
+        
+        with write_transaction() as conn:
             cursor = conn.cursor()
-            
-            current_time = datetime.datetime.now().isoformat()
-            context_json = json.dumps(context, ensure_ascii=False) if context else None
-            
-            cursor.execute('''
-            INSERT INTO logs (timestamp, level, message, user_id, context)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (current_time, level, message, user_id, context_json))
+            cursor.execute(query, params)
             
             log_id = cursor.lastrowid
             
-            conn.commit()
-            conn.close()
             return log_id
             
-        except Exception as e:
-            debug_log(f"خطا در افزودن لاگ جدید: {str(e)}", "ERROR")
-            return -1
+    except Exception as e:
+        debug_log(f"خطا در افزودن لاگ جدید: {str(e)}", "ERROR")
+        return -1
 
 @debug_decorator
 def get_logs(level: Optional[str] = None, user_id: Optional[int] = None, 
@@ -574,46 +1265,238 @@ def get_logs(level: Optional[str] = None, user_id: Optional[int] = None,
     Returns:
         لیست لاگ‌ها
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            query = "SELECT * FROM logs"
-            params = []
-            conditions = []
-            
-            if level:
-                conditions.append("level = ?")
-                params.append(level)
-                
-            if user_id:
-                conditions.append("user_id = ?")
-                params.append(user_id)
-                
-            if conditions:
-                query += " WHERE " + " AND ".join(conditions)
-                
-            query += " ORDER BY timestamp DESC LIMIT ? OFFSET ?"
-            params.extend([limit, offset])
-            
-            cursor.execute(query, params)
-            logs = cursor.fetchall()
-            
-            # تبدیل context از JSON به دیکشنری
-            for log in logs:
-                if log.get('context'):
-                    try:
-                        log['context'] = json.loads(log['context'])
-                    except:
-                        log['context'] = {}
-            
-            conn.close()
-            return logs
-            
-        except Exception as e:
-            debug_log(f"خطا در دریافت لاگ‌ها: {str(e)}", "ERROR")
-            return []
+    try:
+        write_behind.sync("logs")
+        conn = get_db_connection()
+        
+        conditions, params = _log_conditions(level, user_id)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        
+        # جدول‌های روزانه از جدیدترین تا رسیدن به تعداد لازم
+        needed = offset + limit
+        logs = []
+        for day in list_log_partitions(conn):
+            if len(logs) >= needed:
+                break
+            logs.extend(conn.execute(
+                f"SELECT * FROM {log_table_name(day)}{where} ORDER BY timestamp DESC, id ASC LIMIT ?",
+                params + [needed - len(logs)]
+            ).fetchall())
+        logs = logs[offset:needed]
+        
+        # تبدیل context از JSON به دیکشنری
+        for log in logs:
+            if log.get('context'):
+                try:
+                    log['context'] = json.loads(log['context'])
+                except:
+                    log['context'] = {}
+        
+        return logs
+        
+    except Exception as e:
+        debug_log(f"خطا در دریافت لاگ‌ها: {str(e)}", "ERROR")
+        return []
+
+# --- صفحه‌بندی با نشانگر (keyset) ---
+
+# جداکننده مقدار مرتب‌سازی و شناسه در نشانگر
+_CURSOR_SEPARATOR = "|"
+
+def encode_cursor(sort_value: str, row_id: int) -> str:
+    """
+    ساخت نشانگر صفحه بعد از آخرین ردیف صفحه فعلی
+    
+    Args:
+        sort_value: مقدار ستون مرتب‌سازی (زمان) در آخرین ردیف
+        row_id: شناسه آخرین ردیف
+        
+    Returns:
+        رشته base64 فشرده (قابل استفاده در callback_data دکمه‌ها)
+    """
+    raw = f"{sort_value}{_CURSOR_SEPARATOR}{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """
+    خواندن نشانگر صفحه
+    
+    Args:
+        cursor: نشانگر ساخته شده با encode_cursor
+        
+    Returns:
+        (مقدار ستون مرتب‌سازی، شناسه)؛ در صورت نامعتبر بودن ValueError
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        sort_value, row_id = raw.rsplit(_CURSOR_SEPARATOR, 1)
+        return sort_value, int(row_id)
+    except Exception:
+        raise ValueError("نشانگر صفحه نامعتبر است")
+
+def _keyset_page(table: str, sort_column: str, conditions: List[str], params: List[Any],
+                 cursor: Optional[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    دریافت یک صفحه به ترتیب نزولی sort_column و صعودی id (همان ترتیب شاخص‌ها)
+    
+    به جای OFFSET از آخرین ردیف صفحه قبل ادامه می‌دهد، پس صفحه‌های عمیق هم با یک
+    جستجوی شاخص خوانده می‌شوند. شرط «<=» محدوده شاخص را مشخص می‌کند و شرط OR فقط
+    ردیف‌های هم‌زمان با نشانگر را فیلتر می‌کند.
+    
+    Returns:
+        (ردیف‌ها، نشانگر صفحه بعد یا None در صفحه آخر)
+    """
+    rows = _keyset_rows(table, sort_column, conditions, params, cursor, limit + 1)
+    return _page_result(rows, sort_column, limit)
+
+def _keyset_rows(table: str, sort_column: str, conditions: List[str], params: List[Any],
+                 cursor: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """حداکثر limit ردیف پس از نشانگر از یک جدول"""
+    conditions = list(conditions)
+    params = list(params)
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        conditions.append(f"{sort_column} <= ? AND ({sort_column} < ? OR id > ?)")
+        params.extend([sort_value, sort_value, row_id])
+    
+    query = f"SELECT * FROM {table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {sort_column} DESC, id ASC LIMIT ?"
+    params.append(limit)
+    
+    return get_db_connection().execute(query, params).fetchall()
+
+def _page_result(rows: List[Dict[str, Any]], sort_column: str,
+                 limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """جدا کردن صفحه از limit + 1 ردیف و ساخت نشانگر صفحه بعد"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][sort_column], rows[-1]["id"])
+    return rows, next_cursor
+
+def _log_conditions(level: Optional[str], user_id: Optional[int]) -> Tuple[List[str], List[Any]]:
+    """شرط‌های فیلتر لاگ‌ها"""
+    conditions, params = [], []
+    if level:
+        conditions.append("level = ?")
+        params.append(level)
+    if user_id:
+        conditions.append("user_id = ?")
+        params.append(user_id)
+    return conditions, params
+
+def _decode_json_column(rows: List[Dict[str, Any]], column: str) -> None:
+    """تبدیل ستون JSON ردیف‌ها به دیکشنری"""
+    for row in rows:
+        if row.get(column):
+            try:
+                row[column] = json.loads(row[column])
+            except:
+                row[column] = {}
+
+@debug_decorator
+def get_users_page(cursor: Optional[str] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    دریافت یک صفحه از کاربران به ترتیب آخرین فعالیت
+    
+    Args:
+        cursor: نشانگر صفحه (None برای صفحه اول)
+        limit: تعداد کاربران هر صفحه
+        
+    Returns:
+        (لیست کاربران، نشانگر صفحه بعد یا None)
+    """
+    try:
+        return _keyset_page("users", "last_activity", [], [], cursor, limit)
+    except Exception as e:
+        debug_log(f"خطا در دریافت صفحه کاربران: {str(e)}", "ERROR")
+        return [], None
+
+@debug_decorator
+def get_downloads_page(status: Optional[int] = None, cursor: Optional[str] = None,
+                       limit: int = 20) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    دریافت یک صفحه از همه دانلودها به ترتیب زمان شروع
+    
+    Args:
+        status: فیلتر وضعیت (اختیاری)
+        cursor: نشانگر صفحه (None برای صفحه اول)
+        limit: تعداد دانلودهای هر صفحه
+        
+    Returns:
+        (لیست دانلودها، نشانگر صفحه بعد یا None)
+    """
+    try:
+        write_behind.sync("downloads")
+        conditions, params = (["status = ?"], [status]) if status is not None else ([], [])
+        downloads, next_cursor = _keyset_page("downloads", "start_time", conditions, params, cursor, limit)
+        _decode_json_column(downloads, "metadata")
+        return downloads, next_cursor
+    except Exception as e:
+        debug_log(f"خطا در دریافت صفحه دانلودها: {str(e)}", "ERROR")
+        return [], None
+
+@debug_decorator
+def get_user_downloads_page(user_id: int, cursor: Optional[str] = None,
+                            limit: int = 10) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    دریافت یک صفحه از دانلودهای یک کاربر به ترتیب زمان شروع
+    
+    Args:
+        user_id: شناسه کاربر
+        cursor: نشانگر صفحه (None برای صفحه اول)
+        limit: تعداد دانلودهای هر صفحه
+        
+    Returns:
+        (لیست دانلودها، نشانگر صفحه بعد یا None)
+    """
+    try:
+        write_behind.sync("downloads")
+        downloads, next_cursor = _keyset_page("downloads", "start_time", ["user_id = ?"], [user_id], cursor, limit)
+        _decode_json_column(downloads, "metadata")
+        return downloads, next_cursor
+    except Exception as e:
+        debug_log(f"خطا در دریافت صفحه دانلودهای کاربر: {str(e)}", "ERROR")
+        return [], None
+
+@debug_decorator
+def get_logs_page(level: Optional[str] = None, user_id: Optional[int] = None, cursor: Optional[str] = None,
+                  limit: int = 10) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    دریافت یک صفحه از لاگ‌ها به ترتیب زمان
+    
+    Args:
+        level: سطح لاگ (اختیاری)
+        user_id: شناسه کاربر (اختیاری)
+        cursor: نشانگر صفحه (None برای صفحه اول)
+        limit: تعداد لاگ‌های هر صفحه
+        
+    Returns:
+        (لیست لاگ‌ها، نشانگر صفحه بعد یا None)
+    """
+    try:
+        write_behind.sync("logs")
+        conditions, params = _log_conditions(level, user_id)
+        
+        # نشانگر در جدول روز خودش اعمال می‌شود؛ جدول‌های قدیمی‌تر از ابتدا خوانده می‌شوند
+        cursor_day = datetime.date.fromisoformat(decode_cursor(cursor)[0][:10]) if cursor else None
+        rows = []
+        for day in list_log_partitions():
+            if len(rows) > limit:
+                break
+            if cursor_day and day > cursor_day:
+                continue
+            rows.extend(_keyset_rows(log_table_name(day), "timestamp", conditions, params,
+                                     cursor if day == cursor_day else None, limit + 1 - len(rows)))
+        
+        logs, next_cursor = _page_result(rows, "timestamp", limit)
+        _decode_json_column(logs, "context")
+        return logs, next_cursor
+    except Exception as e:
+        debug_log(f"خطا در دریافت صفحه لاگ‌ها: {str(e)}", "ERROR")
+        return [], None
 
 # --- مدیریت تنظیمات ---
 
@@ -630,9 +1513,8 @@ def set_setting(key: str, value: str, description: str = None) -> bool:
     Returns:
         True در صورت موفقیت
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
+    try:
+        with write_transaction() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -640,13 +1522,11 @@ def set_setting(key: str, value: str, description: str = None) -> bool:
             VALUES (?, ?, ?)
             ''', (key, value, description))
             
-            conn.commit()
-            conn.close()
             return True
             
-        except Exception as e:
-            debug_log(f"خطا در تنظیم مقدار {key}: {str(e)}", "ERROR")
-            return False
+    except Exception as e:
+        debug_log(f"خطا در تنظیم مقدار {key}: {str(e)}", "ERROR")
+        return False
 
 @debug_decorator
 def get_setting(key: str, default: str = None) -> str:
@@ -660,21 +1540,18 @@ def get_setting(key: str, default: str = None) -> str:
     Returns:
         مقدار تنظیم یا مقدار پیش‌فرض
     """
-    with db_lock:
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
-            result = cursor.fetchone()
-            
-            conn.close()
-            
-            if result:
-                return result['value']
-            else:
-                return default
-                
-        except Exception as e:
-            debug_log(f"خطا در دریافت تنظیم {key}: {str(e)}", "ERROR")
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT value FROM settings WHERE key = ?', (key,))
+        result = cursor.fetchone()
+        
+        if result:
+            return result['value']
+        else:
             return default
+            
+    except Exception as e:
+        debug_log(f"خطا در دریافت تنظیم {key}: {str(e)}", "ERROR")
+        return default
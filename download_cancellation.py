@@ -0,0 +1,246 @@
+"""
+ماژول لغو دانلود
+
+هر دانلود در حال اجرا یک توکن لغو دارد که از داخل progress hook های yt-dlp
+بررسی می‌شود؛ با لغو توکن، دانلود در اولین تکه داده بعدی متوقف می‌شود.
+یک ترد نگهبان (watchdog) هم دانلودهایی را که از مهلت خود گذشته‌اند لغو
+می‌کند. فایل‌های نیمه‌کاره (.part) پس از لغو پاک می‌شوند.
+"""
+
+import os
+import re
+import time
+import threading
+from typing import Dict, Optional, List
+
+from config import CANCEL_WATCHDOG_INTERVAL
+from debug_logger import debug_log
+
+try:
+    from yt_dlp.utils import DownloadCancelled as _YtdlpDownloadCancelled
+except ImportError:
+    _YtdlpDownloadCancelled = Exception
+
+# پسوند فایل‌های نیمه‌کاره yt-dlp
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp', '.segments')
+
+# فایل‌های میانی هر فرمت پیش از ادغام (مثلا name.f137.mp4)
+INTERMEDIATE_PATTERN = re.compile(r'\.f\d+\.\w+$')
+
+
+class DownloadCancelled(_YtdlpDownloadCancelled):
+    """لغو دانلود توسط کاربر یا پایان مهلت"""
+
+    def __init__(self, reason: str = "canceled"):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """
+    توکن لغو یک دانلود
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.reason = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "canceled") -> None:
+        """
+        لغو توکن
+
+        Args:
+            reason: دلیل لغو (canceled یا timeout)
+        """
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def check(self) -> None:
+        """ایجاد خطای DownloadCancelled در صورت لغو شدن توکن"""
+        if self._event.is_set():
+            raise DownloadCancelled(self.reason)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """انتظار برای لغو توکن"""
+        return self._event.wait(timeout)
+
+
+class SharedCancelToken:
+    """
+    توکن لغو یک دانلود مشترک که فقط وقتی همه درخواست‌کنندگان آن لغو کرده
+    باشند لغو شده حساب می‌شود
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = []
+
+    def add(self, token: CancelToken) -> None:
+        with self._lock:
+            self._tokens.append(token)
+
+    def remove(self, token: CancelToken) -> None:
+        with self._lock:
+            if token in self._tokens:
+                self._tokens.remove(token)
+
+    @property
+    def cancelled(self) -> bool:
+        with self._lock:
+            return bool(self._tokens) and all(token.cancelled for token in self._tokens)
+
+    @property
+    def reason(self) -> Optional[str]:
+        with self._lock:
+            reasons = [token.reason for token in self._tokens if token.reason]
+        if not reasons:
+            return None
+        return "timeout" if "timeout" in reasons else reasons[0]
+
+    def check(self) -> None:
+        """ایجاد خطای DownloadCancelled اگر همه درخواست‌کنندگان لغو کرده باشند"""
+        if self.cancelled:
+            raise DownloadCancelled(self.reason or "canceled")
+
+
+class CancelRegistry:
+    """
+    نگهداری توکن‌های لغو دانلودهای در حال اجرا و ترد نگهبان مهلت‌ها
+    """
+
+    def __init__(self, interval: float = CANCEL_WATCHDOG_INTERVAL):
+        self.interval = interval
+        self._lock = threading.RLock()
+        self._tokens = {}  # download_id -> CancelToken
+        self._watchdog = None
+        self.stats = {"canceled": 0, "timeouts": 0}
+
+    def register(self, download_id: int, timeout: Optional[float] = None) -> CancelToken:
+        """
+        ایجاد توکن لغو برای یک دانلود
+
+        Args:
+            download_id: شناسه دانلود
+            timeout: حداکثر زمان مجاز دانلود به ثانیه (اختیاری)
+
+        Returns:
+            توکن لغو
+        """
+        deadline = time.time() + timeout if timeout else None
+
+        with self._lock:
+            token = CancelToken(deadline)
+            self._tokens[download_id] = token
+
+        if deadline is not None:
+            self._start_watchdog()
+
+        return token
+
+    def unregister(self, download_id: int) -> None:
+        """حذف توکن دانلود پایان یافته"""
+        with self._lock:
+            self._tokens.pop(download_id, None)
+
+    def get(self, download_id: int) -> Optional[CancelToken]:
+        """دریافت توکن لغو یک دانلود"""
+        with self._lock:
+            return self._tokens.get(download_id)
+
+    def cancel(self, download_id: int, reason: str = "canceled") -> bool:
+        """
+        لغو یک دانلود در حال اجرا
+
+        Args:
+            download_id: شناسه دانلود
+            reason: دلیل لغو
+
+        Returns:
+            True اگر دانلود در حال اجرا بود
+        """
+        with self._lock:
+            token = self._tokens.get(download_id)
+
+            if token is None or token.cancelled:
+                return False
+
+            token.cancel(reason)
+            self.stats["timeouts" if reason == "timeout" else "canceled"] += 1
+
+        debug_log(f"توکن لغو دانلود {download_id} فعال شد ({reason})", "INFO")
+        return True
+
+    def _start_watchdog(self) -> None:
+        """راه‌اندازی ترد نگهبان (فقط یک بار)"""
+        with self._lock:
+            if self._watchdog is not None:
+                return
+
+            self._watchdog = threading.Thread(target=self._watchdog_loop, name="download-watchdog")
+            self._watchdog.daemon = True
+            self._watchdog.start()
+
+    def _watchdog_loop(self) -> None:
+        """لغو دانلودهایی که از مهلت خود گذشته‌اند"""
+        while True:
+            time.sleep(self.interval)
+            now = time.time()
+
+            with self._lock:
+                expired = [
+                    download_id for download_id, token in self._tokens.items()
+                    if token.deadline is not None and now > token.deadline and not token.cancelled
+                ]
+
+            for download_id in expired:
+                debug_log(f"دانلود {download_id} از مهلت مجاز گذشت و متوقف می‌شود", "WARNING")
+                self.cancel(download_id, "timeout")
+
+    def get_stats(self) -> Dict[str, int]:
+        """دریافت آمار لغوها"""
+        with self._lock:
+            return {"active": len(self._tokens), **self.stats}
+
+
+def cleanup_partial_files(directory: str, prefix: str) -> List[str]:
+    """
+    حذف فایل‌های نیمه‌کاره یک دانلود
+
+    Args:
+        directory: پوشه دانلود
+        prefix: پیشوند نام فایل‌های دانلود (مثلا "12-")
+
+    Returns:
+        لیست فایل‌های حذف شده
+    """
+    removed = []
+
+    if not os.path.isdir(directory):
+        return removed
+
+    for file in os.listdir(directory):
+        if not file.startswith(prefix):
+            continue
+        if not (file.endswith(PARTIAL_SUFFIXES) or '.part-Frag' in file or INTERMEDIATE_PATTERN.search(file)):
+            continue
+
+        try:
+            os.remove(os.path.join(directory, file))
+            removed.append(file)
+        except OSError as e:
+            debug_log(f"خطا در حذف فایل نیمه‌کاره {file}: {str(e)}", "WARNING")
+
+    if removed:
+        debug_log(f"{len(removed)} فایل نیمه‌کاره با پیشوند {prefix} حذف شد", "INFO")
+
+    return removed
+
+
+# نمونه سراسری
+cancel_registry = CancelRegistry()
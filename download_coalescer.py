@@ -0,0 +1,193 @@
+"""
+ماژول یکپارچه‌سازی دانلودهای تکراری
+
+وقتی چند کاربر همزمان یک ویدیو را با یک فرمت درخواست می‌کنند، فقط یک
+دانلود واقعی انجام می‌شود (single-flight) و بقیه درخواست‌ها به همان دانلود
+متصل می‌شوند. هر درخواست‌کننده پیشرفت دانلود را از طریق callback خودش
+دریافت می‌کند. فایل‌های تکمیل شده در مخزن فایل‌ها ثبت می‌شوند و تا زمانی
+که توسط سیاست LRU حذف نشده‌اند برای درخواست‌های بعدی دوباره استفاده می‌شوند.
+"""
+
+import threading
+from typing import Dict, Any, Optional, Tuple, Callable
+
+from debug_logger import debug_log
+from artifact_store import artifact_store
+from download_cancellation import CancelToken, SharedCancelToken, DownloadCancelled
+
+# (وضعیت موفقیت، مسیر فایل، خطا)
+DownloadResult = Tuple[bool, Optional[str], Optional[Dict]]
+# callback(درصد، وضعیت، رویداد پیشرفت اختیاری)
+ProgressCallback = Callable[..., None]
+
+
+class _Flight:
+    """یک دانلود در حال انجام و درخواست‌کنندگان متصل به آن"""
+
+    def __init__(self, key: Tuple[str, str], leader_id: int):
+        self.key = key
+        self.leader_id = leader_id
+        self.done = threading.Event()
+        self.subscribers = {}  # download_id -> progress_callback
+        self.last_progress = (0.0, "در حال شروع...")  # آخرین آرگومان‌های ارسال شده
+        self.cancel = SharedCancelToken()  # فقط با لغو همه درخواست‌کنندگان لغو می‌شود
+        self.result = None
+        self.exception = None
+
+
+class DownloadCoalescer:
+    """
+    مدیریت دانلودهای مشترک بر اساس کلید (شناسه ویدیو، فرمت نهایی)
+    """
+
+    def __init__(self, store=artifact_store):
+        self.store = store
+        self._lock = threading.RLock()
+        self._flights = {}  # key -> _Flight
+        self.stats = {"downloads": 0, "attached": 0, "reused": 0}
+
+    def get_cached_file(self, key: Tuple[str, str], download_id: Optional[int] = None) -> Optional[str]:
+        """
+        دریافت فایل تکمیل شده یک کلید از مخزن فایل‌ها
+
+        Args:
+            key: (شناسه ویدیو، فرمت نهایی)
+            download_id: شناسه دانلودی که از فایل استفاده می‌کند (اختیاری)
+
+        Returns:
+            مسیر فایل یا None
+        """
+        return self.store.lookup(key, owner=download_id)
+
+    def evict(self, key: Tuple[str, str]) -> None:
+        """
+        حذف یک کلید از فایل‌های قابل استفاده مجدد
+
+        Args:
+            key: (شناسه ویدیو، فرمت نهایی)
+        """
+        self.store.forget_key(key)
+
+    def _broadcast(self, flight: _Flight, *progress) -> None:
+        """ارسال پیشرفت (درصد، وضعیت و رویداد اختیاری) به همه درخواست‌کنندگان یک دانلود"""
+        with self._lock:
+            flight.last_progress = progress
+            callbacks = list(flight.subscribers.values())
+
+        for callback in callbacks:
+            try:
+                callback(*progress)
+            except Exception as e:
+                debug_log(f"خطا در ارسال پیشرفت دانلود مشترک: {str(e)}", "WARNING")
+
+    def run(self, key: Optional[Tuple[str, str]], download_id: int,
+            progress_callback: Optional[ProgressCallback],
+            fetch: Callable[[ProgressCallback, SharedCancelToken], DownloadResult],
+            cancel_token: Optional[CancelToken] = None) -> DownloadResult:
+        """
+        اجرای دانلود یا اتصال به دانلود در حال انجام با همان کلید
+
+        Args:
+            key: (شناسه ویدیو، فرمت نهایی) یا None برای دانلود بدون اشتراک
+            download_id: شناسه دانلود درخواست‌کننده
+            progress_callback: callback پیشرفت همین درخواست‌کننده
+            fetch: تابع انجام دانلود واقعی که callback پخش پیشرفت و توکن لغو مشترک را می‌گیرد
+            cancel_token: توکن لغو همین درخواست‌کننده (اختیاری)
+
+        Returns:
+            (وضعیت موفقیت، مسیر فایل، خطا)
+        """
+        callback = progress_callback or (lambda *progress: None)
+
+        if key is None:
+            shared_cancel = SharedCancelToken()
+            if cancel_token is not None:
+                shared_cancel.add(cancel_token)
+            result = fetch(callback, shared_cancel)
+            if result[0] and result[1]:
+                self.store.add(result[1], owner=download_id)
+            return result
+
+        # استفاده مجدد از فایل تکمیل شده
+        cached_file = self.get_cached_file(key, download_id)
+        if cached_file:
+            with self._lock:
+                self.stats["reused"] += 1
+            debug_log(f"استفاده مجدد از فایل دانلود شده برای {key}: {cached_file}", "INFO")
+            callback(100, "فایل از قبل موجود است")
+            return True, cached_file, None
+
+        with self._lock:
+            flight = self._flights.get(key)
+
+            if flight is not None:
+                # اتصال به دانلود در حال انجام
+                flight.subscribers[download_id] = callback
+                if cancel_token is not None:
+                    flight.cancel.add(cancel_token)
+                self.stats["attached"] += 1
+                last_progress = flight.last_progress
+                is_leader = False
+            else:
+                flight = _Flight(key, download_id)
+                flight.subscribers[download_id] = callback
+                if cancel_token is not None:
+                    flight.cancel.add(cancel_token)
+                self._flights[key] = flight
+                self.stats["downloads"] += 1
+                is_leader = True
+
+        if not is_leader:
+            debug_log(f"دانلود {download_id} به دانلود در حال انجام {flight.leader_id} متصل شد", "INFO")
+            callback(*last_progress)
+
+            # انتظار برای پایان دانلود (درخواست لغو شده بدون توقف دانلود مشترک جدا می‌شود)
+            while not flight.done.wait(0.5):
+                if cancel_token is not None and cancel_token.cancelled:
+                    with self._lock:
+                        flight.subscribers.pop(download_id, None)
+                    raise DownloadCancelled(cancel_token.reason)
+
+            with self._lock:
+                flight.subscribers.pop(download_id, None)
+
+            if flight.exception is not None:
+                raise flight.exception
+            if flight.result[0] and flight.result[1]:
+                self.store.add(flight.result[1], owner=download_id)
+            return flight.result
+
+        try:
+            result = fetch(lambda *progress: self._broadcast(flight, *progress), flight.cancel)
+            flight.result = result
+
+            success, file_path, _ = result
+            if success and file_path:
+                self.store.add(file_path, owner=download_id, key=key)
+            return result
+        except BaseException as e:
+            flight.exception = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                flight.subscribers.pop(download_id, None)
+            flight.done.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        دریافت آمار دانلودهای مشترک
+
+        Returns:
+            دیکشنری آمار
+        """
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "waiting": sum(len(flight.subscribers) for flight in self._flights.values()),
+                **self.stats,
+            }
+
+
+# نمونه سراسری
+download_coalescer = DownloadCoalescer()
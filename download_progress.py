@@ -0,0 +1,345 @@
+"""
+ماژول پیشرفت دانلود
+
+پیشرفت دانلود را مستقیما از progress_hooks و postprocessor_hooks کتابخانه
+yt-dlp دریافت می‌کند (به جای تجزیه متن لاگ‌ها) و آن را به رویدادهای ساخت‌یافته
+با حجم دانلود شده، حجم کل، سرعت، زمان باقیمانده و شماره قطعه تبدیل می‌کند.
+زمان هر مرحله (استخراج، دانلود، ادغام، آپلود) هم برای هر دانلود ثبت می‌شود.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Callable
+
+from debug_logger import debug_log
+
+# حداکثر تعداد زمان‌سنج‌های نگهداری شده برای دانلودهای اخیر
+MAX_TRACKED_TIMERS = 500
+
+# برچسب فارسی مراحل
+STAGE_LABELS = {
+    "extract": "استخراج اطلاعات",
+    "download": "دانلود",
+    "merge": "ادغام صدا و تصویر",
+    "upload": "آپلود",
+}
+
+
+def format_bytes(size: Optional[float]) -> str:
+    """
+    فرمت‌بندی حجم به صورت خوانا
+
+    Args:
+        size: حجم به بایت
+
+    Returns:
+        متن فرمت‌بندی شده
+    """
+    if size is None:
+        return "نامشخص"
+
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+
+
+def format_eta(eta: Optional[float]) -> str:
+    """
+    فرمت‌بندی زمان باقیمانده
+
+    Args:
+        eta: زمان باقیمانده به ثانیه
+
+    Returns:
+        متن فرمت‌بندی شده
+    """
+    if eta is None:
+        return "نامشخص"
+
+    minutes, seconds = divmod(int(eta), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    if hours:
+        return f"{hours:02}:{minutes:02}:{seconds:02}"
+    return f"{minutes:02}:{seconds:02}"
+
+
+class ProgressEvent:
+    """
+    یک رویداد پیشرفت دانلود
+    """
+
+    __slots__ = ("stage", "status", "downloaded_bytes", "total_bytes", "speed", "eta",
+                 "fragment_index", "fragment_count", "filename", "timestamp")
+
+    def __init__(self, stage: str, status: str, downloaded_bytes: Optional[int] = None,
+                 total_bytes: Optional[int] = None, speed: Optional[float] = None,
+                 eta: Optional[float] = None, fragment_index: Optional[int] = None,
+                 fragment_count: Optional[int] = None, filename: Optional[str] = None):
+        self.stage = stage
+        self.status = status
+        self.downloaded_bytes = downloaded_bytes
+        self.total_bytes = total_bytes
+        self.speed = speed
+        self.eta = eta
+        self.fragment_index = fragment_index
+        self.fragment_count = fragment_count
+        self.filename = filename
+        self.timestamp = time.time()
+
+    @classmethod
+    def from_ytdlp(cls, data: Dict[str, Any]) -> "ProgressEvent":
+        """
+        ساخت رویداد از دیکشنری progress_hooks کتابخانه yt-dlp
+
+        Args:
+            data: دیکشنری ارسالی به progress hook
+
+        Returns:
+            رویداد پیشرفت
+        """
+        return cls(
+            stage="download",
+            status=data.get("status", "downloading"),
+            downloaded_bytes=data.get("downloaded_bytes"),
+            total_bytes=data.get("total_bytes") or data.get("total_bytes_estimate"),
+            speed=data.get("speed"),
+            eta=data.get("eta"),
+            fragment_index=data.get("fragment_index"),
+            fragment_count=data.get("fragment_count"),
+            filename=data.get("filename"),
+        )
+
+    @property
+    def percent(self) -> float:
+        """درصد پیشرفت (بر اساس بایت یا در نبود آن بر اساس قطعه‌ها)"""
+        if self.status == "finished":
+            return 100.0
+        if self.downloaded_bytes is not None and self.total_bytes:
+            return min(100.0, self.downloaded_bytes * 100.0 / self.total_bytes)
+        if self.fragment_index is not None and self.fragment_count:
+            return min(100.0, self.fragment_index * 100.0 / self.fragment_count)
+        return 0.0
+
+    def format_status(self) -> str:
+        """
+        متن وضعیت برای نمایش به کاربر
+
+        Returns:
+            متن وضعیت
+        """
+        if self.stage != "download":
+            return f"در حال {STAGE_LABELS.get(self.stage, self.stage)}..."
+
+        if self.status == "finished":
+            return "دانلود فایل کامل شد"
+
+        parts = []
+        if self.downloaded_bytes is not None:
+            if self.total_bytes:
+                parts.append(f"{format_bytes(self.downloaded_bytes)} از {format_bytes(self.total_bytes)}")
+            else:
+                parts.append(format_bytes(self.downloaded_bytes))
+        if self.speed:
+            parts.append(f"{format_bytes(self.speed)}/s")
+        if self.eta is not None:
+            parts.append(f"باقیمانده {format_eta(self.eta)}")
+        if self.fragment_index is not None and self.fragment_count:
+            parts.append(f"قطعه {self.fragment_index}/{self.fragment_count}")
+
+        if not parts:
+            return "در حال دانلود..."
+        return "در حال دانلود (" + " • ".join(parts) + ")"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """تبدیل رویداد به دیکشنری برای ذخیره در active_downloads"""
+        return {
+            "stage": self.stage,
+            "downloaded_bytes": self.downloaded_bytes,
+            "total_bytes": self.total_bytes,
+            "speed": self.speed,
+            "eta": self.eta,
+            "fragment_index": self.fragment_index,
+            "fragment_count": self.fragment_count,
+        }
+
+
+ProgressEventCallback = Callable[[ProgressEvent], None]
+
+
+def make_progress_hook(on_event: ProgressEventCallback, min_interval: float = 0.5,
+                       cancel_token=None) -> Callable[[Dict[str, Any]], None]:
+    """
+    ساخت progress hook برای yt-dlp
+
+    رویدادهای "downloading" حداکثر هر min_interval ثانیه یک بار ارسال
+    می‌شوند تا callback‌ها برای هر تکه داده فراخوانی نشوند.
+
+    Args:
+        on_event: تابع دریافت رویداد پیشرفت
+        min_interval: حداقل فاصله بین دو رویداد دانلود (ثانیه)
+        cancel_token: توکن لغو که در هر فراخوانی بررسی می‌شود (اختیاری)
+
+    Returns:
+        تابع قابل استفاده در progress_hooks
+    """
+    last_emit = [0.0]
+
+    def hook(data: Dict[str, Any]) -> None:
+        # توقف دانلود در اولین تکه داده پس از لغو
+        if cancel_token is not None:
+            cancel_token.check()
+
+        status = data.get("status")
+        now = time.time()
+
+        if status == "downloading" and now - last_emit[0] < min_interval:
+            return
+
+        last_emit[0] = now
+        on_event(ProgressEvent.from_ytdlp(data))
+
+    return hook
+
+
+def make_postprocessor_hook(on_event: ProgressEventCallback,
+                            timer: Optional["StageTimer"] = None,
+                            cancel_token=None) -> Callable[[Dict[str, Any]], None]:
+    """
+    ساخت postprocessor hook برای yt-dlp (برای تشخیص مرحله ادغام)
+
+    Args:
+        on_event: تابع دریافت رویداد پیشرفت
+        timer: زمان‌سنج مراحل دانلود (اختیاری)
+        cancel_token: توکن لغو (اختیاری)
+
+    Returns:
+        تابع قابل استفاده در postprocessor_hooks
+    """
+    def hook(data: Dict[str, Any]) -> None:
+        if cancel_token is not None and data.get("status") == "started":
+            cancel_token.check()
+
+        if data.get("postprocessor") != "Merger":
+            return
+
+        status = data.get("status")
+        if status == "started":
+            if timer:
+                # ادغام پس از پایان دانلود فایل‌ها انجام می‌شود
+                timer.finish("download")
+                timer.start("merge")
+            on_event(ProgressEvent("merge", "started"))
+        elif status == "finished":
+            if timer:
+                timer.finish("merge")
+            on_event(ProgressEvent("merge", "finished"))
+
+    return hook
+
+
+class StageTimer:
+    """
+    زمان‌سنج مراحل یک دانلود
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = {}  # stage -> زمان شروع
+        self.timings = {}  # stage -> مدت زمان (ثانیه)
+
+    def start(self, name: str) -> None:
+        """شروع زمان‌سنجی یک مرحله"""
+        with self._lock:
+            self._started[name] = time.time()
+
+    def finish(self, name: str) -> None:
+        """پایان زمان‌سنجی یک مرحله"""
+        with self._lock:
+            started = self._started.pop(name, None)
+            if started is not None:
+                self.timings[name] = self.timings.get(name, 0.0) + time.time() - started
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        زمان‌سنجی یک مرحله به صورت context manager
+
+        Args:
+            name: نام مرحله (extract، download، merge، upload)
+        """
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.finish(name)
+
+    def get_timings(self) -> Dict[str, float]:
+        """
+        دریافت زمان مراحل (شامل مرحله در حال اجرا)
+
+        Returns:
+            دیکشنری مدت زمان هر مرحله به ثانیه
+        """
+        with self._lock:
+            timings = dict(self.timings)
+            now = time.time()
+            for name, started in self._started.items():
+                timings[name] = timings.get(name, 0.0) + now - started
+            return {name: round(seconds, 2) for name, seconds in timings.items()}
+
+    def format_timings(self) -> str:
+        """متن خلاصه زمان مراحل"""
+        timings = self.get_timings()
+        return "، ".join(
+            f"{STAGE_LABELS.get(name, name)}: {seconds:.1f}s"
+            for name, seconds in timings.items()
+        )
+
+
+# زمان‌سنج‌های دانلودهای اخیر
+_timers_lock = threading.Lock()
+_timers = OrderedDict()  # download_id -> StageTimer
+
+
+def get_stage_timer(download_id: int) -> StageTimer:
+    """
+    دریافت (یا ایجاد) زمان‌سنج مراحل یک دانلود
+
+    Args:
+        download_id: شناسه دانلود
+
+    Returns:
+        زمان‌سنج مراحل
+    """
+    with _timers_lock:
+        timer = _timers.get(download_id)
+
+        if timer is None:
+            timer = StageTimer()
+            _timers[download_id] = timer
+
+            while len(_timers) > MAX_TRACKED_TIMERS:
+                _timers.popitem(last=False)
+        else:
+            _timers.move_to_end(download_id)
+
+        return timer
+
+
+def log_stage_timings(download_id: int) -> None:
+    """
+    ثبت زمان مراحل یک دانلود در لاگ
+
+    Args:
+        download_id: شناسه دانلود
+    """
+    with _timers_lock:
+        timer = _timers.get(download_id)
+
+    if timer is not None:
+        debug_log(f"زمان مراحل دانلود {download_id}: {timer.format_timings()}", "INFO",
+                  {"timings": timer.get_timings()})
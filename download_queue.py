@@ -0,0 +1,440 @@
+"""
+ماژول صف دانلود
+
+زمان‌بند مرکزی دانلودها: یک استخر ثابت از تردهای کارگر که کارها را از یک
+صف اولویت‌دار برمی‌دارند. صف در فایل ذخیره می‌شود تا کارهای در انتظار
+پس از راه‌اندازی مجدد از بین نروند. همزمانی هر مرحله (استخراج، دانلود،
+آپلود) هم به صورت جداگانه محدود می‌شود.
+"""
+
+import os
+import json
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Callable
+
+from config import DOWNLOAD_WORKERS, DOWNLOAD_QUEUE_FILE, DOWNLOAD_STAGE_LIMITS
+from debug_logger import debug_log
+
+
+class JobPriority:
+    HIGH = 0        # کاربران ویژه و ادمین‌ها
+    NORMAL = 10     # کاربران عادی
+    LOW = 20        # کارهای پس‌زمینه
+
+
+class DownloadJob:
+    """
+    یک کار دانلود در صف
+    """
+
+    def __init__(self, job_id: int, kind: str, payload: Dict[str, Any],
+                 priority: int = JobPriority.NORMAL, user_id: Optional[int] = None,
+                 download_id: Optional[int] = None, persist: bool = True,
+                 submitted_at: Optional[float] = None):
+        self.job_id = job_id
+        self.kind = kind
+        self.payload = payload
+        self.priority = priority
+        self.user_id = user_id
+        self.download_id = download_id
+        self.persist = persist
+        self.submitted_at = submitted_at or time.time()
+        self.started_at = None
+        self.status = "queued"
+        self.future = Future()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """تبدیل کار به دیکشنری برای ذخیره در فایل"""
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "payload": self.payload,
+            "priority": self.priority,
+            "user_id": self.user_id,
+            "download_id": self.download_id,
+            "submitted_at": self.submitted_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DownloadJob":
+        """ساخت کار از دیکشنری ذخیره شده"""
+        return cls(
+            job_id=data["job_id"],
+            kind=data["kind"],
+            payload=data.get("payload", {}),
+            priority=data.get("priority", JobPriority.NORMAL),
+            user_id=data.get("user_id"),
+            download_id=data.get("download_id"),
+            submitted_at=data.get("submitted_at"),
+        )
+
+
+class DownloadScheduler:
+    """
+    زمان‌بند دانلود با تعداد ثابت کارگر و صف اولویت‌دار پایدار
+
+    هر نوع کار (kind) یک تابع پردازشگر دارد که با register_handler ثبت می‌شود
+    و به صورت handler(payload, job) فراخوانی می‌شود. کارهایی که از فایل صف
+    بارگیری شده‌اند تا زمان ثبت پردازشگرشان در صف باقی می‌مانند.
+    """
+
+    def __init__(self, num_workers: int = DOWNLOAD_WORKERS,
+                 stage_limits: Optional[Dict[str, int]] = None,
+                 queue_file: Optional[str] = DOWNLOAD_QUEUE_FILE):
+        self.num_workers = max(1, num_workers)
+        self.queue_file = queue_file
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._heap = []  # (priority, seq, job_id)
+        self._jobs = {}  # job_id -> DownloadJob (در انتظار و در حال اجرا)
+        self._handlers = {}
+        self._seq = itertools.count()
+        self._next_id = 1
+        self._workers = []
+        self._stage_limits = dict(stage_limits if stage_limits is not None else DOWNLOAD_STAGE_LIMITS)
+        self._stage_semaphores = {
+            stage: threading.BoundedSemaphore(max(1, limit))
+            for stage, limit in self._stage_limits.items()
+        }
+        self._stage_active = {stage: 0 for stage in self._stage_limits}
+        self._load_queue()
+
+    # --- ذخیره‌سازی صف ---
+
+    def _load_queue(self) -> None:
+        """بارگیری کارهای ذخیره شده از فایل صف"""
+        if not self.queue_file or not os.path.exists(self.queue_file):
+            return
+
+        try:
+            with open(self.queue_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+            for item in data.get("jobs", []):
+                job = DownloadJob.from_dict(item)
+                self._jobs[job.job_id] = job
+                heapq.heappush(self._heap, (job.priority, next(self._seq), job.job_id))
+                self._next_id = max(self._next_id, job.job_id + 1)
+
+            if self._jobs:
+                debug_log(f"{len(self._jobs)} کار از صف ذخیره شده بارگیری شد", "INFO")
+        except Exception as e:
+            debug_log(f"خطا در بارگیری صف دانلود: {str(e)}", "ERROR")
+
+    def _save_queue(self) -> None:
+        """ذخیره کارهای پایدار در فایل صف (باید با قفل فراخوانی شود)"""
+        if not self.queue_file:
+            return
+
+        try:
+            jobs = sorted(
+                (job for job in self._jobs.values() if job.persist),
+                key=lambda job: (job.priority, job.submitted_at)
+            )
+            temp_file = self.queue_file + ".tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump({"jobs": [job.to_dict() for job in jobs]}, f, ensure_ascii=False)
+            os.replace(temp_file, self.queue_file)
+        except Exception as e:
+            debug_log(f"خطا در ذخیره صف دانلود: {str(e)}", "ERROR")
+
+    # --- مدیریت کارگرها ---
+
+    def start(self) -> None:
+        """راه‌اندازی تردهای کارگر (فقط یک بار)"""
+        with self._lock:
+            if self._workers:
+                return
+
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"download-worker-{i + 1}")
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+            debug_log(f"زمان‌بند دانلود با {self.num_workers} کارگر راه‌اندازی شد", "INFO")
+
+    def register_handler(self, kind: str, handler: Callable[[Dict[str, Any], DownloadJob], Any]) -> None:
+        """
+        ثبت پردازشگر برای یک نوع کار
+
+        Args:
+            kind: نوع کار
+            handler: تابعی که با (payload, job) فراخوانی می‌شود
+        """
+        with self._cond:
+            self._handlers[kind] = handler
+            self._cond.notify_all()
+        self.start()
+
+    def _pop_runnable(self) -> Optional[DownloadJob]:
+        """برداشتن اولین کار قابل اجرا از صف (باید با قفل فراخوانی شود)"""
+        skipped = []
+        job = None
+
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            candidate = self._jobs.get(entry[2])
+
+            if candidate is None or candidate.status != "queued":
+                continue
+
+            if candidate.kind in self._handlers:
+                job = candidate
+                break
+
+            skipped.append(entry)
+
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+
+        return job
+
+    def _worker_loop(self) -> None:
+        """حلقه اصلی هر ترد کارگر"""
+        while True:
+            with self._cond:
+                job = self._pop_runnable()
+                while job is None:
+                    self._cond.wait()
+                    job = self._pop_runnable()
+
+                job.status = "running"
+                job.started_at = time.time()
+                handler = self._handlers[job.kind]
+
+            wait_time = job.started_at - job.submitted_at
+            debug_log(f"شروع کار {job.job_id} ({job.kind}) پس از {wait_time:.1f} ثانیه انتظار", "INFO")
+
+            try:
+                result = handler(job.payload, job)
+                job.future.set_result(result)
+            except Exception as e:
+                debug_log(f"خطا در اجرای کار {job.job_id} ({job.kind}): {str(e)}", "ERROR")
+                job.future.set_exception(e)
+            finally:
+                with self._lock:
+                    job.status = "done"
+                    self._jobs.pop(job.job_id, None)
+                    if job.persist:
+                        self._save_queue()
+
+    # --- ثبت و لغو کارها ---
+
+    def submit(self, kind: str, payload: Dict[str, Any], priority: int = JobPriority.NORMAL,
+               user_id: Optional[int] = None, download_id: Optional[int] = None,
+               persist: bool = True) -> DownloadJob:
+        """
+        افزودن کار جدید به صف
+
+        Args:
+            kind: نوع کار (باید پردازشگر آن ثبت شده باشد یا بعدا ثبت شود)
+            payload: داده‌های کار (برای کارهای پایدار باید قابل تبدیل به JSON باشد)
+            priority: اولویت کار (عدد کمتر = اولویت بیشتر)
+            user_id: شناسه کاربر (اختیاری)
+            download_id: شناسه دانلود در دیتابیس (اختیاری)
+            persist: ذخیره کار در فایل صف
+
+        Returns:
+            کار ثبت شده
+        """
+        with self._cond:
+            job = DownloadJob(self._next_id, kind, payload, priority, user_id, download_id, persist)
+            self._next_id += 1
+            self._jobs[job.job_id] = job
+            heapq.heappush(self._heap, (priority, next(self._seq), job.job_id))
+
+            if persist:
+                self._save_queue()
+
+            self._cond.notify()
+
+        self.start()
+        debug_log(f"کار {job.job_id} ({kind}) با اولویت {priority} به صف اضافه شد", "INFO")
+        return job
+
+    def get_position(self, job_id: int) -> int:
+        """
+        دریافت جایگاه کار در صف
+
+        Args:
+            job_id: شناسه کار
+
+        Returns:
+            جایگاه (از 1)، 0 اگر در حال اجراست و -1 اگر یافت نشد
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+            if job is None:
+                return -1
+            if job.status == "running":
+                return 0
+
+            ahead = sorted(
+                entry for entry in self._heap
+                if entry[2] in self._jobs and self._jobs[entry[2]].status == "queued"
+            )
+
+            for position, entry in enumerate(ahead, 1):
+                if entry[2] == job_id:
+                    return position
+
+            return -1
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        لغو کاری که هنوز شروع نشده است
+
+        Args:
+            job_id: شناسه کار
+
+        Returns:
+            True اگر کار از صف حذف شد
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+            if job is None or job.status != "queued":
+                return False
+
+            job.status = "canceled"
+            del self._jobs[job_id]
+            if job.persist:
+                self._save_queue()
+
+        job.future.cancel()
+        debug_log(f"کار {job_id} از صف دانلود حذف شد", "INFO")
+        return True
+
+    def cancel_by_download_id(self, download_id: int) -> bool:
+        """
+        لغو کار در انتظار مربوط به یک دانلود
+
+        Args:
+            download_id: شناسه دانلود در دیتابیس
+
+        Returns:
+            True اگر کاری از صف حذف شد
+        """
+        with self._lock:
+            job_ids = [job.job_id for job in self._jobs.values() if job.download_id == download_id]
+
+        return any([self.cancel(job_id) for job_id in job_ids])
+
+    def update_payload(self, job: DownloadJob, **fields) -> None:
+        """
+        افزودن داده به کار و ذخیره آن در فایل صف (مثلا فرمت دانلود برای ادامه پس از راه‌اندازی مجدد)
+
+        Args:
+            job: کار
+            **fields: مقادیر جدید payload
+        """
+        with self._lock:
+            job.payload.update(fields)
+            if job.persist and job.job_id in self._jobs:
+                self._save_queue()
+
+    def drop_unhandled_jobs(self) -> List[DownloadJob]:
+        """
+        حذف کارهای بارگیری شده از فایل صف که پردازشگری برای نوعشان ثبت نشده است
+
+        باید پس از ثبت پردازشگرهای برنامه فراخوانی شود؛ در غیر این صورت این کارها
+        برای همیشه در صف در انتظار می‌مانند.
+
+        Returns:
+            لیست کارهای حذف شده (شکست خورده)
+        """
+        with self._lock:
+            dropped = [job for job in self._jobs.values()
+                       if job.status == "queued" and job.kind not in self._handlers]
+            for job in dropped:
+                job.status = "failed"
+                self._jobs.pop(job.job_id, None)
+                job.future.set_exception(RuntimeError(f"پردازشگری برای کار {job.kind} ثبت نشده است"))
+            if dropped:
+                self._save_queue()
+
+        for job in dropped:
+            debug_log(f"کار {job.job_id} از نوع ناشناخته {job.kind} از صف حذف شد", "WARNING")
+        return dropped
+
+    # --- محدودیت همزمانی مراحل ---
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        محدود کردن تعداد کارهای همزمان در یک مرحله
+
+        Args:
+            name: نام مرحله (extract، download، upload)
+        """
+        semaphore = self._stage_semaphores.get(name)
+
+        if semaphore is None:
+            yield
+            return
+
+        semaphore.acquire()
+        with self._lock:
+            self._stage_active[name] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._stage_active[name] -= 1
+            semaphore.release()
+
+    def has_download(self, download_id: int) -> bool:
+        """
+        بررسی وجود کار در انتظار یا در حال اجرا برای یک دانلود
+
+        Args:
+            download_id: شناسه دانلود
+
+        Returns:
+            True اگر کاری برای این دانلود در صف باشد
+        """
+        with self._lock:
+            return any(job.download_id == download_id for job in self._jobs.values())
+
+    # --- آمار ---
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        دریافت آمار صف دانلود
+
+        Returns:
+            دیکشنری آمار
+        """
+        with self._lock:
+            queued = [job for job in self._jobs.values() if job.status == "queued"]
+            running = [job for job in self._jobs.values() if job.status == "running"]
+
+            return {
+                "workers": self.num_workers,
+                "queued": len(queued),
+                "running": len(running),
+                "oldest_wait": int(time.time() - min((job.submitted_at for job in queued), default=time.time())),
+                "stages": {
+                    stage: {"active": self._stage_active[stage], "limit": limit}
+                    for stage, limit in self._stage_limits.items()
+                },
+            }
+
+    def get_queued_jobs(self) -> List[DownloadJob]:
+        """دریافت کارهای در انتظار به ترتیب اجرا"""
+        with self._lock:
+            return [
+                self._jobs[entry[2]] for entry in sorted(self._heap)
+                if entry[2] in self._jobs and self._jobs[entry[2]].status == "queued"
+            ]
+
+
+# نمونه سراسری زمان‌بند دانلود
+download_scheduler = DownloadScheduler()
@@ -2,7 +2,7 @@ import os
 import re
 import asyncio
 import logging
-from typing import Tuple, Optional
+from typing import Tuple, Optional, List
 
 # تنظیم لاگینگ
 logging.basicConfig(level=logging.INFO)
@@ -43,9 +43,9 @@ class YouTubeDownloader:
             return True
         return False
     
-    async def download(self, url) -> Tuple[str, str]:
+    def download_sync(self, url) -> Tuple[str, str]:
         """
-        دانلود ویدیوی یوتیوب
+        دانلود ویدیوی یوتیوب در ترد فعلی (برای کارگرهای صف دانلود)
 
         Args:
             url (str): آدرس ویدیوی یوتیوب
@@ -73,16 +73,30 @@ class YouTubeDownloader:
                 'restrictfilenames': True
             }
             
-            # اجرای دانلود به صورت غیرهمزمان
-            loop = asyncio.get_event_loop()
             logger.info(f"Starting download for URL: {url}")
             
-            def extract_info():
+            from ytdlp_pool import ytdlp_pool, is_process_mode
+            from segmented_downloader import segmented_downloader, plan_from_info
+            from config import SEGMENTED_DOWNLOAD
+
+            if is_process_mode():
+                # اجرا در پروسه کارگر جداگانه تا پروسه ربات پاسخگو بماند
+                info_dict = ytdlp_pool.run("extract_and_download", (url, ydl_opts))
+            else:
                 with YoutubeDL(ydl_opts) as ydl:
-                    return ydl.extract_info(url, download=True)
+                    info_dict = ydl.extract_info(url, download=False)
 
-            # اجرای عملیات دانلود در یک thread جداگانه
-            info_dict = await loop.run_in_executor(None, extract_info)
+                    # فرمت‌های تک فایلی با چند اتصال موازی دانلود می‌شوند
+                    plan = plan_from_info(info_dict, ydl_opts) if SEGMENTED_DOWNLOAD else None
+                    if plan:
+                        file_path = segmented_downloader.download(
+                            plan["url"], plan["filename"], plan["headers"], total_size=plan["filesize"]
+                        )
+                        title = info_dict.get('title', 'Unknown')
+                        logger.info(f"Segmented download completed: {file_path}")
+                        return file_path, title
+
+                    ydl.process_ie_result(info_dict, download=True)
             
             # دریافت اطلاعات ویدیو
             title = info_dict.get('title', 'Unknown')
@@ -102,6 +116,41 @@ class YouTubeDownloader:
             logger.error(f"Error in YouTube download: {str(e)}")
             raise Exception(f"خطا در دانلود: {str(e)}")
 
+    async def download(self, url) -> Tuple[str, str]:
+        """
+        دانلود ویدیوی یوتیوب
+
+        Args:
+            url (str): آدرس ویدیوی یوتیوب
+
+        Returns:
+            Tuple[str, str]: (مسیر فایل دانلود شده, عنوان ویدیو)
+
+        Raises:
+            Exception: در صورت بروز خطا در دانلود
+        """
+        # اجرای عملیات دانلود در یک thread جداگانه
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.download_sync, url)
+
+def get_instagram_shortcode(url: str) -> Optional[str]:
+    """
+    استخراج شناسه پست از آدرس اینستاگرام
+    
+    Args:
+        url (str): آدرس پست
+        
+    Returns:
+        Optional[str]: شناسه پست یا None
+    """
+    match = re.search(r'instagram.com/(?:p|reel)/([^/?]+)', url)
+    return match.group(1) if match else None
+
+def _media_order(filename: str) -> Tuple[int, str]:
+    """کلید مرتب‌سازی فایل‌های instaloader بر اساس شماره رسانه در پست"""
+    match = re.search(r'_(\d+)\.\w+$', filename)
+    return (int(match.group(1)) if match else 0, filename)
+
 class InstagramDownloader:
     def __init__(self, temp_dir):
         """
@@ -118,7 +167,7 @@ class InstagramDownloader:
     
     async def download(self, url) -> Tuple[str, str]:
         """
-        دانلود پست اینستاگرام
+        دانلود پست اینستاگرام (فقط یک فایل؛ برای همه رسانه‌ها download_all)
         
         Args:
             url (str): آدرس پست اینستاگرام
@@ -126,6 +175,28 @@ class InstagramDownloader:
         Returns:
             Tuple[str, str]: (مسیر فایل دانلود شده, عنوان پست)
             
+        Raises:
+            Exception: در صورت بروز خطا در دانلود
+        """
+        media_files, title = await self.download_all(url)
+        
+        # ترجیح دادن فایل‌های ویدیویی به تصاویر
+        video_files = [f for f in media_files if f.endswith(('.mp4', '.mov'))]
+        file_path = video_files[0] if video_files else media_files[0]
+        
+        logger.info(f"Instagram download completed: {file_path}")
+        return file_path, title
+    
+    async def download_all(self, url) -> Tuple[List[str], str]:
+        """
+        دانلود همه رسانه‌های پست اینستاگرام (پست‌های چندتایی)
+        
+        Args:
+            url (str): آدرس پست اینستاگرام
+            
+        Returns:
+            Tuple[List[str], str]: (مسیر فایل‌های دانلود شده به ترتیب پست, عنوان پست)
+            
         Raises:
             Exception: در صورت بروز خطا در دانلود
         """
@@ -133,10 +204,7 @@ class InstagramDownloader:
             import instaloader
             
             # استخراج شناسه پست از URL
-            shortcode = None
-            match = re.search(r'instagram.com/(?:p|reel)/([^/?]+)', url)
-            if match:
-                shortcode = match.group(1)
+            shortcode = get_instagram_shortcode(url)
             
             if not shortcode:
                 raise Exception("شناسه پست اینستاگرام یافت نشد")
@@ -168,8 +236,8 @@ class InstagramDownloader:
             # اجرای عملیات دانلود در یک thread جداگانه
             username, caption = await loop.run_in_executor(None, download_post)
             
-            # یافتن فایل دانلود شده
-            files = os.listdir(download_dir)
+            # یافتن فایل‌های دانلود شده به ترتیب پست (shortcode_1، shortcode_2، ...)
+            files = sorted(os.listdir(download_dir), key=_media_order)
             media_files = [f for f in files if f.endswith(('.jpg', '.mp4', '.mov'))]
             
             if not media_files:
@@ -198,15 +266,7 @@ class InstagramDownloader:
             if not valid_files:
                 raise Exception("No valid media files found in the Instagram post")
                 
-            # استفاده از اولین فایل معتبر
-            file_path = os.path.join(download_dir, valid_files[0])
-            
-            # ترجیح دادن فایل‌های ویدیویی به تصاویر
-            video_files = [f for f in media_files if f.endswith(('.mp4', '.mov'))]
-            if video_files:
-                file_path = os.path.join(download_dir, video_files[0])
-            else:
-                file_path = os.path.join(download_dir, media_files[0])
+            file_paths = [os.path.join(download_dir, file) for file in valid_files]
             
             # ایجاد عنوان مناسب
             title = f"Post by {username}"
@@ -214,8 +274,8 @@ class InstagramDownloader:
                 short_caption = caption[:50] + "..." if len(caption) > 50 else caption
                 title = f"{title} - {short_caption}"
                 
-            logger.info(f"Instagram download completed: {file_path}")
-            return file_path, title
+            logger.info(f"Instagram download completed: {len(file_paths)} files")
+            return file_paths, title
             
         except Exception as e:
             logger.error(f"Error in Instagram download: {str(e)}")
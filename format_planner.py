@@ -0,0 +1,245 @@
+"""
+ماژول انتخاب فرمت بر اساس حجم
+
+پیش از شروع دانلود، حجم هر فرمت (یا ترکیب ویدیو + صدا) از روی filesize،
+filesize_approx یا در نبود آن‌ها از بیت‌ریت × مدت زمان تخمین زده می‌شود و
+بهترین کیفیتی که در محدودیت ارسال کاربر (عادی، ویژه یا سرور Bot API محلی)
+جا می‌شود انتخاب می‌شود. اگر کیفیت درخواستی بزرگتر از حد مجاز باشد به کیفیت
+پایین‌تر تغییر می‌کند و اگر هیچ گزینه‌ای جا نشود درخواست پیش از دریافت حتی
+یک بایت رد می‌شود، مگر اینکه فشرده‌سازی یا (برای فراخوان‌هایی که بخش‌ها را ارسال می‌کنند) تقسیم به چند بخش ممکن باشد.
+"""
+
+from typing import Dict, Any, Optional, List
+
+from config import (
+    REGULAR_DELIVERY_LIMIT_MB, PREMIUM_DELIVERY_LIMIT_MB, FORMAT_SIZE_MARGIN,
+    TRANSCODE_TO_FIT, TRANSCODE_SOURCE_MAX_HEIGHT, SPLIT_OVERSIZED, SPLIT_MAX_PARTS
+)
+from debug_logger import debug_log
+from uploader import get_upload_limit
+
+# کدک‌هایی که بدون تبدیل در کانتینر mp4 قابل پخش در تلگرام هستند
+MP4_VIDEO_CODECS = ("avc1", "h264")
+MP4_AUDIO_EXTENSIONS = ("m4a", "mp4")
+
+
+def get_delivery_limit(user_id: Optional[int] = None) -> int:
+    """
+    حداکثر حجم فایل قابل ارسال برای یک کاربر
+
+    Args:
+        user_id: شناسه کاربر (اختیاری)
+
+    Returns:
+        حجم به بایت (حداقل محدودیت کاربر و محدودیت سرور Bot API)
+    """
+    limit_mb = REGULAR_DELIVERY_LIMIT_MB
+    if user_id is not None:
+        try:
+            from user_management import is_premium
+            if is_premium(user_id):
+                limit_mb = PREMIUM_DELIVERY_LIMIT_MB
+        except Exception as e:
+            debug_log(f"خطا در بررسی کاربر ویژه برای محدودیت حجم: {str(e)}", "WARNING")
+
+    return min(limit_mb * 1024 * 1024, get_upload_limit())
+
+
+def estimate_format_size(fmt: Dict[str, Any], duration: Optional[float]) -> Optional[int]:
+    """
+    تخمین حجم یک فرمت
+
+    Args:
+        fmt: دیکشنری فرمت yt-dlp
+        duration: مدت زمان ویدیو به ثانیه
+
+    Returns:
+        حجم تخمینی به بایت یا None در صورت نامشخص بودن
+    """
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return int(size)
+
+    # بیت‌ریت به کیلوبیت بر ثانیه است
+    bitrate = fmt.get("tbr") or ((fmt.get("vbr") or 0) + (fmt.get("abr") or 0))
+    if bitrate and duration:
+        return int(bitrate * 1000 / 8 * duration)
+    return None
+
+
+def _has_video(fmt: Dict[str, Any]) -> bool:
+    return fmt.get("vcodec") not in (None, "none")
+
+
+def _has_audio(fmt: Dict[str, Any]) -> bool:
+    return fmt.get("acodec") not in (None, "none")
+
+
+def _video_rank(fmt: Dict[str, Any]):
+    """کلید مرتب‌سازی کیفیت ویدیو (ارتفاع، سازگاری با mp4، بیت‌ریت)"""
+    codec = (fmt.get("vcodec") or "").lower()
+    return (fmt.get("height") or 0, codec.startswith(MP4_VIDEO_CODECS), fmt.get("tbr") or fmt.get("vbr") or 0)
+
+
+def _best_audio(formats: List[Dict[str, Any]], duration: Optional[float]) -> Optional[Dict[str, Any]]:
+    """بهترین فرمت فقط صوتی (ترجیحا m4a برای ادغام در mp4)"""
+    audios = [f for f in formats if _has_audio(f) and not _has_video(f)]
+    if not audios:
+        return None
+    return max(audios, key=lambda f: (f.get("ext") in MP4_AUDIO_EXTENSIONS,
+                                      estimate_format_size(f, duration) is not None,
+                                      f.get("abr") or f.get("tbr") or 0))
+
+
+def build_candidates(video_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    ساخت گزینه‌های قابل دانلود (فرمت تک فایلی یا ترکیب ویدیو + صدا) به ترتیب کیفیت
+
+    Args:
+        video_info: دیکشنری اطلاعات ویدیو
+
+    Returns:
+        لیست گزینه‌ها: {"format", "height", "size", "merged", "video_id"}
+    """
+    formats = video_info.get("formats") or []
+    duration = video_info.get("duration")
+    audio = _best_audio(formats, duration)
+    audio_size = estimate_format_size(audio, duration) if audio else None
+
+    candidates = []
+    for fmt in sorted((f for f in formats if _has_video(f)), key=_video_rank, reverse=True):
+        size = estimate_format_size(fmt, duration)
+
+        if _has_audio(fmt):
+            candidates.append({"format": fmt["format_id"], "height": fmt.get("height"),
+                               "size": size, "merged": False, "video_id": fmt["format_id"]})
+        elif audio:
+            total = size + audio_size if size is not None and audio_size is not None else None
+            candidates.append({"format": f"{fmt['format_id']}+{audio['format_id']}", "height": fmt.get("height"),
+                               "size": total, "merged": True, "video_id": fmt["format_id"]})
+
+    return candidates
+
+
+def plan_format(video_info: Dict[str, Any], quality: str = "best",
+                limit: Optional[int] = None, allow_split: bool = False) -> Dict[str, Any]:
+    """
+    انتخاب فرمت دانلود با توجه به محدودیت حجم
+
+    Args:
+        video_info: دیکشنری اطلاعات ویدیو
+        quality: کیفیت درخواستی (best، audio یا شناسه فرمت)
+        limit: حداکثر حجم به بایت (پیش‌فرض: محدودیت کاربر عادی)
+        allow_split: امکان ارسال در چند بخش (فقط برای فراخوان‌هایی که بخش‌ها را ارسال می‌کنند)
+
+    Returns:
+        دیکشنری برنامه: format (عبارت فرمت yt-dlp یا None برای بدون تغییر)، estimated_size،
+        height، merged، downgraded، transcode (فشرده‌سازی پس از دانلود تا حجم target_size)،
+        split (ارسال در چند بخش)، rejected و error (در صورت رد شدن)
+    """
+    if limit is None:
+        limit = get_delivery_limit()
+    budget = limit / FORMAT_SIZE_MARGIN
+    plan = {"format": None, "estimated_size": None, "height": None, "merged": False,
+            "downgraded": False, "transcode": False, "target_size": None, "split": False,
+            "rejected": False, "error": None}
+
+    formats = video_info.get("formats") or []
+    duration = video_info.get("duration")
+
+    # فقط صدا
+    requested = next((f for f in formats if f.get("format_id") == quality), None)
+    if quality == "audio" or (requested and _has_audio(requested) and not _has_video(requested)):
+        audio = requested if requested and not _has_video(requested) else _best_audio(formats, duration)
+        if audio:
+            size = estimate_format_size(audio, duration)
+            plan.update(format=audio["format_id"], estimated_size=size)
+            if size is not None and size > budget:
+                plan.update(rejected=True, error=_too_large_error(size, limit))
+        return plan
+
+    candidates = build_candidates(video_info)
+    if not candidates:
+        return plan
+
+    # گزینه‌های مجاز: کیفیت درخواستی یا پایین‌تر
+    if requested and _has_video(requested):
+        max_height = requested.get("height") or 0
+        preferred = [c for c in candidates if c["video_id"] == quality]
+        allowed = preferred + [c for c in candidates if c["video_id"] != quality and (c["height"] or 0) <= max_height]
+    else:
+        allowed = candidates
+
+    known = [c for c in allowed if c["size"] is not None]
+    if not known:
+        # حجم هیچ گزینه‌ای مشخص نیست؛ انتخاب پیش‌فرض yt-dlp حفظ می‌شود
+        return plan
+
+    # کیفیت درخواستی (یا بهترین) با حجم نامشخص جا شده فرض می‌شود؛ کاهش کیفیت فقط وقتی
+    # انجام می‌شود که حجم آن قطعا بیشتر از حد مجاز باشد
+    fitting = next((c for c in allowed
+                    if (c["size"] is None and c is allowed[0]) or (c["size"] is not None and c["size"] <= budget)),
+                   None)
+    if fitting is None:
+        source = _transcode_source(known, duration, limit)
+        if source is not None:
+            # هیچ فرمتی جا نمی‌شود؛ دانلود کیفیت مناسب و فشرده‌سازی پس از دانلود
+            plan.update(format=source["format"], estimated_size=source["size"], height=source["height"],
+                        merged=source["merged"], downgraded=True, transcode=True, target_size=int(budget))
+            debug_log(f"هیچ فرمتی در {limit} بایت جا نمی‌شود؛ دانلود {source['format']} و فشرده‌سازی", "INFO")
+            return plan
+
+        source = _split_source(known, duration, budget) if allow_split else None
+        if source is not None:
+            # ارسال با کیفیت کامل در چند بخش (برش با کپی جریان پس از دانلود)
+            plan.update(format=source["format"], estimated_size=source["size"], height=source["height"],
+                        merged=source["merged"], downgraded=source is not allowed[0], split=True)
+            debug_log(f"هیچ فرمتی در {limit} بایت جا نمی‌شود؛ دانلود {source['format']} و ارسال در چند بخش", "INFO")
+            return plan
+
+        smallest = min(c["size"] for c in known)
+        plan.update(rejected=True, estimated_size=smallest, error=_too_large_error(smallest, limit))
+        return plan
+
+    plan.update(format=fitting["format"], estimated_size=fitting["size"], height=fitting["height"],
+                merged=fitting["merged"], downgraded=fitting is not allowed[0])
+
+    if plan["downgraded"]:
+        debug_log(f"کیفیت به دلیل حجم به {fitting['height']}p ({fitting['format']}) کاهش یافت؛ "
+                  f"حجم تخمینی {fitting['size']} بایت از حداکثر {limit}", "INFO")
+    return plan
+
+
+def _transcode_source(candidates: List[Dict[str, Any]], duration: Optional[float],
+                      limit: int) -> Optional[Dict[str, Any]]:
+    """انتخاب فرمت دانلود برای فشرده‌سازی (بهترین کیفیت تا TRANSCODE_SOURCE_MAX_HEIGHT)"""
+    if not TRANSCODE_TO_FIT or not duration:
+        return None
+
+    from transcoder import compute_target_bitrates, is_available
+    if not is_available() or compute_target_bitrates(duration, int(limit / FORMAT_SIZE_MARGIN)) is None:
+        return None
+
+    within_height = [c for c in candidates if (c["height"] or 0) <= TRANSCODE_SOURCE_MAX_HEIGHT]
+    if within_height:
+        return within_height[0]
+    return min(candidates, key=lambda c: c["size"])
+
+
+def _split_source(candidates: List[Dict[str, Any]], duration: Optional[float],
+                  budget: float) -> Optional[Dict[str, Any]]:
+    """انتخاب بهترین فرمتی که در حداکثر SPLIT_MAX_PARTS بخش ارسال شود"""
+    if not SPLIT_OVERSIZED or not duration:
+        return None
+
+    from video_splitter import is_available
+    if not is_available():
+        return None
+
+    return next((c for c in candidates if c["size"] <= budget * SPLIT_MAX_PARTS), None)
+
+
+def _too_large_error(size: int, limit: int) -> str:
+    """متن خطای حجم بیش از حد مجاز"""
+    return (f"حجم ویدیو (حدود {size / 1024 / 1024:.0f} مگابایت) بیشتر از حداکثر حجم قابل ارسال "
+            f"({limit // (1024 * 1024)} مگابایت) است")
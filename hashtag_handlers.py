@@ -15,6 +15,7 @@ except ImportError:
         print(f"{level}: {message}")
 
 from hashtag_manager import hashtag_manager, load_hashtags, save_hashtags
+from progress_renderer import progress_renderer
 
 # حداکثر تعداد پیام‌ها برای ارسال
 MAX_SEND_MESSAGES = 15
@@ -330,28 +331,25 @@ def search_hashtag_in_channels(bot, message, hashtag, processing_msg_id):
     """
     try:
         # تابع گزارش پیشرفت
+        # (فقط آخرین وضعیت ثبت و حداکثر هر چند ثانیه یک بار ارسال می‌شود)
         def progress_callback(processed, found_count, total, error_msg=None):
-            try:
-                if error_msg:
-                    bot.edit_message_text(
-                        error_msg,
-                        chat_id=message.chat.id,
-                        message_id=processing_msg_id
-                    )
-                    return
-                
-                bot.edit_message_text(
-                    f"🔍 در حال جستجوی {total} کانال برای هشتگ {hashtag}...\n"
-                    f"پیشرفت: {processed+1}/{total} کانال\n"
-                    f"تعداد پیام‌های یافته شده: {found_count}",
-                    chat_id=message.chat.id,
-                    message_id=processing_msg_id
-                )
-            except Exception as e:
-                debug_log(f"خطا در به‌روزرسانی پیام پیشرفت: {e}", "ERROR")
+            if error_msg:
+                progress_renderer.update(bot, message.chat.id, processing_msg_id, error_msg)
+                return
+            
+            progress_renderer.update(
+                bot, message.chat.id, processing_msg_id,
+                f"🔍 در حال جستجوی {total} کانال برای هشتگ {hashtag}...\n"
+                f"پیشرفت: {processed+1}/{total} کانال\n"
+                f"تعداد پیام‌های یافته شده: {found_count}"
+            )
         
         # جستجو در کانال‌ها
-        found_messages = hashtag_manager.search_hashtag_in_channels(hashtag, progress_callback)
+        try:
+            found_messages = hashtag_manager.search_hashtag_in_channels(hashtag, progress_callback)
+        finally:
+            # پیام پیشرفت با نتیجه جستجو جایگزین یا حذف می‌شود
+            progress_renderer.cancel(message.chat.id, processing_msg_id)
         
         # نمایش نتایج
         if found_messages:
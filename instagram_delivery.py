@@ -0,0 +1,178 @@
+"""
+ماژول ارسال پست‌های اینستاگرام
+
+همه رسانه‌های یک پست چندتایی (carousel) به صورت آلبوم‌های حداکثر 10 تایی با
+sendMediaGroup ارسال می‌شوند، یعنی یک درخواست به جای یک درخواست برای هر
+فایل. file_id رسانه‌هایی که قبلا ارسال شده‌اند در دیتابیس نگهداری و دوباره
+استفاده می‌شود. اگر چت پیش‌آپلود (INSTAGRAM_CACHE_CHAT_ID) تنظیم شده باشد،
+رسانه‌های جدید به صورت موازی در آن چت آپلود می‌شوند و آلبوم فقط با file_id ها
+ساخته می‌شود.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple
+
+from config import INSTAGRAM_CACHE_CHAT_ID, INSTAGRAM_UPLOAD_WORKERS
+from database import get_telegram_file, save_telegram_file
+from debug_logger import debug_log
+from uploader import telegram_uploader, UploadError
+
+# حداکثر تعداد رسانه در هر آلبوم تلگرام
+MEDIA_GROUP_LIMIT = 10
+
+# پسوند فایل‌های ویدیویی
+VIDEO_EXTENSIONS = ('.mp4', '.mov')
+
+# فرمت ثابت برای کلید ذخیره file_id رسانه‌های اینستاگرام
+CACHE_FORMAT = "original"
+
+
+def media_kind(file_path: str) -> str:
+    """نوع رسانه تلگرام بر اساس پسوند فایل (video یا photo)"""
+    return "video" if file_path.lower().endswith(VIDEO_EXTENSIONS) else "photo"
+
+
+def _cache_key(shortcode: str, index: int) -> str:
+    """کلید ذخیره file_id یک رسانه از پست"""
+    return f"instagram:{shortcode}:{index}"
+
+
+def _message_file(message: Dict[str, Any], kind: str) -> Optional[Tuple[str, str, Optional[int]]]:
+    """
+    استخراج file_id از پیام ارسال شده
+
+    Returns:
+        (file_id، file_unique_id، حجم) یا None
+    """
+    media = message.get(kind)
+    if isinstance(media, list):
+        # برای عکس‌ها بزرگترین اندازه آخرین مورد است
+        media = media[-1] if media else None
+    if not media:
+        return None
+    return media["file_id"], media["file_unique_id"], media.get("file_size")
+
+
+class InstagramDelivery:
+    """
+    ارسال رسانه‌های یک پست اینستاگرام به صورت آلبوم
+    """
+
+    def __init__(self, uploader=telegram_uploader, cache_chat_id: int = INSTAGRAM_CACHE_CHAT_ID,
+                 workers: int = INSTAGRAM_UPLOAD_WORKERS):
+        self.uploader = uploader
+        self.cache_chat_id = cache_chat_id
+        self.workers = max(1, workers)
+
+    def deliver(self, chat_id: int, shortcode: str, media_files: List[str],
+                caption: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        ارسال همه رسانه‌های یک پست
+
+        Args:
+            chat_id: شناسه چت
+            shortcode: شناسه پست اینستاگرام
+            media_files: مسیر فایل‌ها به ترتیب پست
+            caption: کپشن (روی اولین رسانه)
+
+        Returns:
+            لیست پیام‌های ارسال شده
+        """
+        items = [
+            {"index": index, "path": path, "kind": media_kind(path), "file_id": None, "cached": False}
+            for index, path in enumerate(media_files)
+        ]
+
+        # استفاده مجدد از file_id رسانه‌هایی که قبلا ارسال شده‌اند
+        for item in items:
+            cached = get_telegram_file(_cache_key(shortcode, item["index"]), CACHE_FORMAT, item["kind"])
+            if cached:
+                item["file_id"] = cached["file_id"]
+                item["cached"] = True
+
+        self._preupload(shortcode, items)
+
+        messages = []
+        for start in range(0, len(items), MEDIA_GROUP_LIMIT):
+            group = items[start:start + MEDIA_GROUP_LIMIT]
+            group_caption = caption if start == 0 else None
+
+            try:
+                sent = self._send_group(chat_id, group, group_caption)
+            except UploadError as e:
+                if not any(item["cached"] for item in group):
+                    raise
+                # file_id ذخیره شده ممکن است نامعتبر شده باشد؛ ارسال دوباره با فایل‌ها
+                debug_log(f"ارسال آلبوم با file_id ناموفق بود، ارسال با فایل: {str(e)}", "WARNING")
+                for item in group:
+                    item["file_id"] = None
+                    item["cached"] = False
+                sent = self._send_group(chat_id, group, group_caption)
+
+            # ذخیره file_id رسانه‌هایی که در همین آلبوم آپلود شدند
+            for item, message in zip(group, sent):
+                if not item["file_id"]:
+                    self._remember(shortcode, item, message)
+
+            messages.extend(sent)
+
+        reused = sum(1 for item in items if item["cached"])
+        debug_log(f"پست اینستاگرام {shortcode} با {len(items)} رسانه ارسال شد ({reused} از کش)", "INFO")
+        return messages
+
+    def _preupload(self, shortcode: str, items: List[Dict[str, Any]]) -> None:
+        """آپلود موازی رسانه‌های جدید در چت پیش‌آپلود برای گرفتن file_id"""
+        pending = [item for item in items if not item["file_id"]]
+
+        if not self.cache_chat_id or len(pending) < 2:
+            return
+
+        def upload(item):
+            message = self.uploader.send_file(item["kind"], self.cache_chat_id, item["path"],
+                                              disable_notification=True)
+            return item, message
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as executor:
+            futures = [executor.submit(upload, item) for item in pending]
+            for future in futures:
+                try:
+                    item, message = future.result()
+                    self._remember(shortcode, item, message)
+                except Exception as e:
+                    # این رسانه همراه آلبوم آپلود می‌شود
+                    debug_log(f"خطا در پیش‌آپلود رسانه اینستاگرام: {str(e)}", "WARNING")
+
+    def _remember(self, shortcode: str, item: Dict[str, Any], message: Dict[str, Any]) -> None:
+        """ذخیره file_id رسانه ارسال شده"""
+        media = _message_file(message, item["kind"])
+        if not media:
+            return
+
+        item["file_id"] = media[0]
+        save_telegram_file(_cache_key(shortcode, item["index"]), CACHE_FORMAT, item["kind"],
+                           media[0], media[1], media[2])
+
+    def _send_group(self, chat_id: int, group: List[Dict[str, Any]],
+                    caption: Optional[str]) -> List[Dict[str, Any]]:
+        """ارسال یک آلبوم (یا یک رسانه تکی) و برگرداندن پیام‌ها"""
+        if len(group) == 1:
+            item = group[0]
+            if item["file_id"]:
+                method = "sendVideo" if item["kind"] == "video" else "sendPhoto"
+                return [self.uploader.call(method, chat_id=chat_id, caption=caption, **{item["kind"]: item["file_id"]})]
+            return [self.uploader.send_file(item["kind"], chat_id, item["path"], caption=caption)]
+
+        media = []
+        for position, item in enumerate(group):
+            entry = {"type": item["kind"], "caption": caption if position == 0 else None}
+            if item["file_id"]:
+                entry["media"] = item["file_id"]
+            else:
+                entry["path"] = item["path"]
+            media.append(entry)
+
+        return self.uploader.send_media_group(chat_id, media)
+
+
+# نمونه سراسری
+instagram_delivery = InstagramDelivery()
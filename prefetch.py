@@ -0,0 +1,285 @@
+"""
+ماژول پیش‌واکشی حدسی
+
+بین نمایش دکمه‌های کیفیت و انتخاب کاربر معمولا چند ثانیه فاصله است. در این
+فاصله کیفیت محتمل (پرکاربردترین کیفیت در دانلودهای اخیر همان کاربر، یا در
+نبود آن همه کاربران) با اولویت پایین در صف دانلود شروع می‌شود. دانلود
+پیش‌واکشی از همان مسیر یکپارچه‌سازی دانلودها عبور می‌کند؛ اگر کاربر همان
+کیفیت را انتخاب کند دانلود واقعی به دانلود در حال انجام متصل می‌شود یا فایل
+تکمیل شده را دوباره استفاده می‌کند و در غیر این صورت پیش‌واکشی لغو می‌شود.
+
+دانلودهای پیش‌واکشی شناسه منفی دارند و در دیتابیس ثبت نمی‌شوند.
+"""
+
+import os
+import time
+import itertools
+import threading
+from typing import Dict, Any, Optional, List
+
+from config import (
+    PREFETCH_ENABLED, PREFETCH_TTL, PREFETCH_MAX_SIZE_MB, PREFETCH_RESERVED_WORKERS, PREFETCH_HISTORY,
+    SPLIT_OVERSIZED
+)
+from database import get_quality_counts, get_telegram_file
+from debug_logger import debug_log
+from download_cancellation import cancel_registry
+from download_queue import download_scheduler, JobPriority
+from video_info_cache import get_video_id
+from youtube_downloader import (
+    download_video, cancel_download, active_downloads, active_downloads_lock, MAX_DOWNLOAD_TIME
+)
+
+# نوع کار پیش‌واکشی در صف دانلود
+PREFETCH_JOB_KIND = "prefetch.youtube"
+
+
+class _Prefetch:
+    """یک دانلود پیش‌واکشی"""
+
+    def __init__(self, download_id: int, user_id: int, url: str, video_id: str, quality: str):
+        self.download_id = download_id
+        self.user_id = user_id
+        self.url = url
+        self.video_id = video_id
+        self.quality = quality
+        self.state = "queued"  # queued، running، done، failed، canceled
+        self.file_path = None
+        self.wasted_bytes = 0
+        self.timer = None
+        self.created = time.time()
+
+
+class Prefetcher:
+    """
+    پیش‌واکشی کیفیت محتمل هر کاربر تا زمان انتخاب کیفیت
+    """
+
+    def __init__(self, scheduler=download_scheduler, enabled: bool = PREFETCH_ENABLED,
+                 ttl: float = PREFETCH_TTL, max_size: int = PREFETCH_MAX_SIZE_MB * 1024 * 1024,
+                 reserved_workers: int = PREFETCH_RESERVED_WORKERS):
+        self.scheduler = scheduler
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_size = max_size
+        self.reserved_workers = max(0, reserved_workers)
+        self._lock = threading.Lock()
+        self._entries: Dict[int, _Prefetch] = {}  # user_id -> پیش‌واکشی فعال
+        self._by_download: Dict[int, _Prefetch] = {}  # download_id -> پیش‌واکشی
+        self._ids = itertools.count(1)
+        self._registered = False
+        self.stats = {"started": 0, "skipped": 0, "hits": 0, "partial_hits": 0, "misses": 0,
+                      "unstarted": 0, "unused": 0, "saved_bytes": 0, "wasted_bytes": 0}
+
+    def predict_quality(self, user_id: int, offered: List[str]) -> Optional[str]:
+        """
+        حدس کیفیتی که کاربر انتخاب خواهد کرد
+
+        Args:
+            user_id: شناسه کاربر
+            offered: شناسه کیفیت‌های قابل انتخاب برای این ویدیو
+
+        Returns:
+            پرکاربردترین کیفیت کاربر (یا همه کاربران) که برای این ویدیو موجود است، یا None
+        """
+        for counts in (get_quality_counts(user_id, PREFETCH_HISTORY), get_quality_counts(None, PREFETCH_HISTORY)):
+            for quality, _ in counts:
+                if quality in offered:
+                    return quality
+        return None
+
+    def start(self, user_id: int, url: str, formats: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        شروع پیش‌واکشی پس از نمایش دکمه‌های کیفیت
+
+        Args:
+            user_id: شناسه کاربر
+            url: آدرس ویدیو
+            formats: گزینه‌های نمایش داده شده ({"format_id"، "filesize"}) با همان شناسه دکمه‌ها
+
+        Returns:
+            کیفیت پیش‌واکشی شده یا None
+        """
+        if not self.enabled:
+            return None
+
+        # لینک جدید جایگزین پیش‌واکشی قبلی همین کاربر می‌شود
+        self.discard(user_id)
+
+        video_id = get_video_id(url)
+        sizes = {fmt["format_id"]: fmt.get("filesize") for fmt in formats if fmt.get("format_id")}
+        quality = self.predict_quality(user_id, list(sizes)) if video_id else None
+
+        if quality is None:
+            reason = "کیفیت محتملی یافت نشد"
+        elif get_telegram_file(video_id, quality):
+            reason = "فایل قبلا در تلگرام آپلود شده است"
+        elif not sizes[quality] or sizes[quality] > self.max_size:
+            reason = "حجم فایل نامشخص یا بیش از حد پیش‌واکشی است"
+        elif not self._has_idle_worker():
+            reason = "کارگر آزاد در صف دانلود نیست"
+        else:
+            reason = None
+
+        if reason:
+            with self._lock:
+                self.stats["skipped"] += 1
+            debug_log(f"پیش‌واکشی برای کاربر {user_id} انجام نشد: {reason}", "DEBUG")
+            return None
+
+        entry = _Prefetch(-next(self._ids), user_id, url, video_id, quality)
+        # لغو پیش‌واکشی اگر کاربر کیفیتی انتخاب نکند
+        entry.timer = threading.Timer(self.ttl, self._expire, (user_id, entry))
+        entry.timer.daemon = True
+
+        with self._lock:
+            self._entries[user_id] = entry
+            self._by_download[entry.download_id] = entry
+            self.stats["started"] += 1
+            if not self._registered:
+                self.scheduler.register_handler(PREFETCH_JOB_KIND, self._run_job)
+                self._registered = True
+
+        self.scheduler.submit(
+            PREFETCH_JOB_KIND,
+            {"download_id": entry.download_id, "user_id": user_id, "url": url, "quality": quality},
+            priority=JobPriority.LOW,
+            user_id=user_id,
+            download_id=entry.download_id,
+            persist=False
+        )
+
+        entry.timer.start()
+
+        debug_log(f"پیش‌واکشی {video_id} با کیفیت {quality} برای کاربر {user_id} شروع شد", "INFO")
+        return quality
+
+    def resolve(self, user_id: int, url: str, quality: str) -> Optional[str]:
+        """
+        اعلام انتخاب کاربر؛ پیش‌واکشی ناهمخوان لغو می‌شود
+
+        Args:
+            user_id: شناسه کاربر
+            url: آدرس ویدیو انتخاب شده
+            quality: کیفیت انتخاب شده
+
+        Returns:
+            نتیجه (hits، partial_hits، misses یا unstarted) یا None اگر پیش‌واکشی وجود نداشت
+        """
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return None
+        entry.timer.cancel()
+
+        if entry.video_id == get_video_id(url) and entry.quality == quality and entry.state in ("running", "done"):
+            # دانلود واقعی به همین دانلود متصل می‌شود یا فایل آن را دوباره استفاده می‌کند
+            outcome = "hits" if entry.state == "done" else "partial_hits"
+            with self._lock:
+                self.stats[outcome] += 1
+                self.stats["saved_bytes"] += self._downloaded_bytes(entry)
+            debug_log(f"پیش‌واکشی {entry.video_id} ({quality}) استفاده شد: {outcome}", "INFO")
+            return outcome
+
+        outcome = "misses" if entry.state != "queued" else "unstarted"
+        self._cancel(entry, outcome)
+        return outcome
+
+    def discard(self, user_id: int) -> None:
+        """
+        لغو پیش‌واکشی استفاده نشده کاربر (مثلا با دکمه لغو یا ارسال لینک جدید)
+
+        Args:
+            user_id: شناسه کاربر
+        """
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            entry.timer.cancel()
+            self._cancel(entry, "unused")
+
+    def _expire(self, user_id: int, entry: _Prefetch) -> None:
+        """لغو پیش‌واکشی که کاربر در مهلت تعیین شده کیفیتی برای آن انتخاب نکرد"""
+        with self._lock:
+            if self._entries.get(user_id) is not entry:
+                return
+            del self._entries[user_id]
+        self._cancel(entry, "unused")
+
+    def _cancel(self, entry: _Prefetch, outcome: str) -> None:
+        """لغو یک پیش‌واکشی و ثبت حجم هدر رفته"""
+        with self._lock:
+            state = entry.state
+            entry.state = "canceled"
+            entry.wasted_bytes = self._downloaded_bytes(entry)
+            self.stats[outcome] += 1
+            self.stats["wasted_bytes"] += entry.wasted_bytes
+
+        if state == "queued":
+            # اگر کارگری کار را برداشته باشد، با دیدن وضعیت لغو شده بدون دانلود برمی‌گردد
+            self.scheduler.cancel_by_download_id(entry.download_id)
+        elif state == "running":
+            cancel_download(entry.download_id)
+        debug_log(f"پیش‌واکشی {entry.video_id} ({entry.quality}) لغو شد: {outcome}", "INFO")
+
+    def _downloaded_bytes(self, entry: _Prefetch) -> int:
+        """حجم دریافت شده تا این لحظه برای یک پیش‌واکشی"""
+        if entry.file_path and os.path.exists(entry.file_path):
+            return os.path.getsize(entry.file_path)
+        with active_downloads_lock:
+            info = active_downloads.get(entry.download_id)
+            return (info or {}).get("downloaded_bytes") or 0
+
+    def _has_idle_worker(self) -> bool:
+        """بررسی وجود کارگر آزاد (به جز کارگرهای رزرو شده برای دانلودهای واقعی)"""
+        stats = self.scheduler.get_stats()
+        return stats["queued"] == 0 and stats["running"] < stats["workers"] - self.reserved_workers
+
+    def _run_job(self, payload: Dict[str, Any], job) -> None:
+        """پردازشگر کار پیش‌واکشی در صف دانلود"""
+        with self._lock:
+            entry = self._by_download.get(payload["download_id"])
+            if entry is None or entry.state != "queued":
+                self._by_download.pop(payload["download_id"], None)
+                return
+            # توکن لغو پیش از وضعیت running ثبت می‌شود تا لغوی که پیش از ثبت دانلود در
+            # active_downloads برسد (cancel_download) دانلود را متوقف کند
+            cancel_token = cancel_registry.register(payload["download_id"], MAX_DOWNLOAD_TIME)
+            entry.state = "running"
+
+        try:
+            # همان برنامه فرمت دانلود واقعی bot_handlers (با امکان ارسال چند بخشی)
+            success, file_path, _ = download_video(
+                payload["url"], payload["download_id"], payload["user_id"], payload["quality"],
+                allow_split=SPLIT_OVERSIZED, cancel_token=cancel_token
+            )
+        finally:
+            cancel_registry.unregister(payload["download_id"])
+            with self._lock:
+                self._by_download.pop(payload["download_id"], None)
+
+        with self._lock:
+            if entry.state == "running":
+                entry.state = "done" if success else "failed"
+            if success and file_path:
+                entry.file_path = file_path
+                if entry.state == "canceled":
+                    # پیش‌واکشی همزمان با لغو کامل شد؛ کل فایل هدر رفته است
+                    self.stats["wasted_bytes"] += max(0, os.path.getsize(file_path) - entry.wasted_bytes)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        دریافت آمار پیش‌واکشی
+
+        Returns:
+            دیکشنری آمار شامل نرخ استفاده از پیش‌واکشی‌ها و حجم هدر رفته
+        """
+        with self._lock:
+            stats = dict(self.stats, active=len(self._entries))
+        resolved = sum(stats[key] for key in ("hits", "partial_hits", "misses", "unstarted", "unused"))
+        stats["hit_rate"] = (stats["hits"] + stats["partial_hits"]) / resolved if resolved else 0.0
+        return stats
+
+
+# نمونه سراسری
+prefetcher = Prefetcher()
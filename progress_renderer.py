@@ -0,0 +1,190 @@
+"""
+ماژول نمایش پیام‌های پیشرفت
+
+به‌روزرسانی‌های پیشرفت (دانلود، آپلود، جستجوی هشتگ) به جای ویرایش مستقیم
+پیام، فقط آخرین وضعیت هر پیام را ثبت می‌کنند. یک ترد پس‌زمینه هر پیام را
+حداکثر یک بار در هر PROGRESS_EDIT_INTERVAL ثانیه با آخرین متن ویرایش می‌کند،
+وضعیت‌های میانی قدیمی حذف می‌شوند و اگر متن تغییری نکرده باشد ویرایشی ارسال
+نمی‌شود. با finish آخرین وضعیت (یا متن نهایی) همیشه فوراً ارسال می‌شود.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple
+
+from config import PROGRESS_EDIT_INTERVAL, PROGRESS_RENDER_WORKERS
+from debug_logger import debug_log
+
+# مدت نگهداری وضعیت پیام‌هایی که finish نشده‌اند (ثانیه)
+STATE_TTL = 600
+
+
+class _MessageState:
+    """آخرین وضعیت یک پیام پیشرفت"""
+
+    __slots__ = ("bot", "text", "kwargs", "sent_text", "last_flush", "sending", "scheduled")
+
+    def __init__(self):
+        self.bot = None
+        self.text = None
+        self.kwargs = {}
+        self.sent_text = None
+        self.last_flush = 0.0
+        self.sending = False
+        self.scheduled = False
+
+    @property
+    def dirty(self) -> bool:
+        return self.text is not None and self.text != self.sent_text
+
+
+class ProgressRenderer:
+    """
+    ویرایش تجمیعی پیام‌های پیشرفت (فقط آخرین وضعیت هر پیام)
+    """
+
+    def __init__(self, interval: float = PROGRESS_EDIT_INTERVAL, workers: int = PROGRESS_RENDER_WORKERS):
+        self.interval = interval
+        self.workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._states: Dict[Tuple[Any, Any], _MessageState] = {}
+        self._executor = None
+        self._thread = None
+        self.stats = {"updates": 0, "edits": 0, "coalesced": 0, "errors": 0}
+
+    def _start(self) -> None:
+        """راه‌اندازی ترد ارسال (زیر قفل، فقط یک بار)"""
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="progress-render")
+            self._thread = threading.Thread(target=self._run, name="progress-renderer", daemon=True)
+            self._thread.start()
+
+    def update(self, bot, chat_id, message_id, text: str, **kwargs) -> None:
+        """
+        ثبت آخرین وضعیت یک پیام پیشرفت (بدون انتظار برای ارسال)
+
+        Args:
+            bot: نمونه ربات
+            chat_id: شناسه چت
+            message_id: شناسه پیام
+            text: متن جدید پیام
+            **kwargs: سایر پارامترهای edit_message_text (parse_mode، reply_markup و ...)
+        """
+        with self._cond:
+            self._start()
+            state = self._states.get((chat_id, message_id))
+            if state is None:
+                state = self._states[(chat_id, message_id)] = _MessageState()
+
+            self.stats["updates"] += 1
+            if state.text is not None and state.text != state.sent_text:
+                self.stats["coalesced"] += 1  # وضعیت قبلی ارسال نشده جایگزین می‌شود
+
+            state.bot = bot
+            state.text = text
+            state.kwargs = kwargs
+            self._cond.notify_all()
+
+    def finish(self, bot, chat_id, message_id, text: Optional[str] = None, **kwargs) -> None:
+        """
+        ارسال فوری وضعیت نهایی پیام و پایان پیگیری آن
+
+        ویرایش در حال ارسال همین پیام ابتدا کامل می‌شود تا وضعیت قدیمی بعد از
+        وضعیت نهایی نرسد. خطای ارسال متن نهایی به فراخواننده برگردانده می‌شود.
+
+        Args:
+            bot: نمونه ربات
+            chat_id: شناسه چت
+            message_id: شناسه پیام
+            text: متن نهایی (پیش‌فرض: آخرین وضعیت ثبت شده در صورت ارسال نشدن)
+            **kwargs: سایر پارامترهای edit_message_text
+        """
+        state = self._detach(chat_id, message_id)
+
+        if text is None:
+            if state is None or not state.dirty:
+                return
+            bot, text, kwargs = state.bot, state.text, state.kwargs
+        elif state is not None and text == state.sent_text:
+            return
+
+        bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, **kwargs)
+        with self._cond:
+            self.stats["edits"] += 1
+
+    def cancel(self, chat_id, message_id) -> None:
+        """
+        حذف وضعیت‌های ارسال نشده پیام (مثلا پیش از جایگزینی پیام با نتیجه)
+
+        Args:
+            chat_id: شناسه چت
+            message_id: شناسه پیام
+        """
+        self._detach(chat_id, message_id)
+
+    def _detach(self, chat_id, message_id) -> Optional[_MessageState]:
+        """حذف وضعیت پیام پس از پایان ویرایش در حال ارسال آن"""
+        with self._cond:
+            state = self._states.pop((chat_id, message_id), None)
+            while state is not None and state.sending:
+                self._cond.wait()
+            return state
+
+    def _run(self) -> None:
+        """حلقه ترد پس‌زمینه: ارسال پیام‌هایی که زمان ویرایش آن‌ها رسیده است"""
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                timeout = None
+
+                for key, state in list(self._states.items()):
+                    if state.sending or state.scheduled:
+                        continue
+                    if not state.dirty:
+                        if now - state.last_flush > STATE_TTL:
+                            del self._states[key]
+                        continue
+
+                    due = state.last_flush + self.interval
+                    if due <= now:
+                        state.scheduled = True
+                        self._executor.submit(self._flush, key, state)
+                    else:
+                        timeout = due - now if timeout is None else min(timeout, due - now)
+
+                self._cond.wait(timeout)
+
+    def _flush(self, key: Tuple[Any, Any], state: _MessageState) -> None:
+        """ارسال آخرین وضعیت یک پیام"""
+        with self._cond:
+            state.scheduled = False
+            if self._states.get(key) is not state or not state.dirty:
+                return
+            state.sending = True
+            bot, text, kwargs = state.bot, state.text, state.kwargs
+
+        try:
+            bot.edit_message_text(text, chat_id=key[0], message_id=key[1], **kwargs)
+            error = None
+        except Exception as e:
+            error = e
+
+        with self._cond:
+            state.sending = False
+            state.sent_text = text
+            state.last_flush = time.monotonic()
+            self.stats["errors" if error else "edits"] += 1
+            self._cond.notify_all()
+
+        if error is not None and "message is not modified" not in str(error):
+            debug_log(f"خطا در ویرایش پیام پیشرفت: {str(error)}", "WARNING")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """دریافت آمار ویرایش‌ها (تعداد به‌روزرسانی‌ها، ویرایش‌های ارسال شده و حذف شده)"""
+        with self._cond:
+            return dict(self.stats, pending=sum(1 for state in self._states.values() if state.dirty))
+
+
+# نمونه سراسری
+progress_renderer = ProgressRenderer()
@@ -9,6 +9,8 @@ from datetime import datetime
 import psutil
 import traceback
 
+from download_queue import download_scheduler
+
 # تنظیم سیستم لاگینگ
 logging.basicConfig(
     level=logging.INFO,
@@ -103,12 +105,99 @@ def create_process_lock():
         logger.error(f"خطا در ایجاد فایل قفل: {e}")
         return False
 
+def format_youtube_error(error_msg: str) -> str:
+    """تبدیل خطای دانلود یوتیوب به پیام قابل فهم برای کاربر"""
+    if "Invalid URL" in error_msg:
+        return "❌ لینک نامعتبر است. لطفاً یک لینک معتبر یوتیوب ارسال کنید."
+    elif "Video unavailable" in error_msg:
+        return "❌ این ویدیو در دسترس نیست یا خصوصی است."
+    elif "Sign in" in error_msg:
+        return "❌ این ویدیو نیاز به ورود به حساب کاربری دارد."
+    else:
+        return f"⚠️ خطا در پردازش لینک:\n{error_msg}"
+
+def process_youtube_job(payload, job):
+    """اجرای کار دانلود یوتیوب از صف دانلود"""
+    from youtube_downloader import download_video, extract_video_info
+    from video_info_cache import get_video_id
+    from database import save_telegram_file, get_download
+    from download_progress import get_stage_timer, log_stage_timings
+    from artifact_store import artifact_store
+    from uploader import telegram_uploader
+    from progress_renderer import progress_renderer
+
+    chat_id = payload["chat_id"]
+    message_id = payload["message_id"]
+    url = payload["url"]
+
+    try:
+        video_info = extract_video_info(url)
+        if not video_info:
+            bot.edit_message_text("❌ خطا در دریافت اطلاعات ویدیو", chat_id, message_id)
+            return
+
+        bot.edit_message_text("⏳ در حال دانلود ویدیو...", chat_id, message_id)
+        # شناسه ثابت دانلود تا پس از راه‌اندازی مجدد از فایل .part ادامه یابد
+        download_id = payload.get("download_id") or int(time.time())
+        success, file_path, error = download_video(url, download_id, payload["user_id"], job=job)
+
+        if success and file_path:
+            def upload_progress(percent, sent, total):
+                progress_renderer.update(bot, chat_id, message_id, f"📤 در حال آپلود... {percent:.0f}%")
+
+            with download_scheduler.stage("upload"), get_stage_timer(download_id).stage("upload"), \
+                    artifact_store.pinned(file_path):
+                result = telegram_uploader.send_file(
+                    "video", chat_id, file_path, upload_progress,
+                    caption=f"✅ دانلود شد\n🎥 {video_info.get('title', '')}"
+                )
+                sent_message = telebot.types.Message.de_json(result)
+            progress_renderer.finish(bot, chat_id, message_id)
+            log_stage_timings(download_id)
+            # ذخیره file_id برای ارسال مجدد بدون دانلود
+            # (فقط اگر کیفیت به دلیل محدودیت حجم این کاربر کاهش نیافته باشد)
+            media = sent_message.video or sent_message.document
+            video_id = get_video_id(url)
+            metadata = (get_download(download_id) or {}).get('metadata')
+            full_quality = isinstance(metadata, dict) and not metadata.get('downgraded')
+            if media and video_id and full_quality:
+                media_kind = 'video' if sent_message.video else 'document'
+                save_telegram_file(video_id, "best", media_kind, media.file_id, media.file_unique_id,
+                                   media.file_size, video_info.get('title'))
+            # فایل برای درخواست‌های بعدی همین ویدیو در مخزن فایل‌ها نگه داشته می‌شود
+        else:
+            error_msg = error.get('error', 'خطای نامشخص') if error else 'خطای نامشخص'
+            bot.edit_message_text(f"❌ {error_msg}", chat_id, message_id)
+
+    except Exception as e:
+        detailed_error = traceback.format_exc()
+        logger.error(f"Error processing YouTube link: {detailed_error}")
+        progress_renderer.finish(bot, chat_id, message_id, format_youtube_error(str(e)))
+
 def setup_bot_handlers():
     """تنظیم هندلرهای ربات"""
+    # ثبت پردازشگر کارهای دانلود در زمان‌بند
+    download_scheduler.register_handler("run_bot.youtube", process_youtube_job)
+
+    # افزودن مجدد دانلودهای نیمه‌کاره به صف
+    def resubmit_download(row):
+        from download_queue import JobPriority
+        message = bot.send_message(row["user_id"], f"♻️ دانلود {row['id']} پس از راه‌اندازی مجدد ادامه می‌یابد...")
+        download_scheduler.submit(
+            "run_bot.youtube",
+            {"chat_id": row["user_id"], "message_id": message.message_id, "url": row["url"],
+             "user_id": row["user_id"], "download_id": row["id"]},
+            priority=JobPriority.NORMAL, user_id=row["user_id"], download_id=row["id"]
+        )
+        return True
+
+    from youtube_downloader import recover_interrupted_downloads
+    recover_interrupted_downloads(resubmit_download)
+
     @bot.message_handler(func=lambda message: 'youtube.com' in message.text or 'youtu.be' in message.text)
     def youtube_link_handler(message):
         try:
-            from youtube_downloader import download_video, validate_youtube_url, extract_video_info
+            from youtube_downloader import validate_youtube_url
             debug_msg = bot.reply_to(message, "🔄 در حال پردازش لینک...")
 
             url = message.text.strip()
@@ -116,38 +205,50 @@ def setup_bot_handlers():
                 bot.edit_message_text("❌ لینک نامعتبر است", message.chat.id, debug_msg.message_id)
                 return
 
-            video_info = extract_video_info(url)
-            if not video_info:
-                bot.edit_message_text("❌ خطا در دریافت اطلاعات ویدیو", message.chat.id, debug_msg.message_id)
-                return
-
-            bot.edit_message_text("⏳ در حال دانلود ویدیو...", message.chat.id, debug_msg.message_id)
-            success, file_path, error = download_video(url, int(time.time()), message.from_user.id)
+            # ارسال مجدد با file_id اگر این ویدیو قبلا آپلود شده باشد
+            from video_info_cache import get_video_id
+            from database import get_telegram_file, delete_telegram_file
+            video_id = get_video_id(url)
+            cached = get_telegram_file(video_id, "best") if video_id else None
+            if cached:
+                try:
+                    caption = f"✅ دانلود شد\n🎥 {cached.get('title') or ''}"
+                    if cached['media_kind'] == 'document':
+                        bot.send_document(message.chat.id, cached['file_id'], caption=caption)
+                    else:
+                        bot.send_video(message.chat.id, cached['file_id'], caption=caption)
+                    bot.delete_message(message.chat.id, debug_msg.message_id)
+                    return
+                except Exception as e:
+                    logger.warning(f"file_id ذخیره شده نامعتبر است: {str(e)}")
+                    delete_telegram_file(video_id, "best", cached['media_kind'])
+
+            # ثبت در دیتابیس و افزودن به صف دانلود
+            from database import add_download
+            download_id = add_download(message.from_user.id, url)
+            job = download_scheduler.submit(
+                "run_bot.youtube",
+                {
+                    "chat_id": message.chat.id,
+                    "message_id": debug_msg.message_id,
+                    "url": url,
+                    "user_id": message.from_user.id,
+                    "download_id": download_id if download_id != -1 else None
+                },
+                user_id=message.from_user.id,
+                download_id=download_id if download_id != -1 else None
+            )
 
-            if success and file_path:
-                with open(file_path, 'rb') as video_file:
-                    bot.send_video(message.chat.id, video_file, caption=f"✅ دانلود شد\n🎥 {video_info.get('title', '')}")
-                os.remove(file_path)  # پاک کردن فایل پس از ارسال
-            else:
-                error_msg = error.get('error', 'خطای نامشخص') if error else 'خطای نامشخص'
-                bot.edit_message_text(f"❌ {error_msg}", message.chat.id, debug_msg.message_id)
+            position = download_scheduler.get_position(job.job_id)
+            if position > 0:
+                bot.edit_message_text(f"⏳ شما نفر #{position} در صف دانلود هستید...", message.chat.id, debug_msg.message_id)
 
         except Exception as e:
-            error_msg = str(e)
             detailed_error = traceback.format_exc()
             logger.error(f"Error processing YouTube link: {detailed_error}")
 
-            if "Invalid URL" in error_msg:
-                error_response = "❌ لینک نامعتبر است. لطفاً یک لینک معتبر یوتیوب ارسال کنید."
-            elif "Video unavailable" in error_msg:
-                error_response = "❌ این ویدیو در دسترس نیست یا خصوصی است."
-            elif "Sign in" in error_msg:
-                error_response = "❌ این ویدیو نیاز به ورود به حساب کاربری دارد."
-            else:
-                error_response = f"⚠️ خطا در پردازش لینک:\n{error_msg}"
-
             bot.edit_message_text(
-                error_response,
+                format_youtube_error(str(e)),
                 message.chat.id,
                 debug_msg.message_id
             )
@@ -231,7 +332,11 @@ def main():
 
         sys.excepthook = handle_exception
 
-        # ایجاد نمونه جدید ربات
+        # ایجاد نمونه جدید ربات (در صورت تنظیم، با سرور Bot API محلی)
+        from uploader import configure_telebot_api
+        from telegram_gateway import install_telebot_gateway
+        configure_telebot_api()
+        install_telebot_gateway()
         bot = telebot.TeleBot(TOKEN)
 
         # تنظیم هندلرهای ربات
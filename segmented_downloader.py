@@ -0,0 +1,382 @@
+"""
+ماژول دانلود چند اتصالی
+
+برای فرمت‌های تک فایلی (progressive) که yt-dlp با یک اتصال HTTP دانلود
+می‌کند، فایل به چند بخش تقسیم می‌شود و هر بخش با یک درخواست Range جداگانه
+و به صورت موازی در فایل از پیش تخصیص داده شده نوشته می‌شود. این کار محدودیت
+سرعت هر اتصال در سمت سرور را دور می‌زند. تعداد اتصال‌های هر دانلود و کل
+دانلودها محدود است. موقعیت هر بخش در فایل وضعیت (.segments) ذخیره می‌شود
+تا دانلود پس از راه‌اندازی مجدد ربات از همان نقطه ادامه یابد.
+"""
+
+import os
+import re
+import json
+import time
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple, List, Callable
+
+from config import (
+    SEGMENT_COUNT, SEGMENT_MAX_CONNECTIONS, SEGMENT_GLOBAL_CONNECTIONS, SEGMENT_MIN_SIZE_MB
+)
+from debug_logger import debug_log
+
+# اندازه هر بار خواندن از اتصال
+CHUNK_SIZE = 64 * 1024
+
+# تعداد تلاش مجدد برای هر بخش
+SEGMENT_RETRIES = 3
+
+# پسوند فایل وضعیت بخش‌ها برای ادامه دانلود پس از راه‌اندازی مجدد
+STATE_SUFFIX = ".segments"
+
+# فاصله ذخیره وضعیت بخش‌ها (ثانیه)
+STATE_SAVE_INTERVAL = 1.0
+
+# محدودیت اتصال‌های همزمان کل دانلودها
+_global_connections = threading.BoundedSemaphore(max(1, SEGMENT_GLOBAL_CONNECTIONS))
+
+# callback پیشرفت با دیکشنری هم‌شکل progress_hooks کتابخانه yt-dlp
+ProgressHook = Callable[[Dict[str, Any]], None]
+
+
+class SegmentError(Exception):
+    """خطا در دانلود یک بخش"""
+
+
+class RangeNotSupported(Exception):
+    """سرور درخواست Range را نادیده گرفته است"""
+
+
+def _open(url: str, headers: Dict[str, str], start: Optional[int] = None,
+          end: Optional[int] = None, timeout: float = 30):
+    """باز کردن اتصال HTTP با هدر Range اختیاری"""
+    request_headers = dict(headers or {})
+    if start is not None:
+        request_headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+    request = urllib.request.Request(url, headers=request_headers)
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+def probe(url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 30) -> Tuple[Optional[int], bool]:
+    """
+    بررسی حجم فایل و پشتیبانی سرور از درخواست Range
+
+    Args:
+        url: آدرس فایل
+        headers: هدرهای HTTP (اختیاری)
+        timeout: مهلت اتصال
+
+    Returns:
+        (حجم کل یا None، پشتیبانی از Range)
+    """
+    with _open(url, headers or {}, 0, 0, timeout) as response:
+        content_range = response.headers.get("Content-Range", "")
+        match = re.match(r"bytes \d+-\d+/(\d+)", content_range)
+
+        if response.status == 206 and match:
+            return int(match.group(1)), True
+
+        length = response.headers.get("Content-Length")
+        return (int(length) if length else None), False
+
+
+def split_ranges(total_size: int, segments: int) -> List[Tuple[int, int]]:
+    """
+    تقسیم فایل به بازه‌های بایتی
+
+    Args:
+        total_size: حجم کل
+        segments: تعداد بخش‌ها
+
+    Returns:
+        لیست بازه‌ها به صورت (شروع، پایان شامل)
+    """
+    segments = max(1, min(segments, total_size))
+    size = total_size // segments
+    ranges = []
+
+    for i in range(segments):
+        start = i * size
+        end = total_size - 1 if i == segments - 1 else start + size - 1
+        ranges.append((start, end))
+
+    return ranges
+
+
+class SegmentedDownloader:
+    """
+    دانلود یک فایل با چند اتصال موازی
+    """
+
+    def __init__(self, segments: int = SEGMENT_COUNT, max_connections: int = SEGMENT_MAX_CONNECTIONS,
+                 min_size: int = SEGMENT_MIN_SIZE_MB * 1024 * 1024, timeout: float = 30):
+        self.segments = max(1, segments)
+        self.max_connections = max(1, max_connections)
+        self.min_size = min_size
+        self.timeout = timeout
+
+    def download(self, url: str, dest_path: str, headers: Optional[Dict[str, str]] = None,
+                 progress_hook: Optional[ProgressHook] = None, cancel_token=None,
+                 total_size: Optional[int] = None) -> str:
+        """
+        دانلود فایل در مسیر مقصد
+
+        Args:
+            url: آدرس فایل
+            dest_path: مسیر فایل نهایی
+            headers: هدرهای HTTP (اختیاری)
+            progress_hook: تابع دریافت پیشرفت (هم‌شکل progress_hooks در yt-dlp)
+            cancel_token: توکن لغو (اختیاری)
+            total_size: حجم فایل اگر از قبل معلوم باشد (اختیاری)
+
+        Returns:
+            مسیر فایل دانلود شده
+        """
+        headers = dict(headers or {})
+        supports_range = True
+
+        if not total_size:
+            total_size, supports_range = probe(url, headers, self.timeout)
+
+        part_path = dest_path + ".part"
+        state_path = dest_path + STATE_SUFFIX
+        state = {
+            "downloaded": 0,
+            "resumed": 0,
+            "started_at": time.time(),
+            "saved_at": 0.0,
+            "lock": threading.Lock(),
+        }
+
+        def report(status: str = "downloading") -> None:
+            if progress_hook is None:
+                return
+            elapsed = max(time.time() - state["started_at"], 1e-6)
+            downloaded = state["downloaded"]
+            speed = (downloaded - state["resumed"]) / elapsed
+            progress_hook({
+                "status": status,
+                "downloaded_bytes": downloaded,
+                "total_bytes": total_size,
+                "speed": speed,
+                "eta": (total_size - downloaded) / speed if total_size and speed else None,
+                "filename": dest_path,
+            })
+
+        # ادامه از داده‌های فایل .part یک اجرای قبلی (مثلا پیش از راه‌اندازی مجدد ربات)
+        segments = self._load_state(state_path, part_path, total_size) if supports_range else None
+
+        if segments:
+            state["downloaded"] = state["resumed"] = sum(seg["position"] - seg["start"] for seg in segments)
+            debug_log(f"ادامه دانلود {dest_path} از {state['downloaded']} بایت", "INFO")
+        else:
+            if not supports_range or not total_size or total_size < self.min_size or self.segments == 1:
+                ranges = [(0, total_size - 1 if total_size else None)]
+            else:
+                ranges = split_ranges(total_size, self.segments)
+            segments = [{"start": start, "end": end, "position": start} for start, end in ranges]
+
+            # تخصیص فضای فایل پیش از شروع نوشتن بخش‌ها
+            with open(part_path, "wb") as f:
+                if total_size:
+                    f.truncate(total_size)
+
+        def save_state(force: bool = False) -> None:
+            # فقط فایل‌هایی با حجم معلوم و پشتیبانی Range قابل ادامه هستند
+            if not supports_range or not total_size:
+                return
+            with state["lock"]:
+                now = time.time()
+                if not force and now - state["saved_at"] < STATE_SAVE_INTERVAL:
+                    return
+                state["saved_at"] = now
+                self._save_state(state_path, total_size, segments)
+
+        save_state(force=True)
+        debug_log(f"دانلود چند اتصالی {dest_path}: {len(segments)} بخش، حجم {total_size}", "DEBUG")
+
+        # با خطای یک بخش، بقیه بخش‌ها هم متوقف می‌شوند
+        abort = threading.Event()
+
+        def fetch_range(segment: Dict[str, Any]) -> None:
+            start, end = segment["start"], segment["end"]
+            position = segment["position"]
+            attempts = 0
+
+            if end is not None and position > end:
+                return
+
+            while True:
+                if cancel_token is not None:
+                    cancel_token.check()
+                if abort.is_set():
+                    return
+
+                try:
+                    # بدون بافر، تا داده ثبت شده در فایل وضعیت واقعا روی دیسک باشد
+                    with _global_connections, open(part_path, "r+b", buffering=0) as f:
+                        f.seek(position)
+                        use_range = len(segments) > 1 or position > 0
+                        with _open(url, headers, position if use_range else None,
+                                   end if use_range else None, self.timeout) as response:
+                            if use_range and response.status != 206:
+                                raise RangeNotSupported(f"پاسخ {response.status} برای بخش {start}-{end}")
+
+                            while True:
+                                if cancel_token is not None:
+                                    cancel_token.check()
+                                if abort.is_set():
+                                    return
+
+                                remaining = (end - position + 1) if end is not None else CHUNK_SIZE
+                                chunk = response.read(min(CHUNK_SIZE, remaining))
+                                if not chunk:
+                                    break
+
+                                f.write(chunk)
+                                position += len(chunk)
+                                with state["lock"]:
+                                    state["downloaded"] += len(chunk)
+                                    segment["position"] = position
+                                report()
+                                save_state()
+
+                                if end is not None and position > end:
+                                    break
+
+                    if end is None or position > end:
+                        return
+
+                    raise SegmentError(f"اتصال پیش از پایان بخش {start}-{end} بسته شد")
+
+                except (OSError, SegmentError) as e:
+                    attempts += 1
+                    if attempts > SEGMENT_RETRIES:
+                        raise SegmentError(f"خطا در دانلود بخش {start}-{end}: {str(e)}")
+                    debug_log(f"تلاش مجدد بخش {start}-{end} از بایت {position}: {str(e)}", "WARNING")
+                    time.sleep(attempts)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_connections, len(segments))) as executor:
+            futures = [executor.submit(fetch_range, segment) for segment in segments]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                # توقف بخش‌های باقیمانده در اولین خطا
+                abort.set()
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                save_state(force=True)
+
+        os.replace(part_path, dest_path)
+        try:
+            os.remove(state_path)
+        except OSError:
+            pass
+        report("finished")
+        return dest_path
+
+    @staticmethod
+    def discard_partial(dest_path: str) -> None:
+        """
+        حذف فایل .part و فایل وضعیت یک دانلود
+
+        فایل .part از قبل به اندازه کامل تخصیص داده شده است و نباید توسط
+        yt-dlp به عنوان داده دانلود شده ادامه داده شود.
+
+        Args:
+            dest_path: مسیر فایل نهایی
+        """
+        for path in (dest_path + ".part", dest_path + STATE_SUFFIX):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _save_state(state_path: str, total_size: int, segments: List[Dict[str, Any]]) -> None:
+        """ذخیره موقعیت بخش‌ها در فایل وضعیت"""
+        try:
+            temp_file = state_path + ".tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump({"total_size": total_size, "segments": segments}, f)
+            os.replace(temp_file, state_path)
+        except OSError as e:
+            debug_log(f"خطا در ذخیره وضعیت بخش‌ها: {str(e)}", "WARNING")
+
+    @staticmethod
+    def _load_state(state_path: str, part_path: str, total_size: Optional[int]) -> Optional[List[Dict[str, Any]]]:
+        """
+        بارگیری موقعیت بخش‌ها از فایل وضعیت یک دانلود قبلی
+
+        Returns:
+            لیست بخش‌ها یا None اگر ادامه دانلود ممکن نباشد
+        """
+        if not total_size or not os.path.exists(state_path) or not os.path.exists(part_path):
+            return None
+
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+            # فایل در سرور تغییر کرده یا فایل .part ناقص است
+            if data.get("total_size") != total_size or os.path.getsize(part_path) != total_size:
+                return None
+
+            segments = data["segments"]
+            if not segments or any(not seg["start"] <= seg["position"] <= seg["end"] + 1 for seg in segments):
+                return None
+
+            return segments
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            debug_log(f"فایل وضعیت بخش‌ها نامعتبر است: {str(e)}", "WARNING")
+            return None
+
+
+def plan_from_info(video_info: Dict[str, Any], ydl_opts: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    بررسی اینکه فرمت انتخاب شده یک فایل HTTP تکی است و قابل دانلود چند اتصالی
+
+    Args:
+        video_info: دیکشنری اطلاعات استخراج شده توسط yt-dlp
+        ydl_opts: تنظیمات yt-dlp (format و outtmpl استفاده می‌شوند)
+
+    Returns:
+        {"url", "headers", "filename", "filesize"} یا None برای فرمت‌های ترکیبی/قطعه‌ای
+    """
+    try:
+        import copy
+        from yt_dlp import YoutubeDL
+
+        plan_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'format': ydl_opts.get('format', 'best'),
+            'outtmpl': ydl_opts.get('outtmpl', '%(title)s.%(ext)s'),
+            'restrictfilenames': ydl_opts.get('restrictfilenames', False),
+        }
+        with YoutubeDL(plan_opts) as ydl:
+            resolved = ydl.process_ie_result(copy.deepcopy(video_info), download=False)
+
+            # فرمت‌های ترکیبی (ویدیو+صدا) و پروتکل‌های قطعه‌ای (HLS/DASH) به yt-dlp سپرده می‌شوند
+            if resolved.get('requested_formats') or resolved.get('protocol') not in ('http', 'https'):
+                return None
+
+            return {
+                "url": resolved['url'],
+                "headers": resolved.get('http_headers') or {},
+                "filename": ydl.prepare_filename(resolved),
+                "filesize": resolved.get('filesize'),
+            }
+    except Exception as e:
+        debug_log(f"امکان دانلود چند اتصالی وجود ندارد: {str(e)}", "DEBUG")
+        return None
+
+
+# نمونه سراسری با تنظیمات پیش‌فرض
+segmented_downloader = SegmentedDownloader()
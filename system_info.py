@@ -2,7 +2,7 @@ import os
 import platform
 import datetime
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 import threading
 import time
 
@@ -488,11 +488,77 @@ def get_system_status_text() -> str:
         f"🧠 حافظه: {system_info['process']['this_process']['memory_usage']}",
         f"🧵 تعداد ترد‌ها: {system_info['process']['this_process']['threads_count']}",
         "",
+        *get_gateway_status_lines(),
+        *get_prefetch_status_lines(),
+        *get_write_behind_status_lines(),
         "⏱ *زمان:* " + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     ]
     
     return "\n".join(status_lines)
 
+def get_gateway_status_lines() -> List[str]:
+    """
+    خطوط وضعیت دروازه ارسال درخواست‌ها به تلگرام
+
+    Returns:
+        لیست خطوط متن وضعیت
+    """
+    from telegram_gateway import telegram_gateway
+
+    stats = telegram_gateway.get_stats()
+    lines = [
+        "📨 *ارسال به تلگرام:*",
+        f"📊 درخواست‌ها: {stats['requests']} | در صف: {stats['waiting']}",
+        f"⛔️ پاسخ 429: {stats['rate_limited']} ({stats['rate_limited_ratio'] * 100:.1f}%)",
+    ]
+    for name, delay in stats["queue_delay"].items():
+        if delay["count"]:
+            lines.append(f"⏳ تاخیر صف {name}: میانگین {delay['avg']:.2f}s، بیشینه {delay['max']:.2f}s")
+    lines.append("")
+    return lines
+
+def get_prefetch_status_lines() -> List[str]:
+    """
+    خطوط وضعیت پیش‌واکشی حدسی
+
+    Returns:
+        لیست خطوط متن وضعیت
+    """
+    from prefetch import prefetcher
+
+    stats = prefetcher.get_stats()
+    if not stats["started"]:
+        return []
+    return [
+        "🔮 *پیش‌واکشی:*",
+        f"🎯 نرخ استفاده: {stats['hit_rate'] * 100:.0f}% ({stats['hits']} کامل، {stats['partial_hits']} نیمه‌کاره "
+        f"از {stats['started']})",
+        f"🗑 حجم هدر رفته: {stats['wasted_bytes'] / 1024 / 1024:.1f}MB | "
+        f"صرفه‌جویی: {stats['saved_bytes'] / 1024 / 1024:.1f}MB",
+        "",
+    ]
+
+def get_write_behind_status_lines() -> List[str]:
+    """
+    خطوط وضعیت صف نوشتن با تاخیر دیتابیس
+
+    Returns:
+        لیست خطوط متن وضعیت
+    """
+    from database import write_behind
+
+    stats = write_behind.get_stats()
+    if not stats["enqueued"]:
+        return []
+    return [
+        "🗄 *نوشتن دسته‌ای دیتابیس:*",
+        f"📥 در صف: {stats['depth']}/{stats['max_pending']} (بیشترین {stats['max_depth']}) | "
+        f"میانگین دسته: {stats['avg_batch']:.1f} ردیف",
+        f"⏳ انتظار تولیدکننده‌ها: {stats['backpressure_waits']} بار ({stats['backpressure_seconds']:.1f} ثانیه) | "
+        f"خطا: {stats['failed']}",
+        "",
+    ]
+
 @debug_decorator
 def get_system_status_short() -> str:
     """
@@ -239,35 +239,6 @@ def save_hashtags(data):
         debug_log(f"خطا در ذخیره اطلاعات هشتگ‌ها: {e}", "ERROR")
         return False
 
-# پاکسازی فایل‌های قدیمی و نگهداری حداکثر تعداد مشخصی فایل
-def clear_folder(folder_path, max_files=MAX_VIDEOS_TO_KEEP):
-    """حذف فایل‌های قدیمی و نگهداری حداکثر تعداد مشخصی فایل"""
-    try:
-        # دریافت همه فایل‌ها
-        all_files = glob.glob(f"{folder_path}/*.*")
-
-        # اگر تعداد فایل‌ها از حد مجاز بیشتر است
-        if len(all_files) > max_files:
-            # مرتب‌سازی فایل‌ها بر اساس زمان ویرایش
-            files_with_time = [(f, os.path.getmtime(f)) for f in all_files]
-            files_sorted = sorted(files_with_time, key=lambda x: x[1])
-
-            # حذف فایل‌های قدیمی
-            files_to_delete = files_sorted[:-max_files]  # نگهداری max_files فایل جدیدتر
-
-            for file_path, _ in files_to_delete:
-                try:
-                    os.remove(file_path)
-                    debug_log(f"فایل قدیمی حذف شد: {file_path}")
-                except Exception as e:
-                    debug_log(f"خطا در حذف فایل {file_path}: {e}", "ERROR")
-
-            return len(files_to_delete)
-    except Exception as e:
-        debug_log(f"خطا در پاکسازی پوشه {folder_path}: {e}", "ERROR")
-
-    return 0
-
 # تابع شروع - Start command
 @bot.message_handler(commands=["start"])
 def start_command(message):
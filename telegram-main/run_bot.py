@@ -1,4 +1,5 @@
 import os
+import re
 import sys
 import telebot
 import logging
@@ -107,6 +108,11 @@ def check_instagram_url_direct(url: str) -> bool:
     """بررسی اینکه آیا آدرس مربوط به اینستاگرام است یا خیر (روش قدیمی)"""
     return 'instagram.com' in url and ('/p/' in url or '/reel/' in url or '/tv/' in url)
 
+def _media_order(filename: str):
+    """کلید مرتب‌سازی فایل‌های instaloader بر اساس شماره رسانه در پست (..._2 پیش از ..._10)"""
+    match = re.search(r'_(\d+)\.\w+$', filename)
+    return (int(match.group(1)) if match else 0, filename)
+
 def process_instagram_download(message, url: str):
     """دانلود محتوا از اینستاگرام (روش قدیمی با instaloader مستقیم)"""
     try:
@@ -149,9 +155,9 @@ def process_instagram_download(message, url: str):
             post = instaloader.Post.from_shortcode(L.context, shortcode)
             L.download_post(post, target=temp_dir)
             
-            # یافتن فایل‌های دانلود شده
+            # یافتن فایل‌های دانلود شده به ترتیب پست
             media_files = []
-            for file in os.listdir(temp_dir):
+            for file in sorted(os.listdir(temp_dir), key=_media_order):
                 if file.endswith(('.jpg', '.mp4', '.mov')):
                     media_files.append(os.path.join(temp_dir, file))
             
@@ -162,23 +168,39 @@ def process_instagram_download(message, url: str):
             # بررسی نوع فایل (تصویر یا ویدیو) و ارسال آن
             bot.edit_message_text("📤 در حال ارسال فایل...", message.chat.id, debug_msg.message_id)
             
-            for file_path in media_files:
-                if file_path.endswith(('.mp4', '.mov')):
-                    # ارسال ویدیو
-                    with open(file_path, 'rb') as video_file:
-                        bot.send_video(
-                            message.chat.id, 
-                            video_file,
-                            caption=f"✅ دانلود شد از اینستاگرام\n👤 {post.owner_username}"
-                        )
-                else:
-                    # ارسال تصویر
-                    with open(file_path, 'rb') as photo_file:
-                        bot.send_photo(
-                            message.chat.id, 
-                            photo_file,
-                            caption=f"✅ دانلود شد از اینستاگرام\n👤 {post.owner_username}"
-                        )
+            caption = f"✅ دانلود شد از اینستاگرام\n👤 {post.owner_username}"
+            
+            if len(media_files) == 1:
+                file_path = media_files[0]
+                with open(file_path, 'rb') as media_file:
+                    if file_path.endswith(('.mp4', '.mov')):
+                        bot.send_video(message.chat.id, media_file, caption=caption)
+                    else:
+                        bot.send_photo(message.chat.id, media_file, caption=caption)
+            else:
+                # ارسال پست چندتایی به صورت آلبوم‌های حداکثر 10 تایی (یک درخواست برای هر آلبوم)
+                for start in range(0, len(media_files), 10):
+                    group_files = [open(file_path, 'rb') for file_path in media_files[start:start + 10]]
+                    try:
+                        media_group = []
+                        for position, media_file in enumerate(group_files):
+                            item_caption = caption if start == 0 and position == 0 else None
+                            if media_file.name.endswith(('.mp4', '.mov')):
+                                media_group.append(telebot.types.InputMediaVideo(media_file, caption=item_caption))
+                            else:
+                                media_group.append(telebot.types.InputMediaPhoto(media_file, caption=item_caption))
+                        
+                        if len(media_group) == 1:
+                            # آلبوم حداقل 2 رسانه لازم دارد
+                            if group_files[0].name.endswith(('.mp4', '.mov')):
+                                bot.send_video(message.chat.id, group_files[0])
+                            else:
+                                bot.send_photo(message.chat.id, group_files[0])
+                        else:
+                            bot.send_media_group(message.chat.id, media_group)
+                    finally:
+                        for media_file in group_files:
+                            media_file.close()
             
             # حذف پیام پردازش
             bot.delete_message(message.chat.id, debug_msg.message_id)
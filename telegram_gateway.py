@@ -0,0 +1,555 @@
+"""
+ماژول دروازه ارسال درخواست‌ها به تلگرام
+
+همه درخواست‌های خروجی ربات (ارسال پیام، ویرایش پیام، آپلود و ...) از این
+دروازه عبور می‌کنند:
+- اتصال‌های HTTP به صورت keep-alive در یک استخر نگهداری و دوباره استفاده می‌شوند؛
+- محدودیت کلی ربات (حدود 30 درخواست در ثانیه) و محدودیت هر چت (حدود یک پیام
+  در ثانیه در چت خصوصی و 20 پیام در دقیقه در گروه) با سطل توکن رعایت می‌شود؛
+- درخواست‌های منتظر بر اساس اولویت نوبت می‌گیرند: پاسخ به کاربر، سپس ویرایش
+  پیام‌های پیشرفت و در آخر ارسال همگانی؛
+- با پاسخ 429 چت (یا کل ربات) به اندازه retry_after متوقف و درخواست دوباره
+  ارسال می‌شود.
+
+درخواست در همان ترد فراخواننده ارسال می‌شود؛ دروازه فقط زمان ارسال را تعیین
+می‌کند، بنابراین رفتار همگام کتابخانه telebot تغییر نمی‌کند.
+"""
+
+import os
+import json
+import time
+import uuid
+import bisect
+import queue
+import itertools
+import threading
+import contextlib
+import http.client
+import urllib.parse
+from typing import Dict, Any, Optional, Tuple, Union
+
+from config import (
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_GROUP_RATE_PER_MIN,
+    TELEGRAM_CHAT_BURST, GATEWAY_POOL_SIZE, GATEWAY_MAX_RETRIES, UPLOAD_CHUNK_SIZE
+)
+from debug_logger import debug_log
+
+
+class RequestPriority:
+    """کلاس‌های اولویت درخواست‌های خروجی (عدد کمتر = اولویت بیشتر)"""
+    REPLY = 0       # پاسخ مستقیم به کاربر
+    PROGRESS = 10   # ویرایش پیام‌های پیشرفت
+    BROADCAST = 20  # ارسال همگانی
+
+    NAMES = {REPLY: "reply", PROGRESS: "progress", BROADCAST: "broadcast"}
+
+
+# متدهایی که به صورت پیش‌فرض اولویت پیام پیشرفت دارند
+PROGRESS_METHODS = ("editMessageText", "editMessageCaption", "editMessageReplyMarkup", "sendChatAction")
+
+# متدهایی که مشمول صف و محدودیت نرخ نیستند (long polling و درخواست‌های مدیریتی)
+UNLIMITED_METHODS = ("getUpdates", "getMe", "getFile", "getWebhookInfo", "setWebhook",
+                     "deleteWebhook", "setMyCommands", "deleteMyCommands", "close", "logOut")
+
+
+class TokenBucket:
+    """
+    سطل توکن ساده (بدون قفل؛ زیر قفل دروازه استفاده می‌شود)
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """زمان باقی‌مانده تا آماده شدن یک توکن (ثانیه)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        """برداشتن یک توکن"""
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        """بررسی پر بودن سطل (برای پاکسازی سطل‌های بدون استفاده)"""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _GatewayResponse:
+    """پاسخ HTTP با رابط مشابه requests.Response (مورد نیاز telebot)"""
+
+    def __init__(self, status_code: int, reason: str, content: bytes):
+        self.status_code = status_code
+        self.reason = reason
+        self.content = content
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content.decode("utf-8"))
+
+
+class _ConnectionPool:
+    """استخر اتصال‌های keep-alive به یک سرور"""
+
+    def __init__(self, scheme: str, netloc: str, size: int):
+        self.scheme = scheme
+        self.netloc = netloc
+        self._idle = queue.LifoQueue(maxsize=max(1, size))
+
+    def get(self, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        گرفتن یک اتصال از استخر یا ساخت اتصال جدید
+
+        Returns:
+            (اتصال، آیا اتصال قبلی دوباره استفاده شده است)
+        """
+        try:
+            connection = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            connection = connection_class(self.netloc, timeout=timeout)
+            reused = False
+
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection, reused
+
+    def put(self, connection: http.client.HTTPConnection) -> None:
+        """برگرداندن اتصال به استخر (در صورت پر بودن استخر بسته می‌شود)"""
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+
+def _param_value(value: Any) -> str:
+    """تبدیل مقدار پارامتر به رشته قابل ارسال"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+class _MultipartBody:
+    """
+    بدنه multipart درخواست‌های دارای فایل (فایل‌های telebot)
+
+    فایل‌ها به جای خوانده شدن کامل در حافظه، هنگام ارسال تکه تکه خوانده
+    می‌شوند. بدنه قابل تکرار است تا ارسال مجدد پس از 429 یا قطع اتصال بیکار
+    دوباره از ابتدای فایل‌ها انجام شود.
+    """
+
+    def __init__(self, params: Dict[str, Any], files: Dict[str, Any], chunk_size: int = UPLOAD_CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = max(1024, chunk_size)
+        self._parts = []  # bytes یا (فایل، موقعیت شروع، حجم)
+
+        for name, value in params.items():
+            self._parts.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode("utf-8")
+                + _param_value(value).encode("utf-8") + b"\r\n"
+            )
+
+        for name, value in files.items():
+            filename, content, content_type = name, value, "application/octet-stream"
+            if isinstance(value, tuple):
+                filename, content = value[0], value[1]
+                if len(value) > 2 and value[2]:
+                    content_type = value[2]
+
+            self._parts.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f'Content-Type: {content_type}\r\n\r\n'.encode("utf-8")
+            )
+            self._parts.append(self._content_part(content))
+            self._parts.append(b"\r\n")
+
+        self._parts.append(f"--{self.boundary}--\r\n".encode("utf-8"))
+        self.length = sum(len(part) if isinstance(part, bytes) else part[2] for part in self._parts)
+
+    @staticmethod
+    def _content_part(content: Any):
+        """محتوای فایل: فایل قابل جابجایی به صورت جریانی، بقیه در حافظه"""
+        if hasattr(content, "read"):
+            try:
+                start = content.tell()
+                size = content.seek(0, os.SEEK_END) - start
+                content.seek(start)
+                return (content, start, size)
+            except (AttributeError, OSError, ValueError):
+                content = content.read()
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        return content
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __iter__(self):
+        for part in self._parts:
+            if isinstance(part, bytes):
+                yield part
+                continue
+
+            stream, start, remaining = part
+            stream.seek(start)
+            while remaining > 0:
+                chunk = stream.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    raise OSError("فایل حین آپلود کوتاه‌تر شد")
+                remaining -= len(chunk)
+                yield chunk
+
+
+class TelegramGateway:
+    """
+    دروازه مشترک درخواست‌های خروجی به Bot API
+    """
+
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE, chat_rate: float = TELEGRAM_CHAT_RATE,
+                 group_rate_per_min: float = TELEGRAM_GROUP_RATE_PER_MIN, chat_burst: int = TELEGRAM_CHAT_BURST,
+                 pool_size: int = GATEWAY_POOL_SIZE, max_retries: int = GATEWAY_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_min / 60.0
+        self.chat_burst = chat_burst
+        self.pool_size = pool_size
+        self.max_retries = max(0, max_retries)
+
+        self._cond = threading.Condition()
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._blocked_until: Dict[Optional[str], float] = {}
+        self._waiters = []
+        self._seq = itertools.count()
+        self._local = threading.local()
+
+        self._pools: Dict[Tuple[str, str], _ConnectionPool] = {}
+        self._pools_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0, "retries": 0, "errors": 0,
+                      "connections": 0, "reused_connections": 0}
+        self._delays = {priority: {"count": 0, "total": 0.0, "max": 0.0} for priority in RequestPriority.NAMES}
+
+    # --- اولویت ---
+
+    @contextlib.contextmanager
+    def priority(self, priority: int):
+        """
+        تعیین اولویت درخواست‌های ارسال شده در همین ترد
+
+        Args:
+            priority: یکی از مقادیر RequestPriority
+        """
+        previous = getattr(self._local, "priority", None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def _priority_for(self, method: str) -> int:
+        """اولویت درخواست بر اساس اولویت ترد یا نوع متد"""
+        priority = getattr(self._local, "priority", None)
+        if priority is not None:
+            return priority
+        return RequestPriority.PROGRESS if method in PROGRESS_METHODS else RequestPriority.REPLY
+
+    # --- محدودیت نرخ ---
+
+    @staticmethod
+    def _chat_key(chat_id: Any) -> Optional[str]:
+        return None if chat_id is None or chat_id == "" else str(chat_id)
+
+    def _chat_bucket(self, chat_key: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_key)
+        if bucket is None:
+            # شناسه منفی (گروه) یا نام کاربری (کانال) محدودیت دقیقه‌ای دارند
+            is_group = chat_key.startswith("-") or chat_key.startswith("@")
+            bucket = TokenBucket(self.group_rate if is_group else self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_key] = bucket
+        return bucket
+
+    def _chat_wait(self, chat_key: Optional[str], now: float) -> float:
+        """زمان باقی‌مانده تا مجاز شدن ارسال به یک چت"""
+        wait = self._blocked_until.get(chat_key, 0) - now
+        if chat_key is not None:
+            wait = max(wait, self._chat_bucket(chat_key).wait_time(now))
+        return max(0.0, wait)
+
+    def _global_wait(self, now: float) -> float:
+        """زمان باقی‌مانده تا مجاز شدن ارسال بعدی ربات"""
+        return max(0.0, self._blocked_until.get(None, 0) - now, self._global_bucket.wait_time(now))
+
+    def acquire(self, method: str, chat_id: Any = None, priority: Optional[int] = None) -> float:
+        """
+        انتظار برای نوبت ارسال یک درخواست
+
+        در هر لحظه پر اولویت‌ترین درخواستی که چت آن مجاز به ارسال است نوبت می‌گیرد؛
+        درخواست‌های چت‌های محدود شده مانع ارسال بقیه نمی‌شوند.
+
+        Args:
+            method: نام متد Bot API
+            chat_id: شناسه چت مقصد (اختیاری)
+            priority: اولویت (پیش‌فرض: بر اساس ترد و نوع متد)
+
+        Returns:
+            زمان انتظار در صف (ثانیه)
+        """
+        if priority is None:
+            priority = self._priority_for(method)
+        chat_key = self._chat_key(chat_id)
+        enqueued = time.monotonic()
+        waiter = (priority, next(self._seq), chat_key)
+
+        with self._cond:
+            bisect.insort(self._waiters, waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    timeout = self._try_admit(waiter, now)
+                    if timeout is None:
+                        break
+                    self._cond.wait(timeout)
+            finally:
+                self._waiters.remove(waiter)
+                self._cond.notify_all()
+
+            if len(self._chat_buckets) > 10000:
+                self._prune_buckets(now)
+
+        delay = time.monotonic() - enqueued
+        with self._stats_lock:
+            record = self._delays.setdefault(priority, {"count": 0, "total": 0.0, "max": 0.0})
+            record["count"] += 1
+            record["total"] += delay
+            record["max"] = max(record["max"], delay)
+        return delay
+
+    def _try_admit(self, waiter: Tuple, now: float) -> Optional[float]:
+        """
+        تلاش برای صدور نوبت (زیر قفل)
+
+        Returns:
+            None در صورت صدور نوبت، در غیر این صورت حداکثر زمان انتظار تا بررسی دوباره
+        """
+        own_wait = self._chat_wait(waiter[2], now)
+
+        for other in self._waiters:
+            if other is waiter:
+                break
+            if self._chat_wait(other[2], now) <= 0:
+                # درخواست پر اولویت‌تری آماده است؛ پس از ارسال آن بیدار می‌شویم
+                return max(own_wait, 0.05)
+
+        if own_wait > 0:
+            return own_wait
+
+        global_wait = self._global_wait(now)
+        if global_wait > 0:
+            return global_wait
+
+        self._global_bucket.take(now)
+        if waiter[2] is not None:
+            self._chat_bucket(waiter[2]).take(now)
+        return None
+
+    def _prune_buckets(self, now: float) -> None:
+        """حذف سطل چت‌هایی که مدتی پیامی نداشته‌اند"""
+        waiting = {waiter[2] for waiter in self._waiters}
+        for chat_key in [key for key, bucket in self._chat_buckets.items()
+                         if key not in waiting and bucket.is_full(now)]:
+            del self._chat_buckets[chat_key]
+        for chat_key in [key for key, until in self._blocked_until.items() if until <= now]:
+            del self._blocked_until[chat_key]
+
+    def defer(self, chat_id: Any, retry_after: float) -> None:
+        """
+        توقف ارسال به یک چت (یا کل ربات در صورت نبود چت) پس از پاسخ 429
+
+        Args:
+            chat_id: شناسه چت (None برای کل ربات)
+            retry_after: مدت توقف به ثانیه
+        """
+        chat_key = self._chat_key(chat_id)
+        with self._cond:
+            until = time.monotonic() + retry_after
+            self._blocked_until[chat_key] = max(self._blocked_until.get(chat_key, 0), until)
+            self._cond.notify_all()
+
+        with self._stats_lock:
+            self.stats["rate_limited"] += 1
+        debug_log(f"محدودیت نرخ تلگرام برای {chat_key or 'کل ربات'}: توقف {retry_after} ثانیه", "WARNING")
+
+    # --- ارسال ---
+
+    def _pool(self, scheme: str, netloc: str) -> _ConnectionPool:
+        with self._pools_lock:
+            pool = self._pools.get((scheme, netloc))
+            if pool is None:
+                pool = _ConnectionPool(scheme, netloc, self.pool_size)
+                self._pools[(scheme, netloc)] = pool
+            return pool
+
+    def _send(self, http_method: str, url: str, body: Union[bytes, _MultipartBody, None],
+              headers: Dict[str, str], timeout: float) -> _GatewayResponse:
+        """ارسال یک درخواست HTTP روی اتصال keep-alive"""
+        parsed = urllib.parse.urlsplit(url)
+        pool = self._pool(parsed.scheme, parsed.netloc)
+        path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+
+        while True:
+            connection, reused = pool.get(timeout)
+            with self._stats_lock:
+                self.stats["reused_connections" if reused else "connections"] += 1
+
+            try:
+                connection.request(http_method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                content = response.read()
+            except (ConnectionResetError, BrokenPipeError, http.client.BadStatusLine):
+                connection.close()
+                if reused:
+                    # اتصال بیکار توسط سرور بسته شده است؛ تلاش با اتصال جدید
+                    continue
+                raise
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                pool.put(connection)
+            return _GatewayResponse(response.status, response.reason, content)
+
+    @staticmethod
+    def _retry_after(response: _GatewayResponse) -> Optional[float]:
+        """استخراج retry_after از پاسخ 429"""
+        if response.status_code != 429:
+            return None
+        try:
+            return float((response.json().get("parameters") or {}).get("retry_after", 1))
+        except (ValueError, AttributeError):
+            return 1.0
+
+    def request(self, http_method: str, url: str, params: Optional[Dict[str, Any]] = None,
+                files: Optional[Dict[str, Any]] = None,
+                timeout: Union[float, Tuple[float, float], None] = None) -> _GatewayResponse:
+        """
+        ارسال یک درخواست Bot API با رعایت محدودیت نرخ و تلاش مجدد پس از 429
+
+        Args:
+            http_method: متد HTTP (get یا post)
+            url: آدرس کامل متد (شامل توکن)
+            params: پارامترهای متد
+            files: فایل‌های ارسالی (اختیاری)
+            timeout: مهلت پاسخ به ثانیه یا (اتصال، خواندن)
+
+        Returns:
+            پاسخ HTTP
+        """
+        method = url.rstrip("/").rsplit("/", 1)[-1]
+        params = {name: value for name, value in (params or {}).items() if value is not None}
+        chat_id = params.get("chat_id")
+        if isinstance(timeout, tuple):
+            timeout = max(value for value in timeout if value is not None)
+        timeout = timeout or 60
+
+        headers = {"Connection": "keep-alive"}
+        if files:
+            body = _MultipartBody(params, files)
+            headers["Content-Type"] = body.content_type
+            # با Content-Length مشخص، http.client بدنه را بدون chunked encoding ارسال می‌کند
+            headers["Content-Length"] = str(body.length)
+            http_method = "POST"
+        elif http_method.upper() == "GET":
+            if params:
+                url += ("&" if "?" in url else "?") + urllib.parse.urlencode(
+                    {name: _param_value(value) for name, value in params.items()})
+            body = None
+        else:
+            body = urllib.parse.urlencode({name: _param_value(value) for name, value in params.items()}).encode("utf-8")
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        retries = 0
+        while True:
+            if method not in UNLIMITED_METHODS:
+                self.acquire(method, chat_id)
+
+            try:
+                response = self._send(http_method.upper(), url, body, headers, timeout)
+            except (OSError, http.client.HTTPException):
+                with self._stats_lock:
+                    self.stats["errors"] += 1
+                raise
+
+            with self._stats_lock:
+                self.stats["requests"] += 1
+
+            retry_after = self._retry_after(response)
+            if retry_after is None:
+                return response
+
+            self.defer(chat_id, retry_after)
+            if retries >= self.max_retries:
+                return response
+            retries += 1
+            with self._stats_lock:
+                self.stats["retries"] += 1
+
+    def telebot_sender(self, method: str, url: str, **kwargs) -> _GatewayResponse:
+        """ارسال کننده سفارشی برای apihelper.CUSTOM_REQUEST_SENDER کتابخانه telebot"""
+        return self.request(method, url, params=kwargs.get("params"), files=kwargs.get("files"),
+                            timeout=kwargs.get("timeout"))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        دریافت آمار دروازه
+
+        Returns:
+            دیکشنری آمار شامل نرخ پاسخ‌های 429 و تاخیر صف هر اولویت (ثانیه)
+        """
+        with self._stats_lock:
+            stats = dict(self.stats)
+            delays = {priority: dict(record) for priority, record in self._delays.items()}
+
+        with self._cond:
+            stats["waiting"] = len(self._waiters)
+
+        stats["rate_limited_ratio"] = stats["rate_limited"] / stats["requests"] if stats["requests"] else 0
+        stats["queue_delay"] = {
+            RequestPriority.NAMES.get(priority, str(priority)): {
+                "count": record["count"],
+                "avg": record["total"] / record["count"] if record["count"] else 0,
+                "max": record["max"],
+            }
+            for priority, record in delays.items()
+        }
+        return stats
+
+
+def install_telebot_gateway() -> None:
+    """ارسال همه درخواست‌های کتابخانه telebot از طریق دروازه"""
+    from telebot import apihelper
+
+    apihelper.CUSTOM_REQUEST_SENDER = telegram_gateway.telebot_sender
+
+
+# نمونه سراسری
+telegram_gateway = TelegramGateway()
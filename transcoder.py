@@ -0,0 +1,293 @@
+"""
+ماژول فشرده‌سازی ویدیو برای جا شدن در محدودیت حجم تلگرام
+
+وقتی هیچ فرمت آماده‌ای در محدودیت ارسال جا نمی‌شود، ویدیو پس از دانلود با
+ffmpeg (دو مرحله‌ای یا CRF با سقف بیت‌ریت) به حجم هدف فشرده می‌شود. بیت‌ریت
+هدف از روی حجم مجاز و مدت زمان ویدیو محاسبه می‌شود.
+
+فشرده‌سازی در استخر پروسه‌هایی به تعداد هسته‌های CPU و با اولویت پایین
+(nice) اجرا می‌شود تا پردازش پیام‌های ربات کند نشود. تعداد کارهای در صف و
+در حال اجرا محدود است و درخواست‌های اضافه فوراً رد می‌شوند. با لغو دانلود یا
+گذشتن از حداکثر زمان، پروسه ffmpeg در کارگر متوقف می‌شود.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError, TimeoutError as FutureTimeout
+from typing import Dict, Any, Optional
+
+from config import (
+    TRANSCODE_WORKERS, TRANSCODE_MAX_QUEUE, TRANSCODE_NICE, TRANSCODE_MODE,
+    TRANSCODE_THREADS, TRANSCODE_AUDIO_KBPS, TRANSCODE_MIN_VIDEO_KBPS
+)
+from debug_logger import debug_log
+from download_cancellation import DownloadCancelled
+
+# سهم سربار کانتینر و خطای کنترل بیت‌ریت از حجم هدف
+CONTAINER_OVERHEAD = 0.03
+
+# حداکثر زمان هر اجرای ffmpeg (ثانیه)
+FFMPEG_TIMEOUT = 3 * 3600
+
+# فاصله بررسی درخواست توقف در کارگر (ثانیه)
+STOP_POLL_INTERVAL = 0.5
+
+
+class TranscodeError(Exception):
+    """خطای فشرده‌سازی"""
+
+
+class TranscodeQueueFull(TranscodeError):
+    """صف فشرده‌سازی پر است"""
+
+
+def compute_target_bitrates(duration: float, target_bytes: int,
+                            audio_kbps: int = TRANSCODE_AUDIO_KBPS) -> Optional[Dict[str, int]]:
+    """
+    محاسبه بیت‌ریت ویدیو و صدا برای رسیدن به حجم هدف
+
+    Args:
+        duration: مدت زمان ویدیو به ثانیه
+        target_bytes: حجم هدف به بایت
+        audio_kbps: بیت‌ریت صدا (کیلوبیت بر ثانیه)
+
+    Returns:
+        {"video_kbps", "audio_kbps"} یا None اگر کیفیت قابل قبولی در این حجم ممکن نباشد
+    """
+    if not duration or duration <= 0:
+        return None
+
+    total_kbps = target_bytes * 8 * (1 - CONTAINER_OVERHEAD) / duration / 1000
+    # برای ویدیوهای خیلی طولانی، صدا هم فشرده‌تر می‌شود
+    audio_kbps = min(audio_kbps, max(32, int(total_kbps * 0.15)))
+    video_kbps = int(total_kbps - audio_kbps)
+
+    if video_kbps < TRANSCODE_MIN_VIDEO_KBPS:
+        return None
+    return {"video_kbps": video_kbps, "audio_kbps": audio_kbps}
+
+
+def is_available() -> bool:
+    """بررسی نصب بودن ffmpeg"""
+    return shutil.which("ffmpeg") is not None
+
+
+# --- کدهای اجرا شونده در پروسه کارگر ---
+
+def _lower_priority(nice: int) -> None:
+    """کاهش اولویت CPU پروسه کارگر (ffmpeg همین اولویت را به ارث می‌برد)"""
+    try:
+        os.nice(nice)
+    except (AttributeError, OSError):
+        pass
+
+
+def _stop_process(process: subprocess.Popen) -> None:
+    """توقف ffmpeg (ابتدا terminate و در صورت نیاز kill)"""
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _run_ffmpeg(args, stop_event) -> None:
+    """
+    اجرای ffmpeg و توقف آن با درخواست لغو یا گذشتن از حداکثر زمان
+
+    Args:
+        args: آرگومان‌های ffmpeg
+        stop_event: رویداد Manager که با لغو کار در پروسه اصلی فعال می‌شود
+    """
+    deadline = time.monotonic() + FFMPEG_TIMEOUT
+
+    # خطاها در فایل موقت نوشته می‌شوند تا پر شدن Pipe ffmpeg را متوقف نکند
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(["ffmpeg", "-y", "-hide_banner", "-v", "error"] + args,
+                                   stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=stderr)
+        while True:
+            try:
+                returncode = process.wait(timeout=STOP_POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+
+            if stop_event.is_set():
+                _stop_process(process)
+                raise DownloadCancelled("canceled")
+            if time.monotonic() > deadline:
+                _stop_process(process)
+                raise RuntimeError(f"ffmpeg بیش از {FFMPEG_TIMEOUT} ثانیه طول کشید")
+
+        if returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode("utf-8", errors="replace").strip()[-500:]
+            raise RuntimeError(message or "ffmpeg failed")
+
+
+def _transcode_job(input_path: str, output_path: str, video_kbps: int, audio_kbps: int,
+                   mode: str, threads: int, stop_event) -> Dict[str, Any]:
+    """اجرای فشرده‌سازی در پروسه کارگر"""
+    started = time.time()
+    cpu_before = os.times()
+    common = ["-c:v", "libx264", "-preset", "medium", "-threads", str(threads), "-pix_fmt", "yuv420p"]
+    maxrate = ["-maxrate", f"{video_kbps}k", "-bufsize", f"{video_kbps * 2}k"]
+    audio = ["-c:a", "aac", "-b:a", f"{audio_kbps}k"]
+    output = ["-movflags", "+faststart", output_path]
+
+    if mode == "crf":
+        # یک مرحله با کیفیت ثابت و سقف بیت‌ریت
+        _run_ffmpeg(["-i", input_path] + common + ["-crf", "26"] + maxrate + audio + output, stop_event)
+    else:
+        # دو مرحله‌ای: مرحله اول فقط آمار بیت‌ریت را جمع می‌کند
+        passlog_dir = tempfile.mkdtemp(prefix="transcode-")
+        passlog = os.path.join(passlog_dir, "pass")
+        try:
+            _run_ffmpeg(["-i", input_path] + common + ["-b:v", f"{video_kbps}k", "-pass", "1",
+                         "-passlogfile", passlog, "-an", "-f", "mp4", os.devnull], stop_event)
+            _run_ffmpeg(["-i", input_path] + common + ["-b:v", f"{video_kbps}k"] + maxrate +
+                        ["-pass", "2", "-passlogfile", passlog] + audio + output, stop_event)
+        finally:
+            shutil.rmtree(passlog_dir, ignore_errors=True)
+
+    cpu_after = os.times()
+    return {
+        "output": output_path,
+        "size": os.path.getsize(output_path),
+        "seconds": time.time() - started,
+        # زمان CPU پروسه‌های ffmpeg (فرزندان همین کارگر)
+        "cpu_seconds": (cpu_after.children_user - cpu_before.children_user) +
+                       (cpu_after.children_system - cpu_before.children_system),
+    }
+
+
+# --- مدیریت استخر در پروسه اصلی ---
+
+class Transcoder:
+    """
+    استخر پروسه‌های فشرده‌سازی با محدودیت طول صف
+    """
+
+    def __init__(self, workers: int = TRANSCODE_WORKERS, max_queue: int = TRANSCODE_MAX_QUEUE,
+                 nice: int = TRANSCODE_NICE, mode: str = TRANSCODE_MODE, threads: int = TRANSCODE_THREADS):
+        self.workers = max(1, workers)
+        self.max_queue = max(self.workers, max_queue)
+        self.nice = nice
+        self.mode = mode
+        self.threads = max(1, threads)
+        self._executor = None
+        self._manager = None
+        self._lock = threading.Lock()
+        self._depth = 0
+        self.stats = {"jobs": 0, "failed": 0, "rejected": 0, "media_seconds": 0.0,
+                      "wall_seconds": 0.0, "cpu_seconds": 0.0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """ساخت استخر پروسه‌ها در اولین استفاده (زیر قفل)"""
+        if self._executor is None:
+            # spawn: پروسه اصلی چند تردی است و fork ممکن است قفل‌های گرفته شده را کپی کند
+            context = multiprocessing.get_context("spawn")
+            self._manager = context.Manager()
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                 initializer=_lower_priority, initargs=(self.nice,))
+        return self._executor
+
+    def transcode_to_fit(self, input_path: str, duration: float, target_bytes: int,
+                         output_path: Optional[str] = None, cancel_token=None) -> str:
+        """
+        فشرده‌سازی ویدیو به حجم هدف (تا پایان کار مسدود می‌شود)
+
+        Args:
+            input_path: مسیر ویدیوی ورودی
+            duration: مدت زمان ویدیو به ثانیه
+            target_bytes: حداکثر حجم خروجی به بایت
+            output_path: مسیر خروجی (پیش‌فرض: کنار فایل ورودی با پسوند .fit.mp4)
+            cancel_token: توکن لغو که در صف و حین اجرای ffmpeg بررسی می‌شود (اختیاری)
+
+        Returns:
+            مسیر فایل فشرده شده
+        """
+        bitrates = compute_target_bitrates(duration, target_bytes)
+        if bitrates is None:
+            raise TranscodeError("ویدیو برای فشرده‌سازی در حجم مجاز بیش از حد طولانی است")
+
+        if output_path is None:
+            output_path = os.path.splitext(input_path)[0] + ".fit.mp4"
+
+        with self._lock:
+            if self._depth >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise TranscodeQueueFull("صف فشرده‌سازی پر است، لطفاً کمی بعد دوباره تلاش کنید")
+            self._depth += 1
+            executor = self._get_executor()
+            stop_event = self._manager.Event()
+            future = executor.submit(
+                _transcode_job, input_path, output_path, bitrates["video_kbps"],
+                bitrates["audio_kbps"], self.mode, self.threads, stop_event
+            )
+
+        debug_log(f"فشرده‌سازی {os.path.basename(input_path)} با بیت‌ریت ویدیو "
+                  f"{bitrates['video_kbps']}k و صدا {bitrates['audio_kbps']}k ({self.mode})", "INFO")
+
+        try:
+            while True:
+                if cancel_token is not None and cancel_token.cancelled and not stop_event.is_set():
+                    # کار در صف حذف می‌شود و ffmpeg در حال اجرا در کارگر متوقف می‌شود
+                    stop_event.set()
+                    future.cancel()
+                try:
+                    result = future.result(timeout=STOP_POLL_INTERVAL)
+                    break
+                except FutureTimeout:
+                    continue
+        except (DownloadCancelled, CancelledError):
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise DownloadCancelled(getattr(cancel_token, "reason", None) or "canceled")
+        except Exception as e:
+            with self._lock:
+                self.stats["failed"] += 1
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise TranscodeError(f"خطا در فشرده‌سازی ویدیو: {str(e)}")
+        finally:
+            with self._lock:
+                self._depth -= 1
+
+        if result["size"] > target_bytes:
+            os.remove(output_path)
+            with self._lock:
+                self.stats["failed"] += 1
+            raise TranscodeError("حجم ویدیوی فشرده شده همچنان بیشتر از حد مجاز است")
+
+        with self._lock:
+            self.stats["jobs"] += 1
+            self.stats["media_seconds"] += duration
+            self.stats["wall_seconds"] += result["seconds"]
+            self.stats["cpu_seconds"] += result["cpu_seconds"]
+
+        debug_log(f"فشرده‌سازی در {result['seconds']:.1f} ثانیه انجام شد، حجم خروجی {result['size']} بایت", "INFO")
+        return output_path
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        دریافت آمار فشرده‌سازی
+
+        Returns:
+            دیکشنری آمار شامل سرعت نسبت به زمان واقعی ویدیو برای هر هسته
+        """
+        with self._lock:
+            stats = dict(self.stats, workers=self.workers, queued=self._depth, max_queue=self.max_queue)
+        # ثانیه ویدیو فشرده شده به ازای هر ثانیه CPU
+        stats["realtime_per_core"] = stats["media_seconds"] / stats["cpu_seconds"] if stats["cpu_seconds"] else 0
+        return stats
+
+
+# نمونه سراسری (پروسه‌ها در اولین استفاده ساخته می‌شوند)
+transcoder = Transcoder()
@@ -10,6 +10,7 @@ import time
 import telebot
 from telebot import types
 from typing import Dict, List, Any, Tuple, Optional, Union, Callable
+from progress_renderer import progress_renderer
 
 # مسیر فایل هشتگ‌ها
 HASHTAGS_FILE = "hashtags.json"
@@ -667,33 +668,29 @@ class TransparentBot:
                 try:
                     # ایجاد تابع گزارش پیشرفت
                     def progress_callback(processed, found_count, total, error_msg=None):
-                        try:
-                            # بروزرسانی پیام پیشرفت هر 10 کانال یا در صورت خطا
-                            if error_msg or processed % 10 == 0 or processed == total:
-                                progress_percentage = int((processed / total) * 100) if total > 0 else 0
-                                progress_bar = "▰" * (progress_percentage // 10) + "▱" * (10 - (progress_percentage // 10))
-                                
-                                status_text = (
-                                    f"🔍 جستجوی هشتگ `{hashtag}`\n\n"
-                                    f"📊 پیشرفت: {progress_bar} {progress_percentage}%\n"
-                                    f"🔢 کانال‌های بررسی شده: {processed}/{total}\n"
-                                    f"✅ نتایج یافت شده: {found_count}"
-                                )
-                                
-                                if error_msg:
-                                    status_text += f"\n\n⚠️ {error_msg}"
-                                
-                                self.bot.edit_message_text(
-                                    status_text,
-                                    message.chat.id,
-                                    processing_msg.message_id,
-                                    parse_mode='Markdown'
-                                )
-                        except Exception as e:
-                            debug_log(f"خطا در گزارش پیشرفت جستجو: {e}", "ERROR")
+                        # فقط آخرین وضعیت ثبت و حداکثر هر چند ثانیه یک بار ارسال می‌شود
+                        progress_percentage = int((processed / total) * 100) if total > 0 else 0
+                        progress_bar = "▰" * (progress_percentage // 10) + "▱" * (10 - (progress_percentage // 10))
+                        
+                        status_text = (
+                            f"🔍 جستجوی هشتگ `{hashtag}`\n\n"
+                            f"📊 پیشرفت: {progress_bar} {progress_percentage}%\n"
+                            f"🔢 کانال‌های بررسی شده: {processed}/{total}\n"
+                            f"✅ نتایج یافت شده: {found_count}"
+                        )
+                        
+                        if error_msg:
+                            status_text += f"\n\n⚠️ {error_msg}"
+                        
+                        progress_renderer.update(self.bot, message.chat.id, processing_msg.message_id,
+                                                 status_text, parse_mode='Markdown')
                     
                     # انجام جستجو با گزارش پیشرفت
-                    messages = self.hashtag_manager.search_hashtag_in_channels(hashtag, progress_callback)
+                    try:
+                        messages = self.hashtag_manager.search_hashtag_in_channels(hashtag, progress_callback)
+                    finally:
+                        # پیام پیشرفت با نتیجه جستجو جایگزین می‌شود
+                        progress_renderer.cancel(message.chat.id, processing_msg.message_id)
                     
                     # نمایش نتایج جستجو
                     self.show_hashtag_messages_simple(message, hashtag, messages, processing_msg.message_id)
@@ -0,0 +1,421 @@
+"""
+ماژول آپلود فایل به تلگرام
+
+فایل‌ها به جای ارسال یک‌جا توسط کتابخانه ربات، به صورت multipart و تکه به
+تکه روی یک اتصال HTTP ارسال می‌شوند؛ حافظه مصرفی به اندازه یک تکه محدود
+است، درصد آپلود گزارش می‌شود، خطاهای موقت شبکه و پاسخ 429 (با retry_after)
+با تلاش مجدد مدیریت می‌شوند و سرعت آپلودها ثبت می‌شود.
+
+در حالت سرور Bot API محلی (TELEGRAM_LOCAL_MODE) هیچ داده‌ای از پروسه ربات
+عبور نمی‌کند؛ فقط مسیر file:// فایل ارسال می‌شود و سرور خودش فایل را از
+دیسک می‌خواند (تا 2 گیگابایت).
+"""
+
+import os
+import json
+import time
+import uuid
+import pathlib
+import threading
+import http.client
+import urllib.parse
+from typing import Dict, Any, Optional, Callable, List, Tuple
+
+from config import (
+    BOT_TOKEN, TELEGRAM_API_URL, TELEGRAM_LOCAL_MODE, TELEGRAM_CLOUD_UPLOAD_LIMIT_MB,
+    TELEGRAM_LOCAL_UPLOAD_LIMIT_MB, UPLOAD_CHUNK_SIZE, UPLOAD_RETRIES, UPLOAD_TIMEOUT
+)
+from debug_logger import debug_log
+from telegram_gateway import telegram_gateway
+
+# متد Bot API و نام فیلد فایل برای هر نوع رسانه
+SEND_METHODS = {
+    "video": "sendVideo",
+    "audio": "sendAudio",
+    "document": "sendDocument",
+    "photo": "sendPhoto",
+}
+
+# حداقل فاصله گزارش پیشرفت آپلود (ثانیه)
+PROGRESS_INTERVAL = 2.0
+
+# حداکثر انتظار بین تلاش‌های مجدد (ثانیه)
+MAX_BACKOFF = 30
+
+# callback پیشرفت به صورت (درصد، بایت ارسال شده، حجم کل)
+UploadProgressCallback = Callable[[float, int, int], None]
+
+
+def get_upload_limit() -> int:
+    """
+    حداکثر حجم فایل قابل ارسال با سرور Bot API فعلی
+
+    Returns:
+        حجم به بایت
+    """
+    limit_mb = TELEGRAM_LOCAL_UPLOAD_LIMIT_MB if TELEGRAM_LOCAL_MODE else TELEGRAM_CLOUD_UPLOAD_LIMIT_MB
+    return limit_mb * 1024 * 1024
+
+
+def file_uri(file_path: str) -> str:
+    """
+    تبدیل مسیر فایل به آدرس file:// برای سرور Bot API محلی
+
+    Args:
+        file_path: مسیر فایل
+
+    Returns:
+        آدرس file:// با مسیر مطلق
+    """
+    return pathlib.Path(os.path.abspath(file_path)).as_uri()
+
+
+def configure_telebot_api() -> None:
+    """تنظیم آدرس‌های کتابخانه telebot برای سرور Bot API تعیین شده"""
+    from telebot import apihelper
+
+    api_url = TELEGRAM_API_URL.rstrip("/")
+    apihelper.API_URL = api_url + "/bot{0}/{1}"
+    apihelper.FILE_URL = api_url + "/file/bot{0}/{1}"
+
+
+def configure_ptb_builder(builder):
+    """
+    تنظیم سازنده Application کتابخانه python-telegram-bot برای سرور Bot API تعیین شده
+
+    Args:
+        builder: خروجی Application.builder()
+
+    Returns:
+        همان سازنده
+    """
+    api_url = TELEGRAM_API_URL.rstrip("/")
+    builder = builder.base_url(api_url + "/bot").base_file_url(api_url + "/file/bot")
+    if TELEGRAM_LOCAL_MODE:
+        builder = builder.local_mode(True)
+    return builder
+
+
+class UploadError(Exception):
+    """خطای غیرقابل تکرار در آپلود (پاسخ خطای Bot API)"""
+
+    def __init__(self, description: str, error_code: Optional[int] = None):
+        super().__init__(description)
+        self.description = description
+        self.error_code = error_code
+
+
+class _RetryableError(Exception):
+    """خطای موقت که با تلاش مجدد ممکن است برطرف شود"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _form_value(value: Any) -> str:
+    """تبدیل مقدار پارامتر به رشته قابل ارسال در فرم"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+class TelegramUploader:
+    """
+    آپلود فایل‌ها به Bot API به صورت جریانی
+    """
+
+    def __init__(self, token: str = BOT_TOKEN, api_url: str = TELEGRAM_API_URL,
+                 chunk_size: int = UPLOAD_CHUNK_SIZE, retries: int = UPLOAD_RETRIES,
+                 timeout: float = UPLOAD_TIMEOUT, local_mode: bool = TELEGRAM_LOCAL_MODE):
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.local_mode = local_mode
+        self.chunk_size = max(1024, chunk_size)
+        self.retries = max(0, retries)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.stats = {"uploads": 0, "bytes": 0, "seconds": 0.0, "retries": 0, "failures": 0}
+
+    def send_file(self, kind: str, chat_id: int, file_path: str,
+                  progress_callback: Optional[UploadProgressCallback] = None,
+                  cancel_token=None, filename: Optional[str] = None, **params) -> Dict[str, Any]:
+        """
+        ارسال فایل به یک چت
+
+        Args:
+            kind: نوع رسانه (video، audio، document، photo)
+            chat_id: شناسه چت
+            file_path: مسیر فایل
+            progress_callback: تابع دریافت پیشرفت آپلود (اختیاری)
+            cancel_token: توکن لغو که بین تکه‌ها بررسی می‌شود (اختیاری)
+            filename: نام فایل در تلگرام (پیش‌فرض: نام فایل روی دیسک)
+            **params: سایر پارامترهای متد (caption، supports_streaming و ...)
+
+        Returns:
+            دیکشنری پیام ارسال شده (همان result پاسخ Bot API)
+        """
+        method = SEND_METHODS[kind]
+        fields = {"chat_id": chat_id, **{k: v for k, v in params.items() if v is not None}}
+
+        def attempt():
+            if self.local_mode:
+                return self._send_form(method, dict(fields, **{kind: file_uri(file_path)}))
+            return self._upload_multipart(method, fields, [(kind, file_path, filename)],
+                                          progress_callback, cancel_token)
+
+        return self._send_with_stats(file_path, [file_path], attempt, progress_callback)
+
+    def send_media_group(self, chat_id: int, media: List[Dict[str, Any]],
+                         progress_callback: Optional[UploadProgressCallback] = None,
+                         cancel_token=None, **params) -> List[Dict[str, Any]]:
+        """
+        ارسال آلبوم (2 تا 10 رسانه) در یک درخواست
+
+        Args:
+            chat_id: شناسه چت
+            media: لیست رسانه‌ها؛ هر مورد {"type": "photo"/"video", و "path" یا "media" (file_id)}
+                و کلیدهای اختیاری InputMedia مثل caption
+            progress_callback: تابع دریافت پیشرفت آپلود (اختیاری)
+            cancel_token: توکن لغو (اختیاری)
+            **params: سایر پارامترهای متد
+
+        Returns:
+            لیست پیام‌های ارسال شده به ترتیب رسانه‌ها
+        """
+        entries = []
+        files = []
+
+        for index, item in enumerate(media):
+            entry = {key: value for key, value in item.items() if key != "path" and value is not None}
+            path = item.get("path")
+            if path:
+                if self.local_mode:
+                    entry["media"] = file_uri(path)
+                else:
+                    name = f"file{index}"
+                    entry["media"] = f"attach://{name}"
+                    files.append((name, path, None))
+            entries.append(entry)
+
+        fields = {"chat_id": chat_id, "media": entries, **{k: v for k, v in params.items() if v is not None}}
+
+        def attempt():
+            if files:
+                return self._upload_multipart("sendMediaGroup", fields, files, progress_callback, cancel_token)
+            return self._send_form("sendMediaGroup", fields)
+
+        paths = [path for _, path, _ in files]
+        return self._send_with_stats(f"آلبوم {len(entries)} رسانه‌ای", paths, attempt, progress_callback)
+
+    def call(self, method: str, **params) -> Any:
+        """
+        فراخوانی یک متد Bot API بدون فایل (مثلا ارسال با file_id) با تلاش مجدد
+
+        Args:
+            method: نام متد
+            **params: پارامترهای متد
+
+        Returns:
+            result پاسخ Bot API
+        """
+        fields = {k: v for k, v in params.items() if v is not None}
+        return self._with_retries(method, lambda: self._send_form(method, fields))
+
+    def _with_retries(self, description: str, attempt: Callable[[], Any]) -> Any:
+        """اجرای یک درخواست با تلاش مجدد در خطاهای موقت و پاسخ 429"""
+        retries = 0
+
+        while True:
+            try:
+                return attempt()
+            except _RetryableError as e:
+                retries += 1
+                with self._lock:
+                    self.stats["retries"] += 1
+                if retries > self.retries:
+                    with self._lock:
+                        self.stats["failures"] += 1
+                    raise UploadError(f"آپلود پس از {self.retries} تلاش مجدد ناموفق بود: {str(e)}")
+
+                delay = e.retry_after if e.retry_after is not None else min(2 ** retries, MAX_BACKOFF)
+                debug_log(f"خطای موقت در ارسال {description}، تلاش مجدد {retries} پس از {delay} ثانیه: {str(e)}", "WARNING")
+                time.sleep(delay)
+            except UploadError:
+                with self._lock:
+                    self.stats["failures"] += 1
+                raise
+
+    def _send_with_stats(self, description: str, paths: List[str], attempt: Callable[[], Any],
+                         progress_callback: Optional[UploadProgressCallback]) -> Any:
+        """ارسال فایل‌ها با تلاش مجدد و ثبت سرعت آپلود"""
+        total = sum(os.path.getsize(path) for path in paths)
+        started = [time.time()]
+
+        # سرعت فقط برای تلاش موفق محاسبه می‌شود (بدون زمان انتظار تلاش‌های مجدد)
+        def timed_attempt():
+            started[0] = time.time()
+            return attempt()
+
+        result = self._with_retries(description, timed_attempt)
+        elapsed = max(time.time() - started[0], 1e-6)
+
+        # در حالت سرور محلی داده‌ای ارسال نمی‌شود و پیشرفت یک‌جا کامل است
+        if self.local_mode and progress_callback:
+            try:
+                progress_callback(100.0, total, total)
+            except Exception as e:
+                debug_log(f"خطا در گزارش پیشرفت آپلود: {str(e)}", "WARNING")
+
+        with self._lock:
+            self.stats["uploads"] += 1
+            self.stats["bytes"] += total
+            self.stats["seconds"] += elapsed
+
+        debug_log(
+            f"آپلود {os.path.basename(description)} ({total} بایت) در {elapsed:.1f} ثانیه، "
+            f"سرعت {total / elapsed / 1024 / 1024:.2f}MB/s", "INFO"
+        )
+        return result
+
+    def _connection(self) -> http.client.HTTPConnection:
+        """ساخت اتصال HTTP به سرور Bot API"""
+        parsed = urllib.parse.urlsplit(self.api_url)
+        connection_class = http.client.HTTPSConnection if parsed.scheme == "https" else http.client.HTTPConnection
+        return connection_class(parsed.netloc, timeout=self.timeout)
+
+    def _post(self, method: str, headers: Dict[str, str], body_parts, chat_id: Any = None) -> Any:
+        """ارسال درخواست (در نوبت دروازه) و تبدیل پاسخ Bot API به نتیجه یا خطا"""
+        path = urllib.parse.urlsplit(self.api_url).path + f"/bot{self.token}/{method}"
+        telegram_gateway.acquire(method, chat_id)
+        connection = self._connection()
+
+        try:
+            connection.putrequest("POST", path)
+            for name, value in headers.items():
+                connection.putheader(name, value)
+            connection.endheaders()
+            for part in body_parts:
+                connection.send(part)
+            response = connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            raise _RetryableError(f"{type(e).__name__}: {str(e)}")
+        finally:
+            connection.close()
+
+        try:
+            return self._parse_response(response.status, body)
+        except _RetryableError as e:
+            # سایر درخواست‌های این چت هم تا پایان محدودیت منتظر می‌مانند
+            if e.retry_after is not None:
+                telegram_gateway.defer(chat_id, e.retry_after)
+            raise
+
+    def _send_form(self, method: str, fields: Dict[str, Any]) -> Any:
+        """ارسال درخواست بدون فایل (فرم urlencoded)"""
+        body = urllib.parse.urlencode({name: _form_value(value) for name, value in fields.items()}).encode("utf-8")
+        return self._post(method, {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Content-Length": str(len(body)),
+        }, [body], fields.get("chat_id"))
+
+    def _upload_multipart(self, method: str, fields: Dict[str, Any], files: List[Tuple[str, str, Optional[str]]],
+                          progress_callback: Optional[UploadProgressCallback], cancel_token) -> Any:
+        """یک تلاش آپلود کامل فایل‌ها به صورت multipart"""
+        boundary = uuid.uuid4().hex
+
+        preamble = b"".join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{_form_value(value)}\r\n'.encode("utf-8")
+            for name, value in fields.items()
+        )
+        parts = []
+        for field, file_path, filename in files:
+            filename = (filename or os.path.basename(file_path)).replace('"', "'")
+            header = (
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                f'Content-Type: application/octet-stream\r\n\r\n'
+            ).encode("utf-8")
+            parts.append((header, file_path, os.path.getsize(file_path)))
+        epilogue = f"--{boundary}--\r\n".encode("utf-8")
+
+        total = sum(size for _, _, size in parts)
+        length = len(preamble) + sum(len(header) + size + 2 for header, _, size in parts) + len(epilogue)
+
+        def body_chunks():
+            sent = 0
+            last_report = 0.0
+
+            yield preamble
+
+            for header, file_path, _ in parts:
+                yield header
+                with open(file_path, "rb") as f:
+                    while True:
+                        if cancel_token is not None:
+                            cancel_token.check()
+
+                        chunk = f.read(self.chunk_size)
+                        if not chunk:
+                            break
+
+                        yield chunk
+                        sent += len(chunk)
+
+                        now = time.time()
+                        if progress_callback and (now - last_report >= PROGRESS_INTERVAL or sent == total):
+                            last_report = now
+                            try:
+                                progress_callback(sent * 100.0 / total if total else 100.0, sent, total)
+                            except Exception as e:
+                                debug_log(f"خطا در گزارش پیشرفت آپلود: {str(e)}", "WARNING")
+                yield b"\r\n"
+
+            yield epilogue
+
+        return self._post(method, {
+            "Content-Type": f"multipart/form-data; boundary={boundary}",
+            "Content-Length": str(length),
+        }, body_chunks(), fields.get("chat_id"))
+
+    @staticmethod
+    def _parse_response(status: int, body: bytes) -> Dict[str, Any]:
+        """تبدیل پاسخ Bot API به نتیجه یا خطای مناسب"""
+        try:
+            data = json.loads(body.decode("utf-8"))
+        except ValueError:
+            if status >= 500:
+                raise _RetryableError(f"پاسخ نامعتبر سرور ({status})")
+            raise UploadError(f"پاسخ نامعتبر سرور ({status})", status)
+
+        if data.get("ok"):
+            return data["result"]
+
+        error_code = data.get("error_code", status)
+        description = data.get("description", "خطای نامشخص")
+
+        if error_code == 429:
+            retry_after = (data.get("parameters") or {}).get("retry_after", 1)
+            raise _RetryableError(description, retry_after)
+        if error_code >= 500:
+            raise _RetryableError(description)
+
+        raise UploadError(description, error_code)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        دریافت آمار آپلودها
+
+        Returns:
+            دیکشنری آمار (شامل میانگین سرعت به بایت بر ثانیه)
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        stats["throughput"] = stats["bytes"] / stats["seconds"] if stats["seconds"] else 0
+        return stats
+
+
+# نمونه سراسری
+telegram_uploader = TelegramUploader()
@@ -55,21 +55,6 @@ def cleanup_temp_file(file_path):
         logging.error(f"Error removing file {file_path}: {e}")
     return False
 
-def cleanup_temp_dir(temp_dir):
-    """Clean up temporary directory"""
-    try:
-        if os.path.exists(temp_dir):
-            for root, dirs, files in os.walk(temp_dir, topdown=False):
-                for name in files:
-                    os.remove(os.path.join(root, name))
-                for name in dirs:
-                    os.rmdir(os.path.join(root, name))
-            os.rmdir(temp_dir)
-            return True
-    except Exception as e:
-        logging.error(f"Error cleaning directory {temp_dir}: {e}")
-    return False
-
 def format_size(size):
     """Format file size to human readable format"""
     if size < 1024:
@@ -0,0 +1,186 @@
+"""
+ماژول کش اطلاعات ویدیو
+
+اطلاعات استخراج شده توسط yt-dlp (info dict) را بر اساس شناسه استاندارد
+ویدیو نگه می‌دارد تا پیش‌نمایش، اعتبارسنجی و دانلود یک درخواست فقط یک بار
+هزینه استخراج را بپردازند. ورودی‌ها پس از مدت TTL منقضی می‌شوند (آدرس
+فرمت‌ها پس از مدتی از کار می‌افتند) و تعداد ورودی‌ها با سیاست LRU محدود است.
+"""
+
+import re
+import copy
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable
+
+from config import INFO_CACHE_TTL, INFO_CACHE_SIZE
+from debug_logger import debug_log
+
+# الگوهای شناسایی شناسه ویدیوی یوتیوب
+YOUTUBE_ID_PATTERNS = [
+    re.compile(r'(?:youtube(?:-nocookie)?\.com/(?:watch\?(?:.*&)?v=|embed/|v/|shorts/|live/))([A-Za-z0-9_-]{11})'),
+    re.compile(r'youtu\.be/([A-Za-z0-9_-]{11})'),
+]
+
+
+def get_video_id(url: str) -> Optional[str]:
+    """
+    استخراج شناسه استاندارد ویدیو از آدرس
+
+    Args:
+        url: آدرس ویدیو
+
+    Returns:
+        شناسه به شکل "youtube:<id>" یا None اگر قابل تشخیص نباشد
+    """
+    if not url:
+        return None
+
+    for pattern in YOUTUBE_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return f"youtube:{match.group(1)}"
+
+    return None
+
+
+def get_cache_key(url: str) -> str:
+    """
+    کلید کش برای یک آدرس (شناسه استاندارد یا خود آدرس)
+
+    Args:
+        url: آدرس ویدیو
+
+    Returns:
+        کلید کش
+    """
+    return get_video_id(url) or url.strip()
+
+
+class VideoInfoCache:
+    """
+    کش LRU با زمان انقضا برای اطلاعات ویدیو
+    """
+
+    def __init__(self, max_size: int = INFO_CACHE_SIZE, ttl: float = INFO_CACHE_TTL):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # key -> (expires_at, info)
+        self._key_locks = {}  # key -> [قفل، تعداد ترد‌های استفاده کننده] برای جلوگیری از استخراج تکراری همزمان
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        دریافت اطلاعات از کش
+
+        Args:
+            key: کلید کش
+
+        Returns:
+            کپی اطلاعات ویدیو یا None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            expires_at, info = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return copy.deepcopy(info)
+
+    def put(self, key: str, info: Dict[str, Any]) -> None:
+        """
+        ذخیره اطلاعات در کش
+
+        Args:
+            key: کلید کش
+            info: دیکشنری اطلاعات ویدیو
+        """
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, copy.deepcopy(info))
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_extract(self, url: str, extractor: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        دریافت اطلاعات از کش یا استخراج آن در صورت نبود
+
+        Args:
+            url: آدرس ویدیو
+            extractor: تابع استخراج اطلاعات (فقط در صورت نبود در کش فراخوانی می‌شود)
+
+        Returns:
+            کپی اطلاعات ویدیو یا None در صورت خطا
+        """
+        key = get_cache_key(url)
+
+        with self._lock:
+            record = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            record[1] += 1
+
+        try:
+            with record[0]:
+                info = self.get(key)
+
+                if info is not None:
+                    with self._lock:
+                        self.hits += 1
+                    return info
+
+                with self._lock:
+                    self.misses += 1
+
+                debug_log(f"اطلاعات ویدیو در کش نبود، استخراج: {key}", "DEBUG")
+                info = extractor(url)
+
+                if info:
+                    self.put(key, info)
+        finally:
+            # قفل فقط وقتی حذف می‌شود که هیچ ترد دیگری منتظر یا دارنده آن نباشد
+            with self._lock:
+                record[1] -= 1
+                if record[1] == 0:
+                    self._key_locks.pop(key, None)
+
+        return copy.deepcopy(info) if info else None
+
+    def invalidate(self, url: str) -> None:
+        """
+        حذف اطلاعات یک ویدیو از کش
+
+        Args:
+            url: آدرس ویدیو
+        """
+        with self._lock:
+            self._entries.pop(get_cache_key(url), None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        دریافت آمار کش
+
+        Returns:
+            دیکشنری آمار
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+# نمونه سراسری کش اطلاعات ویدیو
+video_info_cache = VideoInfoCache()
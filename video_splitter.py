@@ -0,0 +1,217 @@
+"""
+ماژول تقسیم ویدیوهای بزرگ به چند بخش
+
+ویدیویی که از حداکثر حجم قابل ارسال بزرگتر است با muxer segment در ffmpeg و
+کپی مستقیم جریان‌ها (بدون تبدیل کدک) روی فریم‌های کلیدی به بخش‌های کوچکتر از
+حد مجاز بریده می‌شود. بخش‌ها به ترتیب و با کپشن «بخش i/n» ارسال می‌شوند؛ اگر
+چت پیش‌آپلود (SPLIT_CACHE_CHAT_ID) تنظیم شده باشد بخش‌ها به صورت موازی در آن
+چت آپلود می‌شوند و سپس با file_id به ترتیب برای کاربر فرستاده می‌شوند.
+"""
+
+import os
+import glob
+import shutil
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Callable
+
+from config import SPLIT_MAX_PARTS, SPLIT_UPLOAD_WORKERS, SPLIT_CACHE_CHAT_ID, FORMAT_SIZE_MARGIN
+from debug_logger import debug_log
+from uploader import telegram_uploader
+
+# تعداد دفعات تقسیم دوباره با بخش‌های کوتاه‌تر وقتی بخشی از حد مجاز بزرگتر شود
+SPLIT_ATTEMPTS = 3
+
+# حداکثر زمان اجرای ffmpeg/ffprobe (ثانیه)
+FFMPEG_TIMEOUT = 3600
+
+
+class SplitError(Exception):
+    """خطای تقسیم ویدیو"""
+
+
+def is_available() -> bool:
+    """بررسی نصب بودن ffmpeg و ffprobe"""
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def probe_duration(file_path: str) -> Optional[float]:
+    """
+    خواندن مدت زمان فایل با ffprobe
+
+    Args:
+        file_path: مسیر فایل
+
+    Returns:
+        مدت زمان به ثانیه یا None در صورت خطا
+    """
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+             "-of", "default=noprint_wrappers=1:nokey=1", file_path],
+            capture_output=True, timeout=60
+        )
+        return float(result.stdout.decode().strip())
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+
+def _segment(file_path: str, output_dir: str, segment_seconds: float) -> List[str]:
+    """یک بار تقسیم فایل با طول بخش مشخص (برش روی اولین فریم کلیدی پس از هر مرز)"""
+    for old in glob.glob(os.path.join(output_dir, "part-*.mp4")):
+        os.remove(old)
+
+    result = subprocess.run(
+        ["ffmpeg", "-y", "-hide_banner", "-v", "error", "-i", file_path,
+         "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy",
+         "-f", "segment", "-segment_time", f"{segment_seconds:.3f}", "-reset_timestamps", "1",
+         "-segment_format_options", "movflags=+faststart",
+         os.path.join(output_dir, "part-%03d.mp4")],
+        capture_output=True, timeout=FFMPEG_TIMEOUT
+    )
+    if result.returncode != 0:
+        raise SplitError(f"خطا در تقسیم ویدیو: {result.stderr.decode('utf-8', errors='replace').strip()[-300:]}")
+
+    return sorted(glob.glob(os.path.join(output_dir, "part-*.mp4")))
+
+
+def split_video(file_path: str, max_bytes: int, duration: Optional[float] = None) -> List[str]:
+    """
+    تقسیم ویدیو به بخش‌هایی کوچکتر از max_bytes (با کپی جریان، بدون تبدیل)
+
+    طول هر بخش از نسبت حجم مجاز به حجم فایل محاسبه می‌شود. چون بیت‌ریت در
+    طول ویدیو ثابت نیست و برش روی فریم کلیدی انجام می‌شود، اگر بخشی بزرگتر از
+    حد مجاز شود تقسیم با بخش‌های کوتاه‌تر تکرار می‌شود.
+
+    Args:
+        file_path: مسیر ویدیو
+        max_bytes: حداکثر حجم هر بخش به بایت
+        duration: مدت زمان ویدیو به ثانیه (پیش‌فرض: خواندن با ffprobe)
+
+    Returns:
+        مسیر بخش‌ها به ترتیب (در پوشه‌ای موقت کنار فایل اصلی)
+    """
+    if not is_available():
+        raise SplitError("ffmpeg برای تقسیم ویدیو نصب نیست")
+
+    duration = duration or probe_duration(file_path)
+    if not duration:
+        raise SplitError("مدت زمان ویدیو برای تقسیم مشخص نیست")
+
+    file_size = os.path.getsize(file_path)
+    budget = max_bytes / FORMAT_SIZE_MARGIN
+    if file_size / budget > SPLIT_MAX_PARTS:
+        raise SplitError(f"ویدیو برای ارسال در حداکثر {SPLIT_MAX_PARTS} بخش بیش از حد بزرگ است")
+
+    output_dir = tempfile.mkdtemp(prefix="parts-", dir=os.path.dirname(os.path.abspath(file_path)))
+    segment_seconds = duration * budget / file_size
+
+    try:
+        for attempt in range(SPLIT_ATTEMPTS):
+            parts = _segment(file_path, output_dir, segment_seconds)
+            if not parts:
+                raise SplitError("هیچ بخشی از ویدیو ساخته نشد")
+
+            largest = max(os.path.getsize(part) for part in parts)
+            if largest <= max_bytes and len(parts) <= SPLIT_MAX_PARTS:
+                debug_log(f"ویدیو {os.path.basename(file_path)} به {len(parts)} بخش "
+                          f"(حداکثر {largest} بایت) تقسیم شد", "INFO")
+                return parts
+
+            # کوتاه کردن بخش‌ها به نسبت بزرگترین بخش
+            segment_seconds *= budget / largest
+            debug_log(f"بخش {largest} بایتی بزرگتر از حد مجاز است، تقسیم دوباره با "
+                      f"بخش‌های {segment_seconds:.0f} ثانیه‌ای", "WARNING")
+    except Exception:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    raise SplitError("تقسیم ویدیو به بخش‌های کوچکتر از حد مجاز ممکن نشد (فاصله فریم‌های کلیدی زیاد است)")
+
+
+def remove_parts(parts: List[str]) -> None:
+    """حذف بخش‌ها و پوشه موقت آن‌ها"""
+    if parts:
+        shutil.rmtree(os.path.dirname(parts[0]), ignore_errors=True)
+
+
+def part_caption(caption: str, index: int, total: int) -> str:
+    """کپشن یک بخش: «بخش i/n» پیش از کپشن اصلی"""
+    return f"📼 بخش {index}/{total}\n{caption}"
+
+
+def deliver_parts(chat_id: int, parts: List[str], caption: str,
+                  progress_callback: Optional[Callable[[float, int, int], None]] = None,
+                  uploader=telegram_uploader, cache_chat_id: int = SPLIT_CACHE_CHAT_ID,
+                  workers: int = SPLIT_UPLOAD_WORKERS, **params) -> List[Dict[str, Any]]:
+    """
+    ارسال بخش‌های یک ویدیو به ترتیب با کپشن «بخش i/n»
+
+    Args:
+        chat_id: شناسه چت
+        parts: مسیر بخش‌ها به ترتیب
+        caption: کپشن اصلی ویدیو
+        progress_callback: تابع دریافت پیشرفت کل آپلود (درصد، بایت ارسال شده، کل)
+        uploader: آپلودر Bot API
+        cache_chat_id: چت پیش‌آپلود موازی (0: آپلود پشت سر هم در چت کاربر)
+        workers: تعداد آپلودهای موازی
+        **params: سایر پارامترهای sendVideo (supports_streaming و ...)
+
+    Returns:
+        لیست پیام‌های ارسال شده به کاربر به ترتیب بخش‌ها
+    """
+    total = len(parts)
+    sizes = [os.path.getsize(part) for part in parts]
+    total_bytes = sum(sizes)
+    sent_bytes = [0] * total
+    lock = threading.Lock()
+
+    def part_progress(index):
+        def callback(percent, sent, size):
+            if not progress_callback:
+                return
+            with lock:
+                sent_bytes[index] = sent
+                done = sum(sent_bytes)
+            progress_callback(done * 100 / total_bytes if total_bytes else 100.0, done, total_bytes)
+        return callback
+
+    def upload(index, target_chat, **extra):
+        return uploader.send_file("video", target_chat, parts[index], part_progress(index),
+                                  caption=part_caption(caption, index + 1, total), **params, **extra)
+
+    def send(index, file_id):
+        if file_id:
+            return uploader.call("sendVideo", chat_id=chat_id, video=file_id,
+                                 caption=part_caption(caption, index + 1, total), **params)
+        return upload(index, chat_id)
+
+    def preupload(index):
+        message = upload(index, cache_chat_id, disable_notification=True)
+        return (message.get("video") or {}).get("file_id")
+
+    messages = []
+    reused = 0
+    if not cache_chat_id or total < 2:
+        for index in range(total):
+            messages.append(send(index, None))
+    else:
+        # آپلود موازی در چت پیش‌آپلود؛ هر بخش به محض آماده شدن file_id خود و
+        # بخش‌های قبلی، به ترتیب برای کاربر فرستاده می‌شود
+        with ThreadPoolExecutor(max_workers=min(max(1, workers), total)) as executor:
+            futures = [executor.submit(preupload, index) for index in range(total)]
+            for index, future in enumerate(futures):
+                try:
+                    file_id = future.result()
+                except Exception as e:
+                    # این بخش مستقیما در چت کاربر آپلود می‌شود
+                    debug_log(f"خطا در پیش‌آپلود بخش {index + 1}/{total}: {str(e)}", "WARNING")
+                    file_id = None
+                reused += 1 if file_id else 0
+                messages.append(send(index, file_id))
+
+    debug_log(f"{total} بخش ویدیو ({total_bytes} بایت) ارسال شد، {reused} بخش با پیش‌آپلود موازی", "INFO")
+    return messages
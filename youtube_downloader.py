@@ -90,11 +90,13 @@ def clean_old_downloads():
         debug_log(f"خطا در پاکسازی فایل‌های قدیمی: {str(e)}", "ERROR")
 
 import os
+import copy
 import time
 import json
 import re
 import urllib.parse
 import threading
+import subprocess
 import concurrent.futures
 from typing import Dict, Any, Optional, Tuple, List, Union, Callable
 
@@ -114,13 +116,30 @@ from config import (
     DOWNLOADS_DIR
 )
 from debug_logger import debug_log, debug_decorator
-from database import add_download, update_download_status, get_download
+from database import add_download, update_download_status, get_download, get_interrupted_downloads
 from config import DownloadStatus
+from download_queue import download_scheduler
+from video_info_cache import video_info_cache, get_video_id
+from download_coalescer import download_coalescer
+from download_progress import (
+    ProgressEvent, make_progress_hook, make_postprocessor_hook, get_stage_timer
+)
+from download_cancellation import cancel_registry, DownloadCancelled, cleanup_partial_files
+from artifact_store import artifact_store
+from ytdlp_pool import ytdlp_pool, is_process_mode
+from segmented_downloader import segmented_downloader, plan_from_info
+from config import SEGMENTED_DOWNLOAD, RESUME_INTERRUPTED_DOWNLOADS, RESUME_MAX_AGE_HOURS
+from format_planner import plan_format, get_delivery_limit, estimate_format_size
+from transcoder import transcoder, TranscodeError
 
 # قفل‌ها برای مدیریت همزمانی
 active_downloads_lock = threading.RLock()
 active_downloads = {}  # نگهداری اطلاعات دانلودهای فعال
 
+# بازیابی دانلودهای نیمه‌کاره فقط یک بار در هر پروسه انجام می‌شود
+_recovery_lock = threading.Lock()
+_recovery_done = False
+
 @debug_decorator
 def validate_youtube_url(url: str) -> bool:
     """
@@ -133,18 +152,51 @@ def validate_youtube_url(url: str) -> bool:
     return "youtube.com" in url or "youtu.be" in url
 
 
+def _extract_info(url: str) -> Optional[Dict[str, Any]]:
+    """
+    استخراج اطلاعات ویدیو با yt-dlp (بدون کش، خطاها منتقل می‌شوند)
+    Args:
+        url: آدرس ویدیو
+    Returns:
+        دیکشنری اطلاعات ویدیو
+    """
+    temp_ydl_opts = {'quiet': True, 'no_warnings': True, 'skip_download': True}
+
+    # اجرا در پروسه کارگر جداگانه (حالت process)
+    if is_process_mode():
+        with download_scheduler.stage("extract"):
+            return ytdlp_pool.run("extract", (url, temp_ydl_opts))
+
+    with download_scheduler.stage("extract"), YoutubeDL(temp_ydl_opts) as ydl:
+        return ydl.extract_info(url, download=False)
+
+def _resolve_format_id(video_info: Dict[str, Any], format_spec: str) -> str:
+    """
+    تبدیل عبارت انتخاب فرمت به شناسه فرمت نهایی (مثلا "137+140")
+    Args:
+        video_info: دیکشنری اطلاعات ویدیو
+        format_spec: عبارت انتخاب فرمت yt-dlp
+    Returns:
+        شناسه فرمت نهایی یا همان عبارت در صورت خطا
+    """
+    try:
+        with YoutubeDL({'quiet': True, 'no_warnings': True, 'format': format_spec}) as ydl:
+            resolved = ydl.process_ie_result(copy.deepcopy(video_info), download=False)
+        return resolved.get('format_id') or format_spec
+    except Exception:
+        return format_spec
+
 @debug_decorator
 def extract_video_info(url: str) -> Optional[Dict[str, Any]]:
     """
-    استخراج اطلاعات ویدیو بدون دانلود
+    استخراج اطلاعات ویدیو بدون دانلود (با استفاده از کش)
     Args:
         url: آدرس ویدیو
     Returns:
         دیکشنری اطلاعات ویدیو یا None در صورت خطا
     """
     try:
-        with yt_dlp.YoutubeDL() as ydl:
-            return ydl.extract_info(url, download=False)
+        return video_info_cache.get_or_extract(url, _extract_info)
     except:
         return None
 
@@ -242,8 +294,8 @@ def extract_formats(info_dict: Dict[str, Any]) -> List[Dict[str, Any]]:
                 'ext': ext,
                 'height': height,
                 'width': f.get('width'),
-                'filesize': f.get('filesize'),
-                'filesize_human': format_filesize(f.get('filesize')),
+                'filesize': estimate_format_size(f, info_dict.get('duration')),
+                'filesize_human': format_filesize(estimate_format_size(f, info_dict.get('duration'))),
                 'vcodec': f.get('vcodec'),
                 'acodec': f.get('acodec'),
                 'quality': quality_key
@@ -260,8 +312,8 @@ def extract_formats(info_dict: Dict[str, Any]) -> List[Dict[str, Any]]:
             audio_format = {
                 'format_id': f.get('format_id', ''),
                 'ext': f.get('ext', 'mp3'),
-                'filesize': f.get('filesize'),
-                'filesize_human': format_filesize(f.get('filesize')),
+                'filesize': estimate_format_size(f, info_dict.get('duration')),
+                'filesize_human': format_filesize(estimate_format_size(f, info_dict.get('duration'))),
                 'vcodec': None,
                 'acodec': f.get('acodec'),
                 'quality': 'audio'
@@ -298,11 +350,59 @@ def format_filesize(size: Optional[int]) -> str:
         size_gb = size_mb / 1024
         return f"{size_gb:.2f} GB"
 
+# پسوند خروجی فایل صوتی (بدون تبدیل کدک) بر اساس پسوند جریان دانلود شده
+AUDIO_CONTAINERS = {'m4a': 'm4a', 'mp4': 'm4a', 'webm': 'ogg', 'opus': 'ogg', 'ogg': 'ogg', 'mp3': 'mp3'}
+
+# پسوندهایی که تلگرام با sendAudio به صورت فایل صوتی پخش می‌کند؛ opus داخل .ogg
+# با sendAudio به شکل فایل معمولی نمایش داده می‌شود و با sendDocument ارسال می‌شود
+SEND_AUDIO_EXTENSIONS = ('.m4a', '.mp3')
+
+def tag_audio_file(file_path: str, title: Optional[str], performer: Optional[str]) -> str:
+    """
+    افزودن عنوان و خواننده به فایل صوتی با ffmpeg بدون تبدیل کدک (stream copy)
+    Args:
+        file_path: مسیر جریان صوتی دانلود شده
+        title: عنوان
+        performer: نام خواننده یا کانال
+    Returns:
+        مسیر فایل نهایی (در صورت خطا همان فایل ورودی)
+    """
+    base, ext = os.path.splitext(file_path)
+    container = AUDIO_CONTAINERS.get(ext.lstrip('.').lower(), ext.lstrip('.') or 'm4a')
+    output = f"{base}.{container}"
+    temp_output = f"{base}.tagged.{container}"
+
+    command = ['ffmpeg', '-y', '-v', 'error', '-i', file_path, '-map', '0:a:0', '-c', 'copy', '-map_metadata', '-1']
+    if title:
+        command += ['-metadata', f'title={title}']
+    if performer:
+        command += ['-metadata', f'artist={performer}']
+    if container == 'm4a':
+        command += ['-movflags', '+faststart']
+    command.append(temp_output)
+
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=300)
+    except (OSError, subprocess.SubprocessError) as e:
+        stderr = getattr(e, 'stderr', None)
+        detail = stderr.decode('utf-8', errors='replace').strip() if stderr else str(e)
+        debug_log(f"افزودن مشخصات فایل صوتی ناموفق بود، ارسال فایل اصلی: {detail}", "WARNING")
+        if os.path.exists(temp_output):
+            os.remove(temp_output)
+        return file_path
+
+    os.replace(temp_output, output)
+    if output != file_path:
+        os.remove(file_path)
+    return output
+
 from debug_handler import debug_download, debugger
 
 @debug_download
 def download_video(url: str, download_id: int, user_id: int, quality: str = "best", 
-                  progress_callback: Optional[Callable[[float, str], None]] = None) -> Tuple[bool, Optional[str], Optional[Dict]]:
+                  progress_callback: Optional[Callable[[float, str], None]] = None,
+                  allow_split: bool = False, job=None,
+                  cancel_token=None) -> Tuple[bool, Optional[str], Optional[Dict]]:
     # ثبت شروع دانلود در دیباگر
     debugger.log_download_start(download_id, url, user_id)
 
@@ -413,46 +513,57 @@ def download_video(url: str, download_id: int, user_id: int, quality: str = "bes
             "start_time": time.time(),
             "progress": 0,
             "status": "در حال شروع...",
-            "quality": quality
+            "quality": quality,
+            "stage": "extract",
+            "downloaded_bytes": None,
+            "total_bytes": None,
+            "speed": None,
+            "eta": None,
+            "fragment_index": None,
+            "fragment_count": None
         }
 
+    # زمان‌سنج مراحل این دانلود
+    timer = get_stage_timer(download_id)
+    started_at = time.time()
+
     # تنظیم وضعیت به "در حال پردازش"
     update_download_status(download_id, DownloadStatus.PROCESSING)
 
     # نام فایل برای دانلود
     output_template = os.path.join(DOWNLOADS_DIR, f"{download_id}-%(title)s.%(ext)s")
 
+    # حالت صوتی: فقط بهترین جریان صوتی دریافت می‌شود (بدون ویدیو و تصویر بندانگشتی)
+    audio_mode = quality == "audio"
+
     # تنظیمات yt-dlp
     ydl_opts = YDL_OPTIONS.copy()
     ydl_opts.update({
         'outtmpl': output_template,
-        'format': quality if quality != "best" else 'best',
+        'format': quality if quality not in ("best", "audio") else ('bestaudio' if audio_mode else 'best'),
+        # نام فایل به شناسه دانلود وابسته است، پس پس از راه‌اندازی مجدد از فایل .part ادامه می‌یابد
+        'continuedl': True,
     })
+    if audio_mode:
+        ydl_opts['writethumbnail'] = False
 
-    # کلاس برای دریافت پیشرفت دانلود
-    class YTDLLogger:
-        def debug(self, msg):
-            # چک کردن اگر پیام حاوی اطلاعات پیشرفت است
-            if "% of" in msg and "at" in msg:
-                try:
-                    parts = msg.split()
-                    percent_str = next((p for p in parts if "%" in p), "0%")
-                    percent = float(percent_str.replace("%", ""))
-
-                    speed_str = parts[parts.index("at") + 1]
-
-                    # به‌روزرسانی پیشرفت
-                    with active_downloads_lock:
-                        if download_id in active_downloads:
-                            active_downloads[download_id]["progress"] = percent
-                            active_downloads[download_id]["status"] = f"در حال دانلود ({speed_str})..."
+    # به‌روزرسانی پیشرفت همین دانلود
+    def report_progress(percent, status, event=None):
+        with active_downloads_lock:
+            if download_id in active_downloads:
+                active_downloads[download_id]["progress"] = percent
+                active_downloads[download_id]["status"] = status
+                if event is not None:
+                    active_downloads[download_id].update(event.to_dict())
 
-                    # فراخوانی callback پیشرفت
-                    if progress_callback:
-                        progress_callback(percent, f"در حال دانلود ({speed_str})...")
+        # فراخوانی callback پیشرفت
+        if progress_callback:
+            progress_callback(percent, status)
 
-                except Exception:
-                    pass
+    # لاگر yt-dlp (پیشرفت از progress_hooks دریافت می‌شود، نه از متن لاگ‌ها)
+    class YTDLLogger:
+        def debug(self, msg):
+            pass
 
         def warning(self, msg):
             debug_log(f"هشدار yt-dlp: {msg}", "WARNING")
@@ -460,9 +571,6 @@ def download_video(url: str, download_id: int, user_id: int, quality: str = "bes
         def error(self, msg):
             debug_log(f"خطای yt-dlp: {msg}", "ERROR")
 
-    # بررسی زمانبندی دانلود
-    deadline = time.time() + MAX_DOWNLOAD_TIME
-
     # در ابتدا اطلاعات ویدیو را استخراج می‌کنیم
     try:
         debug_log(f"شروع استخراج اطلاعات ویدیو با ID دانلود {download_id}", "INFO")
@@ -475,33 +583,49 @@ def download_video(url: str, download_id: int, user_id: int, quality: str = "bes
         if progress_callback:
             progress_callback(0, "در حال استخراج اطلاعات...")
 
-        # استخراج اطلاعات
-        temp_ydl_opts = {'quiet': True, 'no_warnings': True, 'skip_download': True}
-        with YoutubeDL(temp_ydl_opts) as ydl:
-            video_info = ydl.extract_info(url, download=False)
+        # استخراج اطلاعات (در صورت وجود در کش، از همان اطلاعات استفاده می‌شود)
+        with timer.stage("extract"):
+            video_info = video_info_cache.get_or_extract(url, _extract_info)
+
+        if not video_info:
+            debug_log(f"اطلاعات ویدیو استخراج نشد: {url}", "ERROR")
+            update_download_status(download_id, DownloadStatus.FAILED, error_message="اطلاعات ویدیو استخراج نشد")
+            return False, None, {"error": "اطلاعات ویدیو استخراج نشد"}
+
+        # بررسی مدت زمان ویدیو
+        duration = video_info.get('duration') or 0
+
+        if duration > MAX_VIDEO_DURATION:
+            error_msg = f"مدت زمان ویدیو بیش از حد مجاز است ({format_duration(duration)})"
+            debug_log(error_msg, "WARNING")
+            update_download_status(download_id, DownloadStatus.FAILED, error_message=error_msg)
+            return False, None, {"error": error_msg}
+
+        # بررسی حجم ویدیو
+        filesize = video_info.get('filesize') or video_info.get('filesize_approx')
 
-            if not video_info:
-                debug_log(f"اطلاعات ویدیو استخراج نشد: {url}", "ERROR")
-                update_download_status(download_id, DownloadStatus.FAILED, error_message="اطلاعات ویدیو استخراج نشد")
-                return False, None, {"error": "اطلاعات ویدیو استخراج نشد"}
+        if filesize and filesize > (MAX_VIDEO_SIZE_MB * 1024 * 1024):
+            error_msg = f"حجم ویدیو بیش از حد مجاز است ({format_filesize(filesize)})"
+            debug_log(error_msg, "WARNING")
+            update_download_status(download_id, DownloadStatus.FAILED, error_message=error_msg)
+            return False, None, {"error": error_msg}
 
-            # بررسی مدت زمان ویدیو
-            duration = video_info.get('duration', 0)
+        # انتخاب فرمتی که در محدودیت ارسال کاربر جا شود (پیش از دریافت هر بایت)
+        # فایل بزرگتر از حد مجاز فقط برای فراخوانی که ارسال چند بخشی دارد (allow_split) دانلود می‌شود
+        plan = plan_format(video_info, quality, get_delivery_limit(user_id), allow_split=allow_split)
 
-            if duration > MAX_VIDEO_DURATION:
-                error_msg = f"مدت زمان ویدیو بیش از حد مجاز است ({format_duration(duration)})"
-                debug_log(error_msg, "WARNING")
-                update_download_status(download_id, DownloadStatus.FAILED, error_message=error_msg)
-                return False, None, {"error": error_msg}
+        if plan["rejected"]:
+            debug_log(plan["error"], "WARNING")
+            update_download_status(download_id, DownloadStatus.FAILED, error_message=plan["error"])
+            return False, None, {"error": plan["error"]}
 
-            # بررسی حجم ویدیو
-            filesize = video_info.get('filesize') or video_info.get('filesize_approx')
+        if plan["format"]:
+            ydl_opts['format'] = plan["format"]
+            if plan["merged"]:
+                ydl_opts['merge_output_format'] = 'mp4'
 
-            if filesize and filesize > (MAX_VIDEO_SIZE_MB * 1024 * 1024):
-                error_msg = f"حجم ویدیو بیش از حد مجاز است ({format_filesize(filesize)})"
-                debug_log(error_msg, "WARNING")
-                update_download_status(download_id, DownloadStatus.FAILED, error_message=error_msg)
-                return False, None, {"error": error_msg}
+        if plan["downgraded"] and progress_callback:
+            progress_callback(0, f"کیفیت به دلیل محدودیت حجم به {plan['height']}p کاهش یافت")
 
     except (DownloadError, ExtractorError) as e:
         error_msg = f"خطا در استخراج اطلاعات ویدیو: {str(e)}"
@@ -509,77 +633,186 @@ def download_video(url: str, download_id: int, user_id: int, quality: str = "bes
         update_download_status(download_id, DownloadStatus.FAILED, error_message=error_msg)
         return False, None, {"error": error_msg}
 
+    # توکن لغو (با /cancel یا پایان مهلت MAX_DOWNLOAD_TIME توسط نگهبان)؛ فراخوان می‌تواند توکن را
+    # پیش از شروع ثبت کرده باشد تا لغوی که پیش از این نقطه برسد از دست نرود
+    if cancel_token is None:
+        cancel_token = cancel_registry.register(download_id, max(1, MAX_DOWNLOAD_TIME - (time.time() - started_at)))
+
     # شروع دانلود ویدیو
     try:
+        # دانلود ممکن است حین استخراج اطلاعات لغو شده باشد
+        with active_downloads_lock:
+            if download_id not in active_downloads:
+                cancel_token.cancel("canceled")
+        cancel_token.check()
+
         debug_log(f"شروع دانلود ویدیو با ID دانلود {download_id}", "INFO")
 
         # به‌روزرسانی وضعیت
         with active_downloads_lock:
             if download_id in active_downloads:
                 active_downloads[download_id]["status"] = "در حال دانلود..."
+                active_downloads[download_id]["stage"] = "download"
 
         if progress_callback:
             progress_callback(0, "در حال دانلود...")
 
-        # تنظیم لاگر
-        ydl_opts['logger'] = YTDLLogger()
-
-        with YoutubeDL(ydl_opts) as ydl:
-            # دانلود ویدیو
-            ydl.download([url])
-
-            # بررسی پایان زمان
-            if time.time() > deadline:
-                error_msg = "زمان دانلود بیش از حد مجاز طول کشید"
-                debug_log(error_msg, "WARNING")
-                update_download_status(download_id, DownloadStatus.FAILED, error_message=error_msg)
-                return False, None, {"error": error_msg}
+        # دانلود واقعی (فقط برای اولین درخواست‌کننده یک ویدیو و فرمت اجرا می‌شود)
+        def fetch(broadcast_progress, shared_cancel):
+            result = fetch_stream(broadcast_progress, shared_cancel)
+            if audio_mode and result[0]:
+                # افزودن مشخصات به همان جریان صوتی بدون تبدیل کدک
+                broadcast_progress(100, "در حال افزودن مشخصات فایل صوتی...")
+                performer = video_info.get('artist') or video_info.get('uploader') or video_info.get('channel')
+                return True, tag_audio_file(result[1], video_info.get('title'), performer), None
+            if plan["transcode"] and result[0] and os.path.getsize(result[1]) > plan["target_size"]:
+                return transcode(result[1], broadcast_progress, shared_cancel)
+            return result
+
+        # فشرده‌سازی ویدیو تا حجم قابل ارسال (وقتی هیچ فرمت آماده‌ای جا نمی‌شد)؛ داخل بخش مشترک
+        # اجرا می‌شود تا درخواست‌های همزمان با همین حجم هدف فقط یک بار فشرده‌سازی کنند
+        def transcode(source_file, broadcast_progress, shared_cancel):
+            broadcast_progress(100, "🗜 در حال فشرده‌سازی ویدیو برای ارسال...")
+            # فایل اصلی تا پایان فشرده‌سازی از حذف LRU مخزن محافظت می‌شود
+            with timer.stage("transcode"), artifact_store.pinned(source_file):
+                try:
+                    output = transcoder.transcode_to_fit(
+                        source_file, video_info.get('duration'), plan["target_size"],
+                        os.path.join(DOWNLOADS_DIR, f"{download_id}-video.fit.mp4"), shared_cancel
+                    )
+                except TranscodeError as e:
+                    debug_log(str(e), "ERROR")
+                    return False, None, {"error": str(e)}
+                finally:
+                    # فایل اصلی برای درخواست‌های بعدی همان فرمت بدون فشرده‌سازی قابل استفاده است
+                    artifact_store.add(source_file, owner=download_id,
+                                       key=(video_id, source_format_key) if video_id else None)
+            return True, output, None
+
+        def fetch_stream(broadcast_progress, shared_cancel):
+            def on_event(event: ProgressEvent):
+                percent = 100.0 if event.stage == "merge" else event.percent
+                broadcast_progress(percent, event.format_status(), event)
+
+            progress_hook = make_progress_hook(on_event, cancel_token=shared_cancel)
+            postprocessor_hook = make_postprocessor_hook(on_event, timer, shared_cancel)
+
+            # فرمت‌های تک فایلی با چند اتصال موازی دانلود می‌شوند
+            plan = plan_from_info(video_info, ydl_opts) if SEGMENTED_DOWNLOAD else None
+            if plan:
+                try:
+                    with download_scheduler.stage("download"):
+                        shared_cancel.check()
+                        file_path = segmented_downloader.download(
+                            plan["url"], plan["filename"], plan["headers"],
+                            progress_hook, shared_cancel, plan["filesize"]
+                        )
+                    return True, file_path, None
+                except DownloadCancelled:
+                    cleanup_partial_files(DOWNLOADS_DIR, f"{download_id}-")
+                    raise
+                except Exception as e:
+                    debug_log(f"دانلود چند اتصالی ناموفق بود، استفاده از yt-dlp: {str(e)}", "WARNING")
+                    segmented_downloader.discard_partial(plan["filename"])
+
+            try:
+                if is_process_mode():
+                    # دانلود در پروسه کارگر؛ رویدادهای پیشرفت از طریق Pipe به همین hook ها می‌رسند
+                    def forward_progress(kind, data):
+                        (progress_hook if kind == "progress" else postprocessor_hook)(data)
+
+                    with download_scheduler.stage("download"):
+                        shared_cancel.check()
+                        ytdlp_pool.run("download", (video_info, ydl_opts), forward_progress, shared_cancel)
+                else:
+                    fetch_opts = dict(ydl_opts)
+                    fetch_opts['logger'] = YTDLLogger()
+                    fetch_opts['progress_hooks'] = [progress_hook]
+                    fetch_opts['postprocessor_hooks'] = [postprocessor_hook]
+
+                    with download_scheduler.stage("download"), YoutubeDL(fetch_opts) as ydl:
+                        shared_cancel.check()
+                        # دانلود ویدیو با همان اطلاعات استخراج شده (بدون استخراج مجدد)
+                        ydl.process_ie_result(copy.deepcopy(video_info), download=True)
+            except DownloadCancelled:
+                cleanup_partial_files(DOWNLOADS_DIR, f"{download_id}-")
+                raise
 
             # یافتن فایل دانلود شده
-            downloaded_file = None
-
             for file in os.listdir(DOWNLOADS_DIR):
-                if file.startswith(str(download_id) + "-"):
-                    downloaded_file = os.path.join(DOWNLOADS_DIR, file)
-                    break
-
-            if not downloaded_file:
-                error_msg = "فایل دانلود شده یافت نشد"
-                debug_log(error_msg, "ERROR")
-                update_download_status(download_id, DownloadStatus.FAILED, error_message=error_msg)
-                return False, None, {"error": error_msg}
-
-            # دریافت حجم فایل
-            file_size = os.path.getsize(downloaded_file)
-
-            # به‌روزرسانی وضعیت
-            with active_downloads_lock:
-                if download_id in active_downloads:
-                    active_downloads[download_id]["progress"] = 100
-                    active_downloads[download_id]["status"] = "دانلود کامل شد"
-
-            if progress_callback:
-                progress_callback(100, "دانلود کامل شد")
-
-            # به‌روزرسانی وضعیت دانلود در دیتابیس
-            metadata = {
-                "title": video_info.get('title', ''),
-                "duration": video_info.get('duration', 0),
-                "uploader": video_info.get('uploader', ''),
-                "thumbnail": get_best_thumbnail(video_info)
-            }
-
-            update_download_status(
-                download_id, 
-                DownloadStatus.COMPLETED, 
-                file_path=downloaded_file,
-                file_size=file_size,
-                metadata=metadata
+                if file.startswith(str(download_id) + "-") and not file.endswith(('.part', '.ytdl', '.segments', '.fit.mp4')):
+                    return True, os.path.join(DOWNLOADS_DIR, file), None
+
+            return False, None, {"error": "فایل دانلود شده یافت نشد"}
+
+        # دانلودهای همزمان یک ویدیو با یک فرمت فقط یک بار انجام می‌شوند
+        video_id = get_video_id(url)
+        source_format_key = _resolve_format_id(video_info, ydl_opts['format']) + (":audio" if audio_mode else "")
+        # خروجی فشرده شده به حجم هدف (محدودیت کاربر) وابسته است و کلید جداگانه دارد
+        format_key = source_format_key + (f":fit{plan['target_size']}" if plan["transcode"] else "")
+        coalesce_key = (video_id, format_key) if video_id else None
+
+        # فرمت همراه کار در فایل صف ذخیره می‌شود؛ اگر برنامه فرمت پس از راه‌اندازی مجدد تغییر کرده
+        # باشد (محدودیت یا تنظیمات)، داده‌های .part فرمت قبلی نباید به فایل جدید اضافه شوند
+        if job is not None and job.payload.get("format_id") != source_format_key:
+            if cleanup_partial_files(DOWNLOADS_DIR, f"{download_id}-"):
+                debug_log(f"فرمت دانلود {download_id} تغییر کرده است ({job.payload.get('format_id')} -> "
+                          f"{source_format_key})؛ دانلود از ابتدا انجام می‌شود", "WARNING")
+            download_scheduler.update_payload(job, format_id=source_format_key)
+
+        with timer.stage("download"):
+            success, downloaded_file, error = download_coalescer.run(
+                coalesce_key, download_id, report_progress, fetch, cancel_token
             )
 
-            debug_log(f"دانلود ویدیو با ID {download_id} با موفقیت انجام شد", "INFO")
-            return True, downloaded_file, None
+        # اگر درخواست‌کنندگان دیگری داشت، دانلود مشترک ادامه یافته ولی این درخواست لغو شده است
+        cancel_token.check()
+
+        if not success:
+            error_msg = error.get("error", "خطای نامشخص") if error else "خطای نامشخص"
+            debug_log(error_msg, "ERROR")
+            update_download_status(download_id, DownloadStatus.FAILED, error_message=error_msg)
+            return False, None, {"error": error_msg}
+
+        # دریافت حجم فایل
+        file_size = os.path.getsize(downloaded_file)
+
+        # به‌روزرسانی وضعیت
+        report_progress(100, "دانلود کامل شد")
+
+        # به‌روزرسانی وضعیت دانلود در دیتابیس
+        metadata = {
+            "title": video_info.get('title', ''),
+            "duration": video_info.get('duration', 0),
+            "uploader": video_info.get('uploader', ''),
+            "thumbnail": get_best_thumbnail(video_info),
+            "timings": timer.get_timings(),
+            # فرمت ارسال شده؛ فایل کاهش کیفیت یافته یا فشرده شده به محدودیت همین کاربر وابسته است
+            "format": plan["format"],
+            "downgraded": plan["downgraded"] or plan["transcode"]
+        }
 
+        update_download_status(
+            download_id, 
+            DownloadStatus.COMPLETED, 
+            file_path=downloaded_file,
+            file_size=file_size,
+            metadata=metadata
+        )
+
+        debug_log(f"دانلود ویدیو با ID {download_id} با موفقیت انجام شد", "INFO")
+        return True, downloaded_file, None
+
+    except DownloadCancelled as e:
+        reason = cancel_token.reason or e.reason
+        if reason == "timeout":
+            error_msg = "زمان دانلود بیش از حد مجاز طول کشید"
+            update_download_status(download_id, DownloadStatus.FAILED, error_message=error_msg)
+        else:
+            error_msg = "دانلود لغو شد"
+            update_download_status(download_id, DownloadStatus.CANCELED, error_message=error_msg)
+        debug_log(f"دانلود {download_id} متوقف شد: {error_msg}", "INFO")
+        return False, None, {"error": error_msg, "canceled": reason != "timeout"}
     except (DownloadError, ExtractorError) as e:
         error_msg = f"خطا در دانلود ویدیو: {str(e)}"
         detailed_error = str(e)
@@ -603,10 +836,28 @@ def download_video(url: str, download_id: int, user_id: int, quality: str = "bes
         return False, None, {"error": error_msg}
     finally:
         # حذف از لیست دانلودهای فعال
+        cancel_registry.unregister(download_id)
         with active_downloads_lock:
             if download_id in active_downloads:
                 del active_downloads[download_id]
 
+@debug_decorator
+def download_audio(url: str, download_id: int, user_id: int,
+                   progress_callback: Optional[Callable[[float, str], None]] = None,
+                   job=None) -> Tuple[bool, Optional[str], Optional[Dict]]:
+    """
+    دانلود فقط صدای ویدیو (بهترین جریان صوتی، بدون تبدیل کدک و با عنوان و خواننده)
+    Args:
+        url: آدرس ویدیو
+        download_id: شناسه دانلود
+        user_id: شناسه کاربر
+        progress_callback: تابع کال‌بک پیشرفت
+        job: کار صف دانلود (برای ذخیره فرمت و ادامه از فایل .part)
+    Returns:
+        (وضعیت موفقیت، مسیر فایل صوتی، خطا)
+    """
+    return download_video(url, download_id, user_id, "audio", progress_callback, job=job)
+
 @debug_decorator
 def get_download_progress(download_id: int) -> Dict[str, Any]:
     """
@@ -624,6 +875,7 @@ def get_download_progress(download_id: int) -> Dict[str, Any]:
             elapsed_time = time.time() - download_info.get("start_time", time.time())
             download_info["elapsed_time"] = int(elapsed_time)
             download_info["elapsed_time_human"] = format_duration(int(elapsed_time))
+            download_info["timings"] = get_stage_timer(download_id).get_timings()
             return download_info
 
     # اگر در لیست فعال نبود، از دیتابیس دریافت کنیم
@@ -703,17 +955,23 @@ def cancel_download(download_id: int) -> bool:
     Returns:
         True در صورت موفقیت
     """
+    # توقف دانلود در حال اجرا (در اولین فراخوانی progress hook)
+    stopped = cancel_registry.cancel(download_id)
+
     # بررسی اگر دانلود فعال است
     with active_downloads_lock:
-        if download_id in active_downloads:
+        if stopped or download_id in active_downloads:
             # حذف از لیست فعال
-            del active_downloads[download_id]
+            active_downloads.pop(download_id, None)
 
             # به‌روزرسانی وضعیت در دیتابیس
             update_download_status(download_id, DownloadStatus.CANCELED, error_message="دانلود لغو شد")
             debug_log(f"دانلود با ID {download_id} لغو شد", "INFO")
             return True
 
+    # حذف از صف دانلود اگر هنوز شروع نشده است
+    download_scheduler.cancel_by_download_id(download_id)
+
     # بررسی وضعیت در دیتابیس
     db_info = get_download(download_id)
 
@@ -748,41 +1006,99 @@ def get_all_active_downloads() -> Dict[int, Dict[str, Any]]:
         return active_downloads.copy()
 
 @debug_decorator
-def clean_old_downloads(max_age_days: int = 1) -> int:
+def clean_old_downloads(max_age_days: Optional[int] = None) -> int:
     """
-    پاکسازی دانلودهای قدیمی
+    پاکسازی دانلودهای قدیمی (از طریق مخزن فایل‌ها)
     Args:
-        max_age_days: حداکثر عمر دانلودها به روز
+        max_age_days: حداکثر مدت بدون استفاده به روز (پیش‌فرض: ARTIFACT_CACHE_TTL)
     Returns:
         تعداد فایل‌های پاک شده
     """
-    debug_log(f"پاکسازی دانلودهای قدیمی (حداکثر {max_age_days} روز)", "INFO")
-
-    count = 0
-    current_time = time.time()
-    max_age_seconds = max_age_days * 24 * 60 * 60
+    debug_log("پاکسازی دانلودهای قدیمی", "INFO")
 
     try:
-        # پیمایش دایرکتوری دانلودها
-        for file in os.listdir(DOWNLOADS_DIR):
-            file_path = os.path.join(DOWNLOADS_DIR, file)
-
-            # بررسی اگر فایل است (نه دایرکتوری)
-            if os.path.isfile(file_path):
-                # دریافت زمان آخرین تغییر
-                file_time = os.path.getmtime(file_path)
-                file_age = current_time - file_time
-
-                # اگر قدیمی‌تر از زمان تعیین شده بود، حذف شود
-                if file_age > max_age_seconds:
-                    os.remove(file_path)
-                    count += 1
-                    debug_log(f"فایل {file} حذف شد", "INFO")
-
+        max_idle = max_age_days * 24 * 60 * 60 if max_age_days is not None else None
+        return artifact_store.sweep(max_idle)
     except Exception as e:
         debug_log(f"خطا در پاکسازی دانلودهای قدیمی: {str(e)}", "ERROR")
+        return 0
+
+@debug_decorator
+def recover_interrupted_downloads(resubmit: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Dict[str, int]:
+    """
+    بازیابی دانلودهایی که با توقف یا راه‌اندازی مجدد ربات نیمه‌کاره مانده‌اند
+
+    دانلودهایی که کارشان از فایل صف بارگیری شده خودشان ادامه می‌یابند. بقیه
+    با resubmit دوباره به صف اضافه می‌شوند و چون نام فایل به شناسه دانلود
+    وابسته است، yt-dlp و دانلود چند اتصالی از داده‌های فایل .part ادامه می‌دهند
+    (فقط اگر فرمت ذخیره شده همراه کار با فرمت انتخابی جدید یکسان باشد).
+    کارهای فایل صف با نوع ناشناخته (بدون پردازشگر) شکست خورده و از صف حذف می‌شوند.
+    دانلودهای قدیمی یا غیرقابل بازیابی شکست خورده ثبت و فایل‌های نیمه‌کاره‌شان حذف می‌شوند.
+
+    Args:
+        resubmit: تابعی که رکورد دانلود را دوباره به صف اضافه می‌کند و در صورت موفقیت True برمی‌گرداند
 
-    return count
+    Returns:
+        آمار بازیابی (queued، resubmitted، failed، dropped)
+    """
+    global _recovery_done
+
+    stats = {"queued": 0, "resubmitted": 0, "failed": 0, "dropped": 0}
+
+    with _recovery_lock:
+        if _recovery_done:
+            return stats
+        _recovery_done = True
+
+    # کارهای فایل صف که نوعشان در این نسخه پردازشگری ندارد شکست خورده ثبت می‌شوند و
+    # دانلودشان مانند بقیه دانلودهای بدون کار بازیابی می‌شود
+    stats["dropped"] = len(download_scheduler.drop_unhandled_jobs())
+
+    if not RESUME_INTERRUPTED_DOWNLOADS:
+        return stats
+
+    # نام datetime در این ماژول چند بار بازتعریف شده است
+    from datetime import datetime as _datetime
+
+    max_age = RESUME_MAX_AGE_HOURS * 60 * 60
+    now = _datetime.now()
+
+    for row in get_interrupted_downloads():
+        download_id = row["id"]
+
+        # کار این دانلود از فایل صف بارگیری شده یا در حال اجراست
+        if download_scheduler.has_download(download_id):
+            stats["queued"] += 1
+            continue
+
+        try:
+            age = (now - _datetime.fromisoformat(row["start_time"])).total_seconds()
+        except (TypeError, ValueError):
+            age = max_age + 1
+
+        if age <= max_age and resubmit is not None:
+            try:
+                # وضعیت پیش از افزودن به صف ثبت می‌شود؛ کارگر ممکن است بلافاصله دانلود را شروع کند
+                update_download_status(download_id, DownloadStatus.PENDING)
+                if resubmit(row):
+                    stats["resubmitted"] += 1
+                    continue
+            except Exception as e:
+                debug_log(f"خطا در افزودن مجدد دانلود {download_id} به صف: {str(e)}", "ERROR")
+
+        update_download_status(download_id, DownloadStatus.FAILED, error_message="دانلود با راه‌اندازی مجدد ربات متوقف شد")
+        cleanup_partial_files(DOWNLOADS_DIR, f"{download_id}-")
+        stats["failed"] += 1
+
+    if any(stats.values()):
+        debug_log(
+            f"بازیابی دانلودهای نیمه‌کاره: {stats['queued']} در صف، "
+            f"{stats['resubmitted']} افزوده شده، {stats['failed']} شکست خورده، "
+            f"{stats['dropped']} کار ناشناخته حذف شده",
+            "INFO"
+        )
+
+    return stats
 
 import datetime
 def process_youtube_url(message, url):
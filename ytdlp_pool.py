@@ -0,0 +1,345 @@
+"""
+ماژول استخر پروسه‌های yt-dlp
+
+در حالت DOWNLOAD_ENGINE_MODE = "process" استخراج اطلاعات و دانلود yt-dlp
+به جای ترد‌های پروسه ربات، در پروسه‌های کارگر جداگانه اجرا می‌شوند تا
+تفسیر جاوااسکریپت و ادغام فایل‌ها GIL پروسه اصلی را اشغال نکنند. هر کارگر
+یک کار در هر لحظه انجام می‌دهد، پیشرفت و نتیجه را از طریق Pipe برمی‌گرداند
+و پس از تعداد مشخصی کار یا با عبور مصرف حافظه از حد مجاز بازسازی می‌شود.
+"""
+
+import os
+import queue
+import itertools
+import threading
+import multiprocessing
+from typing import Dict, Any, Optional, Callable, Tuple
+
+from config import (
+    DOWNLOAD_ENGINE_MODE, DOWNLOAD_PROCESS_WORKERS,
+    DOWNLOAD_PROCESS_MAX_JOBS, DOWNLOAD_PROCESS_MAX_RSS_MB
+)
+from debug_logger import debug_log
+from download_cancellation import DownloadCancelled
+
+try:
+    from yt_dlp.utils import DownloadError
+except ImportError:
+    DownloadError = RuntimeError
+
+
+def is_process_mode() -> bool:
+    """بررسی فعال بودن اجرای yt-dlp در استخر پروسه‌ها"""
+    return DOWNLOAD_ENGINE_MODE == "process"
+
+
+def _current_rss() -> int:
+    """مصرف حافظه فعلی همین پروسه به بایت"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+
+# --- کدهای اجرا شونده در پروسه کارگر ---
+
+def _task_extract(args: Tuple, send_progress: Callable, cancel_event: threading.Event) -> Dict[str, Any]:
+    """استخراج اطلاعات ویدیو (بدون دانلود)"""
+    from yt_dlp import YoutubeDL
+
+    url, opts = args
+    with YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+        return ydl.sanitize_info(info) if info else None
+
+
+def _make_child_hooks(send_progress: Callable, cancel_event: threading.Event):
+    """ساخت hook های پیشرفت که رویدادها را به پروسه اصلی می‌فرستند"""
+    from yt_dlp.utils import DownloadCancelled as YtdlpDownloadCancelled
+
+    progress_keys = ("status", "downloaded_bytes", "total_bytes", "total_bytes_estimate",
+                     "speed", "eta", "fragment_index", "fragment_count", "filename")
+
+    def progress_hook(data):
+        if cancel_event.is_set():
+            raise YtdlpDownloadCancelled("canceled")
+        send_progress("progress", {key: data.get(key) for key in progress_keys})
+
+    def postprocessor_hook(data):
+        if cancel_event.is_set() and data.get("status") == "started":
+            raise YtdlpDownloadCancelled("canceled")
+        send_progress("postprocessor", {"status": data.get("status"), "postprocessor": data.get("postprocessor")})
+
+    return progress_hook, postprocessor_hook
+
+
+def _task_download(args: Tuple, send_progress: Callable, cancel_event: threading.Event) -> None:
+    """دانلود با اطلاعات از قبل استخراج شده"""
+    from yt_dlp import YoutubeDL
+
+    video_info, opts = args
+    progress_hook, postprocessor_hook = _make_child_hooks(send_progress, cancel_event)
+    opts = dict(opts, progress_hooks=[progress_hook], postprocessor_hooks=[postprocessor_hook])
+
+    with YoutubeDL(opts) as ydl:
+        ydl.process_ie_result(video_info, download=True)
+    return None
+
+
+def _task_extract_and_download(args: Tuple, send_progress: Callable, cancel_event: threading.Event) -> Dict[str, Any]:
+    """استخراج و دانلود در یک مرحله (برای YouTubeDownloader)"""
+    from yt_dlp import YoutubeDL
+
+    url, opts = args
+    progress_hook, postprocessor_hook = _make_child_hooks(send_progress, cancel_event)
+    opts = dict(opts, progress_hooks=[progress_hook], postprocessor_hooks=[postprocessor_hook])
+
+    with YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        return {"title": info.get("title"), "ext": info.get("ext"), "id": info.get("id")} if info else None
+
+
+TASKS = {
+    "extract": _task_extract,
+    "download": _task_download,
+    "extract_and_download": _task_extract_and_download,
+}
+
+
+def _worker_main(task_conn, result_conn) -> None:
+    """
+    حلقه اصلی پروسه کارگر
+
+    پیام‌های ورودی: ("run", task_id, name, args)، ("cancel", task_id)، ("stop",)
+    پیام‌های خروجی: ("progress", task_id, kind, data)، ("result", task_id, value, rss)،
+    ("error", task_id, error_type, message, rss)
+    """
+    tasks = queue.Queue()
+    cancel_events = {}
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            result_conn.send(message)
+
+    # ترد شنونده برای دریافت درخواست لغو حین اجرای کار
+    def listen():
+        while True:
+            try:
+                message = task_conn.recv()
+            except (EOFError, OSError):
+                tasks.put(None)
+                return
+
+            if message[0] == "run":
+                cancel_events[message[1]] = threading.Event()
+                tasks.put(message)
+            elif message[0] == "cancel":
+                event = cancel_events.get(message[1])
+                if event is not None:
+                    event.set()
+            elif message[0] == "stop":
+                tasks.put(None)
+                return
+
+    listener = threading.Thread(target=listen, daemon=True)
+    listener.start()
+
+    while True:
+        message = tasks.get()
+        if message is None:
+            return
+
+        _, task_id, name, args = message
+        cancel_event = cancel_events[task_id]
+
+        def send_progress(kind, data, task_id=task_id):
+            send(("progress", task_id, kind, data))
+
+        try:
+            value = TASKS[name](args, send_progress, cancel_event)
+            send(("result", task_id, value, _current_rss()))
+        except Exception as e:
+            if cancel_event.is_set() or type(e).__name__ == "DownloadCancelled":
+                error_type = "cancelled"
+            elif type(e).__name__ in ("DownloadError", "ExtractorError"):
+                error_type = "download_error"
+            else:
+                error_type = "error"
+            send(("error", task_id, error_type, str(e), _current_rss()))
+        finally:
+            cancel_events.pop(task_id, None)
+
+
+# --- مدیریت استخر در پروسه اصلی ---
+
+class _WorkerProcess:
+    """یک پروسه کارگر و کانال‌های ارتباطی آن"""
+
+    def __init__(self, context, index: int):
+        self.index = index
+        self.jobs = 0
+        # Pipe(duplex=False) خروجی (سمت دریافت، سمت ارسال) برمی‌گرداند
+        child_task_conn, self.task_conn = context.Pipe(duplex=False)
+        self.result_conn, child_result_conn = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_task_conn, child_result_conn),
+            name=f"ytdlp-worker-{index}",
+            daemon=True
+        )
+        self.process.start()
+        child_task_conn.close()
+        child_result_conn.close()
+
+    def stop(self) -> None:
+        """توقف پروسه کارگر"""
+        try:
+            self.task_conn.send(("stop",))
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        self.task_conn.close()
+        self.result_conn.close()
+
+
+class YtdlpProcessPool:
+    """
+    استخر پروسه‌های کارگر yt-dlp با بازسازی دوره‌ای
+    """
+
+    def __init__(self, num_workers: int = DOWNLOAD_PROCESS_WORKERS,
+                 max_jobs: int = DOWNLOAD_PROCESS_MAX_JOBS,
+                 max_rss_mb: int = DOWNLOAD_PROCESS_MAX_RSS_MB):
+        self.num_workers = max(1, num_workers)
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._started = False
+        self._task_ids = itertools.count(1)
+        self._worker_ids = itertools.count(1)
+        self.stats = {"tasks": 0, "errors": 0, "cancelled": 0, "recycled": 0, "crashed": 0}
+
+    def start(self) -> None:
+        """راه‌اندازی پروسه‌های کارگر (فقط یک بار)"""
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.num_workers):
+                self._idle.put(_WorkerProcess(self._context, next(self._worker_ids)))
+            self._started = True
+
+        debug_log(f"استخر پروسه‌های yt-dlp با {self.num_workers} کارگر راه‌اندازی شد", "INFO")
+
+    def _replace(self, worker: _WorkerProcess, reason: str) -> None:
+        """جایگزینی پروسه کارگر با یک پروسه جدید"""
+        debug_log(f"بازسازی پروسه کارگر {worker.index} ({reason})", "INFO")
+        worker.stop()
+        self._idle.put(_WorkerProcess(self._context, next(self._worker_ids)))
+
+    def run(self, name: str, args: Tuple,
+            progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+            cancel_token=None) -> Any:
+        """
+        اجرای یک کار yt-dlp در پروسه کارگر (تا پایان کار مسدود می‌شود)
+
+        Args:
+            name: نام کار (extract، download، extract_and_download)
+            args: آرگومان‌های کار (باید قابل pickle باشند)
+            progress_callback: تابع دریافت پیشرفت به صورت (نوع، داده)
+            cancel_token: توکن لغو که هنگام انتظار بررسی می‌شود (اختیاری)
+
+        Returns:
+            نتیجه کار
+        """
+        self.start()
+        worker = self._idle.get()
+        task_id = next(self._task_ids)
+        cancel_sent = False
+        rss = 0
+
+        with self._lock:
+            self.stats["tasks"] += 1
+
+        try:
+            worker.task_conn.send(("run", task_id, name, args))
+
+            while True:
+                # ارسال درخواست لغو به پروسه کارگر
+                if cancel_token is not None and cancel_token.cancelled and not cancel_sent:
+                    worker.task_conn.send(("cancel", task_id))
+                    cancel_sent = True
+
+                if not worker.result_conn.poll(0.5):
+                    if not worker.process.is_alive():
+                        raise EOFError("پروسه کارگر متوقف شد")
+                    continue
+
+                message = worker.result_conn.recv()
+
+                if message[0] == "progress":
+                    if progress_callback and not cancel_sent:
+                        try:
+                            progress_callback(message[2], message[3])
+                        except DownloadCancelled:
+                            pass  # درخواست لغو در دور بعدی حلقه ارسال می‌شود
+                    continue
+
+                if message[0] == "result":
+                    rss = message[3]
+                    return message[2]
+
+                _, _, error_type, error_message, rss = message
+                with self._lock:
+                    self.stats["cancelled" if error_type == "cancelled" else "errors"] += 1
+
+                if error_type == "cancelled":
+                    raise DownloadCancelled(getattr(cancel_token, "reason", None) or "canceled")
+                if error_type == "download_error":
+                    raise DownloadError(error_message)
+                raise RuntimeError(error_message)
+
+        except (EOFError, OSError) as e:
+            # پروسه کارگر از کار افتاده است
+            with self._lock:
+                self.stats["crashed"] += 1
+            error_message = str(e) or type(e).__name__
+            self._replace(worker, f"خطا: {error_message}")
+            worker = None
+            raise RuntimeError(f"پروسه دانلود به صورت غیرمنتظره متوقف شد: {error_message}")
+
+        finally:
+            if worker is not None:
+                worker.jobs += 1
+                if worker.jobs >= self.max_jobs or (rss and rss > self.max_rss):
+                    with self._lock:
+                        self.stats["recycled"] += 1
+                    self._replace(worker, f"{worker.jobs} کار، حافظه {rss // (1024 * 1024)}MB")
+                else:
+                    self._idle.put(worker)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """دریافت آمار استخر پروسه‌ها"""
+        with self._lock:
+            return {
+                "mode": DOWNLOAD_ENGINE_MODE,
+                "workers": self.num_workers,
+                "idle": self._idle.qsize(),
+                **self.stats,
+            }
+
+
+# نمونه سراسری (پروسه‌ها در اولین استفاده ساخته می‌شوند)
+ytdlp_pool = YtdlpProcessPool()